@@ -0,0 +1,106 @@
+"""
+API key management endpoints.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Literal, Optional
+
+from beanie import PydanticObjectId
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import BaseModel, Field
+
+from app.auth.api_keys import api_key_auth, generate_api_key, hash_api_key
+from app.auth.dependencies import get_current_user
+from app.models.api_key import ApiKey
+from app.models.user import User
+
+router = APIRouter(prefix="/auth/api-keys", tags=["authentication"])
+
+# Active keys a user may hold at once
+MAX_KEYS_PER_USER = 20
+
+
+class ApiKeyCreate(BaseModel):
+    """API key creation request."""
+    name: str = Field(..., min_length=1, max_length=100)
+    scopes: List[Literal["read", "write"]] = Field(default_factory=lambda: ["read", "write"], min_length=1)
+    daily_quota: Optional[int] = Field(None, ge=1, description="Requests allowed per UTC day")
+    expires_in_days: Optional[int] = Field(None, ge=1, le=3650)
+
+
+def _require_session(request: Request) -> None:
+    """Keys are managed with a user session, never with another key."""
+    if getattr(request.state, "api_key", None) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="API keys cannot manage API keys"
+        )
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def create_api_key(
+    data: ApiKeyCreate,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Create an API key; the key itself is only returned in this response."""
+    _require_session(request)
+    
+    active = await ApiKey.find({"user_id": str(current_user.id), "is_active": True}).count()
+    if active >= MAX_KEYS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_KEYS_PER_USER} active API keys are allowed"
+        )
+    
+    key, prefix = generate_api_key()
+    api_key = ApiKey(
+        name=data.name,
+        user_id=str(current_user.id),
+        prefix=prefix,
+        key_hash=hash_api_key(key),
+        scopes=sorted(set(data.scopes)),
+        daily_quota=data.daily_quota,
+        expires_at=datetime.utcnow() + timedelta(days=data.expires_in_days) if data.expires_in_days else None
+    )
+    await api_key.insert()
+    
+    return dict(api_key.dict_public(), key=key)
+
+
+@router.get("")
+async def list_api_keys(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, List[Dict[str, Any]]]:
+    """List the user's API keys."""
+    _require_session(request)
+    keys = await ApiKey.find({"user_id": str(current_user.id)}).sort("-created_at").to_list()
+    return {"items": [api_key.dict_public() for api_key in keys]}
+
+
+@router.delete("/{key_id}")
+async def revoke_api_key(
+    key_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, str]:
+    """
+    Revoke an API key.
+    
+    The key stops working at once on this API process. Other processes
+    cache verified keys, so they may accept it for up to
+    api_key_cache_ttl_seconds more.
+    """
+    _require_session(request)
+    
+    api_key = None
+    if PydanticObjectId.is_valid(key_id):
+        api_key = await ApiKey.find_one({"_id": PydanticObjectId(key_id), "user_id": str(current_user.id)})
+    if not api_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="API key not found")
+    
+    api_key.is_active = False
+    await api_key.save()
+    api_key_auth.revoke(api_key.prefix)
+    
+    return {"message": "API key revoked"}
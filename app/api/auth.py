@@ -10,8 +10,9 @@ from fastapi.responses import RedirectResponse
 from pydantic import BaseModel, EmailStr, Field, validator
 import re
 
-from app.auth.password import get_password_hash, verify_password
+from app.auth.password import PasswordHasherBusy, password_hasher
 from app.auth.jwt import create_access_token
+from app.auth import oauth
 from app.auth.oauth import get_google_oauth, get_github_oauth
 from app.auth.dependencies import get_current_user
 from app.models.user import User
@@ -67,6 +68,22 @@ class OAuthResponse(BaseModel):
     user: UserResponse
 
 
+async def _hash_password(password: str) -> str:
+    """Hash a password in the bcrypt pool, answering 503 when it is saturated."""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise _busy(e)
+
+
+def _busy(error: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister):
     """Register a new user with email and password."""
@@ -82,7 +99,7 @@ async def register(user_data: UserRegister):
     user = User(
         email=user_data.email,
         full_name=user_data.full_name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await _hash_password(user_data.password),
         is_active=True
     )
     await user.insert()
@@ -102,12 +119,21 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    except PasswordHasherBusy as e:
+        raise _busy(e)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Upgrade hashes made with outdated cost parameters while the password is at hand
+    if new_hash:
+        user.hashed_password = new_hash
+        await user.save()
+    
     # Check if user is active
     if not user.is_active:
         raise HTTPException(
@@ -175,15 +201,13 @@ async def google_oauth_callback(request: Request, code: Optional[str] = None, er
         )
     
     try:
-        google = get_google_oauth()
         redirect_uri = str(request.url_for("google_oauth_callback"))
         
         # Exchange code for token
-        token_data = await google.exchange_code_for_token(code, redirect_uri)
-        access_token = token_data["access_token"]
+        token_data = await oauth.exchange_google_code(code, redirect_uri)
         
-        # Get user info
-        user_info = await google.get_user_info(access_token)
+        # Get user info (from the verified ID token when possible)
+        user_info = await oauth.get_google_identity(token_data)
         
         # Find or create user
         user = await User.find_one(User.email == user_info["email"])
@@ -249,15 +273,14 @@ async def github_oauth_callback(request: Request, code: Optional[str] = None, er
         )
     
     try:
-        github = get_github_oauth()
         redirect_uri = str(request.url_for("github_oauth_callback"))
         
         # Exchange code for token
-        token_data = await github.exchange_code_for_token(code, redirect_uri)
+        token_data = await oauth.exchange_github_code(code, redirect_uri)
         access_token = token_data["access_token"]
         
         # Get user info
-        user_info = await github.get_user_info(access_token)
+        user_info = await oauth.get_github_user_info(access_token)
         
         # GitHub might not provide email
         email = user_info.get("email")
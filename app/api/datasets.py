@@ -0,0 +1,104 @@
+"""Dataset job API endpoints."""
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+
+from app.auth.dependencies import get_current_user
+from app.models.user import User
+from app.generation.dataset import DATASET_FORMATS, dataset_service
+
+
+router = APIRouter(prefix="/api/v1", tags=["datasets"])
+
+
+def _dataset_public(generation, chunks: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    data = {
+        "job_id": generation.job_id,
+        "status": generation.status.value,
+        "template_id": generation.template_id,
+        "provider": generation.provider,
+        "model": generation.model,
+        "count": generation.count,
+        "result_count": generation.result_count,
+        "progress": generation.progress,
+        "total_tokens": generation.total_tokens,
+        "cost": generation.cost,
+        "error_message": generation.error_message,
+        "created_at": generation.created_at.isoformat(),
+        "completed_at": generation.completed_at.isoformat() if generation.completed_at else None
+    }
+    if chunks is not None:
+        data["chunks"] = chunks
+    return data
+
+
+@router.post("/datasets", status_code=202)
+async def start_dataset(
+    file: UploadFile = File(..., description="Variable sets, one per NDJSON line or CSV row"),
+    template_id: str = Form(...),
+    provider: str = Form(...),
+    model: str = Form(...),
+    format: Optional[str] = Form(None, description="ndjson or csv; defaults from the file name"),
+    variables: Optional[str] = Form(None, description="JSON object of variables shared by all rows"),
+    max_cost: Optional[float] = Form(None, gt=0),
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Start a dataset job generating one item per row of the uploaded file."""
+    format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    if format not in DATASET_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported variables file format: {format}")
+    
+    try:
+        shared = json.loads(variables) if variables else {}
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="variables must be a JSON object")
+    if not isinstance(shared, dict):
+        raise HTTPException(status_code=400, detail="variables must be a JSON object")
+    
+    try:
+        generation = await dataset_service.start_dataset(
+            user=current_user,
+            template_id=template_id,
+            provider=provider,
+            model=model,
+            source=file.file,
+            format=format,
+            variables=shared,
+            max_cost=max_cost
+        )
+    except ValueError as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=404, detail="Template not found")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return dict(_dataset_public(generation), chunks=generation.metadata["dataset"]["chunks"])
+
+
+@router.get("/datasets/{job_id}")
+async def get_dataset(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Progress of a dataset job, including its chunks per status."""
+    generation = await dataset_service.get_dataset(job_id, current_user)
+    if not generation:
+        raise HTTPException(status_code=404, detail="Dataset job not found")
+    
+    return _dataset_public(generation, await dataset_service.chunk_counts(generation.id))
+
+
+@router.post("/datasets/{job_id}/resume", status_code=202)
+async def resume_dataset(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Continue an interrupted dataset job; completed chunks are not generated again."""
+    try:
+        generation = await dataset_service.resume(job_id, current_user)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return _dataset_public(generation)
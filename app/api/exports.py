@@ -0,0 +1,106 @@
+"""Bulk export API endpoints."""
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+
+from app.auth.dependencies import get_current_user
+from app.models.generation import GenerationStatus
+from app.models.user import User
+from app.generation.bulk_export import BULK_MEDIA_TYPES, bulk_export_service
+
+
+router = APIRouter(prefix="/api/v1", tags=["exports"])
+
+
+class BulkExportFormat(str, Enum):
+    """Archive formats of bulk exports."""
+    
+    ZIP = "zip"
+    NDJSON = "ndjson"
+
+
+class ArchiveEntryFormat(str, Enum):
+    """Formats of the per-generation files inside a ZIP archive."""
+    
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
+    TSV = "tsv"
+    MARKDOWN = "markdown"
+    HTML = "html"
+    XML = "xml"
+    TXT = "txt"
+
+
+class BulkExportRequest(BaseModel):
+    """Request model for a bulk export; filters match the history endpoint."""
+    
+    format: BulkExportFormat = Field(BulkExportFormat.ZIP, description="Archive format")
+    entry_format: ArchiveEntryFormat = Field(
+        ArchiveEntryFormat.JSON, description="Format of each generation inside a ZIP archive"
+    )
+    status: Optional[str] = Field(GenerationStatus.COMPLETED.value, description="Generation status")
+    template_id: Optional[str] = Field(None, description="Only generations of this template")
+    created_from: Optional[datetime] = Field(None, description="Created at or after")
+    created_to: Optional[datetime] = Field(None, description="Created before")
+
+
+@router.post("/exports", status_code=202)
+async def start_bulk_export(
+    request: BulkExportRequest,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Export every generation matching a history filter into one archive."""
+    try:
+        export = await bulk_export_service.start_export(
+            user=current_user,
+            format=request.format.value,
+            entry_format=request.entry_format.value,
+            status=request.status,
+            template_id=request.template_id,
+            created_from=request.created_from,
+            created_to=request.created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return export.dict_public()
+
+
+@router.get("/exports/{export_id}")
+async def get_bulk_export(
+    export_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Get bulk export progress and, once completed, its download URL."""
+    export = await bulk_export_service.get_export(export_id, current_user)
+    if not export:
+        raise HTTPException(status_code=404, detail="Export not found")
+    
+    return export.dict_public()
+
+
+@router.get("/exports/{export_id}/download")
+async def download_bulk_export(
+    export_id: str,
+    current_user: User = Depends(get_current_user)
+) -> FileResponse:
+    """Download a completed bulk export archive."""
+    export = await bulk_export_service.get_export(export_id, current_user)
+    if not export:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if export.status != GenerationStatus.COMPLETED or not export.path:
+        raise HTTPException(status_code=409, detail=f"Export is {export.status.value}")
+    if not Path(export.path).is_file():
+        raise HTTPException(status_code=410, detail="Export archive no longer available")
+    
+    return FileResponse(
+        export.path,
+        media_type=BULK_MEDIA_TYPES[export.format],
+        filename=f"generations_{export.export_id}.{export.format}"
+    )
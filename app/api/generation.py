@@ -1,12 +1,23 @@
 """Generation API endpoints."""
-from typing import Dict, Any, List, Optional
+import asyncio
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.auth.dependencies import get_current_user
+from app.models.generation import GENERATION_VIEW_FIELDS, GenerationView, view_for_fields
 from app.models.user import User
 from app.generation.service import generation_service
+from app.generation.export import BINARY_EXPORT_MEDIA_TYPES, export_media
+from app.generation.export_cache import export_cache, export_usage, parse_range
+from app.generation.export_pool import ExportBusyError
+from app.generation.pagination import HistoryTotal
+from app.providers.router import RoutingConstraints
 
 
 router = APIRouter(prefix="/api/v1", tags=["generation"])
@@ -16,10 +27,16 @@ class GenerationRequest(BaseModel):
     """Request model for starting generation."""
     
     template_id: str = Field(..., description="Template ID to use")
-    provider: str = Field(..., description="LLM provider (openrouter/ollama)")
-    model: str = Field(..., description="Model identifier")
+    provider: str = Field(..., description="LLM provider (openrouter/ollama), or 'auto' with model 'auto'")
+    model: str = Field(..., description="Model identifier, or 'auto' to let the router choose")
     variables: Dict[str, Any] = Field(default_factory=dict, description="Template variables")
-    count: int = Field(1, ge=1, le=100, description="Number of items to generate")
+    count: int = Field(1, ge=1, description="Number of items to generate (up to generation_max_count)")
+    routing: Optional[RoutingConstraints] = Field(
+        None, description="Routing policy and constraints used when model is 'auto'"
+    )
+    max_cost: Optional[float] = Field(
+        None, gt=0, description="Budget in USD; the job is rejected or cut short when exceeded"
+    )
 
 
 class BatchGenerationRequest(BaseModel):
@@ -40,17 +57,46 @@ class GenerationResponse(BaseModel):
     created_at: str
 
 
-class ExportFormat(str):
+class ExportFormat(str, Enum):
     """Supported export formats."""
     
     JSON = "json"
+    NDJSON = "ndjson"
     CSV = "csv"
+    TSV = "tsv"
     PDF = "pdf"
     XLSX = "xlsx"
     MARKDOWN = "markdown"
     HTML = "html"
     XML = "xml"
     TXT = "txt"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+def _resolve_view(
+    view: Optional[GenerationView],
+    fields: Optional[str]
+) -> Tuple[GenerationView, Optional[List[str]]]:
+    """View to read and the fields to return for the `view`/`fields` parameters."""
+    if not fields:
+        return view or GenerationView.FULL, None
+    
+    selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    try:
+        needed = view_for_fields(selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # An explicit larger view still wins, fields only trim its output
+    views = list(GENERATION_VIEW_FIELDS)
+    if view and views.index(view) > views.index(needed):
+        needed = view
+    return needed, selected
+
+
+def _select_fields(data: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    return {name: data[name] for name in fields} if fields else data
 
 
 @router.post("/generate", response_model=GenerationResponse, status_code=202)
@@ -66,7 +112,9 @@ async def start_generation(
             provider=request.provider,
             model=request.model,
             variables=request.variables,
-            count=request.count
+            count=request.count,
+            routing=request.routing.dict() if request.routing else None,
+            max_cost=request.max_cost
         )
         
         return GenerationResponse(
@@ -86,31 +134,60 @@ async def start_generation(
         raise HTTPException(status_code=500, detail="Failed to start generation")
 
 
+@router.post("/generate/estimate")
+async def estimate_generation(
+    request: GenerationRequest,
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Estimate token usage and cost of a generation job from cached pricing."""
+    try:
+        return await generation_service.estimate_generation(
+            user=current_user,
+            template_id=request.template_id,
+            provider=request.provider,
+            model=request.model,
+            variables=request.variables,
+            count=request.count,
+            routing=request.routing.dict() if request.routing else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/generate/{job_id}")
 async def get_generation_status(
     job_id: str,
+    view: Optional[GenerationView] = Query(
+        None, description="status, summary or full (default); status is the cheapest to poll"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     current_user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Get generation job status."""
-    generation = await generation_service.get_generation_status(job_id, current_user)
+    view, selected = _resolve_view(view, fields)
+    generation = await generation_service.get_generation_view(job_id, current_user, view)
     if not generation:
         raise HTTPException(status_code=404, detail="Generation job not found")
     
-    return generation.dict_public()
+    return _select_fields(generation, selected)
 
 
 @router.get("/generate/{job_id}/result")
 async def get_generation_result(
     job_id: str,
     current_user: User = Depends(get_current_user)
-) -> Dict[str, Any]:
+) -> StreamingResponse:
     """Get generation results if completed."""
     try:
         generation = await generation_service.get_generation_result(job_id, current_user)
         if not generation:
             raise HTTPException(status_code=404, detail="Generation job not found")
         
-        return generation.dict_public()
+        # Results are streamed from generation_items rather than loaded at once
+        return StreamingResponse(
+            generation_service.stream_generation_result(generation),
+            media_type="application/json"
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -136,162 +213,125 @@ async def get_generation_history(
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = Query(None),
     template_id: Optional[str] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    view: Optional[GenerationView] = Query(
+        None, description="status, summary or full (default); summary omits results and variables"
+    ),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return per item"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    total: HistoryTotal = Query(
+        HistoryTotal.CACHED, description="exact, cached (may lag by up to a minute) or none"
+    ),
     current_user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Get user's generation history."""
-    return await generation_service.get_user_history(
-        user=current_user,
-        skip=skip,
-        limit=limit,
-        status=status,
-        template_id=template_id
-    )
+    view, selected = _resolve_view(view, fields)
+    try:
+        history = await generation_service.get_user_history(
+            user=current_user,
+            skip=skip,
+            limit=limit,
+            status=status,
+            template_id=template_id,
+            created_from=created_from,
+            created_to=created_to,
+            view=view,
+            cursor=cursor,
+            total=total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    history["items"] = [_select_fields(item, selected) for item in history["items"]]
+    return history
 
 
 @router.get("/generate/{job_id}/export")
 async def export_generation(
     job_id: str,
+    request: Request,
     format: ExportFormat = Query(ExportFormat.JSON),
     current_user: User = Depends(get_current_user)
 ):
     """Export generation results in specified format."""
-    from fastapi.responses import Response, JSONResponse
-    
     try:
-        export_data = await generation_service.export_generation(
-            job_id, current_user, format.value
-        )
-        
-        # Return appropriate response based on format
-        if format == ExportFormat.JSON:
-            return JSONResponse(content=export_data)
-        
-        elif format == ExportFormat.CSV:
-            return Response(
-                content=export_data,
-                media_type="text/csv",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.csv"
-                }
-            )
+        generation_id = await generation_service.get_export_target(job_id, current_user)
+        export_usage.record(str(current_user.id), format.value)
         
-        elif format == ExportFormat.MARKDOWN:
-            return Response(
-                content=export_data,
-                media_type="text/markdown",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.md"
-                }
-            )
+        media_type, disposition, extension = export_media(format.value)
+        key = export_cache.key(str(generation_id), format.value)
+        headers = {
+            "Content-Disposition": f"{disposition}; filename=generation_{job_id}.{extension}",
+            "ETag": export_cache.etag(key),
+            "Cache-Control": "private, no-cache"
+        }
         
-        elif format == ExportFormat.HTML:
-            return Response(
-                content=export_data,
-                media_type="text/html",
-                headers={
-                    "Content-Disposition": f"inline; filename=generation_{job_id}.html"
-                }
-            )
+        # Completed generations never change, so a matching ETag is always current
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or export_cache.etag(key) in if_none_match:
+            return Response(status_code=304, headers=headers)
         
-        elif format == ExportFormat.XML:
-            return Response(
-                content=export_data,
-                media_type="application/xml",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.xml"
-                }
-            )
+        if export_cache.enabled:
+            path = export_cache.get(key)
+            if path:
+                return _cached_export_response(path, request, media_type, headers)
         
-        elif format == ExportFormat.TXT:
-            return Response(
-                content=export_data,
-                media_type="text/plain",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.txt"
-                }
-            )
+        if format.value in BINARY_EXPORT_MEDIA_TYPES:
+            # Spreadsheet and PDF rendering is CPU bound; it runs in worker processes
+            content = await generation_service.render_binary_export(generation_id, format.value)
+            if export_cache.enabled:
+                await export_cache.store(key, content)
+            return Response(content=content, media_type=media_type, headers=headers)
         
-        elif format == ExportFormat.XLSX:
-            # For Excel, we need to create actual file
-            import io
-            import pandas as pd
-            
-            excel_data = export_data["sheets"][0]["data"]
-            df = pd.DataFrame(excel_data)
-            
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Results', index=False)
-            
-            return Response(
-                content=output.getvalue(),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.xlsx"
-                }
-            )
-        
-        elif format == ExportFormat.PDF:
-            # For PDF, we'll use reportlab
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
-            import io
-            
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            elements.append(Paragraph(export_data["title"], styles['Title']))
-            elements.append(Paragraph(f"Generated: {export_data['generated_at']}", styles['Normal']))
-            elements.append(Spacer(1, 20))
-            
-            # Results
-            for i, result in enumerate(export_data["results"], 1):
-                elements.append(Paragraph(f"Result {i}", styles['Heading2']))
-                
-                # Convert result to table data
-                table_data = []
-                for key, value in result.items():
-                    table_data.append([str(key), str(value)])
-                
-                if table_data:
-                    t = Table(table_data)
-                    t.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 12),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                    ]))
-                    elements.append(t)
-                    elements.append(Spacer(1, 20))
-            
-            doc.build(elements)
-            
-            return Response(
-                content=buffer.getvalue(),
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename=generation_{job_id}.pdf"
-                }
-            )
-        
-        else:
-            return JSONResponse(content=export_data)
+        # Text formats are rendered result by result while being sent
+        chunks = generation_service.stream_results_export(generation_id, format.value)
+        if export_cache.enabled:
+            chunks = export_cache.store_stream(key, chunks)
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
             
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ExportBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Export timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
+def _cached_export_response(
+    path: Path,
+    request: Request,
+    media_type: str,
+    headers: Dict[str, str]
+) -> Response:
+    """Serve a cached export, honouring a single byte Range."""
+    size = path.stat().st_size
+    headers = dict(headers, **{"Accept-Ranges": "bytes"})
+    
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == headers["ETag"]:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(export_cache.read(path), media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        export_cache.read(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
+
+
 @router.post("/generate/batch", status_code=202)
 async def start_batch_generation(
     request: BatchGenerationRequest,
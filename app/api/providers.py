@@ -7,6 +7,8 @@ from pydantic import BaseModel
 
 from app.providers.factory import ProviderFactory
 from app.providers.base import ModelInfo
+from app.providers.circuit_breaker import circuit_breakers
+from app.providers.telemetry import telemetry
 from app.auth.dependencies import get_current_user
 from app.models.user import User
 
@@ -59,6 +61,18 @@ async def list_providers():
     return provider_list
 
 
+@router.get("/circuits")
+async def list_circuit_breakers():
+    """List circuit breaker state for every provider/model seen so far."""
+    return circuit_breakers.snapshot()
+
+
+@router.get("/telemetry")
+async def list_model_telemetry():
+    """List rolling latency and error-rate statistics used by the model router."""
+    return telemetry.snapshot()
+
+
 @router.get("/models", response_model=List[ModelInfo])
 async def list_models(
     provider: Optional[str] = Query(None, description="Filter by provider"),
@@ -0,0 +1,72 @@
+"""Usage statistics API endpoints."""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.auth.dependencies import get_current_superuser, get_current_user
+from app.models.usage import RollupGranularity, RollupScope
+from app.models.user import User
+from app.stats.rollups import usage_rollups
+from app.templates.service import TemplateService
+
+
+router = APIRouter(prefix="/api/v1/stats", tags=["stats"])
+
+# Initialize service
+template_service = TemplateService()
+
+
+async def _series(
+    scope: RollupScope,
+    key: str,
+    granularity: RollupGranularity,
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Dict[str, Any]:
+    try:
+        return await usage_rollups.series(scope, key, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/usage")
+async def get_usage(
+    granularity: RollupGranularity = Query(RollupGranularity.HOUR),
+    start: Optional[datetime] = Query(None, description="Defaults to 24 hours or 30 days before end"),
+    end: Optional[datetime] = Query(None, description="Defaults to now"),
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Jobs, items, tokens, cost and item latency of the current user over time."""
+    return await _series(RollupScope.USER, str(current_user.id), granularity, start, end)
+
+
+@router.get("/templates/{template_id}")
+async def get_template_usage(
+    template_id: str,
+    granularity: RollupGranularity = Query(RollupGranularity.HOUR),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Usage of a template by all users; only for the template's creator."""
+    template = await template_service.get_template(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    if template.owner_id != str(current_user.id) and not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not authorized to view usage of this template")
+    
+    return await _series(RollupScope.TEMPLATE, template_id, granularity, start, end)
+
+
+@router.get("/models")
+async def get_model_usage(
+    provider: str = Query(..., description="Provider ID, e.g. openrouter"),
+    model: str = Query(..., description="Model ID as requested"),
+    granularity: RollupGranularity = Query(RollupGranularity.HOUR),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    current_user: User = Depends(get_current_superuser)
+) -> Dict[str, Any]:
+    """Usage of a model across all users."""
+    return await _series(RollupScope.MODEL, f"{provider}/{model}", granularity, start, end)
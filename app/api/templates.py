@@ -172,7 +172,7 @@ async def get_template(
     
     # Check access rights
     if not template.is_public:
-        if not current_user or str(template.created_by.id) != str(current_user.id):
+        if not current_user or template.owner_id != str(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access denied to private template"
@@ -264,7 +264,7 @@ async def preview_template(
             )
         
         # Check access
-        if not template.is_public and str(template.created_by.id) != str(current_user.id):
+        if not template.is_public and template.owner_id != str(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access denied to private template"
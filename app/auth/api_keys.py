@@ -0,0 +1,275 @@
+"""
+API keys for machine clients.
+
+Keys look like `ltk_<prefix>_<secret>`. Only an HMAC-SHA256 of the whole key
+(keyed with the app secret) is stored, so verification is a single fast
+hash instead of bcrypt; the prefix is indexed for lookup. Verified keys are
+cached in memory, and usage counters are accumulated per process and
+written to MongoDB in periodic batches instead of once per request.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.cache import TTLCache
+from app.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ltk_"
+
+API_KEY_SCOPES = ("read", "write")
+
+
+class ApiKeyError(Exception):
+    """The key is unknown, revoked, expired or lacks a scope."""
+
+
+class ApiKeyScopeError(ApiKeyError):
+    """The key does not grant the scope a request needs."""
+
+
+class ApiKeyQuotaExceeded(ApiKeyError):
+    """The key used up its daily quota."""
+
+
+def generate_api_key() -> Tuple[str, str]:
+    """New (key, prefix) pair; the key is shown to its owner once."""
+    prefix = secrets.token_hex(6)
+    return f"{KEY_PREFIX}{prefix}_{secrets.token_urlsafe(32)}", prefix
+
+
+def hash_api_key(key: str) -> str:
+    """Keyed hash stored in place of the key."""
+    secret = get_settings().secret_key.encode("utf-8")
+    return hmac.new(secret, key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def is_api_key(token: str) -> bool:
+    return token.startswith(KEY_PREFIX)
+
+
+def key_prefix(key: str) -> Optional[str]:
+    """Lookup prefix of a well-formed key, else None."""
+    prefix, _, secret = key[len(KEY_PREFIX):].partition("_")
+    return prefix if prefix and secret else None
+
+
+def required_scope(method: str) -> str:
+    """Scope a request needs: reads for safe methods, writes otherwise."""
+    return "read" if method.upper() in ("GET", "HEAD", "OPTIONS") else "write"
+
+
+def _today() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+@dataclass
+class CachedKey:
+    """Snapshot of a verified key and its owner."""
+    
+    key_id: Any
+    key_hash: str
+    scopes: List[str]
+    daily_quota: Optional[int]
+    expires_at: Optional[datetime]
+    user: Any
+    used_today: int = 0
+    day: str = field(default_factory=_today)
+
+
+class ApiKeyCache(TTLCache[str, CachedKey]):
+    """Size-bounded TTL cache of prefix -> verified key."""
+    
+    ttl_setting = "api_key_cache_ttl_seconds"
+    size_setting = "api_key_cache_size"
+    
+    def invalidate(self, prefix: str) -> None:
+        self.pop(prefix)
+    
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached key of a user (after the user changes)."""
+        for prefix, cached in self.items():
+            if str(cached.user.id) == user_id:
+                self.pop(prefix)
+
+
+# (key id, UTC day) -> (requests, last use)
+UsageCounts = Dict[Tuple[Any, str], Tuple[int, datetime]]
+
+
+async def _write_usage(pending: UsageCounts) -> None:
+    """Apply accumulated usage to MongoDB in one bulk write."""
+    from pymongo import UpdateOne
+    from app.models.api_key import ApiKey
+    
+    operations = [
+        UpdateOne(
+            {"_id": key_id},
+            {
+                "$inc": {"usage_count": count, f"daily_usage.{day}": count},
+                "$max": {"last_used_at": last_used}
+            }
+        )
+        for (key_id, day), (count, last_used) in pending.items()
+    ]
+    if operations:
+        await ApiKey.get_motor_collection().bulk_write(operations, ordered=False)
+
+
+class UsageRecorder:
+    """Counts key usage in memory and flushes it in batches."""
+    
+    def __init__(
+        self,
+        writer: Optional[Callable[[UsageCounts], Awaitable[None]]] = None,
+        interval: Optional[float] = None
+    ):
+        self._writer = writer or _write_usage
+        self._interval = interval
+        self._pending: UsageCounts = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+    
+    @property
+    def interval(self) -> float:
+        return get_settings().api_key_usage_flush_seconds if self._interval is None else self._interval
+    
+    @property
+    def pending(self) -> int:
+        return sum(count for count, _ in self._pending.values())
+    
+    def record(self, key_id: Any) -> None:
+        """Count one request; counts are written by the next flush."""
+        slot = (key_id, _today())
+        count, _ = self._pending.get(slot, (0, None))
+        self._pending[slot] = (count + 1, datetime.utcnow())
+    
+    def start(self) -> None:
+        """Flush every interval, in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the background flusher and write the counts still pending."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """Write pending counters; they are kept for the next flush on failure."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await self._writer(pending)
+            self.flushes += 1
+        except Exception as e:
+            logger.warning(f"Could not write API key usage: {e}")
+            for slot, (count, last_used) in pending.items():
+                current = self._pending.get(slot)
+                if current:
+                    count += current[0]
+                    last_used = max(last_used, current[1])
+                self._pending[slot] = (count, last_used)
+    
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending, "flushes": self.flushes}
+
+
+class ApiKeyAuthenticator:
+    """Resolves API keys to their users with caching, scopes and quotas."""
+    
+    def __init__(self, cache: Optional[ApiKeyCache] = None, usage: Optional[UsageRecorder] = None):
+        self.cache = cache or ApiKeyCache()
+        self.usage = usage or UsageRecorder()
+    
+    async def _load(self, prefix: str) -> Optional[CachedKey]:
+        from app.models.api_key import ApiKey
+        from app.models.user import User
+        
+        api_key = await ApiKey.find_one({"prefix": prefix})
+        if api_key is None or not api_key.is_active:
+            return None
+        user = await User.get(api_key.user_id)
+        if user is None or not user.is_active:
+            return None
+        return CachedKey(
+            key_id=api_key.id,
+            key_hash=api_key.key_hash,
+            scopes=list(api_key.scopes),
+            daily_quota=api_key.daily_quota,
+            expires_at=api_key.expires_at,
+            user=user,
+            used_today=api_key.daily_usage.get(_today(), 0)
+        )
+    
+    async def authenticate(self, key: str, scope: str) -> Tuple[Any, CachedKey]:
+        """
+        User of a key allowed to use `scope`.
+        
+        Raises ApiKeyError for invalid keys and ApiKeyQuotaExceeded once the
+        daily quota is used up. Quotas are enforced per process on top of
+        the usage persisted when the key was loaded, so they are approximate
+        across workers.
+        """
+        prefix = key_prefix(key)
+        if prefix is None:
+            raise ApiKeyError("Invalid API key")
+        
+        cached = self.cache.get(prefix)
+        if cached is None:
+            cached = await self._load(prefix)
+            if cached is None:
+                raise ApiKeyError("Invalid API key")
+            self.cache.set(prefix, cached)
+        
+        if not hmac.compare_digest(cached.key_hash, hash_api_key(key)):
+            raise ApiKeyError("Invalid API key")
+        if cached.expires_at and cached.expires_at <= datetime.utcnow():
+            raise ApiKeyError("API key expired")
+        if scope not in cached.scopes:
+            raise ApiKeyScopeError(f"API key lacks the '{scope}' scope")
+        
+        today = _today()
+        if cached.day != today:
+            cached.day = today
+            cached.used_today = 0
+        if cached.daily_quota is not None and cached.used_today >= cached.daily_quota:
+            raise ApiKeyQuotaExceeded("API key daily quota exceeded")
+        
+        cached.used_today += 1
+        self.usage.record(cached.key_id)
+        return cached.user.model_copy(), cached
+    
+    def revoke(self, prefix: str) -> None:
+        """
+        Forget a revoked key in this process.
+        
+        Other processes keep accepting it until their cached copy expires,
+        at most api_key_cache_ttl_seconds later.
+        """
+        self.cache.invalidate(prefix)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self.cache.stats(), "usage": self.usage.stats()}
+
+
+# Shared authenticator for the API process
+api_key_auth = ApiKeyAuthenticator()
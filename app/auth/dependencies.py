@@ -2,10 +2,19 @@
 FastAPI authentication dependencies.
 """
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.auth.jwt import get_user_email_from_token
+from app.auth.api_keys import (
+    ApiKeyError,
+    ApiKeyQuotaExceeded,
+    ApiKeyScopeError,
+    api_key_auth,
+    is_api_key,
+    required_scope
+)
+from app.auth.jwt import verify_token
+from app.auth.user_cache import user_cache
 from app.models.user import User
 
 # HTTP Bearer token scheme
@@ -13,13 +22,23 @@ security = HTTPBearer()
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    request: Request = None
 ) -> User:
-    """Get current authenticated user from JWT token."""
+    """Get current authenticated user from JWT token or API key."""
     token = credentials.credentials
     
+    if is_api_key(token):
+        return await _get_api_key_user(token, request)
+    
+    # Recently verified tokens skip signature checking and the user lookup
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+    
     # Extract email from token
-    email = get_user_email_from_token(token)
+    payload = verify_token(token)
+    email = payload.get("sub") if payload else None
     if email is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -43,6 +62,28 @@ async def get_current_user(
             detail="Inactive user"
         )
     
+    user_cache.set(token, user, payload.get("exp"))
+    return user
+
+
+async def _get_api_key_user(key: str, request: Optional[Request]) -> User:
+    """Owner of an API key; safe methods need the read scope, others write."""
+    scope = required_scope(request.method) if request is not None else "write"
+    try:
+        user, api_key = await api_key_auth.authenticate(key, scope)
+    except ApiKeyQuotaExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except ApiKeyScopeError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except ApiKeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    if request is not None:
+        request.state.api_key = api_key
     return user
 
 
@@ -62,6 +103,7 @@ async def get_current_superuser(current_user: User = Depends(get_current_user))
 
 
 async def get_optional_current_user(
+    request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
 ) -> Optional[User]:
     """Get current user if authenticated, None otherwise."""
@@ -69,6 +111,6 @@ async def get_optional_current_user(
         return None
     
     try:
-        return await get_current_user(credentials)
+        return await get_current_user(credentials, request)
     except HTTPException:
         return None
\ No newline at end of file
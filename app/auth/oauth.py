@@ -1,13 +1,100 @@
 """
 OAuth providers integration (Google, GitHub).
 """
-from typing import Dict, Any, Optional
+import asyncio
+import time
+from typing import Dict, Any, Optional, Tuple
 import httpx
+from jose import JWTError, jwt
 from urllib.parse import urlencode
 
 from app.config import get_settings
 
 
+# Shared client so token exchanges and API calls reuse pooled connections
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_oauth_client() -> httpx.AsyncClient:
+    """Pooled HTTP client for all OAuth provider calls."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        settings = get_settings()
+        _http_client = httpx.AsyncClient(
+            timeout=settings.oauth_http_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.oauth_http_max_connections,
+                max_keepalive_connections=settings.oauth_http_max_connections
+            )
+        )
+    return _http_client
+
+
+def set_oauth_client(client: Optional[httpx.AsyncClient]) -> None:
+    """Replace the shared client (e.g. with one bound to a mock server)."""
+    global _http_client
+    _http_client = client
+
+
+async def close_oauth_client() -> None:
+    """Close the shared client."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class MetadataCache:
+    """JSON documents (discovery, JWKS) cached for a TTL, fetched once per expiry."""
+    
+    # Forced refreshes (key rotation) are not repeated more often than this
+    MIN_REFRESH_INTERVAL = 60.0
+    
+    def __init__(self, ttl: Optional[float] = None):
+        self._ttl = ttl
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.fetches = 0
+    
+    @property
+    def ttl(self) -> float:
+        return get_settings().oauth_metadata_ttl_seconds if self._ttl is None else self._ttl
+    
+    def _cached(self, url: str, force: bool) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        limit = self.MIN_REFRESH_INTERVAL if force else self.ttl
+        return entry[1] if age < limit else None
+    
+    async def get(self, url: str, force: bool = False) -> Dict[str, Any]:
+        """Cached document at url, refetched when expired or forced."""
+        document = self._cached(url, force)
+        if document is not None:
+            return document
+        
+        # Concurrent logins wait for a single fetch
+        async with self._locks.setdefault(url, asyncio.Lock()):
+            document = self._cached(url, force)
+            if document is not None:
+                return document
+            response = await get_oauth_client().get(url)
+            response.raise_for_status()
+            document = response.json()
+            self.fetches += 1
+            self._entries[url] = (time.monotonic(), document)
+            return document
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self.fetches = 0
+
+
+# Provider metadata shared by all logins
+metadata_cache = MetadataCache()
+
+
 class OAuthProvider:
     """Base OAuth provider class."""
     
@@ -15,6 +102,10 @@ class OAuthProvider:
         self.client_id = client_id
         self.client_secret = client_secret
     
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return get_oauth_client()
+    
     def get_authorization_url(self, redirect_uri: str, state: str = None) -> str:
         """Get OAuth authorization URL."""
         raise NotImplementedError
@@ -34,6 +125,8 @@ class GoogleOAuth(OAuthProvider):
     AUTHORIZATION_URL = "https://accounts.google.com/o/oauth2/v2/auth"
     TOKEN_URL = "https://oauth2.googleapis.com/token"
     USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+    DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+    ISSUERS = ("https://accounts.google.com", "accounts.google.com")
     
     def get_authorization_url(self, redirect_uri: str, state: str = None) -> str:
         """Get Google OAuth authorization URL."""
@@ -59,19 +152,45 @@ class GoogleOAuth(OAuthProvider):
             "redirect_uri": redirect_uri
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.TOKEN_URL, data=data)
-            response.raise_for_status()
-            return response.json()
+        response = await self.http.post(self.TOKEN_URL, data=data)
+        response.raise_for_status()
+        return response.json()
     
     async def get_user_info(self, access_token: str) -> Dict[str, Any]:
         """Get Google user information."""
         headers = {"Authorization": f"Bearer {access_token}"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.USERINFO_URL, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.http.get(self.USERINFO_URL, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    
+    async def verify_id_token(self, id_token: str, access_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Verify an OpenID Connect ID token against Google's cached signing keys.
+        
+        Raises JWTError when the token is invalid.
+        """
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        discovery = await metadata_cache.get(self.DISCOVERY_URL)
+        
+        key = None
+        for force in (False, True):
+            # An unknown key id means Google rotated keys since the JWKS was cached
+            jwks = await metadata_cache.get(discovery["jwks_uri"], force=force)
+            key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
+            if key:
+                break
+        if key is None:
+            raise JWTError(f"No signing key found for kid {kid}")
+        
+        return jwt.decode(
+            id_token,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            audience=self.client_id,
+            issuer=self.ISSUERS,
+            access_token=access_token
+        )
 
 
 class GitHubOAuth(OAuthProvider):
@@ -80,6 +199,7 @@ class GitHubOAuth(OAuthProvider):
     AUTHORIZATION_URL = "https://github.com/login/oauth/authorize"
     TOKEN_URL = "https://github.com/login/oauth/access_token"
     USERINFO_URL = "https://api.github.com/user"
+    EMAILS_URL = "https://api.github.com/user/emails"
     
     def get_authorization_url(self, redirect_uri: str, state: str = None) -> str:
         """Get GitHub OAuth authorization URL."""
@@ -104,10 +224,9 @@ class GitHubOAuth(OAuthProvider):
         
         headers = {"Accept": "application/json"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.TOKEN_URL, data=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.http.post(self.TOKEN_URL, data=data, headers=headers)
+        response.raise_for_status()
+        return response.json()
     
     async def get_user_info(self, access_token: str) -> Dict[str, Any]:
         """Get GitHub user information."""
@@ -116,31 +235,28 @@ class GitHubOAuth(OAuthProvider):
             "Accept": "application/vnd.github.v3+json"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.USERINFO_URL, headers=headers)
-            response.raise_for_status()
-            user_data = response.json()
-            
-            # GitHub might not provide email in the main endpoint
-            if not user_data.get("email"):
+        # The profile often has no public email, so both are requested at once
+        response, email_response = await asyncio.gather(
+            self.http.get(self.USERINFO_URL, headers=headers),
+            self.http.get(self.EMAILS_URL, headers=headers)
+        )
+        response.raise_for_status()
+        user_data = response.json()
+        
+        # GitHub might not provide email in the main endpoint
+        if not user_data.get("email"):
+            primary_email = None
+            if email_response.status_code == 200:
                 # Try to get primary email
-                email_response = await client.get(
-                    "https://api.github.com/user/emails", 
-                    headers=headers
-                )
-                if email_response.status_code == 200:
-                    emails = email_response.json()
-                    primary_email = next((e for e in emails if e.get("primary")), None)
-                    if primary_email:
-                        user_data["email"] = primary_email["email"]
-                    else:
-                        # Fallback to noreply email
-                        user_data["email"] = f"{user_data['login']}@users.noreply.github.com"
-                else:
-                    # Fallback to noreply email
-                    user_data["email"] = f"{user_data['login']}@users.noreply.github.com"
-            
-            return user_data
+                emails = email_response.json()
+                primary_email = next((e for e in emails if e.get("primary")), None)
+            if primary_email:
+                user_data["email"] = primary_email["email"]
+            else:
+                # Fallback to noreply email
+                user_data["email"] = f"{user_data['login']}@users.noreply.github.com"
+        
+        return user_data
 
 
 # OAuth provider instances
@@ -169,6 +285,34 @@ async def get_google_user_info(access_token: str) -> Dict[str, Any]:
     return await provider.get_user_info(access_token)
 
 
+async def get_google_identity(token_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Google user of a token response.
+    
+    The ID token is verified locally with cached keys, saving the userinfo
+    round trip; the userinfo endpoint is only used when it is missing or
+    does not verify.
+    """
+    id_token = token_data.get("id_token")
+    if id_token:
+        try:
+            claims = await get_google_oauth().verify_id_token(id_token, token_data.get("access_token"))
+            if claims.get("email"):
+                return {
+                    "id": claims["sub"],
+                    "email": claims["email"],
+                    "name": claims.get("name", ""),
+                    "email_verified": claims.get("email_verified", False)
+                }
+        except (JWTError, httpx.HTTPError, KeyError):
+            pass
+    
+    user_info = await get_google_user_info(token_data["access_token"])
+    # The v2 userinfo endpoint says "id", OpenID Connect userinfo says "sub"
+    user_info.setdefault("id", user_info.get("sub"))
+    return user_info
+
+
 async def exchange_github_code(code: str, redirect_uri: str) -> Dict[str, Any]:
     """Helper function for exchanging GitHub code (used in mocking)."""
     provider = get_github_oauth()
@@ -178,4 +322,4 @@ async def exchange_github_code(code: str, redirect_uri: str) -> Dict[str, Any]:
 async def get_github_user_info(access_token: str) -> Dict[str, Any]:
     """Helper function for getting GitHub user info (used in mocking)."""
     provider = get_github_oauth()
-    return await provider.get_user_info(access_token)
\ No newline at end of file
+    return await provider.get_user_info(access_token)
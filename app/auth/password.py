@@ -1,10 +1,25 @@
 """
 Password hashing and verification utilities.
+
+bcrypt is deliberately slow (~100-300 ms per call), so the API hashes and
+verifies through `password_hasher`, which runs bcrypt in a small dedicated
+thread pool (bcrypt releases the GIL) and rejects work once too much is
+queued instead of letting a login storm stall every request.
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
 from passlib.context import CryptContext
 
-# Password context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config import get_settings
+
+# Password context using bcrypt; hashes with other rounds are upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=get_settings().password_bcrypt_rounds
+)
 
 
 def get_password_hash(password: str) -> str:
@@ -14,4 +29,87 @@ def get_password_hash(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, when its hash uses outdated parameters, rehash it.
+    
+    Returns (valid, new_hash); new_hash is None when the stored hash is current.
+    Accounts without a password (OAuth) never verify.
+    """
+    if not hashed_password:
+        return False, None
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are already waiting for a worker."""
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop with a bounded queue."""
+    
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.rejected = 0
+    
+    @property
+    def workers(self) -> int:
+        return get_settings().password_hash_workers if self._workers is None else self._workers
+    
+    @property
+    def max_pending(self) -> int:
+        """Hashes allowed to be running or queued before new ones are rejected."""
+        return get_settings().password_hash_max_pending if self._max_pending is None else self._max_pending
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.workers),
+                thread_name_prefix="bcrypt"
+            )
+        return self._executor
+    
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many authentication requests, please retry shortly")
+        
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password in the pool."""
+        return await self._run(get_password_hash, password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify (and possibly rehash) a password in the pool."""
+        return await self._run(verify_and_update, plain_password, hashed_password)
+    
+    def stats(self) -> Dict[str, int]:
+        """Current load of the pool."""
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared hasher for the API process
+password_hasher = PasswordHasher()
@@ -0,0 +1,63 @@
+"""
+Cache of verified access tokens and the users they belong to.
+
+Resolving a bearer token costs a JWT signature check and a MongoDB lookup.
+Verified tokens are remembered with a snapshot of their (active) user for a
+short TTL, never past the token's own expiry. User saves and deletes in this
+process invalidate entries immediately; the TTL bounds staleness for changes
+made elsewhere.
+"""
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Set
+
+from app.cache import TTLCache
+
+if TYPE_CHECKING:
+    from app.models.user import User
+
+
+class UserCache(TTLCache[str, "User"]):
+    """Size-bounded TTL cache of token -> user snapshot."""
+    
+    ttl_setting = "auth_cache_ttl_seconds"
+    size_setting = "auth_cache_size"
+    
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        super().__init__(ttl, max_size)
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+    
+    def get(self, token: str) -> Optional["User"]:
+        """Cached user for a token, or None when absent or expired."""
+        user = super().get(token)
+        # Callers may modify the user they get; keep the cached snapshot intact
+        return user.model_copy() if user is not None else None
+    
+    def set(self, token: str, user: "User", token_expires_at: Optional[float] = None) -> None:
+        """Remember a verified token for an active user, never past the token's expiry."""
+        ttl = None if token_expires_at is None else token_expires_at - time.time()
+        super().set(token, user.model_copy(), ttl)
+    
+    def invalidate(self, user_id: str) -> None:
+        """Drop every cached token of a user."""
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self.pop(token)
+    
+    # Indexed by id, which unlike the email stays the same when a user is edited
+    def _stored(self, token: str, user: "User") -> None:
+        self._tokens_by_user.setdefault(str(user.id), set()).add(token)
+    
+    def _removed(self, token: str, user: "User") -> None:
+        tokens = self._tokens_by_user.get(str(user.id))
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[str(user.id)]
+    
+    def clear(self) -> None:
+        """Forget all tokens and counters."""
+        super().clear()
+        self._tokens_by_user.clear()
+
+
+# Shared cache for the API process
+user_cache = UserCache()
@@ -0,0 +1,100 @@
+"""
+Size-bounded TTL caches kept in process memory.
+
+Entries expire after a TTL and the least recently used entry is evicted
+once the cache is full. TTL and size are read from settings on every use
+unless fixed when the cache is built, so a cache shared by the process
+follows configuration changes (and test overrides) without being rebuilt.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Size-bounded TTL cache that evicts the least recently used entry."""
+    
+    # Settings holding the TTL (seconds) and size when not given explicitly
+    ttl_setting: str = ""
+    size_setting: str = ""
+    
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def ttl(self) -> float:
+        """Seconds an entry lives; 0 disables caching."""
+        return getattr(get_settings(), self.ttl_setting) if self._ttl is None else self._ttl
+    
+    @property
+    def max_size(self) -> int:
+        return getattr(get_settings(), self.size_setting) if self._max_size is None else self._max_size
+    
+    def get(self, key: K) -> Optional[V]:
+        """Cached value, or None when absent or expired."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self.pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Cache a value for the cache's TTL, or for `ttl` seconds when that is shorter."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        self.pop(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._stored(key, value)
+        while len(self._entries) > self.max_size:
+            self.pop(next(iter(self._entries)))
+    
+    def pop(self, key: K) -> Optional[V]:
+        """Drop an entry, returning its value."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._removed(key, entry[1])
+        return entry[1]
+    
+    def items(self) -> List[Tuple[K, V]]:
+        """Snapshot of the cached entries, including expired ones not yet dropped."""
+        return [(key, value) for key, (_, value) in self._entries.items()]
+    
+    def _stored(self, key: K, value: V) -> None:
+        """Called after an entry is added; subclasses keep secondary indexes here."""
+    
+    def _removed(self, key: K, value: V) -> None:
+        """Called after an entry is dropped, expired or evicted."""
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def clear(self) -> None:
+        """Forget all entries and counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -11,7 +11,7 @@ celery_app = Celery(
     "llm_template_backend",
     broker=settings.celery_broker_url,
     backend=settings.celery_result_backend,
-    include=["app.generation.tasks"]
+    include=["app.generation.tasks", "app.providers.tasks"]
 )
 
 # Celery configuration
@@ -50,6 +50,7 @@ celery_app.conf.beat_schedule = {
     },
     "update-model-prices": {
         "task": "app.providers.tasks.update_model_prices",
-        "schedule": 86400.0,  # Run once per day
+        # Publish before the API processes' catalogs go stale and fetch themselves
+        "schedule": settings.catalog_ttl_seconds / 2,
     },
 }
\ No newline at end of file
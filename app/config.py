@@ -2,7 +2,7 @@
 Application configuration using pydantic-settings.
 """
 from functools import lru_cache
-from typing import List
+from typing import Dict, List
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -31,22 +31,103 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    auth_cache_ttl_seconds: float = 30.0
+    auth_cache_size: int = 10_000
+    password_bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+    api_key_cache_ttl_seconds: float = 60.0
+    api_key_cache_size: int = 10_000
+    api_key_usage_flush_seconds: float = 5.0
     
     # Database
     mongodb_url: str = "mongodb://localhost:27017"
     mongodb_db_name: str = "llm_template_system"
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 10
+    mongodb_max_idle_time_ms: int = 300_000
+    mongodb_wait_queue_timeout_ms: int = 5_000
+    mongodb_server_selection_timeout_ms: int = 5_000
+    mongodb_connect_timeout_ms: int = 5_000
+    mongodb_socket_timeout_ms: int = 30_000
+    mongodb_compressors: str = "zstd,snappy,zlib"
+    mongodb_secondary_reads: bool = True
+    mongodb_max_staleness_seconds: int = 90
     
     # OAuth
     google_client_id: str = ""
     google_client_secret: str = ""
     github_client_id: str = ""
     github_client_secret: str = ""
+    oauth_http_timeout: float = 10.0
+    oauth_http_max_connections: int = 20
+    oauth_metadata_ttl_seconds: float = 3600.0
     
     # LLM Providers
     openrouter_api_key: str = ""
     openrouter_base_url: str = "https://openrouter.ai/api/v1"
     ollama_base_url: str = "http://localhost:11434"
     
+    # Provider resilience
+    provider_max_retries: int = 3
+    provider_retry_base_delay: float = 0.5
+    provider_retry_max_delay: float = 20.0
+    provider_request_timeout: float = 120.0
+    provider_hedging_enabled: bool = False
+    provider_hedge_min_samples: int = 20
+    generation_job_deadline_seconds: float = 1800.0
+    generation_max_count: int = 1000
+    generation_item_batch_size: int = 50
+    generation_heartbeat_seconds: float = 15.0
+    generation_stale_seconds: float = 120.0
+    generation_reaper_interval_seconds: float = 60.0
+    generation_max_attempts: int = 3
+    circuit_breaker_failure_rate: float = 0.5
+    circuit_breaker_min_calls: int = 10
+    circuit_breaker_window: int = 50
+    circuit_breaker_open_seconds: float = 30.0
+    circuit_breaker_half_open_calls: int = 1
+    catalog_ttl_seconds: float = 3600.0
+    
+    # Tokenizers
+    tokenizer_dir: str = ""
+    min_completion_tokens: int = 16
+    
+    # Export
+    export_batch_size: int = 500
+    export_process_workers: int = 2
+    export_max_pending: int = 8
+    export_timeout_seconds: float = 60.0
+    export_cache_dir: str = "/tmp/llm-template-exports"
+    export_cache_max_bytes: int = 512 * 1024 * 1024
+    export_prebuild_formats: int = 0
+    export_prebuild_max_pending: int = 2
+    bulk_export_dir: str = "/tmp/llm-template-bulk-exports"
+    bulk_export_max_generations: int = 5000
+    bulk_export_ttl_hours: float = 24.0
+    
+    # Dataset jobs
+    dataset_dir: str = "/tmp/llm-template-datasets"
+    dataset_max_items: int = 1_000_000
+    dataset_chunk_size: int = 500
+    dataset_workers: int = 4
+    dataset_heartbeat_seconds: float = 30.0
+    dataset_chunk_stale_seconds: float = 300.0
+    
+    # Usage statistics
+    stats_max_points: int = 744
+    
+    # Retention (days generations are kept per user tier; 0 keeps them)
+    retention_days: Dict[str, int] = {"free": 30, "pro": 180, "enterprise": 0}
+    retention_archive_dir: str = "/tmp/llm-template-archive"
+    retention_max_generations: int = 1000
+    retention_delete_batch_size: int = 1000
+    retention_delete_pause_seconds: float = 0.1
+    
+    # History
+    history_count_cache_ttl_seconds: float = 60.0
+    history_count_cache_size: int = 10_000
+    
     # Celery
     celery_broker_url: str = ""
     celery_result_backend: str = ""
@@ -1,33 +1,187 @@
 """
 Database configuration and utilities.
 """
+import importlib.util
+import threading
 import time
-from typing import Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
 from beanie import init_beanie
+from beanie.odm.utils.parsing import parse_obj
+from beanie.odm.utils.projection import get_projection
 
-from app.config import get_settings
+from app.config import Settings, get_settings
 
 # Global database client
 _client: Optional[AsyncIOMotorClient] = None
 _database: Optional[AsyncIOMotorDatabase] = None
 
+# Python packages pymongo needs for each wire compressor
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def available_compressors(names: str) -> List[str]:
+    """Wire compressors from a comma-separated list whose codec is installed."""
+    compressors = []
+    for name in (part.strip() for part in names.split(",")):
+        module = _COMPRESSOR_MODULES.get(name)
+        if module and importlib.util.find_spec(module) is not None:
+            compressors.append(name)
+    return compressors
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool utilization from pymongo's CMAP events.
+    
+    Events arrive on driver threads; a checkout starts and finishes on the
+    same thread, which is how its wait time is measured.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits: Dict[int, float] = {}
+        self.reset()
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._waits.clear()
+            self.open: Counter = Counter()
+            self.in_use: Counter = Counter()
+            self.waiting = 0
+            self.peak_in_use = 0
+            self.checkouts = 0
+            self.failures: Counter = Counter()
+            self.clears = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+    
+    def pool_created(self, event) -> None:
+        pass
+    
+    def pool_ready(self, event) -> None:
+        pass
+    
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.clears += 1
+    
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self.open.pop(event.address, None)
+            self.in_use.pop(event.address, None)
+    
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open[event.address] += 1
+    
+    def connection_ready(self, event) -> None:
+        pass
+    
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            if self.open[event.address] > 0:
+                self.open[event.address] -= 1
+    
+    def connection_check_out_started(self, event) -> None:
+        with self._lock:
+            self.waiting += 1
+            self._waits[threading.get_ident()] = time.perf_counter()
+    
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.waiting = max(self.waiting - 1, 0)
+            self._waits.pop(threading.get_ident(), None)
+            self.failures[event.reason] += 1
+    
+    def connection_checked_out(self, event) -> None:
+        with self._lock:
+            self.waiting = max(self.waiting - 1, 0)
+            started = self._waits.pop(threading.get_ident(), None)
+            if started is not None:
+                wait = time.perf_counter() - started
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            self.checkouts += 1
+            self.in_use[event.address] += 1
+            self.peak_in_use = max(self.peak_in_use, sum(self.in_use.values()))
+    
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            if self.in_use[event.address] > 0:
+                self.in_use[event.address] -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Pool utilization; a server's pool is full at max_pool_size connections in use."""
+        max_pool_size = get_settings().mongodb_max_pool_size
+        with self._lock:
+            busiest = max(self.in_use.values(), default=0)
+            return {
+                "max_pool_size": max_pool_size,
+                "open": sum(self.open.values()),
+                "in_use": sum(self.in_use.values()),
+                "peak_in_use": self.peak_in_use,
+                "waiting": self.waiting,
+                "utilization": round(busiest / max_pool_size, 3) if max_pool_size else None,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.failures),
+                "avg_wait_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 3),
+                "pool_clears": self.clears
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+def client_options(settings: Settings) -> Dict[str, Any]:
+    """Keyword arguments for the Motor client from settings."""
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongodb_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongodb_connect_timeout_ms,
+        "socketTimeoutMS": settings.mongodb_socket_timeout_ms or None,
+        "event_listeners": [pool_metrics],
+    }
+    compressors = available_compressors(settings.mongodb_compressors)
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
 
 async def connect_to_database():
     """Create database connection."""
     global _client, _database
     settings = get_settings()
     
-    _client = AsyncIOMotorClient(settings.mongodb_url)
+    _client = AsyncIOMotorClient(settings.mongodb_url, **client_options(settings))
     _database = _client[settings.mongodb_db_name]
     
     # Initialize Beanie with document models
     from app.models.user import User
     from app.models.template import Template
     from app.models.generation import Generation
+    from app.models.generation_item import GenerationItem
+    from app.models.export import BulkExport
+    from app.models.api_key import ApiKey
+    from app.models.dataset import DatasetChunk
+    from app.models.usage import UsageRollup
+    from app.models.provider_models import ProviderModels
     
-    await init_beanie(database=_database, document_models=[User, Template, Generation])
+    await init_beanie(
+        database=_database,
+        document_models=[
+            User, Template, Generation, GenerationItem, DatasetChunk, BulkExport, ApiKey, UsageRollup,
+            ProviderModels
+        ]
+    )
 
 
 async def close_database_connection():
@@ -36,6 +190,49 @@ async def close_database_connection():
     if _client:
         _client.close()
         _client = None
+        pool_metrics.reset()
+
+
+def secondary_read_preference() -> Optional[SecondaryPreferred]:
+    """
+    Read preference for reads that tolerate replication lag (history,
+    listings, bulk exports); None keeps them on the primary.
+    """
+    settings = get_settings()
+    if not settings.mongodb_secondary_reads or _client is None:
+        return None
+    staleness = settings.mongodb_max_staleness_seconds
+    return SecondaryPreferred(max_staleness=staleness if staleness > 0 else -1)
+
+
+def secondary_collection(document_model: Any) -> AsyncIOMotorCollection:
+    """A document's collection, read from secondaries when secondary reads are on."""
+    collection = document_model.get_motor_collection()
+    preference = secondary_read_preference()
+    if preference is None:
+        return collection
+    return collection.with_options(read_preference=preference)
+
+
+async def find_secondary(find: Any) -> List[Any]:
+    """Results of a Beanie find query, read from secondaries when secondary reads are on."""
+    if secondary_read_preference() is None:
+        return await find.to_list()
+    cursor = secondary_collection(find.document_model).find(
+        filter=find.get_filter_query(),
+        sort=find.sort_expressions or None,
+        projection=get_projection(find.projection_model),
+        skip=find.skip_number,
+        limit=find.limit_number
+    )
+    return [parse_obj(find.projection_model, document) async for document in cursor]
+
+
+async def count_secondary(find: Any) -> int:
+    """Count of a Beanie find query, read from secondaries when secondary reads are on."""
+    if secondary_read_preference() is None:
+        return await find.count()
+    return await secondary_collection(find.document_model).count_documents(find.get_filter_query())
 
 
 def get_database() -> AsyncIOMotorDatabase:
@@ -58,7 +255,8 @@ async def check_database_health() -> dict:
         
         return {
             "connected": True,
-            "response_time_ms": round(response_time, 2)
+            "response_time_ms": round(response_time, 2),
+            "pool": pool_metrics.stats()
         }
     except Exception as e:
         return {
@@ -0,0 +1,336 @@
+"""
+Bulk export of a user's generation history into a single archive.
+
+One cursor scan over the matching generations replaces a request (and a
+document load) per job. ZIP archives hold one file per generation plus a
+manifest; NDJSON archives hold one line per result tagged with its job.
+"""
+import asyncio
+import json
+import logging
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from beanie import PydanticObjectId
+
+from app.config import get_settings
+from app.database import secondary_collection
+from app.models.export import BulkExport
+from app.models.generation import Generation, GenerationStatus
+from app.models.template import Template
+from app.models.user import User
+from app.generation.export import STREAMING_EXPORTERS, get_exporter_class, iter_export
+from app.generation.items import iter_items
+
+
+logger = logging.getLogger(__name__)
+
+BULK_EXPORT_FORMATS = ("zip", "ndjson")
+
+BULK_MEDIA_TYPES = {
+    "zip": "application/zip",
+    "ndjson": "application/x-ndjson",
+}
+
+# Fields read per generation by the export cursor
+_PROJECTION = {
+    "job_id": 1, "template_id": 1, "template_snapshot.output_schema": 1,
+    "status": 1, "created_at": 1, "results": 1
+}
+
+# Generations fetched per cursor round trip
+_CURSOR_BATCH = 20
+
+# Progress is persisted every this many generations
+_PROGRESS_EVERY = 25
+
+
+def history_query(
+    user_id: str,
+    status: Optional[str] = None,
+    template_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """MongoDB filter for a user's generation history."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if status:
+        query["status"] = status
+    if template_id:
+        query["template_id"] = template_id
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
+    return query
+
+
+class BulkArchiveWriter:
+    """Writes generation documents into a ZIP or NDJSON file, one at a time."""
+    
+    def __init__(self, path: Path, format: str = "zip", entry_format: str = "json"):
+        if format not in BULK_EXPORT_FORMATS:
+            raise ValueError(f"Unsupported bulk export format: {format}")
+        if entry_format not in STREAMING_EXPORTERS:
+            raise ValueError(f"Unsupported archive entry format: {entry_format}")
+        self.path = path
+        self.format = format
+        self.entry_format = entry_format
+        self.manifest: List[Dict[str, Any]] = []
+        self._file: Any = None
+    
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.format == "zip":
+            self._file = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._file = open(self.path, "w", encoding="utf-8")
+    
+    def add(self, document: Dict[str, Any], output_schema: Optional[Dict[str, Any]] = None) -> None:
+        """Append one generation document (blocking; run off the event loop)."""
+        job_id = document.get("job_id") or str(document.get("_id"))
+        results = document.get("results") or []
+        
+        if self.format == "ndjson":
+            for index, result in enumerate(results, 1):
+                self._file.write(json.dumps({
+                    "job_id": job_id,
+                    "template_id": document.get("template_id"),
+                    "index": index,
+                    "result": result
+                }, default=str) + "\n")
+        else:
+            extension = get_exporter_class(self.entry_format).extension
+            name = f"{job_id}.{extension}"
+            with self._file.open(name, "w") as entry:
+                for fragment in iter_export(results, self.entry_format, output_schema):
+                    entry.write(fragment.encode("utf-8"))
+            self.manifest.append({
+                "file": name,
+                "job_id": job_id,
+                "template_id": document.get("template_id"),
+                "status": document.get("status"),
+                "created_at": document.get("created_at"),
+                "results": len(results)
+            })
+    
+    def close(self) -> int:
+        """Finish the archive and return its size in bytes."""
+        if self.format == "zip":
+            self._file.writestr("manifest.json", json.dumps(self.manifest, indent=2, default=str))
+        self._file.close()
+        return self.path.stat().st_size
+    
+    def abort(self) -> None:
+        """Close and delete a partial archive."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+        self.path.unlink(missing_ok=True)
+
+
+async def write_bulk_archive(
+    documents: AsyncIterator[Dict[str, Any]],
+    writer: BulkArchiveWriter,
+    output_schema: Callable[[Optional[str]], Awaitable[Optional[Dict[str, Any]]]],
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+) -> int:
+    """
+    Stream documents into an archive; returns its size.
+    
+    `output_schema` resolves a template id to its schema (for CSV/TSV
+    entries of generations without a template snapshot) and `on_progress` is awaited with the number of generations
+    written every few documents.
+    """
+    await asyncio.to_thread(writer.open)
+    written = 0
+    try:
+        async for document in documents:
+            schema = None
+            if writer.format == "zip":
+                snapshot = document.get("template_snapshot")
+                if snapshot:
+                    schema = snapshot.get("output_schema") or None
+                else:
+                    schema = await output_schema(document.get("template_id"))
+            await asyncio.to_thread(writer.add, document, schema)
+            written += 1
+            if on_progress and written % _PROGRESS_EVERY == 0:
+                await on_progress(written)
+        size = await asyncio.to_thread(writer.close)
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
+    
+    if on_progress:
+        await on_progress(written)
+    return size
+
+
+async def with_results(documents: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Attach the results kept in generation_items to each generation document."""
+    async for document in documents:
+        # Legacy documents still carry their results inline
+        if not document.get("results"):
+            document["results"] = [result async for result in iter_items(document["_id"], secondary=True)]
+        yield document
+
+
+class BulkExportService:
+    """Creates, runs and looks up bulk exports."""
+    
+    async def start_export(
+        self,
+        user: User,
+        format: str = "zip",
+        entry_format: str = "json",
+        status: Optional[str] = GenerationStatus.COMPLETED.value,
+        template_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> BulkExport:
+        """Record an export job and queue it."""
+        if format not in BULK_EXPORT_FORMATS:
+            raise ValueError(f"Unsupported bulk export format: {format}")
+        if entry_format not in STREAMING_EXPORTERS:
+            raise ValueError(f"Unsupported archive entry format: {entry_format}")
+        
+        export = BulkExport(
+            export_id=f"exp_{uuid.uuid4().hex[:12]}",
+            user_id=str(user.id),
+            format=format,
+            entry_format=entry_format,
+            filters={
+                "status": status,
+                "template_id": template_id,
+                "created_from": created_from,
+                "created_to": created_to
+            }
+        )
+        await export.save()
+        
+        bulk_export_task.delay(str(export.id))
+        return export
+    
+    async def get_export(self, export_id: str, user: User) -> Optional[BulkExport]:
+        """Export job owned by the user."""
+        return await BulkExport.find_one({"export_id": export_id, "user_id": str(user.id)})
+    
+    async def process_export(self, export_db_id: str) -> None:
+        """Scan the matching generations with one cursor and write the archive."""
+        export = await BulkExport.get(export_db_id)
+        if not export:
+            logger.error(f"Bulk export {export_db_id} not found")
+            return
+        
+        settings = get_settings()
+        collection = BulkExport.get_motor_collection()
+        query = history_query(export.user_id, **export.filters)
+        
+        try:
+            generations = secondary_collection(Generation)
+            export.total = min(
+                await generations.count_documents(query),
+                settings.bulk_export_max_generations
+            )
+            export.status = GenerationStatus.PROCESSING
+            await export.save()
+            
+            cursor = generations.find(query, _PROJECTION).sort("created_at", -1)
+            cursor = cursor.limit(settings.bulk_export_max_generations).batch_size(_CURSOR_BATCH)
+            
+            async def on_progress(written: int) -> None:
+                await collection.update_one({"_id": export.id}, {"$set": {"processed": written}})
+            
+            path = Path(settings.bulk_export_dir) / f"{export.export_id}.{export.format}"
+            writer = BulkArchiveWriter(path, export.format, export.entry_format)
+            size = await write_bulk_archive(with_results(cursor), writer, _SchemaLookup(), on_progress)
+            
+            export = await BulkExport.get(export_db_id)
+            export.status = GenerationStatus.COMPLETED
+            export.path = str(path)
+            export.size = size
+            export.completed_at = datetime.utcnow()
+            export.expires_at = export_expiry(export.completed_at)
+            await export.save()
+        except Exception as e:
+            logger.error(f"Bulk export {export.export_id} failed: {e}")
+            export.status = GenerationStatus.FAILED
+            export.error_message = str(e)
+            export.completed_at = datetime.utcnow()
+            export.expires_at = export_expiry(export.completed_at)
+            await export.save()
+    
+    async def purge_expired(self, now: Optional[datetime] = None) -> int:
+        """Delete the archives and records of expired exports; returns how many were deleted."""
+        ttl = export_ttl()
+        if ttl is None:
+            return 0
+        now = now or datetime.utcnow()
+        collection = BulkExport.get_motor_collection()
+        query = {"$or": [
+            {"expires_at": {"$lte": now}},
+            # Exports finished before expiry was recorded
+            {"expires_at": None, "completed_at": {"$lte": now - ttl}}
+        ]}
+        
+        expired = []
+        async for document in collection.find(query, {"_id": 1, "path": 1}):
+            # Files go first, so an interrupted run leaves records to retry rather than orphaned files
+            if document.get("path"):
+                Path(document["path"]).unlink(missing_ok=True)
+            expired.append(document["_id"])
+        if expired:
+            await collection.delete_many({"_id": {"$in": expired}})
+            logger.info(f"Deleted {len(expired)} expired bulk exports")
+        return len(expired)
+
+
+def export_ttl() -> Optional[timedelta]:
+    """How long finished exports are kept, or None to keep them."""
+    hours = get_settings().bulk_export_ttl_hours
+    return timedelta(hours=hours) if hours > 0 else None
+
+
+def export_expiry(completed_at: datetime) -> Optional[datetime]:
+    """When an export finished at completed_at is deleted."""
+    ttl = export_ttl()
+    return completed_at + ttl if ttl else None
+
+
+class _SchemaLookup:
+    """Template output schemas, loaded once per template during an export."""
+    
+    def __init__(self):
+        self._schemas: Dict[str, Optional[Dict[str, Any]]] = {}
+    
+    async def __call__(self, template_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not template_id or not PydanticObjectId.is_valid(template_id):
+            return None
+        if template_id not in self._schemas:
+            template = await Template.get_motor_collection().find_one(
+                {"_id": PydanticObjectId(template_id)}, {"output_schema": 1}
+            )
+            self._schemas[template_id] = (template or {}).get("output_schema") or None
+        return self._schemas[template_id]
+
+
+# Create service instance
+bulk_export_service = BulkExportService()
+
+
+class BulkExportTask:
+    """Runs bulk exports in the background of the API process."""
+    
+    def delay(self, export_db_id: str):
+        asyncio.create_task(bulk_export_service.process_export(export_db_id))
+
+
+bulk_export_task = BulkExportTask()
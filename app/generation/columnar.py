@@ -0,0 +1,122 @@
+"""
+Columnar exports (Apache Arrow IPC and Parquet).
+
+Columns follow the template's JSON `output_schema`, flattened with the same
+dotted names as the CSV export; keys outside the schema (or every key, for
+schemaless templates) get a type inferred from the values.
+"""
+import io
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.generation.flatten import flatten_into, schema_columns as declared_columns
+
+
+# JSON Schema type -> Arrow type name
+_ARROW_TYPES = {
+    "integer": "int64",
+    "number": "float64",
+    "boolean": "bool_",
+    "string": "string",
+}
+
+
+def schema_columns(output_schema: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Flattened (column, JSON type) pairs declared by an object schema."""
+    return [
+        (column, kind if kind in _ARROW_TYPES else "string")
+        for column, kind in declared_columns(output_schema)
+    ]
+
+
+def infer_type(values: List[Any]) -> str:
+    """Narrowest JSON type that holds every non-null value."""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("boolean")
+        elif isinstance(value, int):
+            kinds.add("integer")
+        elif isinstance(value, float):
+            kinds.add("number")
+        else:
+            return "string"
+    
+    if kinds == {"boolean"}:
+        return "boolean"
+    if kinds == {"integer"}:
+        return "integer"
+    if kinds and kinds <= {"integer", "number"}:
+        return "number"
+    return "string"
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    """Convert a value to a column's type, or None if it does not fit."""
+    if value is None:
+        return None
+    try:
+        if kind == "integer":
+            if isinstance(value, bool):
+                return None
+            if isinstance(value, float):
+                return int(value) if value.is_integer() else None
+            return int(value)
+        if kind == "number":
+            return None if isinstance(value, bool) else float(value)
+        if kind == "boolean":
+            return value if isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        return None
+    
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def build_table(results: List[Dict[str, Any]], output_schema: Optional[Dict[str, Any]] = None):
+    """Arrow table of flattened results, typed by the schema where possible."""
+    import pyarrow as pa
+    
+    rows = [flatten_into(result, {}) for result in results]
+    
+    columns: Dict[str, str] = dict(schema_columns(output_schema))
+    extra: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            if key not in columns and key not in extra:
+                extra[key] = None
+    for key in extra:
+        columns[key] = infer_type([row.get(key) for row in rows])
+    
+    arrays = []
+    fields = []
+    for name, kind in columns.items():
+        arrow_type = getattr(pa, _ARROW_TYPES[kind])()
+        arrays.append(pa.array([_coerce(row.get(name), kind) for row in rows], type=arrow_type))
+        fields.append(pa.field(name, arrow_type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def render_arrow(results: List[Dict[str, Any]], output_schema: Optional[Dict[str, Any]] = None) -> bytes:
+    """Arrow IPC file bytes."""
+    import pyarrow as pa
+    
+    table = build_table(results, output_schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render_parquet(results: List[Dict[str, Any]], output_schema: Optional[Dict[str, Any]] = None) -> bytes:
+    """Parquet file bytes (zstd compressed)."""
+    import pyarrow.parquet as pq
+    
+    output = io.BytesIO()
+    pq.write_table(build_table(results, output_schema), output, compression="zstd")
+    return output.getvalue()
@@ -0,0 +1,459 @@
+"""
+Dataset jobs: generations of up to millions of items, one per row of an
+uploaded variables file.
+
+The upload is normalised to NDJSON on disk while recording the byte offset
+of every chunk of rows, so a worker reads just its chunk's rows. Chunks are
+claimed atomically from the dataset_chunks collection by any number of
+workers; a claim is kept alive by heartbeats and a chunk whose worker
+stopped beating is claimed again, so a crashed worker only loses the chunk
+it was on. Claims and heartbeats also renew the job's own lease, so the
+stale job reaper restarts a runner once every worker of a job has gone
+silent. Items are written to generation_items as they are produced and
+a chunk's usage is added to the job once the chunk completes.
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+
+from app.config import get_settings
+from app.models.dataset import DatasetChunk, DatasetChunkStatus
+from app.models.generation import Generation, GenerationStatus, TemplateSnapshot
+from app.models.generation_item import GenerationItem
+from app.models.user import User
+from app.generation.items import ItemWriter, ItemsTakenOver
+from app.generation.retention import expiry_for
+from app.generation.tasks import GenerationProcessor, JobContext, processor, worker_id
+from app.stats.rollups import usage_rollups
+from app.stats.sketch import LatencySketch
+
+
+logger = logging.getLogger(__name__)
+
+DATASET_FORMATS = ("ndjson", "csv")
+
+
+def _iter_rows(text: io.TextIOBase, format: str) -> Iterator[Dict[str, Any]]:
+    """Variable sets of an NDJSON or CSV (with header) file."""
+    if format == "csv":
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            raise ValueError("The CSV file has no header row")
+        for row in reader:
+            # Cells beyond the header have no name
+            row.pop(None, None)
+            yield row
+        return
+    
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}")
+        if not isinstance(row, dict):
+            raise ValueError(f"Line {line_number} is not a JSON object")
+        yield row
+
+
+def write_variables_file(
+    source: BinaryIO,
+    path: Path,
+    format: str = "ndjson",
+    chunk_size: int = 500,
+    max_items: int = 1_000_000
+) -> Tuple[int, List[int]]:
+    """
+    Copy uploaded variable sets to `path` as NDJSON (blocking).
+    
+    Returns the number of rows and the byte offset of each chunk's first
+    row. Raises ValueError for malformed files or more than max_items rows.
+    """
+    if format not in DATASET_FORMATS:
+        raise ValueError(f"Unsupported variables file format: {format}")
+    
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="" if format == "csv" else None)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    offsets: List[int] = []
+    try:
+        with open(path, "wb") as out:
+            for row in _iter_rows(text, format):
+                if count >= max_items:
+                    raise ValueError(f"The variables file has more than {max_items} rows")
+                if count % chunk_size == 0:
+                    offsets.append(out.tell())
+                out.write(json.dumps(row, default=str).encode("utf-8") + b"\n")
+                count += 1
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    finally:
+        # The upload belongs to the caller
+        text.detach()
+    return count, offsets
+
+
+def read_variables(path: Path, offset: int, size: int) -> List[Dict[str, Any]]:
+    """`size` variable sets starting at a chunk offset (blocking)."""
+    rows = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            rows.append(json.loads(line))
+            if len(rows) >= size:
+                break
+    return rows
+
+
+class DatasetRunner:
+    """Works through a dataset job's chunks with several concurrent workers."""
+    
+    def __init__(self, item_processor: Optional[GenerationProcessor] = None):
+        self.processor = item_processor or processor
+    
+    async def run(self, generation_id: str, workers: Optional[int] = None) -> None:
+        """Process every unclaimed (or abandoned) chunk of a job, then finish it."""
+        generation = await Generation.get(generation_id)
+        if not generation:
+            logger.error(f"Dataset job {generation_id} not found")
+            return
+        if generation.status not in (GenerationStatus.PENDING, GenerationStatus.PROCESSING):
+            return
+        
+        if generation.status == GenerationStatus.PENDING:
+            # Conditional, so a runner that raced this one keeps what it wrote
+            now = datetime.utcnow()
+            await Generation.get_motor_collection().update_one(
+                {"_id": generation.id, "status": GenerationStatus.PENDING.value},
+                {
+                    "$set": {
+                        "status": GenerationStatus.PROCESSING.value,
+                        "started_at": now,
+                        "heartbeat_at": now
+                    },
+                    "$max": {"progress": 10}
+                }
+            )
+            generation.status = GenerationStatus.PROCESSING
+        
+        try:
+            job = await self.processor.prepare_job(generation)
+        except ValueError as e:
+            # Only fails a job that is still processing, never a finished or cancelled one
+            await self.processor._fail_generation(generation, str(e))
+            return
+        
+        workers = workers or get_settings().dataset_workers
+        worker = worker_id()
+        try:
+            await asyncio.gather(*(
+                self._work(generation, job, f"{worker}/{n}") for n in range(workers)
+            ))
+            await self._finish(generation)
+        except Exception as e:
+            # Chunks in flight become stale and are picked up by the next run
+            logger.error(f"Dataset job {generation.job_id} stopped: {e}")
+    
+    async def _work(self, generation: Generation, job: JobContext, worker: str) -> None:
+        while not await self._stopped(generation.id):
+            chunk = await self._claim(generation.id, worker)
+            if chunk is None:
+                return
+            await self._process_chunk(generation, job, chunk, worker)
+    
+    async def _stopped(self, generation_id: PydanticObjectId) -> bool:
+        """Whether the job was cancelled or failed meanwhile."""
+        document = await Generation.get_motor_collection().find_one({"_id": generation_id}, {"status": 1})
+        return not document or document["status"] not in (
+            GenerationStatus.PENDING.value, GenerationStatus.PROCESSING.value
+        )
+    
+    async def _claim(self, generation_id: PydanticObjectId, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the next pending chunk, or one whose worker went silent."""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=get_settings().dataset_chunk_stale_seconds)
+        chunk = await DatasetChunk.get_motor_collection().find_one_and_update(
+            {
+                "generation_id": generation_id,
+                "$or": [
+                    {"status": DatasetChunkStatus.PENDING.value},
+                    {"status": DatasetChunkStatus.PROCESSING.value, "heartbeat_at": {"$lt": stale}}
+                ]
+            },
+            {
+                "$set": {"status": DatasetChunkStatus.PROCESSING.value, "worker": worker, "heartbeat_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("chunk", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if chunk is not None:
+            await self._renew_job(generation_id, now)
+        return chunk
+    
+    async def _renew(self, chunk: Dict[str, Any], worker: str) -> bool:
+        """Renew a claim; False when another worker took the chunk over."""
+        now = datetime.utcnow()
+        result = await DatasetChunk.get_motor_collection().update_one(
+            {"_id": chunk["_id"], "worker": worker},
+            {"$set": {"heartbeat_at": now}}
+        )
+        if result.matched_count == 0:
+            return False
+        await self._renew_job(chunk["generation_id"], now)
+        return True
+    
+    async def _renew_job(self, generation_id: PydanticObjectId, now: datetime) -> None:
+        """Show the stale job reaper that the job still has a live worker."""
+        await Generation.get_motor_collection().update_one(
+            {"_id": generation_id}, {"$max": {"heartbeat_at": now}}
+        )
+    
+    async def _heartbeat(self, chunk: Dict[str, Any], worker: str, lost: asyncio.Event) -> None:
+        """Keep the claim alive while the chunk's items are being generated."""
+        interval = get_settings().dataset_heartbeat_seconds
+        while True:
+            await asyncio.sleep(interval)
+            if not await self._renew(chunk, worker):
+                lost.set()
+                return
+    
+    async def _process_chunk(
+        self,
+        generation: Generation,
+        job: JobContext,
+        chunk: Dict[str, Any],
+        worker: str
+    ) -> None:
+        path = Path(generation.metadata["dataset"]["file"])
+        rows = await asyncio.to_thread(read_variables, path, chunk["offset"], chunk["size"])
+        start = chunk["start"]
+        
+        # A chunk taken over from a silent worker starts over
+        await GenerationItem.get_motor_collection().delete_many({
+            "generation_id": generation.id,
+            "index": {"$gte": start, "$lt": start + chunk["size"]}
+        })
+        
+        spent = await self._spent(generation.id)
+        usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+        latency = LatencySketch()
+        writer = ItemWriter(generation.id)
+        
+        # Renewed in the background so a slow item cannot let the claim go stale
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(chunk, worker, lost))
+        try:
+            for index, row in enumerate(rows, start):
+                if lost.is_set():
+                    break
+                if job.max_cost is not None and spent + usage["cost"] >= job.max_cost:
+                    await writer.add(index, {"error": "Budget exceeded", "index": index})
+                    continue
+                
+                item = await self.processor.generate_item(job, {**generation.variables, **row}, index)
+                # The new owner may already be rewriting the chunk's items
+                if lost.is_set():
+                    break
+                await writer.add(index, item.result)
+                usage["total_tokens"] += item.total_tokens
+                usage["prompt_tokens"] += item.prompt_tokens
+                usage["completion_tokens"] += item.completion_tokens
+                usage["cost"] += item.cost
+                if item.latency is not None:
+                    latency.add(item.latency)
+                if index == 1 and item.prompt:
+                    await Generation.get_motor_collection().update_one(
+                        {"_id": generation.id}, {"$set": {"prompt_rendered": item.prompt}}
+                    )
+            
+            if not lost.is_set():
+                await writer.flush()
+        except ItemsTakenOver:
+            lost.set()
+        finally:
+            heartbeat.cancel()
+        if lost.is_set():
+            logger.warning(f"Chunk {chunk['chunk']} of {generation.job_id} was taken over")
+            return
+        await self._complete_chunk(generation, chunk, worker, len(rows), usage, latency)
+    
+    async def _spent(self, generation_id: PydanticObjectId) -> float:
+        document = await Generation.get_motor_collection().find_one({"_id": generation_id}, {"cost": 1})
+        return (document or {}).get("cost", 0.0)
+    
+    async def _complete_chunk(
+        self,
+        generation: Generation,
+        chunk: Dict[str, Any],
+        worker: str,
+        items: int,
+        usage: Dict[str, Any],
+        latency: LatencySketch
+    ) -> None:
+        """Checkpoint a chunk and add its items and usage to the job, exactly once."""
+        result = await DatasetChunk.get_motor_collection().update_one(
+            {"_id": chunk["_id"], "worker": worker, "status": DatasetChunkStatus.PROCESSING.value},
+            {"$set": dict(usage, status=DatasetChunkStatus.COMPLETED.value, completed_at=datetime.utcnow())}
+        )
+        if result.modified_count == 0:
+            return
+        
+        generations = Generation.get_motor_collection()
+        document = await generations.find_one_and_update(
+            {"_id": generation.id},
+            {"$inc": dict(usage, result_count=items)},
+            projection={"result_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        progress = 10 + int(document["result_count"] / generation.count * 80)
+        await generations.update_one({"_id": generation.id}, {"$max": {"progress": min(progress, 90)}})
+        await usage_rollups.record(generation, items=items, usage=usage, latency=latency)
+    
+    async def _finish(self, generation: Generation) -> None:
+        """Complete the job once every chunk is checkpointed."""
+        remaining = await DatasetChunk.get_motor_collection().count_documents({
+            "generation_id": generation.id,
+            "status": {"$ne": DatasetChunkStatus.COMPLETED.value}
+        })
+        if remaining:
+            return
+        result = await Generation.get_motor_collection().update_one(
+            {"_id": generation.id, "status": GenerationStatus.PROCESSING.value},
+            {"$set": {
+                "status": GenerationStatus.COMPLETED.value,
+                "progress": 100,
+                "completed_at": datetime.utcnow()
+            }}
+        )
+        if result.modified_count:
+            logger.info(f"Dataset job {generation.job_id} completed")
+            # Items and usage were recorded chunk by chunk
+            await usage_rollups.record(generation, completed=1)
+
+
+# Create runner instance
+dataset_runner = DatasetRunner()
+
+
+class DatasetService:
+    """Creates dataset jobs and reports their progress."""
+    
+    async def start_dataset(
+        self,
+        user: User,
+        template_id: str,
+        provider: str,
+        model: str,
+        source: BinaryIO,
+        format: str = "ndjson",
+        variables: Optional[Dict[str, Any]] = None,
+        max_cost: Optional[float] = None
+    ) -> Generation:
+        """Store the variables file, create the job and its chunks, and queue it."""
+        from app.generation.service import generation_service
+        from app.providers.router import AUTO_MODEL
+        
+        if model == AUTO_MODEL:
+            raise ValueError("Dataset jobs need an explicit provider and model")
+        template = await generation_service._load_template(template_id, user)
+        
+        settings = get_settings()
+        job_id = f"ds_{uuid.uuid4().hex[:10]}"
+        path = Path(settings.dataset_dir) / f"{job_id}.ndjson"
+        count, offsets = await asyncio.to_thread(
+            write_variables_file, source, path, format, settings.dataset_chunk_size, settings.dataset_max_items
+        )
+        if count == 0:
+            path.unlink(missing_ok=True)
+            raise ValueError("The variables file has no rows")
+        
+        generation = Generation(
+            job_id=job_id,
+            kind="dataset",
+            user_id=str(user.id),
+            template_id=str(template.id),
+            template_snapshot=TemplateSnapshot.from_template(template),
+            provider=provider,
+            model=model,
+            variables=variables or {},
+            count=count,
+            status=GenerationStatus.PENDING,
+            expires_at=expiry_for(user),
+            metadata={
+                "template_name": template.name,
+                "dataset": {"file": str(path), "chunk_size": settings.dataset_chunk_size, "chunks": len(offsets)}
+            }
+        )
+        if max_cost is not None:
+            generation.metadata["max_cost"] = max_cost
+        await generation.save()
+        
+        chunk_size = settings.dataset_chunk_size
+        await DatasetChunk.get_motor_collection().insert_many([
+            {
+                "generation_id": generation.id,
+                "chunk": number,
+                "start": number * chunk_size + 1,
+                "size": min(chunk_size, count - number * chunk_size),
+                "offset": offset,
+                "status": DatasetChunkStatus.PENDING.value,
+                "worker": None,
+                "attempts": 0,
+                "heartbeat_at": None
+            }
+            for number, offset in enumerate(offsets)
+        ])
+        
+        dataset_task.delay(str(generation.id))
+        return generation
+    
+    async def get_dataset(self, job_id: str, user: User) -> Optional[Generation]:
+        """Dataset job owned by the user."""
+        return await Generation.find_one({"job_id": job_id, "user_id": str(user.id), "kind": "dataset"})
+    
+    async def chunk_counts(self, generation_id: PydanticObjectId) -> Dict[str, int]:
+        """Number of chunks per status."""
+        counts = {status.value: 0 for status in DatasetChunkStatus}
+        cursor = DatasetChunk.get_motor_collection().aggregate([
+            {"$match": {"generation_id": generation_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ])
+        async for group in cursor:
+            counts[group["_id"]] = group["count"]
+        return counts
+    
+    async def resume(self, job_id: str, user: User) -> Generation:
+        """Queue the remaining chunks of an interrupted job again."""
+        generation = await self.get_dataset(job_id, user)
+        if not generation:
+            raise LookupError("Dataset job not found")
+        if generation.status not in (GenerationStatus.PENDING, GenerationStatus.PROCESSING):
+            raise ValueError(f"Cannot resume a {generation.status.value} dataset job")
+        dataset_task.delay(str(generation.id))
+        return generation
+
+
+# Create service instance
+dataset_service = DatasetService()
+
+
+class DatasetTask:
+    """Runs dataset jobs in the background of the API process."""
+    
+    def delay(self, generation_id: str):
+        asyncio.create_task(dataset_runner.run(generation_id))
+
+
+dataset_task = DatasetTask()
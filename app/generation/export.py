@@ -3,117 +3,354 @@ import json
 import csv
 import io
 import xml.etree.ElementTree as ET
-from typing import List, Dict, Any, Union
+from typing import AsyncIterator, Callable, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from datetime import datetime
 
+from app.generation.flatten import Flattener, compile_flattener, flatten_into
 
-def export_results(results: List[Dict[str, Any]], format: str) -> Union[Any, bytes, str]:
-    """Export results in specified format."""
-    if format == "json":
-        return results
+
+# Bump whenever rendered output changes so cached artifacts are rebuilt
+EXPORTER_VERSION = "4"
+
+# Streamed responses are flushed in chunks of roughly this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+class ResultShape:
+    """Column set of a result stream, collected in a pre-pass for tabular formats."""
     
-    elif format == "csv":
-        if not results:
-            return ""
-        
-        # Flatten nested dictionaries
-        flattened_results = []
-        for result in results:
-            flat_result = _flatten_dict(result)
-            flattened_results.append(flat_result)
-        
-        # Get all unique keys
-        keys = set()
-        for result in flattened_results:
-            keys.update(result.keys())
-        keys = sorted(keys)
-        
-        # Create CSV
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(flattened_results)
-        
-        return output.getvalue()
+    def __init__(self):
+        self._keys: Set[str] = set()
+        self._flat_keys: Set[str] = set()
+        self._first_keys: Optional[Set[str]] = None
+        self.consistent = True
     
-    elif format in ["markdown", "md"]:
-        if not results:
-            return "# No Results\n"
-        
-        output = ["# Generation Results\n"]
-        output.append(f"Generated at: {datetime.utcnow().isoformat()}\n")
-        
-        for i, result in enumerate(results, 1):
-            output.append(f"\n## Result {i}\n")
-            _dict_to_markdown(result, output)
-        
-        return "\n".join(output)
+    def add(self, result: Dict[str, Any]) -> None:
+        """Account for one result."""
+        keys = set(result.keys())
+        if self._first_keys is None:
+            self._first_keys = keys
+        elif keys != self._first_keys:
+            self.consistent = False
+        if any(isinstance(value, (dict, list)) for value in result.values()):
+            self.consistent = False
+        self._keys.update(keys)
+        self._flat_keys.update(flatten_into(result, {}))
     
-    elif format == "html":
-        if not results:
-            return "<html><body><h1>No Results</h1></body></html>"
-        
+    @property
+    def columns(self) -> List[str]:
+        """Sorted top-level keys."""
+        return sorted(self._keys)
+    
+    @property
+    def flat_columns(self) -> List[str]:
+        """Sorted keys after flattening nested objects."""
+        return sorted(self._flat_keys)
+
+
+class Exporter:
+    """Renders results as a header, one fragment per result and a footer."""
+    
+    media_type = "application/octet-stream"
+    extension = "bin"
+    disposition = "attachment"
+    needs_shape = False
+    # Tabular formats that can skip the shape pre-pass given a compiled flattener
+    flattens = False
+    
+    def __init__(
+        self,
+        shape: Optional[ResultShape] = None,
+        flattener: Optional[Flattener] = None,
+        generated_at: Optional[datetime] = None
+    ):
+        self.shape = shape
+        self.flattener = flattener
+        # A fixed timestamp (the generation's completion) renders identical bytes every time
+        self.generated_at = (generated_at or datetime.utcnow()).isoformat()
+    
+    def header(self) -> str:
+        return ""
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        raise NotImplementedError
+    
+    def footer(self) -> str:
+        return ""
+    
+    def empty(self) -> str:
+        """Whole document when there are no results."""
+        return self.header() + self.footer()
+
+
+class JSONExporter(Exporter):
+    media_type = "application/json"
+    extension = "json"
+    
+    def header(self) -> str:
+        return "["
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        return ("," if index > 1 else "") + json.dumps(result, default=str)
+    
+    def footer(self) -> str:
+        return "]"
+
+
+class NDJSONExporter(Exporter):
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        return json.dumps(result, default=str) + "\n"
+
+
+class CSVExporter(Exporter):
+    media_type = "text/csv"
+    extension = "csv"
+    needs_shape = True
+    flattens = True
+    delimiter = ","
+    
+    def __init__(
+        self,
+        shape: Optional[ResultShape] = None,
+        flattener: Optional[Flattener] = None,
+        generated_at: Optional[datetime] = None
+    ):
+        if flattener is None:
+            flattener = Flattener(shape.flat_columns if shape else [])
+        super().__init__(shape, flattener, generated_at)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, delimiter=self.delimiter)
+    
+    def _drain(self) -> str:
+        value = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return value
+    
+    def header(self) -> str:
+        self._writer.writerow(self.flattener.columns)
+        return self._drain()
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        self._writer.writerow(self.flattener.values(result))
+        return self._drain()
+    
+    def empty(self) -> str:
+        return ""
+
+
+class TSVExporter(CSVExporter):
+    media_type = "text/tab-separated-values"
+    extension = "tsv"
+    delimiter = "\t"
+
+
+class MarkdownExporter(Exporter):
+    media_type = "text/markdown"
+    extension = "md"
+    
+    def header(self) -> str:
+        return f"# Generation Results\n\nGenerated at: {self.generated_at}\n"
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        output = [f"\n## Result {index}\n"]
+        _dict_to_markdown(result, output)
+        return "\n" + "\n".join(output)
+    
+    def empty(self) -> str:
+        return "# No Results\n"
+
+
+class HTMLExporter(Exporter):
+    media_type = "text/html"
+    extension = "html"
+    disposition = "inline"
+    needs_shape = True
+    
+    def header(self) -> str:
         html = ['<!DOCTYPE html><html><head><title>Generation Results</title>']
         html.append('<style>body{font-family:Arial,sans-serif;margin:20px;}')
         html.append('table{border-collapse:collapse;width:100%;margin:20px 0;}')
         html.append('th,td{border:1px solid #ddd;padding:8px;text-align:left;}')
         html.append('th{background-color:#f2f2f2;}</style></head><body>')
         html.append('<h1>Generation Results</h1>')
-        html.append(f'<p>Generated at: {datetime.utcnow().isoformat()}</p>')
+        html.append(f'<p>Generated at: {self.generated_at}</p>')
         
         # If results have consistent structure, show as table
-        if _has_consistent_structure(results):
+        if self.shape.consistent:
             html.append('<table><thead><tr>')
-            keys = sorted(results[0].keys())
-            for key in keys:
+            for key in self.shape.columns:
                 html.append(f'<th>{key}</th>')
             html.append('</tr></thead><tbody>')
-            
-            for result in results:
-                html.append('<tr>')
-                for key in keys:
-                    value = result.get(key, '')
-                    html.append(f'<td>{_escape_html(str(value))}</td>')
-                html.append('</tr>')
-            html.append('</tbody></table>')
-        else:
-            # Show as individual sections
-            for i, result in enumerate(results, 1):
-                html.append(f'<h2>Result {i}</h2>')
-                html.append('<pre>')
-                html.append(_escape_html(json.dumps(result, indent=2)))
-                html.append('</pre>')
-        
-        html.append('</body></html>')
         return ''.join(html)
     
-    elif format == "xml":
-        root = ET.Element("results")
-        root.set("generated_at", datetime.utcnow().isoformat())
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        if self.shape.consistent:
+            html = ['<tr>']
+            for key in self.shape.columns:
+                value = result.get(key, '')
+                html.append(f'<td>{_escape_html(str(value))}</td>')
+            html.append('</tr>')
+            return ''.join(html)
         
-        for i, result in enumerate(results):
-            result_elem = ET.SubElement(root, "result")
-            result_elem.set("index", str(i + 1))
-            _dict_to_xml(result, result_elem)
-        
-        return ET.tostring(root, encoding='unicode', method='xml')
+        # Show as individual sections
+        return (f'<h2>Result {index}</h2><pre>'
+                f'{_escape_html(json.dumps(result, indent=2, default=str))}</pre>')
     
-    elif format == "txt":
-        if not results:
-            return "No results generated."
-        
-        output = ["Generation Results"]
-        output.append("=" * 50)
-        output.append(f"Generated at: {datetime.utcnow().isoformat()}")
-        output.append("")
-        
-        for i, result in enumerate(results, 1):
-            output.append(f"Result {i}:")
-            output.append("-" * 30)
-            _dict_to_text(result, output)
-            output.append("")
-        
-        return "\n".join(output)
+    def footer(self) -> str:
+        closing = '</tbody></table>' if self.shape.consistent else ''
+        return closing + '</body></html>'
+    
+    def empty(self) -> str:
+        return "<html><body><h1>No Results</h1></body></html>"
+
+
+class XMLExporter(Exporter):
+    media_type = "application/xml"
+    extension = "xml"
+    
+    def header(self) -> str:
+        return f'<results generated_at="{self.generated_at}">'
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        result_elem = ET.Element("result")
+        result_elem.set("index", str(index))
+        _dict_to_xml(result, result_elem)
+        return ET.tostring(result_elem, encoding='unicode', method='xml')
+    
+    def footer(self) -> str:
+        return "</results>"
+    
+    def empty(self) -> str:
+        return f'<results generated_at="{self.generated_at}" />'
+
+
+class TextExporter(Exporter):
+    media_type = "text/plain"
+    extension = "txt"
+    
+    def header(self) -> str:
+        return f"Generation Results\n{'=' * 50}\nGenerated at: {self.generated_at}\n"
+    
+    def row(self, index: int, result: Dict[str, Any]) -> str:
+        output = [f"Result {index}:", "-" * 30]
+        _dict_to_text(result, output)
+        return "\n" + "\n".join(output) + "\n"
+    
+    def empty(self) -> str:
+        return "No results generated."
+
+
+# Formats that can be streamed result by result
+STREAMING_EXPORTERS = {
+    "json": JSONExporter,
+    "ndjson": NDJSONExporter,
+    "csv": CSVExporter,
+    "tsv": TSVExporter,
+    "markdown": MarkdownExporter,
+    "md": MarkdownExporter,
+    "html": HTMLExporter,
+    "xml": XMLExporter,
+    "txt": TextExporter,
+}
+
+
+def get_exporter_class(format: str) -> type:
+    """Exporter for a streamable format; unknown formats fall back to JSON."""
+    return STREAMING_EXPORTERS.get(format, JSONExporter)
+
+
+def export_media(format: str) -> Tuple[str, str, str]:
+    """Media type, content disposition and file extension of a format."""
+    if format in BINARY_EXPORT_MEDIA_TYPES:
+        return BINARY_EXPORT_MEDIA_TYPES[format], "attachment", format
+    exporter_class = get_exporter_class(format)
+    return exporter_class.media_type, exporter_class.disposition, exporter_class.extension
+
+
+def _compiled_flattener(exporter_class: type, output_schema: Optional[Dict[str, Any]]) -> Optional[Flattener]:
+    """Schema-derived flattener for tabular formats, None when a pre-pass is needed."""
+    if exporter_class.flattens and output_schema:
+        return compile_flattener(output_schema)
+    return None
+
+
+def iter_export(
+    results: Iterable[Dict[str, Any]],
+    format: str,
+    output_schema: Optional[Dict[str, Any]] = None,
+    generated_at: Optional[datetime] = None
+) -> Iterator[str]:
+    """Render results already in memory, fragment by fragment."""
+    exporter_class = get_exporter_class(format)
+    flattener = _compiled_flattener(exporter_class, output_schema)
+    shape = None
+    if exporter_class.needs_shape and flattener is None:
+        results = list(results)
+        shape = ResultShape()
+        for result in results:
+            shape.add(result)
+    
+    exporter = exporter_class(shape, flattener, generated_at)
+    count = 0
+    for result in results:
+        count += 1
+        if count == 1:
+            yield exporter.header()
+        yield exporter.row(count, result)
+    yield exporter.footer() if count else exporter.empty()
+
+
+async def stream_export(
+    open_results: Callable[[], AsyncIterator[Dict[str, Any]]],
+    format: str,
+    chunk_size: int = CHUNK_SIZE,
+    output_schema: Optional[Dict[str, Any]] = None,
+    generated_at: Optional[datetime] = None
+) -> AsyncIterator[bytes]:
+    """
+    Render results from an async source as UTF-8 chunks.
+    
+    `open_results` starts a fresh pass over the results. Tabular formats call
+    it twice, once to collect columns and once to render, unless CSV/TSV
+    columns can be taken from the template's output schema. Formats that
+    print a timestamp use `generated_at` when given, so repeated renders match.
+    """
+    exporter_class = get_exporter_class(format)
+    flattener = _compiled_flattener(exporter_class, output_schema)
+    shape = None
+    if exporter_class.needs_shape and flattener is None:
+        shape = ResultShape()
+        async for result in open_results():
+            shape.add(result)
+    
+    exporter = exporter_class(shape, flattener, generated_at)
+    buffer: List[str] = []
+    buffered = 0
+    count = 0
+    async for result in open_results():
+        count += 1
+        if count == 1:
+            buffer.append(exporter.header())
+        fragment = exporter.row(count, result)
+        buffer.append(fragment)
+        buffered += len(fragment)
+        if buffered >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            buffered = 0
+    
+    buffer.append(exporter.footer() if count else exporter.empty())
+    yield "".join(buffer).encode("utf-8")
+
+
+def export_results(results: List[Dict[str, Any]], format: str) -> Union[Any, bytes, str]:
+    """Export results in specified format."""
+    if format == "json":
+        return results
     
     elif format == "xlsx":
         # For XLSX, we'll return the data structure
@@ -143,23 +380,156 @@ def export_results(results: List[Dict[str, Any]], format: str) -> Union[Any, byt
             "results": results
         }
     
+    elif format in STREAMING_EXPORTERS:
+        return "".join(iter_export(results, format))
+    
     else:
         # Default to JSON
         return results
 
 
-def _flatten_dict(d: Dict[str, Any], parent_key: str = '', sep: str = '.') -> Dict[str, Any]:
+BINARY_EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def render_binary(
+    format: str,
+    results: Iterable[Dict[str, Any]],
+    output_schema: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """Render raw results as file bytes (runs in export workers)."""
+    if format == "xlsx":
+        return render_xlsx(results, output_schema)
+    results = list(results)
+    if format == "pdf":
+        return render_pdf(export_results(results, format))
+    if format == "arrow":
+        from app.generation.columnar import render_arrow
+        return render_arrow(results, output_schema)
+    if format == "parquet":
+        from app.generation.columnar import render_parquet
+        return render_parquet(results, output_schema)
+    raise ValueError(f"Unsupported binary export format: {format}")
+
+
+def renders_in_one_pass(format: str, output_schema: Optional[Dict[str, Any]]) -> bool:
+    """Whether render_binary reads results once, so they can come from an iterator."""
+    return format == "xlsx" and compile_flattener(output_schema) is not None
+
+
+def render_xlsx(results: Iterable[Dict[str, Any]], output_schema: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Build an Excel workbook with one flattened row per result.
+    
+    With an output schema the columns are known up front, so each result is
+    flattened and appended to the sheet as it is read. Without one the
+    results are held in memory for a separate pass that collects the columns.
+    """
+    output = io.BytesIO()
+    flattener = compile_flattener(output_schema)
+    if flattener is not None:
+        rows = (flattener.values(result) for result in results)
+        write_xlsx(rows, flattener.columns, output)
+        return output.getvalue()
+    
+    results = list(results)
+    columns = xlsx_columns(results)
+    rows = ([flat.get(column) for column in columns] for flat in map(_flatten_dict, results))
+    write_xlsx(rows, columns, output)
+    return output.getvalue()
+
+
+def xlsx_columns(results: Iterable[Dict[str, Any]]) -> List[str]:
+    """Flattened column names in order of first appearance."""
+    columns: Dict[str, None] = {}
+    for result in results:
+        for key in flatten_into(result, {}):
+            if key not in columns:
+                columns[key] = None
+    return list(columns)
+
+
+def write_xlsx(
+    rows: Iterable[List[Any]],
+    columns: List[str],
+    output: Any,
+    sheet_name: str = "Results"
+) -> None:
+    """
+    Write rows of values to a workbook without holding the sheet in memory.
+    
+    Uses openpyxl's write-only mode, which serializes each row as it is
+    appended instead of building a cell object graph.
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+    workbook.save(output)
+
+
+def _xlsx_value(value: Any) -> Any:
+    """Cell value openpyxl can store; anything exotic is written as text."""
+    if value is None or isinstance(value, (str, int, float, bool, datetime)):
+        return value
+    return str(value)
+
+
+def render_pdf(export_data: Dict[str, Any]) -> bytes:
+    """Build a PDF document with one table per result."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    # Title
+    elements.append(Paragraph(export_data["title"], styles['Title']))
+    elements.append(Paragraph(f"Generated: {export_data['generated_at']}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+    
+    # Results
+    for i, result in enumerate(export_data["results"], 1):
+        elements.append(Paragraph(f"Result {i}", styles['Heading2']))
+        
+        # Convert result to table data
+        table_data = []
+        for key, value in result.items():
+            table_data.append([str(key), str(value)])
+        
+        if table_data:
+            t = Table(table_data)
+            t.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ]))
+            elements.append(t)
+            elements.append(Spacer(1, 20))
+    
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def _flatten_dict(d: Dict[str, Any]) -> Dict[str, Any]:
     """Flatten nested dictionary."""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(_flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            items.append((new_key, json.dumps(v)))
-        else:
-            items.append((new_key, v))
-    return dict(items)
+    return flatten_into(d, {})
 
 
 def _dict_to_markdown(d: Dict[str, Any], output: List[str], level: int = 0) -> None:
@@ -203,25 +573,6 @@ def _dict_to_text(d: Dict[str, Any], output: List[str], indent: int = 0) -> None
             output.append(f"{'  ' * indent}{key}: {value}")
 
 
-def _has_consistent_structure(results: List[Dict[str, Any]]) -> bool:
-    """Check if all results have the same keys."""
-    if not results:
-        return False
-    
-    first_keys = set(results[0].keys())
-    for result in results[1:]:
-        if set(result.keys()) != first_keys:
-            return False
-    
-    # Check if values are simple (not nested)
-    for result in results:
-        for value in result.values():
-            if isinstance(value, (dict, list)):
-                return False
-    
-    return True
-
-
 def _escape_html(text: str) -> str:
     """Escape HTML special characters."""
     return (text
@@ -0,0 +1,247 @@
+"""
+Disk cache for rendered export artifacts.
+
+Completed generations never change, so an export is identified by the
+generation id, the format and EXPORTER_VERSION; the cache key doubles as the
+HTTP ETag.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.generation.export import EXPORTER_VERSION
+
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per chunk when serving cached files
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class ExportCache:
+    """Size-bounded LRU of export files on local disk."""
+    
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def directory(self) -> Path:
+        return Path(get_settings().export_cache_dir if self._directory is None else self._directory)
+    
+    @property
+    def max_bytes(self) -> int:
+        return get_settings().export_cache_max_bytes if self._max_bytes is None else self._max_bytes
+    
+    @property
+    def enabled(self) -> bool:
+        """Caching is off when no directory is configured."""
+        return bool(self._directory if self._directory is not None else get_settings().export_cache_dir)
+    
+    @staticmethod
+    def key(generation_id: str, format: str) -> str:
+        """Cache key of one export of one generation."""
+        raw = f"{generation_id}:{format}:{EXPORTER_VERSION}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    
+    @staticmethod
+    def etag(key: str) -> str:
+        """Strong ETag for a cache key."""
+        return f'"{key}"'
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+    
+    def _index(self) -> "OrderedDict[str, int]":
+        """Entries ordered from least to most recently used, loaded from disk once."""
+        if self._entries is None:
+            files = []
+            if self.directory.is_dir():
+                for path in self.directory.glob("*/*"):
+                    if path.is_file() and not path.name.endswith(".tmp"):
+                        stat = path.stat()
+                        files.append((stat.st_mtime, path.name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        return self._entries
+    
+    def get(self, key: str) -> Optional[Path]:
+        """Path of a cached artifact, marking it recently used."""
+        entries = self._index()
+        if key not in entries:
+            self.misses += 1
+            return None
+        
+        path = self._path(key)
+        if not path.is_file():
+            del entries[key]
+            self.misses += 1
+            return None
+        
+        entries.move_to_end(key)
+        self.hits += 1
+        return path
+    
+    def contains(self, key: str) -> bool:
+        """Whether an artifact is cached, without touching its recency."""
+        return key in self._index()
+    
+    async def store(self, key: str, content: bytes) -> None:
+        """Cache a fully rendered artifact."""
+        await asyncio.to_thread(self._write, key, content)
+        self._add(key, len(content))
+    
+    async def store_stream(self, key: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Pass chunks through while writing them to the cache.
+        
+        The artifact is only published once the stream completes, so aborted
+        downloads never leave partial files behind.
+        """
+        path = self._path(key)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        handle = await asyncio.to_thread(open, tmp_path, "wb")
+        size = 0
+        completed = False
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+                size += len(chunk)
+                yield chunk
+            completed = True
+        finally:
+            handle.close()
+            if completed:
+                os.replace(tmp_path, path)
+                self._add(key, size)
+            else:
+                tmp_path.unlink(missing_ok=True)
+    
+    async def read(self, path: Path, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Stream bytes start..end (inclusive) of a cached file."""
+        remaining = (end if end is not None else path.stat().st_size - 1) - start + 1
+        handle = await asyncio.to_thread(open, path, "rb")
+        try:
+            handle.seek(start)
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+    
+    def _write(self, key: str, content: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    
+    def _add(self, key: str, size: int) -> None:
+        entries = self._index()
+        entries[key] = size
+        entries.move_to_end(key)
+        self._evict()
+    
+    def _evict(self) -> None:
+        """Delete least recently used artifacts until the cache fits its budget."""
+        entries = self._index()
+        total = sum(entries.values())
+        while total > self.max_bytes and len(entries) > 1:
+            key, size = entries.popitem(last=False)
+            total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted export artifact {key} ({size} bytes)")
+    
+    def stats(self) -> Dict[str, int]:
+        """Size and hit counters of the cache."""
+        entries = self._index()
+        return {
+            "entries": len(entries),
+            "bytes": sum(entries.values()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+    
+    def clear(self) -> None:
+        """Forget the in-memory index (files are rediscovered on next use)."""
+        self._entries = None
+        self.hits = 0
+        self.misses = 0
+
+
+class ExportUsage:
+    """Counts which formats each user exports, to choose what to pre-build."""
+    
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._counts: "OrderedDict[str, Counter]" = OrderedDict()
+    
+    def record(self, user_id: str, format: str) -> None:
+        """Count one export request."""
+        counts = self._counts.get(user_id)
+        if counts is None:
+            if len(self._counts) >= self.max_users:
+                self._counts.popitem(last=False)
+            counts = self._counts[user_id] = Counter()
+        self._counts.move_to_end(user_id)
+        counts[format] += 1
+    
+    def top_formats(self, user_id: str, limit: int) -> List[str]:
+        """The user's most requested formats, most frequent first."""
+        counts = self._counts.get(user_id)
+        if not counts or limit <= 0:
+            return []
+        return [format for format, _ in counts.most_common(limit)]
+    
+    def clear(self) -> None:
+        """Forget all counts."""
+        self._counts.clear()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into inclusive (start, end).
+    
+    Returns None when the header is absent or not a single byte range (the
+    full body is served), and raises ValueError when it is unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Range not satisfiable for {size} bytes")
+    return start, end
+
+
+# Shared cache and usage counters
+export_cache = ExportCache()
+export_usage = ExportUsage()
@@ -0,0 +1,165 @@
+"""
+Bounded worker pool for CPU-heavy export rendering (XLSX, PDF).
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from app.config import get_settings
+from app.generation.export import render_binary, renders_in_one_pass
+
+
+class ExportBusyError(Exception):
+    """Too many exports are already waiting for a worker."""
+
+
+class ExportRenderPool:
+    """Runs binary export renderers off the event loop with admission control."""
+    
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._timeout = timeout
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+    
+    @property
+    def workers(self) -> int:
+        """Worker processes; 0 renders in a single background thread instead."""
+        return get_settings().export_process_workers if self._workers is None else self._workers
+    
+    @property
+    def max_pending(self) -> int:
+        """Renders allowed to be running or queued before new ones are rejected."""
+        return get_settings().export_max_pending if self._max_pending is None else self._max_pending
+    
+    @property
+    def background_limit(self) -> int:
+        """Pending renders above which background renders (export pre-builds) are rejected."""
+        return min(get_settings().export_prebuild_max_pending, self.max_pending)
+    
+    def has_capacity(self, background: bool = False) -> bool:
+        """Whether a render would be admitted now."""
+        return self.pending < (self.background_limit if background else self.max_pending)
+    
+    @property
+    def in_process(self) -> bool:
+        """Whether renders run on a thread of this process, so results may be a live iterator."""
+        return self.workers <= 0
+    
+    @property
+    def timeout(self) -> float:
+        """Seconds a request waits for its render."""
+        return get_settings().export_timeout_seconds if self._timeout is None else self._timeout
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # Spawned workers do not inherit the event loop, sockets or locks of the app
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        return self._executor
+    
+    async def render(
+        self,
+        format: str,
+        results: Iterable[Dict[str, Any]],
+        output_schema: Optional[Dict[str, Any]] = None,
+        background: bool = False
+    ) -> bytes:
+        """
+        Render results to file bytes in a worker.
+        
+        Background renders are only admitted while few renders are pending,
+        so they never take the slots user downloads need. Raises
+        ExportBusyError when the pool is saturated and asyncio.TimeoutError
+        when the render takes longer than the timeout.
+        """
+        if not self.has_capacity(background):
+            raise ExportBusyError("Too many exports in progress, please retry shortly")
+        
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future: Future = self._get_executor().submit(render_binary, format, results, output_schema)
+        
+        # The slot is freed when the worker finishes, not when the caller gives up,
+        # so timed-out renders still count against the limit while they run
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+    
+    async def render_stream(
+        self,
+        format: str,
+        results: AsyncIterator[Dict[str, Any]],
+        output_schema: Optional[Dict[str, Any]] = None,
+        background: bool = False,
+        batch_size: int = 500
+    ) -> bytes:
+        """
+        Render results read from an async source.
+        
+        Renders that run on a thread and read their input once (XLSX with an
+        output schema) pull results from the source in batches while they
+        write, so the results are never all in memory. Worker processes can
+        only be sent a list, so anything else is collected first.
+        """
+        if not self.has_capacity(background):
+            raise ExportBusyError("Too many exports in progress, please retry shortly")
+        
+        if self.in_process and renders_in_one_pass(format, output_schema):
+            source = _blocking_batches(results, asyncio.get_running_loop(), batch_size)
+            return await self.render(format, source, output_schema, background=background)
+        return await self.render(format, [result async for result in results], output_schema, background=background)
+    
+    def _release(self) -> None:
+        self.pending -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current load of the pool."""
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending
+        }
+    
+    def shutdown(self) -> None:
+        """Stop workers, dropping queued renders."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _blocking_batches(
+    results: AsyncIterator[Dict[str, Any]],
+    loop: asyncio.AbstractEventLoop,
+    batch_size: int
+) -> Iterator[Dict[str, Any]]:
+    """Iterate an async source from a worker thread, fetching a batch per trip to the event loop."""
+    async def next_batch() -> List[Dict[str, Any]]:
+        batch = []
+        async for result in results:
+            batch.append(result)
+            if len(batch) >= batch_size:
+                break
+        return batch
+    
+    while True:
+        batch = asyncio.run_coroutine_threadsafe(next_batch(), loop).result()
+        if not batch:
+            return
+        yield from batch
+
+
+# Shared pool for the API process
+export_pool = ExportRenderPool()
@@ -0,0 +1,131 @@
+"""
+Flattening of nested results into dotted columns for tabular exports.
+
+Nested objects become `parent.child` columns and arrays are JSON encoded.
+For templates with an `output_schema` the column list is known up front, so
+a flattener is built once from the schema's key paths; whatever a result
+holds outside those paths is kept in an extra column.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+
+# Column holding JSON of the parts of a result the schema does not declare
+EXTRA_COLUMN = "_extra"
+
+# Declared key paths as a tree: leaves hold their column position
+_KeyTree = Dict[str, Union[int, "_KeyTree"]]
+
+
+def flatten_into(d: Dict[str, Any], out: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Write the dotted-key form of d into out and return out."""
+    for key, value in d.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            flatten_into(value, out, name + ".")
+        elif isinstance(value, list):
+            out[name] = json.dumps(value)
+        else:
+            out[name] = value
+    return out
+
+
+def schema_paths(
+    output_schema: Optional[Dict[str, Any]],
+    prefix: Tuple[str, ...] = ()
+) -> List[Tuple[Tuple[str, ...], str]]:
+    """(key path, JSON type) of every leaf property declared by an object schema."""
+    paths = []
+    for name, definition in ((output_schema or {}).get("properties") or {}).items():
+        path = prefix + (name,)
+        kind = schema_type(definition)
+        if kind == "object" and definition.get("properties"):
+            paths.extend(schema_paths(definition, path))
+        else:
+            paths.append((path, kind))
+    return paths
+
+
+def schema_columns(output_schema: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Flattened (column, JSON type) pairs declared by an object schema."""
+    return [(".".join(path), kind) for path, kind in schema_paths(output_schema)]
+
+
+def schema_type(definition: Dict[str, Any]) -> str:
+    """JSON type of a property, ignoring `null` in type unions."""
+    kind = definition.get("type", "string")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "string")
+    return kind
+
+
+def _scalar(value: Any) -> Any:
+    """Leaf value as written by flatten_into."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class Flattener:
+    """Turns a result into a row of values for a fixed column list."""
+    
+    def __init__(self, columns: List[str], values: Optional[Callable[[Dict[str, Any]], List[Any]]] = None):
+        self.columns = columns
+        if values is not None:
+            self.values = values
+    
+    def values(self, result: Dict[str, Any]) -> List[Any]:
+        """Row values in column order; missing columns are None."""
+        flat = flatten_into(result, {})
+        return [flat.get(column) for column in self.columns]
+
+
+def _split(result: Dict[str, Any], tree: _KeyTree, row: List[Any]) -> Dict[str, Any]:
+    """Write declared leaves into row; returns the rest of result, nested as it was."""
+    extra: Dict[str, Any] = {}
+    for key, value in result.items():
+        node = tree.get(key)
+        if node is None:
+            extra[key] = value
+        elif isinstance(node, int):
+            row[node] = _scalar(value)
+        elif isinstance(value, dict):
+            rest = _split(value, node, row)
+            if rest:
+                extra[key] = rest
+        elif value is not None:
+            # Not an object where the schema declares one
+            extra[key] = value
+    return extra
+
+
+def compile_flattener(output_schema: Optional[Dict[str, Any]]) -> Optional[Flattener]:
+    """
+    Build a flattener specialised to an object schema, or None without one.
+    
+    Results are walked along a tree of the declared key paths, so a single
+    pass over the results is enough. Keys the schema does not declare, at
+    any depth, and values that are not objects where the schema expects
+    one, go to EXTRA_COLUMN as JSON in their original nesting, so nothing
+    is dropped.
+    """
+    paths = [path for path, _ in schema_paths(output_schema)]
+    if not paths:
+        return None
+    
+    tree: _KeyTree = {}
+    for position, path in enumerate(paths):
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = position
+    width = len(paths)
+    
+    def values(result: Dict[str, Any]) -> List[Any]:
+        row: List[Any] = [None] * (width + 1)
+        extra = _split(result, tree, row)
+        if extra:
+            row[width] = json.dumps(extra)
+        return row
+    
+    return Flattener([".".join(path) for path in paths] + [EXTRA_COLUMN], values)
@@ -0,0 +1,174 @@
+"""
+Storage of generation results in the generation_items collection.
+
+Each result is its own small document keyed by (generation_id, index), so a
+generation document stays a fixed size however many items it has, progress
+updates no longer rewrite the results, and readers stream items with a
+cursor instead of loading them all. Items are written as they are
+produced, so they double as checkpoints: a resumed generation only has to
+produce the indexes that are missing.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from beanie import PydanticObjectId
+from pymongo.errors import BulkWriteError
+
+from app.config import get_settings
+from app.database import secondary_collection
+from app.models.generation_item import GenerationItem
+
+
+# Fields read when streaming items
+_ITEM_PROJECTION = {"_id": 0, "index": 1, "result": 1}
+
+# Fields read when loading the items of several generations
+_PAGE_PROJECTION = {"_id": 0, "generation_id": 1, "index": 1, "result": 1}
+
+# Fields read when resuming a generation
+_CHECKPOINT_PROJECTION = {"_id": 0, "index": 1, "usage": 1, "served_by": 1}
+
+# MongoDB error code of a unique index violation
+_DUPLICATE_KEY = 11000
+
+USAGE_FIELDS = ("total_tokens", "prompt_tokens", "completion_tokens", "cost")
+
+
+def item_document(
+    generation_id: PydanticObjectId,
+    index: int,
+    result: Dict[str, Any],
+    usage: Optional[Dict[str, float]] = None,
+    served_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """Raw generation_items document."""
+    document = {
+        "generation_id": generation_id,
+        "index": index,
+        "result": result,
+        "created_at": datetime.utcnow()
+    }
+    if usage is not None:
+        document["usage"] = usage
+    if served_by is not None:
+        document["served_by"] = served_by
+    return document
+
+
+class ItemsTakenOver(Exception):
+    """Items were already written by another worker, which now owns the job or chunk."""
+
+
+class ItemWriter:
+    """Buffers a generation's items and inserts them in batches."""
+    
+    def __init__(self, generation_id: PydanticObjectId, batch_size: Optional[int] = None):
+        self.generation_id = generation_id
+        self.batch_size = batch_size or get_settings().generation_item_batch_size
+        self._buffer: List[Dict[str, Any]] = []
+        self.written = 0
+    
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+    
+    async def add(
+        self,
+        index: int,
+        result: Dict[str, Any],
+        usage: Optional[Dict[str, float]] = None,
+        served_by: Optional[str] = None
+    ) -> None:
+        """Queue one item, writing the batch once it is full."""
+        self._buffer.append(item_document(self.generation_id, index, result, usage, served_by))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """
+        Insert the buffered items.
+        
+        Raises ItemsTakenOver when an index is already stored, which only
+        happens once another worker has taken the job or chunk over.
+        """
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            await GenerationItem.get_motor_collection().insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors") or []
+            if errors and all(error.get("code") == _DUPLICATE_KEY for error in errors):
+                raise ItemsTakenOver(f"{len(errors)} items of {self.generation_id} were already written") from e
+            raise
+        self.written += len(batch)
+
+
+@dataclass
+class Checkpoint:
+    """What a generation's stored items already account for."""
+    
+    indexes: Set[int] = field(default_factory=set)
+    usage: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(USAGE_FIELDS, 0))
+    served_by: Dict[str, int] = field(default_factory=dict)
+
+
+async def load_checkpoint(generation_id: PydanticObjectId) -> Checkpoint:
+    """Collect the indexes, usage and fallbacks of a generation's stored items."""
+    checkpoint = Checkpoint()
+    cursor = GenerationItem.get_motor_collection().find(
+        {"generation_id": generation_id}, _CHECKPOINT_PROJECTION
+    )
+    async for document in cursor:
+        checkpoint.indexes.add(document["index"])
+        for name, value in (document.get("usage") or {}).items():
+            if name in checkpoint.usage:
+                checkpoint.usage[name] += value
+        served_by = document.get("served_by")
+        if served_by:
+            checkpoint.served_by[served_by] = checkpoint.served_by.get(served_by, 0) + 1
+    return checkpoint
+
+
+async def iter_items(
+    generation_id: PydanticObjectId,
+    batch_size: Optional[int] = None,
+    secondary: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a generation's results in order through one cursor.
+    
+    `secondary` reads from secondaries; only for generations finished long
+    enough ago that replication lag cannot hide items.
+    """
+    batch_size = batch_size or get_settings().export_batch_size
+    items = secondary_collection(GenerationItem) if secondary else GenerationItem.get_motor_collection()
+    cursor = items.find(
+        {"generation_id": generation_id}, _ITEM_PROJECTION
+    ).sort("index", 1).batch_size(batch_size)
+    async for document in cursor:
+        yield document.get("result") or {}
+
+
+async def load_results(
+    generation_ids: List[PydanticObjectId],
+    batch_size: Optional[int] = None
+) -> Dict[PydanticObjectId, List[Dict[str, Any]]]:
+    """Results of several generations in order, read with one query."""
+    results = {generation_id: [] for generation_id in generation_ids}
+    if not results:
+        return results
+    batch_size = batch_size or get_settings().export_batch_size
+    cursor = GenerationItem.get_motor_collection().find(
+        {"generation_id": {"$in": list(results)}}, _PAGE_PROJECTION
+    ).sort([("generation_id", 1), ("index", 1)]).batch_size(batch_size)
+    async for document in cursor:
+        results[document["generation_id"]].append(document.get("result") or {})
+    return results
+
+
+async def delete_items(generation_id: PydanticObjectId) -> int:
+    """Remove a generation's items; returns how many were deleted."""
+    result = await GenerationItem.get_motor_collection().delete_many({"generation_id": generation_id})
+    return result.deleted_count
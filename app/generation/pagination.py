@@ -0,0 +1,77 @@
+"""
+Keyset pagination for generation history.
+
+Pages are ordered by (created_at, _id) descending and continue from the last
+item of the previous page, so every page is an index range scan on
+(user_id, created_at, _id) instead of skipping over all earlier documents.
+The cursor handed to clients is an opaque base64 token of that position.
+"""
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.cache import TTLCache
+
+
+# Sort order matching the keyset filter
+HISTORY_SORT = ("-created_at", "-_id")
+
+
+class HistoryTotal(str, Enum):
+    """How the total of a history listing is computed."""
+    
+    EXACT = "exact"
+    CACHED = "cached"
+    NONE = "none"
+
+
+def encode_cursor(created_at: datetime, id: Any) -> str:
+    """Opaque cursor positioned after the given item."""
+    raw = json.dumps({"t": created_at.isoformat(), "i": str(id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Position stored in a cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return datetime.fromisoformat(position["t"]), ObjectId(position["i"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(created_at: datetime, id: ObjectId) -> Dict[str, Any]:
+    """Filter for the items that sort after the given position."""
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": id}}
+        ]
+    }
+
+
+class CountCache(TTLCache[str, int]):
+    """Size-bounded TTL cache of history totals per query."""
+    
+    ttl_setting = "history_count_cache_ttl_seconds"
+    size_setting = "history_count_cache_size"
+    
+    @staticmethod
+    def key(query: Dict[str, Any]) -> str:
+        return json.dumps(query, sort_keys=True, default=str)
+    
+    def get(self, query: Dict[str, Any]) -> Optional[int]:
+        return super().get(self.key(query))
+    
+    def set(self, query: Dict[str, Any], total: int) -> None:
+        super().set(self.key(query), total)
+
+
+# History totals shared by all requests of the process
+history_counts = CountCache()
@@ -0,0 +1,97 @@
+"""
+Recovery of generation jobs whose worker died.
+
+Jobs run in the background of the API process, so a restart or deploy
+leaves them ``processing`` with nobody working on them. A worker holds a
+lease on its job that it renews with heartbeats; the reaper periodically
+looks for jobs whose lease went stale (or that never started) and hands
+them back to the generation task, which resumes from the stored items.
+Dataset jobs go back to the dataset runner, which claims their unfinished
+chunks again.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import get_settings
+from app.models.generation import Generation
+from app.generation.dataset import dataset_task
+from app.generation.tasks import claimable_filter, generate_items_task
+
+
+logger = logging.getLogger(__name__)
+
+# Jobs resumed per sweep
+REAP_BATCH = 100
+
+
+class StaleJobReaper:
+    """Finds abandoned generation jobs and resumes them."""
+    
+    def __init__(
+        self,
+        resume: Optional[Callable[[str], Any]] = None,
+        interval: Optional[float] = None,
+        resume_dataset: Optional[Callable[[str], Any]] = None
+    ):
+        self._resume = resume or generate_items_task.delay
+        self._resume_dataset = resume_dataset or dataset_task.delay
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.resumed = 0
+    
+    @property
+    def interval(self) -> float:
+        return get_settings().generation_reaper_interval_seconds if self._interval is None else self._interval
+    
+    async def find_stale(self, limit: int = REAP_BATCH) -> List[Dict[str, Any]]:
+        """IDs and kinds of jobs that are waiting for a worker that is gone."""
+        query = claimable_filter(datetime.utcnow(), stale_pending=True)
+        cursor = Generation.get_motor_collection().find(query, {"_id": 1, "kind": 1}).limit(limit)
+        return [document async for document in cursor]
+    
+    async def reap(self) -> int:
+        """Resume every stale job; lease and chunk claims settle races between replicas."""
+        documents = await self.find_stale()
+        for document in documents:
+            generation_id = str(document["_id"])
+            if document.get("kind") == "dataset":
+                logger.warning(f"Resuming abandoned dataset job {generation_id}")
+                self._resume_dataset(generation_id)
+            else:
+                logger.warning(f"Resuming abandoned generation {generation_id}")
+                self._resume(generation_id)
+        self.sweeps += 1
+        self.resumed += len(documents)
+        return len(documents)
+    
+    def start(self) -> None:
+        """Sweep now and then every interval, in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.warning(f"Stale generation sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def stats(self) -> Dict[str, int]:
+        return {"sweeps": self.sweeps, "resumed": self.resumed}
+
+
+# Create reaper instance
+stale_job_reaper = StaleJobReaper()
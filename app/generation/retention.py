@@ -0,0 +1,215 @@
+"""
+Retention of finished generations.
+
+A generation gets an `expires_at` from its owner's tier when it is created.
+Once it has expired and finished, the cleanup task writes it and its results
+to a zstd-compressed NDJSON archive, deletes its items in small paced
+batches and marks it archived. The TTL index on `expires_at` only covers
+archived generations, so MongoDB removes the (now small) documents itself
+and nothing is ever deleted before it was archived.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from beanie import PydanticObjectId
+
+from app.config import get_settings
+from app.models.dataset import DatasetChunk
+from app.models.generation import Generation, GenerationStatus
+from app.models.generation_item import GenerationItem
+from app.generation.items import iter_items
+
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = (GenerationStatus.COMPLETED, GenerationStatus.FAILED, GenerationStatus.CANCELLED)
+
+# Lines buffered before each compressed write
+_WRITE_BATCH = 500
+
+
+def retention_for(tier: Optional[str]) -> Optional[timedelta]:
+    """How long a tier's generations are kept; None keeps them forever."""
+    retention_days = get_settings().retention_days
+    days = retention_days.get(tier or "free", retention_days.get("free", 0))
+    return timedelta(days=days) if days > 0 else None
+
+
+def expiry_for(user: Any, created_at: Optional[datetime] = None) -> Optional[datetime]:
+    """When a generation created by a user expires."""
+    retention = retention_for(getattr(user, "tier", None))
+    if retention is None:
+        return None
+    return (created_at or datetime.utcnow()) + retention
+
+
+class ArchiveWriter:
+    """Writes NDJSON lines to a zstd-compressed file."""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._stream: Any = None
+        self.lines = 0
+    
+    def open(self) -> None:
+        import pyarrow as pa
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = pa.output_stream(str(self.path), compression="zstd")
+    
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        """Append records (blocking; run off the event loop)."""
+        self._stream.write("".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8"))
+        self.lines += len(records)
+    
+    def close(self) -> int:
+        """Finish the archive and return its size in bytes."""
+        self._stream.close()
+        return self.path.stat().st_size
+    
+    def abort(self) -> None:
+        """Close and delete a partial archive."""
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+        self.path.unlink(missing_ok=True)
+
+
+def read_archive(path: Path) -> List[Dict[str, Any]]:
+    """Records of an archive, for inspection and restores."""
+    import pyarrow as pa
+    
+    with pa.input_stream(str(path), compression="zstd") as stream:
+        return [json.loads(line) for line in stream.read().decode("utf-8").splitlines() if line]
+
+
+class RetentionService:
+    """Archives and deletes generations past their retention."""
+    
+    async def expired(self, now: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Finished generations whose retention is over and that are not archived yet."""
+        cursor = Generation.get_motor_collection().find({
+            "archived_at": None,
+            "expires_at": {"$lte": now},
+            "status": {"$in": [status.value for status in FINISHED_STATUSES]}
+        }).sort("expires_at", 1).limit(limit)
+        return [document async for document in cursor]
+    
+    async def run(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Archive and purge one batch of expired generations."""
+        settings = get_settings()
+        now = now or datetime.utcnow()
+        documents = await self.expired(now, settings.retention_max_generations)
+        stats = {"archived": 0, "purged": 0, "items_deleted": 0}
+        if not documents:
+            return stats
+        
+        # Generations written by an interrupted run only still need purging
+        pending = [document for document in documents if not document.get("archive_file")]
+        if pending:
+            path = Path(settings.retention_archive_dir) / (
+                f"generations-{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}.ndjson.zst"
+            )
+            await self.archive(pending, path)
+            await Generation.get_motor_collection().update_many(
+                {"_id": {"$in": [document["_id"] for document in pending]}},
+                {"$set": {"archive_file": str(path)}}
+            )
+            for document in pending:
+                document["archive_file"] = str(path)
+            stats["archived"] = len(pending)
+        
+        for document in documents:
+            stats["items_deleted"] += await self.purge(document)
+            stats["purged"] += 1
+        
+        logger.info(
+            f"Retention: archived {stats['archived']} generations, "
+            f"purged {stats['purged']} ({stats['items_deleted']} items)"
+        )
+        return stats
+    
+    async def archive(self, documents: List[Dict[str, Any]], path: Path) -> int:
+        """
+        Write generations to one archive; returns its size.
+        
+        Each generation is a `generation` record followed by one `item`
+        record per result, so a record never holds a whole large job.
+        """
+        writer = ArchiveWriter(path)
+        await asyncio.to_thread(writer.open)
+        try:
+            for document in documents:
+                record = {key: value for key, value in document.items() if key != "results"}
+                await asyncio.to_thread(writer.write, [dict(record, type="generation")])
+                
+                batch: List[Dict[str, Any]] = []
+                async for index, result in self._results(document):
+                    batch.append({"type": "item", "job_id": document["job_id"], "index": index, "result": result})
+                    if len(batch) >= _WRITE_BATCH:
+                        await asyncio.to_thread(writer.write, batch)
+                        batch = []
+                if batch:
+                    await asyncio.to_thread(writer.write, batch)
+            return await asyncio.to_thread(writer.close)
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+    
+    async def _results(self, document: Dict[str, Any]):
+        # Legacy documents still carry their results inline
+        if document.get("results"):
+            for index, result in enumerate(document["results"], 1):
+                yield index, result
+            return
+        index = 0
+        async for result in iter_items(document["_id"]):
+            index += 1
+            yield index, result
+    
+    async def purge(self, document: Dict[str, Any]) -> int:
+        """Delete an archived generation's items and files, then mark it archived."""
+        generation_id = document["_id"]
+        deleted = await self.delete_items(generation_id, document.get("count") or 0)
+        
+        if document.get("kind") == "dataset":
+            await DatasetChunk.get_motor_collection().delete_many({"generation_id": generation_id})
+            dataset_file = (document.get("metadata") or {}).get("dataset", {}).get("file")
+            if dataset_file:
+                Path(dataset_file).unlink(missing_ok=True)
+        
+        await Generation.get_motor_collection().update_one(
+            {"_id": generation_id},
+            {"$set": {"archived_at": datetime.utcnow(), "results": []}}
+        )
+        return deleted
+    
+    async def delete_items(self, generation_id: PydanticObjectId, count: int) -> int:
+        """Delete items in index ranges with a pause between batches to spare the primary."""
+        settings = get_settings()
+        batch_size = settings.retention_delete_batch_size
+        items = GenerationItem.get_motor_collection()
+        
+        deleted = 0
+        for start in range(1, count + 1, batch_size):
+            result = await items.delete_many({
+                "generation_id": generation_id,
+                "index": {"$gte": start, "$lt": start + batch_size}
+            })
+            deleted += result.deleted_count
+            await asyncio.sleep(settings.retention_delete_pause_seconds)
+        
+        # Anything outside the expected range
+        result = await items.delete_many({"generation_id": generation_id})
+        return deleted + result.deleted_count
+
+
+# Create service instance
+retention_service = RetentionService()
@@ -1,19 +1,46 @@
 """Generation service for managing LLM generations."""
+import json
+import logging
 import uuid
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 
 from beanie import PydanticObjectId
 
-from app.models.generation import Generation, GenerationStatus
+from app.config import get_settings
+from app.database import count_secondary, find_secondary
+from app.models.generation import (
+    GENERATION_VIEW_MODELS, Generation, GenerationStatus, GenerationView, TemplateSnapshot
+)
 from app.models.template import Template
 from app.models.user import User
 from app.templates.renderer import TemplateRenderer
 from app.templates.validator import TemplateValidator
-from app.providers.factory import get_provider
+from app.providers.base import GenerationError
+from app.providers.catalog import model_catalog
+from app.providers.pricing import ensure_prices, price_table
+from app.providers.tokenizers import fit_max_tokens, tokenizers
+from app.providers.router import AUTO_MODEL, RoutingConstraints, model_router
+from app.generation.bulk_export import history_query
+from app.generation.export import BINARY_EXPORT_MEDIA_TYPES, get_exporter_class, stream_export
+from app.generation.export_cache import export_cache, export_usage
+from app.generation.export_pool import export_pool
+from app.generation.items import iter_items, load_results
+from app.generation.pagination import (
+    HISTORY_SORT,
+    HistoryTotal,
+    decode_cursor,
+    encode_cursor,
+    history_counts,
+    keyset_filter
+)
+from app.generation.retention import expiry_for
 from app.generation.tasks import generate_items_task
 
 
+logger = logging.getLogger(__name__)
+
+
 class GenerationService:
     """Service for managing generations."""
     
@@ -29,17 +56,16 @@ class GenerationService:
         provider: str,
         model: str,
         variables: Dict[str, Any],
-        count: int = 1
+        count: int = 1,
+        routing: Optional[Dict[str, Any]] = None,
+        max_cost: Optional[float] = None
     ) -> Generation:
         """Start a new generation job."""
-        # Load template
-        template = await Template.get(template_id)
-        if not template:
-            raise ValueError("Template not found")
+        max_count = get_settings().generation_max_count
+        if count > max_count:
+            raise ValueError(f"count must be at most {max_count}")
         
-        # Check access
-        if not template.is_public and template.created_by.id != user.id:
-            raise ValueError("Access denied to private template")
+        template = await self._load_template(template_id, user)
         
         # Validate variables if needed
         if template.validation_mode != "none":
@@ -52,23 +78,40 @@ class GenerationService:
             if not is_valid:
                 raise ValueError(f"Validation failed: {', '.join(errors)}")
         
+        # Resolve automatic model selection
+        routing_info = None
+        if model == AUTO_MODEL:
+            provider, model, routing_info = await self._route_model(template, provider, routing)
+        
+        # Refuse jobs whose worst-case cost is over budget before calling any provider
+        if max_cost is not None:
+            estimate = await self._estimate(template, provider, model, variables, count)
+            if estimate["max_cost"] > max_cost:
+                raise ValueError(
+                    f"Estimated cost ${estimate['max_cost']:.4f} exceeds budget ${max_cost:.4f}"
+                )
+        
         # Create generation record
         generation = Generation(
             job_id=f"gen_{uuid.uuid4().hex[:8]}",
-            user=user,
-            template=template,
             user_id=str(user.id),
             template_id=str(template.id),
+            template_snapshot=TemplateSnapshot.from_template(template),
             provider=provider,
             model=model,
             variables=variables,
             count=count,
             status=GenerationStatus.PENDING,
+            expires_at=expiry_for(user),
             metadata={
                 "template_name": template.name,
                 "validation_warnings": warnings if template.validation_mode != "none" else []
             }
         )
+        if routing_info:
+            generation.metadata["routing"] = routing_info
+        if max_cost is not None:
+            generation.metadata["max_cost"] = max_cost
         await generation.save()
         
         # Queue async task
@@ -76,6 +119,97 @@ class GenerationService:
         
         return generation
     
+    async def estimate_generation(
+        self,
+        user: User,
+        template_id: str,
+        provider: str,
+        model: str,
+        variables: Dict[str, Any],
+        count: int = 1,
+        routing: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Estimate token usage and cost of a job without calling the provider."""
+        template = await self._load_template(template_id, user)
+        if model == AUTO_MODEL:
+            provider, model, _ = await self._route_model(template, provider, routing)
+        return await self._estimate(template, provider, model, variables, count)
+    
+    async def _estimate(
+        self,
+        template: Template,
+        provider: str,
+        model: str,
+        variables: Dict[str, Any],
+        count: int
+    ) -> Dict[str, Any]:
+        """Price a job from the rendered first item and the completion token cap."""
+        sample = dict(variables, index=1, date=datetime.utcnow().isoformat())
+        messages = [
+            {"role": "system", "content": self.renderer.render_prompt(
+                template.system_prompt, sample, template.variables
+            )},
+            {"role": "user", "content": self.renderer.render_prompt(
+                template.user_prompt, sample, template.variables
+            )}
+        ]
+        prompt_tokens = tokenizers.count_messages(model, messages)
+        
+        await ensure_prices([provider])
+        try:
+            max_completion_tokens = fit_max_tokens(
+                prompt_tokens,
+                model_catalog.get(provider, model),
+                (template.provider_settings or {}).get("max_tokens")
+            )
+        except GenerationError as e:
+            raise ValueError(str(e))
+        
+        return {
+            "provider": provider,
+            "model": model,
+            "count": count,
+            "prompt_tokens": prompt_tokens * count,
+            "exact_token_count": tokenizers.for_model(model).exact,
+            "max_completion_tokens": max_completion_tokens * count,
+            "priced": price_table.get(provider, model) is not None,
+            "prompt_cost": count * price_table.cost(provider, model, prompt_tokens, 0),
+            "max_cost": count * price_table.cost(provider, model, prompt_tokens, max_completion_tokens)
+        }
+    
+    async def _load_template(self, template_id: str, user: User) -> Template:
+        """Load a template the user is allowed to generate from."""
+        template = await Template.get(template_id)
+        if not template:
+            raise ValueError("Template not found")
+        
+        # Check access
+        if not template.is_public and template.owner_id != str(user.id):
+            raise ValueError("Access denied to private template")
+        
+        return template
+    
+    async def _route_model(
+        self,
+        template: Template,
+        provider: str,
+        routing: Optional[Dict[str, Any]]
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        """Pick a provider/model for `model: "auto"` requests."""
+        provider_settings = template.provider_settings or {}
+        constraints = RoutingConstraints(**(routing or provider_settings.get("routing") or {}))
+        if not constraints.min_context_length:
+            constraints.min_context_length = provider_settings.get("max_tokens", 0)
+        
+        selected = await model_router.select(
+            constraints,
+            None if provider == AUTO_MODEL else provider
+        )
+        if not selected:
+            raise ValueError("No model satisfies the routing constraints")
+        
+        return selected.provider, selected.id, model_router.explain(selected, constraints)
+    
     async def get_generation_status(self, job_id: str, user: User) -> Optional[Generation]:
         """Get generation status by job ID."""
         generation = await Generation.find_one({
@@ -84,6 +218,25 @@ class GenerationService:
         })
         return generation
     
+    async def get_generation_view(
+        self,
+        job_id: str,
+        user: User,
+        view: GenerationView = GenerationView.FULL
+    ) -> Optional[Dict[str, Any]]:
+        """Public data of a generation, reading only the fields the view needs."""
+        query = {"job_id": job_id, "user_id": str(user.id)}
+        if view != GenerationView.FULL:
+            generation = await Generation.find_one(query, projection_model=GENERATION_VIEW_MODELS[view])
+            return generation.dict_public() if generation else None
+        
+        generation = await Generation.find_one(query)
+        if not generation:
+            return None
+        data = generation.dict_public()
+        data["results"] = [result async for result in self._results_of(generation)]
+        return data
+    
     async def get_generation_result(self, job_id: str, user: User) -> Optional[Generation]:
         """Get generation result if completed."""
         generation = await self.get_generation_status(job_id, user)
@@ -120,29 +273,84 @@ class GenerationService:
         skip: int = 0,
         limit: int = 20,
         status: Optional[str] = None,
-        template_id: Optional[str] = None
+        template_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        view: GenerationView = GenerationView.FULL,
+        cursor: Optional[str] = None,
+        total: HistoryTotal = HistoryTotal.CACHED
     ) -> Dict[str, Any]:
-        """Get user's generation history."""
+        """
+        Get user's generation history.
+        
+        Pages continue from `cursor` (the `next_cursor` of the previous page)
+        with an index range scan; `skip` still works but gets slower with
+        depth. Raises ValueError for malformed cursors.
+        """
         # Build query
-        query = {"user_id": str(user.id)}
-        if status:
-            query["status"] = status
-        if template_id:
-            query["template_id"] = template_id
+        query = history_query(str(user.id), status, template_id, created_from, created_to)
+        page_query = query
+        if cursor:
+            page_query = {"$and": [query, keyset_filter(*decode_cursor(cursor))]}
         
-        # Get total count
-        total = await Generation.find(query).count()
+        # One extra item tells whether there is a next page
+        find = Generation.find(page_query).sort(*HISTORY_SORT).skip(skip).limit(limit + 1)
+        if view != GenerationView.FULL:
+            find = find.project(GENERATION_VIEW_MODELS[view])
+        generations = await find_secondary(find)
         
-        # Get paginated results
-        generations = await Generation.find(query).sort("-created_at").skip(skip).limit(limit).to_list()
+        has_more = len(generations) > limit
+        generations = generations[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(generations[-1].created_at, generations[-1].id)
+        
+        items = [gen.dict_public() for gen in generations]
+        if view == GenerationView.FULL:
+            await self._attach_results(generations, items)
         
         return {
-            "items": [gen.dict_public() for gen in generations],
-            "total": total,
+            "items": items,
+            "total": await self._history_total(query, total, cursor, skip, len(generations), has_more),
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": next_cursor
         }
     
+    async def _attach_results(self, generations: List[Generation], items: List[Dict[str, Any]]) -> None:
+        """Fill in the results of a page of generations from generation_items with one query."""
+        # Documents written before results moved to generation_items keep them inline
+        stored = await load_results([
+            generation.id for generation, item in zip(generations, items) if not item["results"]
+        ])
+        for generation, item in zip(generations, items):
+            if generation.id in stored:
+                item["results"] = stored[generation.id]
+    
+    async def _history_total(
+        self,
+        query: Dict[str, Any],
+        total: HistoryTotal,
+        cursor: Optional[str],
+        skip: int,
+        page_size: int,
+        has_more: bool
+    ) -> Optional[int]:
+        """Total of a history listing, counting only when it is not already known."""
+        if total == HistoryTotal.NONE:
+            return None
+        # The first page of a short history is the whole history
+        if not cursor and not has_more and (page_size or not skip):
+            return skip + page_size
+        
+        if total == HistoryTotal.CACHED:
+            cached = history_counts.get(query)
+            if cached is not None:
+                return cached
+        count = await count_secondary(Generation.find(query))
+        history_counts.set(query, count)
+        return count
+    
     async def export_generation(
         self,
         job_id: str,
@@ -157,7 +365,163 @@ class GenerationService:
         # Get export handler (will be implemented with export module)
         from app.generation.export import export_results
         
-        return export_results(generation.results, format)
+        return export_results([result async for result in self._results_of(generation)], format)
+    
+    async def stream_generation_result(
+        self,
+        generation: Generation,
+        batch_size: int = 100
+    ) -> AsyncIterator[bytes]:
+        """JSON body of a generation, with its results streamed from generation_items."""
+        data = generation.dict_public()
+        data.pop("results")
+        yield (json.dumps(data, default=str)[:-1] + ', "results": [').encode("utf-8")
+        
+        batch: List[str] = []
+        first = True
+        async for result in self._results_of(generation):
+            batch.append(json.dumps(result, default=str))
+            if len(batch) >= batch_size:
+                yield (("" if first else ", ") + ", ".join(batch)).encode("utf-8")
+                batch, first = [], False
+        if batch:
+            yield (("" if first else ", ") + ", ".join(batch)).encode("utf-8")
+        yield b"]}"
+    
+    async def _results_of(self, generation: Generation) -> AsyncIterator[Dict[str, Any]]:
+        """Results of a loaded generation: inline on legacy documents, else generation_items."""
+        if generation.results:
+            for result in generation.results:
+                yield result
+            return
+        async for result in iter_items(generation.id):
+            yield result
+    
+    async def get_export_target(self, job_id: str, user: User) -> PydanticObjectId:
+        """Id of a completed generation owned by the user, without loading its results."""
+        document = await Generation.get_motor_collection().find_one(
+            {"job_id": job_id, "user_id": str(user.id)},
+            {"_id": 1, "status": 1}
+        )
+        if not document:
+            raise ValueError("Generation not found")
+        if document["status"] != GenerationStatus.COMPLETED.value:
+            raise ValueError("Generation not completed")
+        return document["_id"]
+    
+    async def stream_results_export(
+        self,
+        generation_id: PydanticObjectId,
+        format: str
+    ) -> AsyncIterator[bytes]:
+        """
+        Byte stream of a text-format export.
+        
+        Stamped with the generation's completion time rather than the render
+        time, so every render carries the same bytes and strong ETag.
+        """
+        output_schema = None
+        if get_exporter_class(format).flattens:
+            # CSV/TSV with a known schema render in a single pass over the results
+            output_schema = await self._output_schema(generation_id)
+        document = await Generation.get_motor_collection().find_one({"_id": generation_id}, {"completed_at": 1})
+        
+        async for chunk in stream_export(
+            lambda: self.iter_results(generation_id),
+            format,
+            output_schema=output_schema,
+            generated_at=(document or {}).get("completed_at")
+        ):
+            yield chunk
+    
+    async def render_binary_export(
+        self,
+        generation_id: PydanticObjectId,
+        format: str,
+        background: bool = False
+    ) -> bytes:
+        """Render a binary export (XLSX, PDF, Arrow, Parquet) in the export worker pool."""
+        return await export_pool.render_stream(
+            format,
+            self.iter_results(generation_id),
+            await self._output_schema(generation_id),
+            background=background,
+            batch_size=get_settings().export_batch_size
+        )
+    
+    async def _output_schema(self, generation_id: PydanticObjectId) -> Dict[str, Any]:
+        """Output schema of the template a generation was made from."""
+        document = await Generation.get_motor_collection().find_one(
+            {"_id": generation_id}, {"template_id": 1, "template_snapshot.output_schema": 1}
+        )
+        if document and document.get("template_snapshot"):
+            return document["template_snapshot"].get("output_schema") or {}
+        if not document or not PydanticObjectId.is_valid(document.get("template_id")):
+            return {}
+        template = await Template.get_motor_collection().find_one(
+            {"_id": PydanticObjectId(document["template_id"])}, {"output_schema": 1}
+        )
+        return (template or {}).get("output_schema") or {}
+    
+    async def prebuild_exports(self, generation_id: PydanticObjectId, user_id: str) -> List[str]:
+        """Render and cache the formats the user exports most; returns the formats built."""
+        limit = get_settings().export_prebuild_formats
+        if not export_cache.enabled or limit <= 0:
+            return []
+        
+        built = []
+        for format in export_usage.top_formats(user_id, limit):
+            key = export_cache.key(str(generation_id), format)
+            if export_cache.contains(key):
+                continue
+            if format in BINARY_EXPORT_MEDIA_TYPES and not export_pool.has_capacity(background=True):
+                # Leave the render slots to user downloads
+                logger.info(f"Skipping {format} pre-build of {generation_id}: export pool is busy")
+                continue
+            try:
+                if format in BINARY_EXPORT_MEDIA_TYPES:
+                    await export_cache.store(
+                        key, await self.render_binary_export(generation_id, format, background=True)
+                    )
+                else:
+                    async for _ in export_cache.store_stream(
+                        key, self.stream_results_export(generation_id, format)
+                    ):
+                        pass
+                built.append(format)
+            except Exception as e:
+                logger.warning(f"Could not pre-build {format} export of {generation_id}: {e}")
+        return built
+    
+    async def iter_results(
+        self,
+        generation_id: PydanticObjectId,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a generation's results, fetching them in batches of batch_size."""
+        batch_size = batch_size or get_settings().export_batch_size
+        found = False
+        async for result in iter_items(generation_id, batch_size):
+            found = True
+            yield result
+        if found:
+            return
+        
+        # Documents written before results moved to generation_items keep them inline
+        collection = Generation.get_motor_collection()
+        
+        skip = 0
+        while True:
+            document = await collection.find_one(
+                {"_id": generation_id},
+                {"_id": 1, "results": {"$slice": [skip, batch_size]}}
+            )
+            batch = (document or {}).get("results") or []
+            for result in batch:
+                yield result
+            if len(batch) < batch_size:
+                return
+            skip += batch_size
     
     async def start_batch_generation(
         self,
@@ -175,7 +539,9 @@ class GenerationService:
                     provider=gen_config["provider"],
                     model=gen_config["model"],
                     variables=gen_config["variables"],
-                    count=gen_config.get("count", 1)
+                    count=gen_config.get("count", 1),
+                    routing=gen_config.get("routing"),
+                    max_cost=gen_config.get("max_cost")
                 )
                 jobs.append({
                     "job_id": generation.job_id,
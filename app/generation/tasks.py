@@ -1,153 +1,425 @@
 """Generation processing logic."""
 import asyncio
 import json
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
 import logging
 
 from beanie import PydanticObjectId
 
-from app.models.generation import Generation, GenerationStatus
+from app.celery_app import celery_app
+from app.config import get_settings
+from app.database import close_database_connection, connect_to_database
+from app.generation.bulk_export import bulk_export_service
+from app.generation.items import ItemWriter, ItemsTakenOver, load_checkpoint
+from app.generation.retention import retention_service
+from app.models.generation import Generation, GenerationStatus, TemplateSnapshot
 from app.models.template import Template
 from app.templates.renderer import TemplateRenderer
-from app.providers.factory import get_provider
-from app.providers.base import GenerationError
+from app.providers.base import GenerationRequest, GenerationError
+from app.providers.fallback import FallbackChain
+from app.providers.catalog import model_catalog
+from app.providers.pricing import ensure_prices, price_table
+from app.providers.tokenizers import fit_max_tokens, tokenizers
+from app.stats.rollups import usage_rollups
+from app.stats.sketch import LatencySketch
 
 
 logger = logging.getLogger(__name__)
 
 
+def worker_id() -> str:
+    """Identifier of one worker of this process, used to hold job leases."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def claimable_filter(now: datetime, stale_pending: bool = False) -> Dict[str, Any]:
+    """
+    Query for jobs that are waiting or whose worker stopped sending heartbeats.
+    
+    With stale_pending, pending jobs only match once they have waited as long
+    as a stale lease, i.e. their task was lost before it started.
+    """
+    stale = now - timedelta(seconds=get_settings().generation_stale_seconds)
+    pending = {"status": GenerationStatus.PENDING.value}
+    if stale_pending:
+        pending["created_at"] = {"$lt": stale}
+    return {"$or": [
+        pending,
+        {"status": GenerationStatus.PROCESSING.value, "heartbeat_at": {"$lt": stale}},
+        # Started before processing leases existed
+        {"status": GenerationStatus.PROCESSING.value, "heartbeat_at": None, "started_at": {"$lt": stale}},
+    ]}
+
+
+@dataclass
+class JobContext:
+    """Per-job state shared by all items: template, provider chain and limits."""
+    
+    template: TemplateSnapshot
+    provider: FallbackChain
+    model: str
+    requested: Tuple[str, str]
+    model_info: Any
+    tokenizer: Any
+    max_cost: Optional[float]
+    deadline: float
+
+
+@dataclass
+class ItemOutcome:
+    """Result and usage of one generated item."""
+    
+    result: Dict[str, Any]
+    prompt: Optional[str] = None
+    fallback: Optional[str] = None
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    latency: Optional[float] = None  # Seconds the provider took; None for failed items
+
+
 class GenerationProcessor:
     """Handles the actual generation processing."""
     
     def __init__(self):
         """Initialize processor."""
         self.renderer = TemplateRenderer()
+        self._background: Set[asyncio.Task] = set()
     
     async def process_generation(self, generation_id: str) -> None:
-        """Process a generation job."""
+        """
+        Process a generation job, or resume one whose worker went silent.
+        
+        Every item is checkpointed to generation_items as soon as it is
+        generated, so a resumed job only generates the missing indexes.
+        """
+        worker = worker_id()
+        heartbeat = None
+        usage = None
+        latency = LatencySketch()
         try:
-            # Load generation with relations
-            generation = await Generation.get(generation_id)
+            # Take the processing lease; another worker may hold a live one
+            generation = await self._claim(generation_id, worker)
             if not generation:
-                logger.error(f"Generation {generation_id} not found")
+                logger.info(f"Generation {generation_id} is not waiting to be processed")
+                return
+            if generation.attempts > get_settings().generation_max_attempts:
+                await self._fail_generation(
+                    generation, f"Processing was interrupted {generation.attempts - 1} times", worker=worker
+                )
                 return
             
-            # Update status to processing
-            generation.status = GenerationStatus.PROCESSING
-            generation.started_at = datetime.utcnow()
-            generation.progress = 10
-            await generation.save()
-            
-            # Load template
-            await generation.fetch_link(Generation.template)
-            template = generation.template
-            
-            # Get provider
             try:
-                provider = get_provider(generation.provider)
+                job = await self.prepare_job(generation)
             except ValueError as e:
-                await self._fail_generation(generation, str(e))
+                await self._fail_generation(generation, str(e), worker=worker)
                 return
             
-            # Generate items
-            results = []
-            total_tokens = 0
-            total_cost = 0.0
+            # Items stored by earlier attempts are kept, with their usage
+            checkpoint = await load_checkpoint(generation.id)
+            if checkpoint.indexes:
+                logger.info(
+                    f"Resuming generation {generation_id}: "
+                    f"{len(checkpoint.indexes)}/{generation.count} items already stored"
+                )
+            usage = dict(checkpoint.usage)
+            served_by = dict(checkpoint.served_by)
             
-            for i in range(generation.count):
-                try:
-                    # Update progress
-                    progress = 10 + int((i / generation.count) * 80)
-                    generation.progress = progress
-                    await generation.save()
-                    
-                    # Prepare variables with index
-                    variables = generation.variables.copy()
-                    variables['index'] = i + 1
-                    variables['date'] = datetime.utcnow().isoformat()
-                    
-                    # Render prompts
-                    system_prompt = self.renderer.render(
-                        template.system_prompt,
-                        variables
-                    )
-                    user_prompt = self.renderer.render(
-                        template.user_prompt,
-                        variables
-                    )
-                    
-                    # Store rendered prompt for first item
-                    if i == 0:
-                        generation.prompt_rendered = f"System: {system_prompt}\n\nUser: {user_prompt}"
-                    
-                    # Get provider settings
-                    settings = template.provider_settings or {}
-                    temperature = settings.get('temperature', 0.7)
-                    max_tokens = settings.get('max_tokens', 1000)
-                    
-                    # Generate with provider
-                    response = await provider.generate(
-                        model=generation.model,
-                        system_prompt=system_prompt,
-                        user_prompt=user_prompt,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        response_format="json" if template.output_schema else "text"
-                    )
-                    
-                    # Parse response
-                    if template.output_schema:
-                        try:
-                            result = json.loads(response['content'])
-                        except json.JSONDecodeError:
-                            result = {"content": response['content'], "raw": True}
-                    else:
-                        result = {"content": response['content']}
-                    
-                    results.append(result)
-                    
-                    # Track usage
-                    if 'usage' in response:
-                        usage = response['usage']
-                        total_tokens += usage.get('total_tokens', 0)
-                        generation.prompt_tokens += usage.get('prompt_tokens', 0)
-                        generation.completion_tokens += usage.get('completion_tokens', 0)
-                        
-                        # Calculate cost
-                        if 'cost' in response:
-                            total_cost += response['cost']
-                    
-                except Exception as e:
-                    logger.error(f"Error generating item {i+1}: {e}")
-                    results.append({
-                        "error": str(e),
-                        "index": i + 1
+            lost = asyncio.Event()
+            heartbeat = asyncio.create_task(self._heartbeat(generation.id, worker, lost))
+            items = ItemWriter(generation.id, batch_size=1)
+            
+            for index in range(1, generation.count + 1):
+                if index in checkpoint.indexes:
+                    continue
+                if lost.is_set():
+                    logger.warning(f"Generation {generation_id} was cancelled or taken over")
+                    return
+                
+                if job.max_cost is not None and usage["cost"] >= job.max_cost:
+                    await items.add(index, {
+                        "error": "Budget exceeded",
+                        "index": index
                     })
+                    continue
+                
+                item = await self.generate_item(job, generation.variables, index)
+                item_usage = {
+                    "total_tokens": item.total_tokens,
+                    "prompt_tokens": item.prompt_tokens,
+                    "completion_tokens": item.completion_tokens,
+                    "cost": item.cost
+                }
+                await items.add(index, item.result, usage=item_usage, served_by=item.fallback)
+                
+                # Track usage
+                for name, value in item_usage.items():
+                    usage[name] += value
+                if item.fallback:
+                    served_by[item.fallback] = served_by.get(item.fallback, 0) + 1
+                if item.latency is not None:
+                    latency.add(item.latency)
+                
+                # Checkpoint progress; store rendered prompt for first item
+                progress = {"progress": 10 + int((index / generation.count) * 80)}
+                if index == 1 and item.prompt:
+                    progress["prompt_rendered"] = item.prompt
+                if not await self._checkpoint(generation.id, worker, progress):
+                    logger.warning(f"Generation {generation_id} was cancelled or taken over")
+                    return
             
-            # Update generation with results
-            generation.status = GenerationStatus.COMPLETED
-            generation.results = results
-            generation.total_tokens = total_tokens
-            generation.cost = total_cost
-            generation.progress = 100
-            generation.completed_at = datetime.utcnow()
-            await generation.save()
+            # Update generation with the result summary
+            result_count = len(checkpoint.indexes) + items.written
+            completed = dict(
+                usage,
+                status=GenerationStatus.COMPLETED.value,
+                result_count=result_count,
+                progress=100,
+                completed_at=datetime.utcnow()
+            )
+            if served_by:
+                completed["metadata.fallbacks_used"] = served_by
+            if not await self._checkpoint(generation.id, worker, completed):
+                logger.warning(f"Generation {generation_id} was cancelled or taken over")
+                return
             
             logger.info(f"Generation {generation_id} completed successfully")
+            await usage_rollups.record(
+                generation, completed=1, items=result_count, usage=usage, latency=latency
+            )
+            
+            # Warm the export cache with the formats this user downloads most
+            if get_settings().export_prebuild_formats > 0:
+                from app.generation.service import generation_service
+                prebuild = asyncio.create_task(
+                    generation_service.prebuild_exports(generation.id, generation.user_id)
+                )
+                # The loop only keeps weak references to tasks
+                self._background.add(prebuild)
+                prebuild.add_done_callback(self._background.discard)
             
+        except ItemsTakenOver:
+            logger.warning(f"Generation {generation_id} was taken over while writing items")
         except Exception as e:
             logger.error(f"Generation {generation_id} failed: {e}")
-            if 'generation' in locals():
-                await self._fail_generation(generation, str(e))
+            if 'generation' in locals() and generation:
+                await self._fail_generation(generation, str(e), usage=usage, latency=latency, worker=worker)
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+    
+    async def _claim(self, generation_id: str, worker: str) -> Optional[Generation]:
+        """Take the lease of a pending job or of one whose worker stopped beating."""
+        now = datetime.utcnow()
+        result = await Generation.get_motor_collection().update_one(
+            {"_id": PydanticObjectId(generation_id), **claimable_filter(now)},
+            {
+                "$set": {
+                    "status": GenerationStatus.PROCESSING.value,
+                    "worker": worker,
+                    "heartbeat_at": now
+                },
+                "$max": {"progress": 10},
+                "$inc": {"attempts": 1}
+            }
+        )
+        if result.matched_count == 0:
+            return None
+        
+        generation = await Generation.get(generation_id)
+        if generation and generation.started_at is None:
+            generation.started_at = now
+            await Generation.get_motor_collection().update_one(
+                {"_id": generation.id}, {"$set": {"started_at": now}}
+            )
+        return generation
+    
+    async def _checkpoint(self, generation_id: PydanticObjectId, worker: str, fields: Dict[str, Any]) -> bool:
+        """Write progress and renew the lease; False once the job is no longer ours."""
+        result = await Generation.get_motor_collection().update_one(
+            {"_id": generation_id, "worker": worker, "status": GenerationStatus.PROCESSING.value},
+            {"$set": dict(fields, heartbeat_at=datetime.utcnow())}
+        )
+        return result.matched_count > 0
     
-    async def _fail_generation(self, generation: Generation, error: str) -> None:
-        """Mark generation as failed."""
+    async def _heartbeat(self, generation_id: PydanticObjectId, worker: str, lost: asyncio.Event) -> None:
+        """Keep the lease alive while a slow item is being generated."""
+        interval = get_settings().generation_heartbeat_seconds
+        while True:
+            await asyncio.sleep(interval)
+            if not await self._checkpoint(generation_id, worker, {}):
+                lost.set()
+                return
+    
+    async def prepare_job(self, generation: Generation) -> JobContext:
+        """
+        Load what every item of a job needs.
+        
+        Raises ValueError when the template is gone or no provider can
+        serve the job.
+        """
+        # Jobs render the template as it was when they were created
+        template = generation.template_snapshot or await self._snapshot_template(generation)
+        
+        # Get provider chain: requested provider/model, then template fallbacks
+        provider = FallbackChain.for_generation(
+            generation.provider,
+            generation.model,
+            template.provider_settings
+        )
+        
+        # Load pricing and limits once per job so items need no per-item lookups
+        await ensure_prices(provider_id for provider_id, _, _ in provider.candidates)
+        
+        return JobContext(
+            template=template,
+            provider=provider,
+            model=generation.model,
+            requested=(generation.provider, generation.model),
+            model_info=model_catalog.get(generation.provider, generation.model),
+            tokenizer=tokenizers.for_model(generation.model),
+            max_cost=generation.metadata.get("max_cost"),
+            # All items of the job share one retry deadline
+            deadline=time.monotonic() + get_settings().generation_job_deadline_seconds
+        )
+    
+    async def _snapshot_template(self, generation: Generation) -> TemplateSnapshot:
+        """Snapshot the template of a job created before snapshots, so that resumes use the same one."""
+        template = await Template.get(generation.template_id)
+        if not template:
+            raise ValueError("Template not found")
+        snapshot = TemplateSnapshot.from_template(template)
+        await Generation.get_motor_collection().update_one(
+            {"_id": generation.id}, {"$set": {"template_snapshot": snapshot.model_dump()}}
+        )
+        generation.template_snapshot = snapshot
+        return snapshot
+    
+    async def generate_item(self, job: JobContext, base_variables: Dict[str, Any], index: int) -> ItemOutcome:
+        """Generate one item; failures become an error result instead of raising."""
+        template = job.template
+        try:
+            # Prepare variables with index
+            variables = base_variables.copy()
+            variables['index'] = index
+            variables['date'] = datetime.utcnow().isoformat()
+            
+            # Render prompts
+            system_prompt = self.renderer.render_prompt(
+                template.system_prompt,
+                variables,
+                template.variables
+            )
+            user_prompt = self.renderer.render_prompt(
+                template.user_prompt,
+                variables,
+                template.variables
+            )
+            
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            
+            # Get provider settings
+            settings = template.provider_settings or {}
+            temperature = settings.get('temperature', 0.7)
+            
+            # Size the completion to the context window; oversized prompts fail here
+            prompt_tokens = job.tokenizer.count_messages(messages)
+            max_tokens = fit_max_tokens(prompt_tokens, job.model_info, settings.get('max_tokens'))
+            
+            # Generate with provider (retries, hedging and fallbacks handled by the chain)
+            started = time.monotonic()
+            response, served_provider, served_model = await job.provider.generate(
+                GenerationRequest(
+                    model=job.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                ),
+                deadline=job.deadline
+            )
+            content = response.choices[0]["message"]["content"] if response.choices else ""
+            
+            # Parse response
+            if template.output_schema:
+                try:
+                    result = json.loads(content)
+                except json.JSONDecodeError:
+                    result = {"content": content, "raw": True}
+            else:
+                result = {"content": content}
+            
+            usage = response.usage
+            return ItemOutcome(
+                result=result,
+                prompt=f"System: {system_prompt}\n\nUser: {user_prompt}",
+                fallback=(
+                    f"{served_provider}/{served_model}"
+                    if (served_provider, served_model) != job.requested else None
+                ),
+                total_tokens=usage.get('total_tokens', 0),
+                prompt_tokens=usage.get('prompt_tokens', 0),
+                completion_tokens=usage.get('completion_tokens', 0),
+                cost=price_table.cost(
+                    served_provider,
+                    served_model,
+                    usage.get('prompt_tokens', 0),
+                    usage.get('completion_tokens', 0)
+                ),
+                latency=time.monotonic() - started
+            )
+            
+        except Exception as e:
+            logger.error(f"Error generating item {index}: {e}")
+            return ItemOutcome(result={
+                "error": str(e),
+                "index": index
+            })
+    
+    async def _fail_generation(
+        self,
+        generation: Generation,
+        error: str,
+        usage: Optional[Dict[str, float]] = None,
+        latency: Optional[LatencySketch] = None,
+        worker: Optional[str] = None
+    ) -> bool:
+        """
+        Mark a processing generation as failed, counting what it used until then.
+        
+        With a worker, only while that worker still holds the lease, so a
+        worker that lost its job never overwrites the new owner's progress.
+        Returns whether the generation was marked.
+        """
+        query: Dict[str, Any] = {"_id": generation.id, "status": GenerationStatus.PROCESSING.value}
+        if worker is not None:
+            query["worker"] = worker
+        completed_at = datetime.utcnow()
+        result = await Generation.get_motor_collection().update_one(query, {"$set": {
+            "status": GenerationStatus.FAILED.value,
+            "error_message": error,
+            "completed_at": completed_at,
+            "progress": 0
+        }})
+        if result.matched_count == 0:
+            logger.warning(f"Generation {generation.id} is no longer ours to fail: {error}")
+            return False
+        
         generation.status = GenerationStatus.FAILED
         generation.error_message = error
-        generation.completed_at = datetime.utcnow()
+        generation.completed_at = completed_at
         generation.progress = 0
-        await generation.save()
+        await usage_rollups.record(generation, failed=1, usage=usage, latency=latency)
+        return True
 
 
 # Create processor instance
@@ -171,4 +443,20 @@ generate_items_task = MockTask()
 # Direct processing function for testing
 async def process_generation(generation_id: str):
     """Process a generation job directly."""
-    await processor.process_generation(generation_id)
\ No newline at end of file
+    await processor.process_generation(generation_id)
+
+
+@celery_app.task(name="app.generation.tasks.cleanup_old_generations")
+def cleanup_old_generations() -> Dict[str, int]:
+    """Archive and delete one batch of generations past their retention, and expired bulk exports."""
+    return asyncio.run(_cleanup_old_generations())
+
+
+async def _cleanup_old_generations() -> Dict[str, int]:
+    await connect_to_database()
+    try:
+        stats = await retention_service.run()
+        stats["exports_deleted"] = await bulk_export_service.purge_expired()
+        return stats
+    finally:
+        await close_database_connection()
@@ -11,9 +11,20 @@ from app import __version__
 from app.config import get_settings
 from app.database import connect_to_database, close_database_connection, check_database_health
 from app.api.auth import router as auth_router
+from app.api.api_keys import router as api_keys_router
+from app.api.datasets import router as datasets_router
 from app.api.providers import router as providers_router
 from app.api.templates import router as templates_router
 from app.api.generation import router as generation_router
+from app.api.exports import router as exports_router
+from app.api.stats import router as stats_router
+from app.auth.api_keys import api_key_auth
+from app.auth.oauth import close_oauth_client
+from app.auth.password import password_hasher
+from app.auth.user_cache import user_cache
+from app.generation.export_cache import export_cache
+from app.generation.export_pool import export_pool
+from app.generation.recovery import stale_job_reaper
 
 
 @asynccontextmanager
@@ -21,8 +32,15 @@ async def lifespan(app: FastAPI):
     """Handle application lifespan events."""
     # Startup
     await connect_to_database()
+    stale_job_reaper.start()
+    api_key_auth.usage.start()
     yield
     # Shutdown
+    await stale_job_reaper.stop()
+    export_pool.shutdown()
+    password_hasher.shutdown()
+    await api_key_auth.usage.stop()
+    await close_oauth_client()
     await close_database_connection()
 
 
@@ -46,9 +64,13 @@ app.add_middleware(
 
 # Include routers
 app.include_router(auth_router)
+app.include_router(api_keys_router)
 app.include_router(providers_router)
 app.include_router(templates_router)
 app.include_router(generation_router)
+app.include_router(exports_router)
+app.include_router(datasets_router)
+app.include_router(stats_router)
 
 
 @app.get("/health")
@@ -71,5 +93,17 @@ async def health_check():
         "version": __version__,
         "environment": settings.environment,
         "timestamp": datetime.utcnow().isoformat(),
-        "database": db_status
+        "database": db_status,
+        "generation": {
+            "reaper": stale_job_reaper.stats()
+        },
+        "exports": {
+            "pool": export_pool.stats(),
+            "cache": export_cache.stats()
+        },
+        "auth": {
+            "user_cache": user_cache.stats(),
+            "password_hasher": password_hasher.stats(),
+            "api_keys": api_key_auth.stats()
+        }
     }
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Database migrations.
+
+Run with `python -m app.migrate` (or `make migrate`). Every migration is
+idempotent, so running them again after a partial run is safe.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app.config import get_settings
+from app.database import close_database_connection, connect_to_database
+from app.generation.items import item_document
+from app.models.generation import Generation
+from app.models.generation_item import GenerationItem
+from app.models.template import Template
+from app.models.user import User
+
+
+logger = logging.getLogger(__name__)
+
+
+async def split_generation_results(batch_size: int = 100) -> int:
+    """
+    Move inline `Generation.results` into generation_items.
+    
+    Returns the number of generations migrated. Items of a generation are
+    replaced as a whole, so an interrupted run is simply repeated.
+    """
+    generations = Generation.get_motor_collection()
+    items = GenerationItem.get_motor_collection()
+    
+    migrated = 0
+    cursor = generations.find({"results.0": {"$exists": True}}, {"results": 1}).batch_size(batch_size)
+    async for document in cursor:
+        generation_id = document["_id"]
+        results = document["results"]
+        
+        await items.delete_many({"generation_id": generation_id})
+        for start in range(0, len(results), batch_size):
+            await items.insert_many(
+                [
+                    item_document(generation_id, index, result)
+                    for index, result in enumerate(results[start:start + batch_size], start + 1)
+                ],
+                ordered=False
+            )
+        await generations.update_one(
+            {"_id": generation_id},
+            {"$set": {"results": [], "result_count": len(results)}}
+        )
+        migrated += 1
+    return migrated
+
+
+async def set_generation_expiry(batch_size: int = 500) -> int:
+    """
+    Give generations created before retention an `expires_at` from their owner's tier.
+    
+    Returns the number of generations updated; ones that already have the
+    field (set, or null for unlimited tiers) are left alone.
+    """
+    retention_days = get_settings().retention_days
+    generations = Generation.get_motor_collection()
+    
+    updated = 0
+    user_ids: Dict[str, List[str]] = {}
+    
+    async def apply(tier: str) -> int:
+        ids, user_ids[tier] = user_ids[tier], []
+        days = retention_days.get(tier, retention_days.get("free", 0))
+        expiry: Any = {"$add": ["$created_at", days * 86_400_000]} if days > 0 else None
+        result = await generations.update_many(
+            {"user_id": {"$in": ids}, "expires_at": {"$exists": False}},
+            [{"$set": {"expires_at": expiry}}]
+        )
+        return result.modified_count
+    
+    cursor = User.get_motor_collection().find({}, {"tier": 1}).batch_size(batch_size)
+    async for user in cursor:
+        tier = user.get("tier") or "free"
+        user_ids.setdefault(tier, []).append(str(user["_id"]))
+        if len(user_ids[tier]) >= batch_size:
+            updated += await apply(tier)
+    for tier in list(user_ids):
+        if user_ids[tier]:
+            updated += await apply(tier)
+    return updated
+
+
+async def set_template_owner_ids(batch_size: int = 500) -> int:
+    """
+    Copy each template's creator from the `created_by` link into `created_by_id`.
+    
+    Returns the number of templates updated.
+    """
+    templates = Template.get_motor_collection()
+    
+    updated = 0
+    cursor = templates.find(
+        {"created_by_id": None, "created_by": {"$ne": None}}, {"created_by": 1}
+    ).batch_size(batch_size)
+    async for document in cursor:
+        await templates.update_one(
+            {"_id": document["_id"]},
+            {"$set": {"created_by_id": str(document["created_by"].id)}}
+        )
+        updated += 1
+    return updated
+
+
+# Applied in order
+MIGRATIONS: List[Callable[[], Awaitable[int]]] = [
+    split_generation_results,
+    set_generation_expiry,
+    set_template_owner_ids,
+]
+
+
+async def run_migrations() -> None:
+    """Apply every migration against the connected database."""
+    for migration in MIGRATIONS:
+        logger.info(f"Running {migration.__name__}")
+        count = await migration()
+        logger.info(f"{migration.__name__}: {count} documents migrated")
+
+
+async def _main() -> None:
+    await connect_to_database()
+    try:
+        await run_migrations()
+    finally:
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,51 @@
+"""
+API key model using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import Field
+from beanie import Document
+from pymongo import IndexModel
+
+
+class ApiKey(Document):
+    """Long-lived credential for machine clients, stored as a keyed hash."""
+    
+    name: str = Field(..., description="Label chosen by the owner")
+    user_id: str = Field(..., description="Owner; requests act as this user")
+    prefix: str = Field(..., description="Public lookup part of the key")
+    key_hash: str = Field(..., description="HMAC-SHA256 of the full key")
+    scopes: List[str] = Field(default_factory=lambda: ["read", "write"], description="Granted scopes")
+    is_active: bool = Field(default=True, description="Revoked keys are inactive")
+    
+    # Quota and usage
+    daily_quota: Optional[int] = Field(None, description="Requests allowed per UTC day")
+    usage_count: int = Field(0, description="Total authenticated requests")
+    daily_usage: Dict[str, int] = Field(default_factory=dict, description="Requests per UTC day")
+    last_used_at: Optional[datetime] = Field(None, description="Last authenticated request")
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = Field(None, description="Key is rejected after this time")
+    
+    class Settings:
+        collection = "api_keys"
+        indexes = [
+            IndexModel([("prefix", 1)], unique=True),
+            [("user_id", 1)],
+        ]
+    
+    def dict_public(self) -> dict:
+        """Return public key data (never the key or its hash)."""
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "prefix": self.prefix,
+            "scopes": self.scopes,
+            "is_active": self.is_active,
+            "daily_quota": self.daily_quota,
+            "usage_count": self.usage_count,
+            "last_used_at": self.last_used_at.isoformat() if self.last_used_at else None,
+            "created_at": self.created_at.isoformat(),
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -0,0 +1,47 @@
+"""
+Dataset chunk model using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+
+
+class DatasetChunkStatus(str, Enum):
+    """Dataset chunk status."""
+    
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+
+
+class DatasetChunk(Document):
+    """A contiguous range of a dataset job's items, claimed and checkpointed as a unit."""
+    
+    generation_id: PydanticObjectId = Field(..., description="Dataset job the chunk belongs to")
+    chunk: int = Field(..., ge=0, description="0-based chunk number")
+    start: int = Field(..., ge=1, description="Index of the chunk's first item")
+    size: int = Field(..., ge=1, description="Number of items in the chunk")
+    offset: int = Field(..., ge=0, description="Byte offset of the chunk's first row in the variables file")
+    
+    # Claiming
+    status: DatasetChunkStatus = Field(DatasetChunkStatus.PENDING, description="Current chunk status")
+    worker: Optional[str] = Field(None, description="Worker holding the chunk")
+    attempts: int = Field(0, description="Times the chunk was claimed")
+    heartbeat_at: Optional[datetime] = Field(None, description="Last sign of life of the worker")
+    completed_at: Optional[datetime] = Field(None, description="When the chunk was checkpointed")
+    
+    # Usage of the chunk's items
+    total_tokens: int = Field(0, description="Total tokens used")
+    prompt_tokens: int = Field(0, description="Prompt tokens used")
+    completion_tokens: int = Field(0, description="Completion tokens used")
+    cost: float = Field(0.0, description="Total cost in USD")
+    
+    class Settings:
+        collection = "dataset_chunks"
+        indexes = [
+            IndexModel([("generation_id", 1), ("chunk", 1)], unique=True),
+            [("generation_id", 1), ("status", 1)],
+        ]
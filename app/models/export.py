@@ -0,0 +1,70 @@
+"""
+Bulk export model using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from typing import Dict, Any, Optional
+from pydantic import Field
+from beanie import Document
+from .generation import GenerationStatus
+
+
+class BulkExport(Document):
+    """Background export of many generations into one archive."""
+    
+    export_id: str = Field(..., description="Unique export identifier")
+    user_id: str = Field(..., description="User who requested the export")
+    
+    # What to export and how
+    format: str = Field("zip", description="Archive format (zip/ndjson)")
+    entry_format: str = Field("json", description="Format of each generation inside a ZIP archive")
+    filters: Dict[str, Any] = Field(default_factory=dict, description="History filter")
+    
+    # Status tracking
+    status: GenerationStatus = Field(GenerationStatus.PENDING, description="Current export status")
+    total: int = Field(0, description="Generations matching the filter")
+    processed: int = Field(0, description="Generations written so far")
+    error_message: Optional[str] = Field(None, description="Error message if failed")
+    
+    # Artifact
+    path: Optional[str] = Field(None, description="Archive location on disk")
+    size: int = Field(0, description="Archive size in bytes")
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = Field(None, description="When the archive was written")
+    expires_at: Optional[datetime] = Field(None, description="When the archive and this record are deleted")
+    
+    class Settings:
+        collection = "bulk_exports"
+        indexes = [
+            [("export_id", 1)],
+            [("user_id", 1), ("created_at", -1)],
+            [("expires_at", 1)],  # For finding expired exports
+        ]
+    
+    @property
+    def progress(self) -> int:
+        """Percentage of matching generations written."""
+        if self.status == GenerationStatus.COMPLETED:
+            return 100
+        return int(self.processed * 100 / self.total) if self.total else 0
+    
+    def dict_public(self) -> dict:
+        """Return public export data."""
+        completed = self.status == GenerationStatus.COMPLETED
+        return {
+            "export_id": self.export_id,
+            "format": self.format,
+            "entry_format": self.entry_format,
+            "filters": self.filters,
+            "status": self.status.value,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": self.progress,
+            "error_message": self.error_message,
+            "size": self.size,
+            "download_url": f"/api/v1/exports/{self.export_id}/download" if completed else None,
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -4,8 +4,9 @@ Generation model using Beanie ODM for MongoDB.
 from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Any, Optional
-from pydantic import Field
-from beanie import Document, Link
+from pydantic import BaseModel, Field
+from beanie import Document, Link, PydanticObjectId
+from pymongo import IndexModel
 from .user import User
 from .template import Template
 
@@ -20,23 +21,57 @@ class GenerationStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class TemplateSnapshot(BaseModel):
+    """The parts of a template a job renders and validates with, as they were when it started."""
+    
+    name: str
+    system_prompt: str
+    user_prompt: str
+    variables: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    output_schema: Dict[str, Any] = Field(default_factory=dict)
+    provider_settings: Dict[str, Any] = Field(default_factory=dict)
+    validation_mode: str = "strict"
+    validation_rules: Dict[str, Any] = Field(default_factory=dict)
+    updated_at: Optional[datetime] = Field(None, description="Template version the snapshot was taken from")
+    
+    @classmethod
+    def from_template(cls, template: Template) -> "TemplateSnapshot":
+        return cls(
+            name=template.name,
+            system_prompt=template.system_prompt,
+            user_prompt=template.user_prompt,
+            variables=template.variables,
+            output_schema=template.output_schema,
+            provider_settings=template.provider_settings,
+            validation_mode=template.validation_mode,
+            validation_rules=template.validation_rules,
+            updated_at=template.updated_at
+        )
+
+
 class Generation(Document):
     """Generation document model."""
     
     # Job information
     job_id: str = Field(..., description="Unique job identifier")
-    user: Link[User] = Field(..., description="User who created the generation")
-    template: Link[Template] = Field(..., description="Template used for generation")
+    kind: str = Field("generation", description="generation, or dataset for jobs fed by a variables file")
+    # Links are only set on older generations; use the IDs and the snapshot
+    user: Optional[Link[User]] = Field(None, description="User who created the generation")
+    template: Optional[Link[Template]] = Field(None, description="Template used for generation")
     
     # For direct access without loading relations
     user_id: str = Field(..., description="User ID for direct queries")
     template_id: str = Field(..., description="Template ID for direct queries")
+    template_snapshot: Optional[TemplateSnapshot] = Field(
+        None,
+        description="Template as it was when the job was created; jobs never load the template"
+    )
     
     # Generation configuration
     provider: str = Field(..., description="LLM provider (openrouter/ollama)")
     model: str = Field(..., description="Model identifier")
     variables: Dict[str, Any] = Field(default_factory=dict, description="Template variables")
-    count: int = Field(1, ge=1, le=100, description="Number of items to generate")
+    count: int = Field(1, ge=1, description="Number of items to generate")
     
     # Status tracking
     status: GenerationStatus = Field(
@@ -46,11 +81,17 @@ class Generation(Document):
     progress: int = Field(0, ge=0, le=100, description="Progress percentage")
     error_message: Optional[str] = Field(None, description="Error message if failed")
     
-    # Results
+    # Processing lease, renewed by heartbeats; stale leases are resumed by the reaper
+    worker: Optional[str] = Field(None, description="Worker processing the job")
+    heartbeat_at: Optional[datetime] = Field(None, description="Last sign of life of the worker")
+    attempts: int = Field(0, description="Times processing was started")
+    
+    # Results (stored in generation_items; inline only on documents not yet migrated)
     results: List[Dict[str, Any]] = Field(
         default_factory=list,
-        description="Generated results"
+        description="Generated results of legacy documents"
     )
+    result_count: int = Field(0, description="Number of results stored in generation_items")
     prompt_rendered: Optional[str] = Field(None, description="Final rendered prompt sent to LLM")
     
     # Cost tracking
@@ -64,6 +105,11 @@ class Generation(Document):
     started_at: Optional[datetime] = Field(None, description="When processing started")
     completed_at: Optional[datetime] = Field(None, description="When generation completed")
     
+    # Retention: archived once expired, then removed by the TTL index
+    expires_at: Optional[datetime] = Field(None, description="When the generation is archived and deleted")
+    archive_file: Optional[str] = Field(None, description="Archive the generation was written to")
+    archived_at: Optional[datetime] = Field(None, description="When its results were archived and deleted")
+    
     # Metadata
     metadata: Dict[str, Any] = Field(
         default_factory=dict,
@@ -74,14 +120,21 @@ class Generation(Document):
         collection = "generations"
         indexes = [
             [("job_id", 1)],
-            [("user", 1)],
-            [("template", 1)],
             [("user_id", 1)],
             [("template_id", 1)],
             [("status", 1)],
             [("created_at", -1)],
-            [("user_id", 1), ("created_at", -1)],  # For history queries
+            [("user_id", 1), ("created_at", -1), ("_id", -1)],  # For keyset-paginated history
             [("template_id", 1), ("status", 1)],  # For template usage stats
+            [("status", 1), ("heartbeat_at", 1)],  # For finding stale jobs
+            [("archived_at", 1), ("expires_at", 1)],  # For finding expired generations
+            # Deletes expired generations, but only once they are archived
+            IndexModel(
+                [("expires_at", 1)],
+                name="expires_at_ttl",
+                expireAfterSeconds=0,
+                partialFilterExpression={"archived_at": {"$type": "date"}}
+            ),
         ]
     
     def dict_public(self) -> dict:
@@ -89,6 +142,7 @@ class Generation(Document):
         return {
             "id": str(self.id),
             "job_id": self.job_id,
+            "kind": self.kind,
             "user_id": self.user_id,
             "template_id": self.template_id,
             "provider": self.provider,
@@ -99,6 +153,7 @@ class Generation(Document):
             "progress": self.progress,
             "error_message": self.error_message,
             "results": self.results,
+            "result_count": self.result_count or len(self.results),
             "total_tokens": self.total_tokens,
             "prompt_tokens": self.prompt_tokens,
             "completion_tokens": self.completion_tokens,
@@ -106,5 +161,132 @@ class Generation(Document):
             "created_at": self.created_at.isoformat(),
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
             "metadata": self.metadata
-        }
\ No newline at end of file
+        }
+
+
+class GenerationView(str, Enum):
+    """How much of a generation an endpoint returns."""
+    
+    STATUS = "status"
+    SUMMARY = "summary"
+    FULL = "full"
+
+
+class GenerationStatusView(BaseModel):
+    """Projection for polling: a few hundred bytes regardless of result size."""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    job_id: str
+    status: GenerationStatus
+    progress: int = 0
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    
+    def dict_public(self) -> dict:
+        """Return public status data."""
+        return {
+            "id": str(self.id),
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "progress": self.progress,
+            "error_message": self.error_message,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class GenerationSummaryView(GenerationStatusView):
+    """Projection for listings: everything except variables, results and metadata."""
+    
+    user_id: str
+    template_id: str
+    provider: str
+    model: str
+    count: int = 1
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    result_count: int = 0
+    
+    class Settings:
+        # Documents not yet migrated count their inline results server-side
+        projection = {
+            "_id": 1,
+            "job_id": 1,
+            "status": 1,
+            "progress": 1,
+            "error_message": 1,
+            "created_at": 1,
+            "started_at": 1,
+            "completed_at": 1,
+            "user_id": 1,
+            "template_id": 1,
+            "provider": 1,
+            "model": 1,
+            "count": 1,
+            "total_tokens": 1,
+            "prompt_tokens": 1,
+            "completion_tokens": 1,
+            "cost": 1,
+            "result_count": {
+                "$max": ["$result_count", {"$size": {"$ifNull": ["$results", []]}}]
+            }
+        }
+    
+    def dict_public(self) -> dict:
+        """Return public summary data."""
+        return dict(
+            super().dict_public(),
+            user_id=self.user_id,
+            template_id=self.template_id,
+            provider=self.provider,
+            model=self.model,
+            count=self.count,
+            total_tokens=self.total_tokens,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cost=self.cost,
+            result_count=self.result_count
+        )
+
+
+# Projection model per view; the full view loads the whole document
+GENERATION_VIEW_MODELS = {
+    GenerationView.STATUS: GenerationStatusView,
+    GenerationView.SUMMARY: GenerationSummaryView,
+}
+
+# Public fields each view returns, smallest view first
+GENERATION_VIEW_FIELDS = {
+    GenerationView.STATUS: (
+        "id", "job_id", "status", "progress", "error_message",
+        "created_at", "started_at", "completed_at"
+    ),
+    GenerationView.SUMMARY: (
+        "id", "job_id", "status", "progress", "error_message",
+        "created_at", "started_at", "completed_at",
+        "user_id", "template_id", "provider", "model", "count",
+        "total_tokens", "prompt_tokens", "completion_tokens", "cost", "result_count"
+    ),
+    GenerationView.FULL: (
+        "id", "job_id", "kind", "user_id", "template_id", "provider", "model", "variables", "count",
+        "status", "progress", "error_message", "results", "result_count",
+        "total_tokens", "prompt_tokens", "completion_tokens", "cost",
+        "created_at", "started_at", "completed_at", "expires_at", "metadata"
+    ),
+}
+
+
+def view_for_fields(fields: List[str]) -> GenerationView:
+    """Smallest view that returns all the requested public fields."""
+    for view, available in GENERATION_VIEW_FIELDS.items():
+        if set(fields) <= set(available):
+            return view
+    unknown = sorted(set(fields) - set(GENERATION_VIEW_FIELDS[GenerationView.FULL]))
+    raise ValueError(f"Unknown fields: {', '.join(unknown)}")
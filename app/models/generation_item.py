@@ -0,0 +1,25 @@
+"""
+Generation item model using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+
+
+class GenerationItem(Document):
+    """One generated result, stored apart from its generation."""
+    
+    generation_id: PydanticObjectId = Field(..., description="Generation the item belongs to")
+    index: int = Field(..., ge=1, description="1-based position within the generation")
+    result: Dict[str, Any] = Field(default_factory=dict, description="Generated result")
+    usage: Optional[Dict[str, float]] = Field(None, description="Tokens and cost of the item")
+    served_by: Optional[str] = Field(None, description="Fallback provider/model that served the item")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        collection = "generation_items"
+        indexes = [
+            IndexModel([("generation_id", 1), ("index", 1)], unique=True),
+        ]
@@ -0,0 +1,22 @@
+"""
+Provider model list using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from typing import Any, Dict, List
+from pydantic import Field
+from beanie import Document
+from pymongo import IndexModel
+
+
+class ProviderModels(Document):
+    """Latest model list (with pricing) of one provider, shared by every process."""
+    
+    provider: str = Field(..., description="Provider ID")
+    models: List[Dict[str, Any]] = Field(default_factory=list, description="ModelInfo of each model")
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow, description="When the list was fetched")
+    
+    class Settings:
+        collection = "provider_models"
+        indexes = [
+            IndexModel([("provider", 1)], unique=True),
+        ]
@@ -4,7 +4,7 @@ Template model using Beanie ODM for MongoDB.
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from pydantic import Field
-from beanie import Document, Link
+from beanie import Document, Insert, Link, Replace, Save, before_event
 from .user import User
 
 
@@ -50,6 +50,7 @@ class Template(Document):
     # Metadata
     is_public: bool = Field(default=True, description="Is template public")
     created_by: Link[User] = Field(..., description="Template creator")
+    created_by_id: Optional[str] = Field(None, description="Creator's user ID, for queries without the link")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -59,9 +60,28 @@ class Template(Document):
             [("category", 1)],
             [("is_public", 1)],
             [("created_by", 1)],
+            [("created_by_id", 1)],
             [("tags", 1)],
         ]
     
+    @property
+    def owner_id(self) -> Optional[str]:
+        """Creator's user ID; templates from before created_by_id read it off the link."""
+        if self.created_by_id:
+            return self.created_by_id
+        if self.created_by is None:
+            return None
+        # An unsaved template holds the User itself rather than a link
+        ref = getattr(self.created_by, "ref", None)
+        owner = ref.id if ref is not None else self.created_by.id
+        return str(owner) if owner is not None else None
+    
+    @before_event(Insert, Replace, Save)
+    def set_created_by_id(self) -> None:
+        """Keep the creator's ID next to the link so listings can filter on it."""
+        if self.created_by_id is None:
+            self.created_by_id = self.owner_id
+    
     def dict_public(self) -> dict:
         """Return public template data."""
         return {
@@ -78,7 +98,7 @@ class Template(Document):
             "validation_mode": self.validation_mode,
             "validation_rules": self.validation_rules,
             "is_public": self.is_public,
-            "created_by": str(self.created_by.ref.id) if self.created_by else None,
+            "created_by": self.owner_id,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat()
         }
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Usage rollup model using Beanie ODM for MongoDB.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Dict
+from pydantic import Field
+from beanie import Document
+from pymongo import IndexModel
+
+
+class RollupScope(str, Enum):
+    """What a rollup is keyed by."""
+    
+    USER = "user"
+    TEMPLATE = "template"
+    MODEL = "model"
+
+
+class RollupGranularity(str, Enum):
+    """Length of a rollup bucket."""
+    
+    HOUR = "hour"
+    DAY = "day"
+
+
+class UsageRollup(Document):
+    """Usage of one user, template or model during one hour or day."""
+    
+    scope: RollupScope = Field(..., description="What the rollup is keyed by")
+    key: str = Field(..., description="User ID, template ID or provider/model")
+    granularity: RollupGranularity = Field(..., description="Bucket length")
+    start: datetime = Field(..., description="Start of the bucket (UTC)")
+    
+    # Counters, only ever incremented
+    completed: int = Field(0, description="Jobs completed")
+    failed: int = Field(0, description="Jobs failed")
+    items: int = Field(0, description="Items generated")
+    total_tokens: int = Field(0, description="Total tokens used")
+    prompt_tokens: int = Field(0, description="Prompt tokens used")
+    completion_tokens: int = Field(0, description="Completion tokens used")
+    cost: float = Field(0.0, description="Total cost in USD")
+    latency: Dict[str, int] = Field(default_factory=dict, description="Item latency sketch bucket counts")
+    
+    class Settings:
+        collection = "usage_rollups"
+        indexes = [
+            IndexModel([("scope", 1), ("key", 1), ("granularity", 1), ("start", 1)], unique=True),
+        ]
@@ -4,7 +4,10 @@ User model using Beanie ODM for MongoDB.
 from datetime import datetime
 from typing import Optional
 from pydantic import Field, EmailStr
-from beanie import Document
+from beanie import Delete, Document, Replace, Save, SaveChanges, Update, after_event
+
+from app.auth.api_keys import api_key_auth
+from app.auth.user_cache import user_cache
 
 
 class User(Document):
@@ -15,6 +18,7 @@ class User(Document):
     hashed_password: str = Field(..., description="Hashed password")
     is_active: bool = Field(default=True, description="Is user active")
     is_superuser: bool = Field(default=False, description="Is user a superuser")
+    tier: str = Field(default="free", description="Plan tier; sets how long generations are kept")
     
     # OAuth fields
     oauth_provider: Optional[str] = Field(default=None, description="OAuth provider (google, github)")
@@ -31,6 +35,13 @@ class User(Document):
             [("oauth_provider", 1), ("oauth_provider_id", 1)],  # OAuth lookup
         ]
     
+    @after_event(Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_cached_tokens(self) -> None:
+        """Make changes (e.g. deactivation) visible to authentication at once."""
+        if self.id is not None:
+            user_cache.invalidate(str(self.id))
+            api_key_auth.cache.invalidate_user(str(self.id))
+    
     def dict_public(self) -> dict:
         """Return public user data (without sensitive fields)."""
         return {
@@ -57,6 +57,24 @@ class GenerationResponse(BaseModel):
     provider: str
 
 
+class GenerationError(Exception):
+    """Error raised when a provider fails to produce a completion."""
+    
+    def __init__(
+        self,
+        message: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        status_code: Optional[int] = None,
+        retryable: bool = False
+    ):
+        super().__init__(message)
+        self.provider = provider
+        self.model = model
+        self.status_code = status_code
+        self.retryable = retryable
+
+
 class LLMProvider(ABC):
     """Base class for LLM providers."""
     
@@ -93,6 +111,7 @@ class LLMProvider(ABC):
         pass
     
     def estimate_cost(self, model_id: str, input_tokens: int, output_tokens: int) -> float:
-        """Estimate cost for a generation request."""
-        # Default implementation - can be overridden
-        return 0.0
\ No newline at end of file
+        """Estimate cost for a generation request from the cached price table."""
+        from app.providers.pricing import price_table
+        
+        return price_table.cost(self.id, model_id, input_tokens, output_tokens)
\ No newline at end of file
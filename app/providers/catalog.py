@@ -0,0 +1,155 @@
+"""
+Cached, indexed catalog of models across providers.
+
+Whichever process fetches a provider's models publishes them to the
+provider_models collection, and other processes load them from there
+while they are fresh, so the scheduled price refresh in the Celery worker
+reaches the API processes that run generation jobs.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.models.provider_models import ProviderModels
+from app.providers.base import ModelInfo
+from app.providers.factory import ProviderFactory
+
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCatalog:
+    """Model metadata from every provider, indexed by (provider, model id)."""
+    
+    def __init__(self, ttl: Optional[float] = None):
+        self._ttl = ttl
+        self._models: Dict[Tuple[str, str], ModelInfo] = {}
+        self._refreshed_at: Dict[str, float] = {}
+        self.version = 0
+    
+    @property
+    def ttl(self) -> float:
+        """Seconds before a provider's models are refetched."""
+        return get_settings().catalog_ttl_seconds if self._ttl is None else self._ttl
+    
+    def is_stale(self, provider_id: str) -> bool:
+        """Whether a provider's models need to be fetched again."""
+        refreshed_at = self._refreshed_at.get(provider_id)
+        return refreshed_at is None or time.monotonic() - refreshed_at >= self.ttl
+    
+    async def refresh(self, provider_id: Optional[str] = None, shared: bool = True) -> int:
+        """
+        Fetch model lists from one or all providers; returns models indexed.
+        
+        With `shared`, lists another process published within the TTL are
+        used instead of asking the provider.
+        """
+        if provider_id:
+            provider = ProviderFactory.get_provider(provider_id)
+            providers = {provider_id: provider} if provider else {}
+        else:
+            providers = ProviderFactory.get_all_providers()
+        
+        count = 0
+        for pid, provider in providers.items():
+            if shared:
+                published = await self._load_published(pid)
+                if published is not None:
+                    models, age = published
+                    self.update(pid, models, age)
+                    count += len(models)
+                    continue
+            
+            try:
+                models = await provider.list_models()
+            except Exception as e:
+                logger.warning(f"Could not refresh models for {pid}: {e}")
+                continue
+            
+            # An empty list usually means the provider is unreachable; keep what we had
+            if not models and any(key[0] == pid for key in self._models):
+                continue
+            
+            self.update(pid, models)
+            if models:
+                await self._publish(pid, models)
+            count += len(models)
+        
+        return count
+    
+    async def _load_published(self, provider_id: str) -> Optional[Tuple[List[ModelInfo], float]]:
+        """Models of a provider published within the TTL, with their age in seconds."""
+        try:
+            document = await ProviderModels.get_motor_collection().find_one({"provider": provider_id})
+        except Exception as e:
+            logger.debug(f"Could not load published models for {provider_id}: {e}")
+            return None
+        if not document or not document.get("models"):
+            return None
+        age = (datetime.utcnow() - document["refreshed_at"]).total_seconds()
+        if age >= self.ttl:
+            return None
+        return [ModelInfo(**model) for model in document["models"]], max(age, 0.0)
+    
+    async def _publish(self, provider_id: str, models: List[ModelInfo]) -> None:
+        """Share freshly fetched models with the other processes."""
+        try:
+            await ProviderModels.get_motor_collection().update_one(
+                {"provider": provider_id},
+                {"$set": {
+                    "models": [model.model_dump() for model in models],
+                    "refreshed_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not publish models for {provider_id}: {e}")
+    
+    def update(self, provider_id: str, models: List[ModelInfo], age: float = 0.0) -> None:
+        """Replace the indexed models of one provider, fetched `age` seconds ago."""
+        for key in [key for key in self._models if key[0] == provider_id]:
+            del self._models[key]
+        for model in models:
+            self._models[(provider_id, model.id)] = model
+        self._refreshed_at[provider_id] = time.monotonic() - age
+        self.version += 1
+    
+    async def ensure_fresh(self, provider_id: Optional[str] = None) -> None:
+        """Refresh stale providers."""
+        provider_ids = [provider_id] if provider_id else list(ProviderFactory._providers)
+        for pid in provider_ids:
+            if self.is_stale(pid):
+                await self.refresh(pid)
+    
+    def items(self) -> List[Tuple[Tuple[str, str], ModelInfo]]:
+        """All cached models with their (provider, model id) keys."""
+        return list(self._models.items())
+    
+    def get(self, provider_id: str, model_id: str) -> Optional[ModelInfo]:
+        """O(1) lookup of a cached model."""
+        return self._models.get((provider_id, model_id))
+    
+    async def lookup(self, provider_id: str, model_id: str) -> Optional[ModelInfo]:
+        """Lookup a model, refreshing its provider first if stale."""
+        await self.ensure_fresh(provider_id)
+        return self.get(provider_id, model_id)
+    
+    async def list_models(self, provider_id: Optional[str] = None) -> List[ModelInfo]:
+        """All cached models, optionally restricted to one provider."""
+        await self.ensure_fresh(provider_id)
+        return [
+            model for (pid, _), model in self._models.items()
+            if provider_id is None or pid == provider_id
+        ]
+    
+    def clear(self) -> None:
+        """Drop all cached models."""
+        self._models.clear()
+        self._refreshed_at.clear()
+        self.version += 1
+
+
+# Shared catalog so routing, pricing and limits never refetch per request
+model_catalog = ModelCatalog()
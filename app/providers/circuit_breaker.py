@@ -0,0 +1,158 @@
+"""
+Circuit breakers for provider/model pairs.
+"""
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from app.config import get_settings
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker state."""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker with half-open probing."""
+    
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        window: int = 50,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+    
+    @property
+    def state(self) -> CircuitState:
+        """Current state, moving from open to half-open once the cool-down elapses."""
+        if (self._state == CircuitState.OPEN and
+                self._clock() - self._opened_at >= self.open_seconds):
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected."""
+        return self.state == CircuitState.OPEN
+    
+    @property
+    def failure_rate(self) -> float:
+        """Failure rate over the rolling window."""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+    
+    def allow_request(self) -> bool:
+        """Check whether a call may proceed, reserving a probe slot when half-open."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        return False
+    
+    def record_success(self) -> None:
+        """Record a successful call."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._close()
+            return
+        self._outcomes.append(True)
+    
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit when the threshold is crossed."""
+        state = self.state
+        if state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+        if state == CircuitState.OPEN:
+            return
+        
+        self._outcomes.append(False)
+        if (len(self._outcomes) >= self.min_calls and
+                self.failure_rate >= self.failure_rate_threshold):
+            self._open()
+    
+    def release(self) -> None:
+        """Free a half-open probe slot for a call that said nothing about backend health."""
+        if self._half_open_in_flight > 0:
+            self._half_open_in_flight -= 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return breaker state for diagnostics."""
+        return {
+            "state": self.state.value,
+            "failure_rate": round(self.failure_rate, 3),
+            "calls": len(self._outcomes)
+        }
+    
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self._half_open_in_flight = 0
+    
+    def _close(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._outcomes.clear()
+        self._half_open_in_flight = 0
+
+
+class CircuitBreakerRegistry:
+    """Lazily created circuit breakers keyed by provider and model."""
+    
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+    
+    def get(self, provider_id: str, model: str) -> CircuitBreaker:
+        """Get (or create) the breaker for a provider/model pair."""
+        key = (provider_id, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            settings = get_settings()
+            breaker = CircuitBreaker(
+                failure_rate_threshold=settings.circuit_breaker_failure_rate,
+                min_calls=settings.circuit_breaker_min_calls,
+                window=settings.circuit_breaker_window,
+                open_seconds=settings.circuit_breaker_open_seconds,
+                half_open_max_calls=settings.circuit_breaker_half_open_calls
+            )
+            self._breakers[key] = breaker
+        return breaker
+    
+    def is_open(self, provider_id: str, model: str) -> bool:
+        """Whether a known breaker is open, without creating one."""
+        breaker = self._breakers.get((provider_id, model))
+        return breaker is not None and breaker.is_open
+    
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return the state of every known breaker."""
+        return [
+            {"provider": provider_id, "model": model, **breaker.snapshot()}
+            for (provider_id, model), breaker in self._breakers.items()
+        ]
+    
+    def clear(self) -> None:
+        """Forget all breakers."""
+        self._breakers.clear()
+
+
+# Shared registry so every job sees the same backend health
+circuit_breakers = CircuitBreakerRegistry()
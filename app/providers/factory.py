@@ -60,4 +60,12 @@ class ProviderFactory:
     @classmethod
     def clear_cache(cls):
         """Clear all cached provider instances."""
-        cls._instances.clear()
\ No newline at end of file
+        cls._instances.clear()
+
+
+def get_provider(provider_id: str) -> LLMProvider:
+    """Get a provider instance by ID, raising if it is unknown."""
+    provider = ProviderFactory.get_provider(provider_id)
+    if provider is None:
+        raise ValueError(f"Unknown provider: {provider_id}")
+    return provider
@@ -0,0 +1,102 @@
+"""
+Provider/model fallback chains guarded by circuit breakers.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.providers.base import GenerationRequest, GenerationResponse, GenerationError
+from app.providers.circuit_breaker import CircuitBreakerRegistry, circuit_breakers
+from app.providers.factory import get_provider
+from app.providers.resilience import ResilientProvider
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_fallbacks(provider_settings: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Read the `fallbacks` list from template provider settings."""
+    fallbacks = (provider_settings or {}).get("fallbacks") or []
+    candidates = []
+    for entry in fallbacks:
+        if isinstance(entry, dict) and entry.get("provider") and entry.get("model"):
+            candidates.append((entry["provider"], entry["model"]))
+    return candidates
+
+
+class FallbackChain:
+    """Tries provider/model candidates in order, skipping those with open circuits."""
+    
+    def __init__(
+        self,
+        candidates: List[Tuple[str, str]],
+        registry: Optional[CircuitBreakerRegistry] = None
+    ):
+        if not candidates:
+            raise ValueError("Fallback chain needs at least one candidate")
+        
+        self.registry = registry or circuit_breakers
+        self.candidates: List[Tuple[str, str, ResilientProvider]] = []
+        
+        for index, (provider_id, model) in enumerate(candidates):
+            try:
+                provider = get_provider(provider_id)
+            except ValueError:
+                # The primary provider must exist; broken fallbacks are only skipped
+                if index == 0:
+                    raise
+                logger.warning(f"Skipping unknown fallback provider {provider_id}")
+                continue
+            
+            resilient = ResilientProvider(
+                provider,
+                breaker=self.registry.get(provider_id, model)
+            )
+            self.candidates.append((provider_id, model, resilient))
+    
+    @classmethod
+    def for_generation(
+        cls,
+        provider_id: str,
+        model: str,
+        provider_settings: Optional[Dict[str, Any]] = None,
+        registry: Optional[CircuitBreakerRegistry] = None
+    ) -> "FallbackChain":
+        """Build the chain for a job: requested provider/model, then template fallbacks."""
+        candidates = [(provider_id, model)]
+        for candidate in parse_fallbacks(provider_settings):
+            if candidate not in candidates:
+                candidates.append(candidate)
+        return cls(candidates, registry)
+    
+    async def generate(
+        self,
+        request: GenerationRequest,
+        deadline: Optional[float] = None
+    ) -> Tuple[GenerationResponse, str, str]:
+        """
+        Generate with the first healthy candidate.
+
+        Returns:
+            Tuple of (response, provider_id, model) that served the request
+        """
+        errors = []
+        
+        for provider_id, model, resilient in self.candidates:
+            if not resilient.breaker.allow_request():
+                errors.append(f"{provider_id}/{model}: circuit open")
+                continue
+            
+            try:
+                response = await resilient.generate(
+                    request.model_copy(update={"model": model}),
+                    deadline=deadline
+                )
+                return response, provider_id, model
+            except GenerationError as e:
+                logger.warning(f"{provider_id}/{model} failed, trying next fallback: {e}")
+                errors.append(f"{provider_id}/{model}: {e}")
+        
+        raise GenerationError(
+            "All providers failed: " + "; ".join(errors),
+            retryable=True
+        )
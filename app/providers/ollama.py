@@ -8,6 +8,7 @@ import json
 
 from app.config import get_settings
 from app.providers.base import LLMProvider, ModelInfo, GenerationRequest, GenerationResponse
+from app.providers.tokenizers import tokenizers
 
 
 class OllamaProvider(LLMProvider):
@@ -158,9 +159,10 @@ class OllamaProvider(LLMProvider):
             response.raise_for_status()
             data = response.json()
         
-        # Estimate token counts (Ollama doesn't always provide exact counts)
-        prompt_tokens = len(prompt.split()) * 1.3  # Rough estimate
-        completion_tokens = len(data.get("response", "").split()) * 1.3
+        # Ollama reports eval counts; fall back to the local tokenizer when missing
+        tokenizer = tokenizers.for_model(request.model)
+        prompt_tokens = data.get("prompt_eval_count") or tokenizer.count(prompt)
+        completion_tokens = data.get("eval_count") or tokenizer.count(data.get("response", ""))
         
         return GenerationResponse(
             id=f"ollama-{int(time.time())}",
@@ -26,6 +26,8 @@ class OpenRouterProvider(LLMProvider):
         self.client = AsyncOpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
+            # Retries, hedging and fallbacks are done by the resilience layer
+            max_retries=0,
             default_headers={
                 "HTTP-Referer": "http://localhost:8000",
                 "X-Title": "LLM Template System"
@@ -223,17 +225,3 @@ class OpenRouterProvider(LLMProvider):
                 ],
                 "provider": self.id
             }
-    
-    def estimate_cost(self, model_id: str, input_tokens: int, output_tokens: int) -> float:
-        """Estimate cost for a generation request."""
-        # Get model info (would need to be async in real usage)
-        # For now, return a simple estimate
-        input_cost_per_million = 1.0  # Default $1 per million tokens
-        output_cost_per_million = 2.0  # Default $2 per million tokens
-        
-        total_cost = (
-            (input_tokens / 1_000_000) * input_cost_per_million +
-            (output_tokens / 1_000_000) * output_cost_per_million
-        )
-        
-        return round(total_cost, 6)
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Model price table and cost calculation.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.providers.catalog import ModelCatalog, model_catalog
+
+
+class PriceTable:
+    """Per-token prices indexed by (provider, model id), derived from the model catalog."""
+    
+    def __init__(self, catalog: Optional[ModelCatalog] = None):
+        self.catalog = catalog or model_catalog
+        self._prices: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._version = -1
+    
+    def _sync(self) -> None:
+        """Rebuild the index whenever the catalog has changed."""
+        if self._version == self.catalog.version:
+            return
+        
+        prices = {}
+        for key, model in self.catalog.items():
+            # Catalog prices are USD per million tokens; store USD per token
+            prices[key] = (
+                float(model.pricing.get("input", 0.0)) / 1_000_000,
+                float(model.pricing.get("output", 0.0)) / 1_000_000
+            )
+        self._prices = prices
+        self._version = self.catalog.version
+    
+    def get(self, provider_id: str, model: str) -> Optional[Tuple[float, float]]:
+        """Return (input, output) USD per token, or None if the model is unknown."""
+        self._sync()
+        return self._prices.get((provider_id, model))
+    
+    def cost(
+        self,
+        provider_id: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int
+    ) -> float:
+        """Cost in USD for the given token usage; unknown models cost nothing."""
+        prices = self.get(provider_id, model)
+        if prices is None:
+            return 0.0
+        input_price, output_price = prices
+        return prompt_tokens * input_price + completion_tokens * output_price
+    
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._prices)
+
+
+# Shared price table
+price_table = PriceTable()
+
+
+async def refresh_prices(provider_id: Optional[str] = None, shared: bool = True) -> int:
+    """Refetch model pricing; returns the number of priced models."""
+    await model_catalog.refresh(provider_id, shared=shared)
+    return len(price_table)
+
+
+async def ensure_prices(provider_ids: Iterable[str]) -> None:
+    """Load pricing for providers that have not been fetched recently."""
+    for provider_id in set(provider_ids):
+        await model_catalog.ensure_fresh(provider_id)
+
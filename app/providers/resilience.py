@@ -0,0 +1,288 @@
+"""
+Resilient call layer for LLM providers: error classification, retries and hedging.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+import openai
+
+from app.config import get_settings
+from app.providers.base import LLMProvider, GenerationRequest, GenerationResponse, GenerationError
+from app.providers.circuit_breaker import CircuitBreaker
+from app.providers.telemetry import ModelTelemetry, telemetry
+
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Fatal errors that still indicate an unhealthy backend rather than a bad request
+BACKEND_FAILURE_STATUS_CODES = {401, 402, 403, 404}
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[int], Optional[float]]:
+    """
+    Classify a provider error.
+
+    Returns:
+        Tuple of (retryable, status_code, retry_after_seconds)
+    """
+    if isinstance(exc, GenerationError):
+        return exc.retryable, exc.status_code, None
+    
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True, None, None
+    
+    if isinstance(exc, openai.APIConnectionError):
+        return True, None, None
+    
+    status_code = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    
+    if status_code is None:
+        return False, None, None
+    
+    retry_after = None
+    if response is not None:
+        retry_after = _parse_retry_after(response.headers.get("retry-after"))
+    
+    return status_code in RETRYABLE_STATUS_CODES, status_code, retry_after
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Whether an error should count against the backend's circuit breaker."""
+    retryable, status_code, _ = classify_error(exc)
+    return retryable or status_code in BACKEND_FAILURE_STATUS_CODES
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a monotonic deadline, or None if unbounded."""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class ResilientProvider:
+    """Wraps an LLMProvider with retries, jittered backoff, deadlines and hedging."""
+    
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        request_timeout: Optional[float] = None,
+        hedging: Optional[bool] = None,
+        hedge_min_samples: Optional[int] = None,
+        tracker: Optional[ModelTelemetry] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        settings = get_settings()
+        self.provider = provider
+        self.max_retries = settings.provider_max_retries if max_retries is None else max_retries
+        self.base_delay = settings.provider_retry_base_delay if base_delay is None else base_delay
+        self.max_delay = settings.provider_retry_max_delay if max_delay is None else max_delay
+        self.request_timeout = (
+            settings.provider_request_timeout if request_timeout is None else request_timeout
+        )
+        self.hedging = settings.provider_hedging_enabled if hedging is None else hedging
+        self.hedge_min_samples = (
+            settings.provider_hedge_min_samples if hedge_min_samples is None else hedge_min_samples
+        )
+        self.tracker = tracker or telemetry
+        self.breaker = breaker
+    
+    async def generate(
+        self,
+        request: GenerationRequest,
+        deadline: Optional[float] = None
+    ) -> GenerationResponse:
+        """Generate a completion, retrying retryable failures until the deadline."""
+        attempt = 0
+        while True:
+            try:
+                response = await self._attempt(request, deadline)
+            except Exception as exc:
+                self._record_failure(exc)
+                delay = self._retry_delay(exc, attempt, request, deadline)
+                logger.warning(
+                    f"{self.provider.id}/{request.model} attempt {attempt + 1} failed: {exc}; "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+            else:
+                if self.breaker:
+                    self.breaker.record_success()
+                return response
+    
+    async def generate_stream(
+        self,
+        request: GenerationRequest,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a completion; retries only happen before the first chunk arrives."""
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async for chunk in self.provider.generate_stream(request):
+                    started = True
+                    yield chunk
+                if self.breaker:
+                    self.breaker.record_success()
+                return
+            except Exception as exc:
+                self._record_failure(exc)
+                if started:
+                    raise self._to_generation_error(exc, request) from exc
+                delay = self._retry_delay(exc, attempt, request, deadline)
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    async def _attempt(
+        self,
+        request: GenerationRequest,
+        deadline: Optional[float]
+    ) -> GenerationResponse:
+        """Run a single (possibly hedged) attempt bounded by timeout and deadline."""
+        timeout = self.request_timeout
+        remaining = remaining_time(deadline)
+        if remaining is not None:
+            if remaining <= 0:
+                raise GenerationError(
+                    "Job deadline exceeded",
+                    provider=self.provider.id,
+                    model=request.model
+                )
+            timeout = min(timeout, remaining)
+        
+        hedge_after = None
+        if self.hedging:
+            hedge_after = self.tracker.percentile(
+                self.provider.id, request.model, 0.95, self.hedge_min_samples
+            )
+        
+        try:
+            if hedge_after is None or hedge_after >= timeout:
+                return await asyncio.wait_for(self._timed_call(request), timeout)
+            return await asyncio.wait_for(self._hedged_call(request, hedge_after), timeout)
+        except asyncio.TimeoutError:
+            # Timed-out calls are cancelled before _timed_call can record them
+            self.tracker.record(self.provider.id, request.model, timeout, success=False)
+            raise
+    
+    async def _timed_call(self, request: GenerationRequest) -> GenerationResponse:
+        """Call the provider and record latency and outcome telemetry."""
+        started = time.monotonic()
+        try:
+            response = await self.provider.generate(request)
+        except Exception:
+            self.tracker.record(
+                self.provider.id, request.model, time.monotonic() - started, success=False
+            )
+            raise
+        self.tracker.record(self.provider.id, request.model, time.monotonic() - started)
+        return response
+    
+    async def _hedged_call(
+        self,
+        request: GenerationRequest,
+        hedge_after: float
+    ) -> GenerationResponse:
+        """Fire a backup request once the primary exceeds p95 latency; first success wins."""
+        primary = asyncio.ensure_future(self._timed_call(request))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if primary in done:
+                return primary.result()
+            
+            logger.info(f"Hedging {self.provider.id}/{request.model} after {hedge_after:.2f}s")
+            pending.add(asyncio.ensure_future(self._timed_call(request)))
+            
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _retry_delay(
+        self,
+        exc: BaseException,
+        attempt: int,
+        request: GenerationRequest,
+        deadline: Optional[float]
+    ) -> float:
+        """Return the backoff before the next attempt, or raise if giving up."""
+        retryable, _, retry_after = classify_error(exc)
+        if not retryable or attempt >= self.max_retries:
+            raise self._to_generation_error(exc, request) from exc
+        
+        # Stop hammering a backend whose circuit has just opened
+        if self.breaker and self.breaker.is_open:
+            raise self._to_generation_error(exc, request) from exc
+        
+        # Full jitter keeps retries from many items from synchronising
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        
+        remaining = remaining_time(deadline)
+        if remaining is not None and delay >= remaining:
+            raise GenerationError(
+                f"Job deadline exceeded after {attempt + 1} attempts: {exc}",
+                provider=self.provider.id,
+                model=request.model
+            ) from exc
+        return delay
+    
+    def _record_failure(self, exc: BaseException) -> None:
+        """Feed a failed attempt into the circuit breaker."""
+        if not self.breaker:
+            return
+        if is_backend_failure(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+    
+    def _to_generation_error(
+        self,
+        exc: BaseException,
+        request: GenerationRequest
+    ) -> GenerationError:
+        """Normalise any provider failure into a GenerationError."""
+        if isinstance(exc, GenerationError):
+            return exc
+        retryable, status_code, _ = classify_error(exc)
+        message = str(exc) or exc.__class__.__name__
+        return GenerationError(
+            message,
+            provider=self.provider.id,
+            model=request.model,
+            status_code=status_code,
+            retryable=retryable
+        )
@@ -0,0 +1,151 @@
+"""
+Latency and cost aware model routing for `model: "auto"` generations.
+"""
+import math
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.providers.base import ModelInfo
+from app.providers.catalog import ModelCatalog, model_catalog
+from app.providers.circuit_breaker import CircuitBreakerRegistry, circuit_breakers
+from app.providers.telemetry import ModelTelemetry, telemetry
+
+
+AUTO_MODEL = "auto"
+
+
+class RoutingPolicy(str, Enum):
+    """How the router ranks eligible models."""
+    
+    CHEAPEST = "cheapest"
+    FASTEST = "fastest"
+    FASTEST_FREE = "fastest_free"
+
+
+class RoutingConstraints(BaseModel):
+    """Constraints and policy for automatic model selection."""
+    
+    policy: RoutingPolicy = Field(RoutingPolicy.CHEAPEST, description="Ranking policy")
+    max_p95_seconds: Optional[float] = Field(None, gt=0, description="Maximum observed p95 latency")
+    max_error_rate: float = Field(0.2, ge=0, le=1, description="Maximum observed error rate")
+    max_price_per_million: Optional[float] = Field(
+        None, ge=0, description="Maximum blended price per million tokens"
+    )
+    min_context_length: int = Field(0, ge=0, description="Minimum context window")
+    required_capabilities: List[str] = Field(
+        default_factory=list, description="Capabilities that must be true, e.g. functions, vision"
+    )
+    min_samples: int = Field(5, ge=1, description="Calls needed before telemetry is trusted")
+
+
+class ModelRouter:
+    """Picks a provider/model from the catalog using live telemetry and pricing."""
+    
+    def __init__(
+        self,
+        catalog: Optional[ModelCatalog] = None,
+        stats: Optional[ModelTelemetry] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None
+    ):
+        self.catalog = catalog or model_catalog
+        self.stats = stats or telemetry
+        self.breakers = breakers or circuit_breakers
+    
+    async def select(
+        self,
+        constraints: RoutingConstraints,
+        provider_id: Optional[str] = None
+    ) -> Optional[ModelInfo]:
+        """Return the best eligible model, or None if nothing qualifies."""
+        models = await self.catalog.list_models(provider_id)
+        ranked = self.rank(models, constraints)
+        return ranked[0] if ranked else None
+    
+    def rank(self, models: List[ModelInfo], constraints: RoutingConstraints) -> List[ModelInfo]:
+        """Filter models by constraints and order them by policy."""
+        scored: List[Tuple[Tuple[float, ...], ModelInfo]] = []
+        for model in models:
+            observed = self._observed(model, constraints.min_samples)
+            if not self._is_eligible(model, observed, constraints):
+                continue
+            scored.append((self._sort_key(model, observed, constraints.policy), model))
+        
+        scored.sort(key=lambda item: item[0])
+        return [model for _, model in scored]
+    
+    def explain(self, model: ModelInfo, constraints: RoutingConstraints) -> Dict[str, Any]:
+        """Describe why a model was chosen, for job metadata."""
+        observed = self._observed(model, constraints.min_samples)
+        return {
+            "policy": constraints.policy.value,
+            "provider": model.provider,
+            "model": model.id,
+            "price_per_million": blended_price(model),
+            "p50_seconds": observed["p50"],
+            "p95_seconds": observed["p95"],
+            "error_rate": observed["error_rate"]
+        }
+    
+    def _observed(self, model: ModelInfo, min_samples: int) -> Dict[str, Optional[float]]:
+        """Telemetry for a model, with values hidden until enough calls were seen."""
+        if self.stats.calls(model.provider, model.id) < min_samples:
+            return {"p50": None, "p95": None, "error_rate": None}
+        return {
+            "p50": self.stats.percentile(model.provider, model.id, 0.5),
+            "p95": self.stats.percentile(model.provider, model.id, 0.95),
+            "error_rate": self.stats.error_rate(model.provider, model.id)
+        }
+    
+    def _is_eligible(
+        self,
+        model: ModelInfo,
+        observed: Dict[str, Optional[float]],
+        constraints: RoutingConstraints
+    ) -> bool:
+        if model.context_length < constraints.min_context_length:
+            return False
+        if any(not model.capabilities.get(cap, False) for cap in constraints.required_capabilities):
+            return False
+        
+        price = blended_price(model)
+        if constraints.policy == RoutingPolicy.FASTEST_FREE and price > 0:
+            return False
+        if constraints.max_price_per_million is not None and price > constraints.max_price_per_million:
+            return False
+        
+        if self.breakers.is_open(model.provider, model.id):
+            return False
+        
+        # Untried models stay eligible so the router keeps exploring
+        if observed["error_rate"] is not None and observed["error_rate"] > constraints.max_error_rate:
+            return False
+        if (constraints.max_p95_seconds is not None and observed["p95"] is not None and
+                observed["p95"] > constraints.max_p95_seconds):
+            return False
+        
+        return True
+    
+    def _sort_key(
+        self,
+        model: ModelInfo,
+        observed: Dict[str, Optional[float]],
+        policy: RoutingPolicy
+    ) -> Tuple[float, ...]:
+        price = blended_price(model)
+        p95 = observed["p95"] if observed["p95"] is not None else math.inf
+        error_rate = observed["error_rate"] or 0.0
+        
+        if policy == RoutingPolicy.CHEAPEST:
+            return (price, p95, error_rate)
+        return (p95, error_rate, price)
+
+
+def blended_price(model: ModelInfo) -> float:
+    """Average of input and output price per million tokens."""
+    return (model.pricing.get("input", 0.0) + model.pricing.get("output", 0.0)) / 2
+
+
+# Shared router instance
+model_router = ModelRouter()
@@ -0,0 +1,27 @@
+"""Periodic provider maintenance tasks."""
+import asyncio
+import logging
+
+from app.celery_app import celery_app
+from app.database import close_database_connection, connect_to_database
+from app.providers.pricing import refresh_prices
+
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.providers.tasks.update_model_prices")
+def update_model_prices() -> int:
+    """Fetch pricing from all providers and publish it to the processes that run jobs."""
+    count = asyncio.run(_update_model_prices())
+    logger.info(f"Refreshed pricing for {count} models")
+    return count
+
+
+async def _update_model_prices() -> int:
+    await connect_to_database()
+    try:
+        # Always ask the providers; this task is what keeps the shared lists fresh
+        return await refresh_prices(shared=False)
+    finally:
+        await close_database_connection()
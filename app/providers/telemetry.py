@@ -0,0 +1,78 @@
+"""
+Per-call telemetry for provider/model pairs.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class ModelTelemetry:
+    """Rolling latency and outcome samples for every provider/model pair."""
+    
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._outcomes: Dict[Tuple[str, str], Deque[bool]] = {}
+    
+    def record(self, provider_id: str, model: str, seconds: float, success: bool = True) -> None:
+        """Record one provider call."""
+        key = (provider_id, model)
+        outcomes = self._outcomes.get(key)
+        if outcomes is None:
+            outcomes = self._outcomes[key] = deque(maxlen=self.window)
+            self._latencies[key] = deque(maxlen=self.window)
+        outcomes.append(success)
+        
+        # Only successful calls describe how long a useful answer takes
+        if success:
+            self._latencies[key].append(seconds)
+    
+    def percentile(
+        self,
+        provider_id: str,
+        model: str,
+        q: float,
+        min_samples: int = 1
+    ) -> Optional[float]:
+        """Return the q-th latency quantile, or None without enough samples."""
+        samples = self._latencies.get((provider_id, model))
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+    
+    def error_rate(self, provider_id: str, model: str) -> Optional[float]:
+        """Failure rate over the rolling window, or None if never called."""
+        outcomes = self._outcomes.get((provider_id, model))
+        if not outcomes:
+            return None
+        return outcomes.count(False) / len(outcomes)
+    
+    def calls(self, provider_id: str, model: str) -> int:
+        """Number of calls in the rolling window."""
+        outcomes = self._outcomes.get((provider_id, model))
+        return len(outcomes) if outcomes else 0
+    
+    def stats(self, provider_id: str, model: str) -> Dict[str, Any]:
+        """Summary statistics for a provider/model pair."""
+        return {
+            "provider": provider_id,
+            "model": model,
+            "calls": self.calls(provider_id, model),
+            "p50_seconds": self.percentile(provider_id, model, 0.5),
+            "p95_seconds": self.percentile(provider_id, model, 0.95),
+            "error_rate": self.error_rate(provider_id, model)
+        }
+    
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Summary statistics for every observed pair."""
+        return [self.stats(provider_id, model) for provider_id, model in self._outcomes]
+    
+    def clear(self) -> None:
+        """Drop all samples."""
+        self._latencies.clear()
+        self._outcomes.clear()
+
+
+# Shared telemetry fed by every provider call in this process
+telemetry = ModelTelemetry()
@@ -0,0 +1,297 @@
+"""
+Local token counting for pre-flight prompt sizing.
+
+Exact BPE tokenizers are loaded from tiktoken-format rank files in
+``settings.tokenizer_dir`` (``<encoding>.tiktoken``, one ``base64-token rank``
+pair per line) so nothing is downloaded at runtime. Model families without a
+rank file use a calibrated estimator.
+"""
+import base64
+import math
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.providers.base import GenerationError, ModelInfo
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional accelerator
+    tiktoken = None
+
+
+# Pre-tokenization used by cl100k/o200k-style encodings, in stdlib `re` syntax
+_PRETOKENIZE = re.compile(
+    r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+_TIKTOKEN_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*"""
+    r"""|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+# Words and single punctuation marks, the features of the estimator
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Chat formatting overhead per message and per request (OpenAI chat format)
+MESSAGE_OVERHEAD_TOKENS = 4
+REQUEST_OVERHEAD_TOKENS = 3
+
+# Model id prefixes per family; more specific prefixes come first
+MODEL_FAMILIES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("o200k_base", ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")),
+    ("cl100k_base", ("gpt-4", "gpt-3.5", "text-embedding")),
+    ("claude", ("claude",)),
+    ("llama", ("llama", "codellama", "meta-llama")),
+    ("mistral", ("mistral", "mixtral", "codestral")),
+    ("qwen", ("qwen",)),
+    ("gemma", ("gemma", "gemini")),
+    ("deepseek", ("deepseek",)),
+]
+DEFAULT_FAMILY = "default"
+
+# Estimator weights (tokens per piece, tokens per character) fitted on English prose
+ESTIMATOR_WEIGHTS: Dict[str, Tuple[float, float]] = {
+    "o200k_base": (0.72, 0.055),
+    "cl100k_base": (0.75, 0.06),
+    "claude": (0.8, 0.065),
+    "llama": (0.9, 0.08),
+    "mistral": (0.9, 0.08),
+    "qwen": (0.75, 0.06),
+    "gemma": (0.72, 0.055),
+    "deepseek": (0.78, 0.065),
+    DEFAULT_FAMILY: (0.85, 0.07),
+}
+
+
+class ContextLengthExceeded(GenerationError):
+    """A rendered prompt does not leave room for a completion."""
+
+
+class Tokenizer(ABC):
+    """Counts tokens for one model family."""
+    
+    name: str = DEFAULT_FAMILY
+    exact: bool = False
+    
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Number of tokens in text."""
+        pass
+    
+    def count_messages(self, messages: Iterable[Dict[str, str]]) -> int:
+        """Number of prompt tokens for a list of chat messages."""
+        total = REQUEST_OVERHEAD_TOKENS
+        for message in messages:
+            total += MESSAGE_OVERHEAD_TOKENS + self.count(message.get("content") or "")
+        return total
+
+
+class EstimatingTokenizer(Tokenizer):
+    """Linear estimate from word/punctuation pieces and characters."""
+    
+    def __init__(self, name: str = DEFAULT_FAMILY, piece_weight: float = 0.85, char_weight: float = 0.07):
+        self.name = name
+        self.piece_weight = piece_weight
+        self.char_weight = char_weight
+    
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        pieces = len(_PIECES.findall(text))
+        return math.ceil(self.piece_weight * pieces + self.char_weight * len(text))
+    
+    @classmethod
+    def calibrate(
+        cls,
+        samples: Iterable[Tuple[str, int]],
+        name: str = DEFAULT_FAMILY
+    ) -> "EstimatingTokenizer":
+        """Fit weights by least squares to (text, true token count) samples."""
+        spp = spc = scc = spy = scy = 0.0
+        for text, tokens in samples:
+            pieces = len(_PIECES.findall(text))
+            chars = len(text)
+            spp += pieces * pieces
+            spc += pieces * chars
+            scc += chars * chars
+            spy += pieces * tokens
+            scy += chars * tokens
+        
+        determinant = spp * scc - spc * spc
+        if not determinant:
+            raise ValueError("Calibration needs samples of varying shape")
+        piece_weight = (spy * scc - scy * spc) / determinant
+        char_weight = (scy * spp - spy * spc) / determinant
+        return cls(name, piece_weight, char_weight)
+
+
+class BPETokenizer(Tokenizer):
+    """Byte-pair encoding over a tiktoken-format rank table."""
+    
+    exact = True
+    
+    def __init__(self, name: str, ranks: Dict[bytes, int], cache_size: int = 50_000):
+        self.name = name
+        self.ranks = ranks
+        self.cache_size = cache_size
+        self._piece_cache: Dict[str, int] = {}
+        self._encoding = None
+        if tiktoken is not None:
+            self._encoding = tiktoken.Encoding(
+                name=name,
+                pat_str=_TIKTOKEN_PATTERN,
+                mergeable_ranks=ranks,
+                special_tokens={}
+            )
+    
+    @classmethod
+    def from_file(cls, path: Path) -> "BPETokenizer":
+        """Load a `.tiktoken` rank file."""
+        ranks = {}
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+        return cls(path.stem, ranks)
+    
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode_ordinary(text))
+        
+        cache = self._piece_cache
+        total = 0
+        for piece in _PRETOKENIZE.findall(text):
+            tokens = cache.get(piece)
+            if tokens is None:
+                tokens = self._merge_count(piece.encode("utf-8"))
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[piece] = tokens
+            total += tokens
+        return total
+    
+    def _merge_count(self, piece: bytes) -> int:
+        """Apply merges in rank order and return the resulting number of parts."""
+        if piece in self.ranks:
+            return 1
+        
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = self.ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return len(parts)
+
+
+def model_family(model: str) -> str:
+    """Tokenizer family of a model id such as `openai/gpt-4o` or `llama3:8b`."""
+    name = model.lower().rsplit("/", 1)[-1]
+    for family, prefixes in MODEL_FAMILIES:
+        if name.startswith(prefixes):
+            return family
+    return DEFAULT_FAMILY
+
+
+class TokenizerRegistry:
+    """Loads one tokenizer per model family and caches it."""
+    
+    def __init__(self, directory: Optional[str] = None):
+        self._directory = directory
+        self._families: Dict[str, Tokenizer] = {}
+        self._models: Dict[str, Tokenizer] = {}
+    
+    @property
+    def directory(self) -> str:
+        """Directory holding `<family>.tiktoken` rank files."""
+        return get_settings().tokenizer_dir if self._directory is None else self._directory
+    
+    def for_model(self, model: str) -> Tokenizer:
+        """Tokenizer for a model id."""
+        tokenizer = self._models.get(model)
+        if tokenizer is None:
+            tokenizer = self.for_family(model_family(model))
+            self._models[model] = tokenizer
+        return tokenizer
+    
+    def for_family(self, family: str) -> Tokenizer:
+        """Tokenizer for a family, loading its rank file on first use."""
+        tokenizer = self._families.get(family)
+        if tokenizer is None:
+            tokenizer = self._load(family)
+            self._families[family] = tokenizer
+        return tokenizer
+    
+    def register(self, family: str, tokenizer: Tokenizer) -> None:
+        """Install a tokenizer for a family, e.g. a freshly calibrated estimator."""
+        self._families[family] = tokenizer
+        self._models.clear()
+    
+    def count(self, model: str, text: str) -> int:
+        """Tokens in text for a model."""
+        return self.for_model(model).count(text)
+    
+    def count_messages(self, model: str, messages: Iterable[Dict[str, str]]) -> int:
+        """Prompt tokens of chat messages for a model."""
+        return self.for_model(model).count_messages(messages)
+    
+    def clear(self) -> None:
+        """Drop loaded tokenizers."""
+        self._families.clear()
+        self._models.clear()
+    
+    def _load(self, family: str) -> Tokenizer:
+        if self.directory:
+            path = Path(self.directory) / f"{family}.tiktoken"
+            if path.is_file():
+                return BPETokenizer.from_file(path)
+        
+        piece_weight, char_weight = ESTIMATOR_WEIGHTS.get(family, ESTIMATOR_WEIGHTS[DEFAULT_FAMILY])
+        return EstimatingTokenizer(family, piece_weight, char_weight)
+
+
+def fit_max_tokens(
+    prompt_tokens: int,
+    model_info: Optional[ModelInfo],
+    requested: Optional[int] = None,
+    min_completion_tokens: Optional[int] = None
+) -> int:
+    """
+    Choose max_tokens for a request so prompt plus completion fit the context.
+    
+    Without a requested value the model's own completion limit is used. Raises
+    ContextLengthExceeded when fewer than `min_completion_tokens` remain.
+    """
+    if model_info is None:
+        return requested or 1000
+    
+    if min_completion_tokens is None:
+        min_completion_tokens = get_settings().min_completion_tokens
+    
+    available = model_info.context_length - prompt_tokens
+    if available < min_completion_tokens:
+        raise ContextLengthExceeded(
+            f"Prompt has {prompt_tokens} tokens, which does not fit the "
+            f"{model_info.context_length}-token context of {model_info.id}",
+            provider=model_info.provider,
+            model=model_info.id
+        )
+    
+    limit = requested or model_info.capabilities.get("max_tokens") or available
+    return min(limit, available)
+
+
+# Shared registry so rank files are parsed once per process
+tokenizers = TokenizerRegistry()
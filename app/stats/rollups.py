@@ -0,0 +1,162 @@
+"""
+Incremental usage rollups.
+
+Every job adds its usage to hourly and daily buckets for its user, its
+template and its model as it completes or fails, with one upsert per bucket.
+Reading statistics then touches a bounded number of small bucket documents
+instead of scanning generations.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.config import get_settings
+from app.models.usage import RollupGranularity, RollupScope, UsageRollup
+from app.stats.sketch import LatencySketch
+
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("completed", "failed", "items", "total_tokens", "prompt_tokens", "completion_tokens", "cost")
+
+BUCKET_LENGTHS = {
+    RollupGranularity.HOUR: timedelta(hours=1),
+    RollupGranularity.DAY: timedelta(days=1),
+}
+
+# Range returned when none is given
+DEFAULT_SPANS = {
+    RollupGranularity.HOUR: timedelta(hours=24),
+    RollupGranularity.DAY: timedelta(days=30),
+}
+
+
+def bucket_start(moment: datetime, granularity: RollupGranularity) -> datetime:
+    """Start of the bucket containing a moment."""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == RollupGranularity.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Stored bucket starts are naive UTC."""
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def rollup_keys(generation: Any) -> Dict[RollupScope, str]:
+    """Keys a job's usage is rolled up under."""
+    return {
+        RollupScope.USER: generation.user_id,
+        RollupScope.TEMPLATE: generation.template_id,
+        RollupScope.MODEL: f"{generation.provider}/{generation.model}",
+    }
+
+
+class UsageRollups:
+    """Maintains and reads usage rollups."""
+    
+    async def record(
+        self,
+        generation: Any,
+        completed: int = 0,
+        failed: int = 0,
+        items: int = 0,
+        usage: Optional[Dict[str, float]] = None,
+        latency: Optional[LatencySketch] = None,
+        at: Optional[datetime] = None
+    ) -> None:
+        """Add a job's outcome and usage to its buckets; failures are only logged."""
+        increments: Dict[str, Any] = {"completed": completed, "failed": failed, "items": items}
+        for name, value in (usage or {}).items():
+            if name in COUNTERS:
+                increments[name] = value
+        if latency:
+            for key, count in latency.counts.items():
+                increments[f"latency.{key}"] = count
+        increments = {name: value for name, value in increments.items() if value}
+        if not increments:
+            return
+        
+        at = at or datetime.utcnow()
+        try:
+            operations = [
+                UpdateOne(
+                    {
+                        "scope": scope.value,
+                        "key": key,
+                        "granularity": granularity.value,
+                        "start": bucket_start(at, granularity)
+                    },
+                    {"$inc": increments},
+                    upsert=True
+                )
+                for scope, key in rollup_keys(generation).items()
+                for granularity in RollupGranularity
+            ]
+            await UsageRollup.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Could not record usage of {generation.job_id}: {e}")
+    
+    async def series(
+        self,
+        scope: RollupScope,
+        key: str,
+        granularity: RollupGranularity = RollupGranularity.HOUR,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Buckets of one user, template or model between start and end, with totals.
+        
+        Raises ValueError when the range holds more than stats_max_points buckets.
+        """
+        end = _naive_utc(end) or datetime.utcnow()
+        start = bucket_start(_naive_utc(start) or end - DEFAULT_SPANS[granularity], granularity)
+        if start >= end:
+            raise ValueError("start must be before end")
+        max_points = get_settings().stats_max_points
+        if (end - start) / BUCKET_LENGTHS[granularity] > max_points:
+            raise ValueError(f"Range spans more than {max_points} {granularity.value} buckets")
+        
+        cursor = UsageRollup.get_motor_collection().find(
+            {
+                "scope": scope.value,
+                "key": key,
+                "granularity": granularity.value,
+                "start": {"$gte": start, "$lt": end}
+            },
+            {"_id": 0, "scope": 0, "key": 0, "granularity": 0}
+        ).sort("start", 1)
+        
+        points: List[Dict[str, Any]] = []
+        totals = dict.fromkeys(COUNTERS, 0)
+        latency = LatencySketch()
+        async for document in cursor:
+            bucket_latency = LatencySketch(document.get("latency"))
+            latency.merge(bucket_latency)
+            point = {"start": document["start"].isoformat()}
+            for name in COUNTERS:
+                point[name] = document.get(name, 0)
+                totals[name] += point[name]
+            point["latency"] = bucket_latency.summary()
+            points.append(point)
+        
+        totals["latency"] = latency.summary()
+        return {
+            "scope": scope.value,
+            "key": key,
+            "granularity": granularity.value,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "points": points,
+            "totals": totals
+        }
+
+
+# Create rollups instance
+usage_rollups = UsageRollups()
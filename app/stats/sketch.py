@@ -0,0 +1,72 @@
+"""
+Mergeable latency sketch.
+
+Latencies are counted in logarithmic buckets, so every quantile estimate is
+within a fixed relative error of the true value however many samples there
+are. Two sketches merge by adding their bucket counts, which is what lets
+rollups keep them as plain counters in MongoDB and combine any number of
+hourly or daily buckets into one percentile.
+"""
+import math
+from typing import Dict, Iterable, Mapping, Optional
+
+
+# Relative accuracy of quantile estimates; stored sketches depend on it
+RELATIVE_ACCURACY = 0.02
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Samples below this many seconds share one bucket
+MIN_VALUE = 1e-3
+_ZERO = "z"
+
+
+class LatencySketch:
+    """Counts latency samples in logarithmic buckets."""
+    
+    def __init__(self, counts: Optional[Mapping[str, int]] = None):
+        self.counts: Dict[str, int] = dict(counts or {})
+    
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+    
+    def add(self, seconds: float) -> None:
+        """Count one sample."""
+        key = _ZERO if seconds < MIN_VALUE else str(math.ceil(math.log(seconds) / _LOG_GAMMA))
+        self.counts[key] = self.counts.get(key, 0) + 1
+    
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        """Add another sketch's samples to this one."""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        return self
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-th quantile in seconds, or None without samples."""
+        total = self.count
+        if not total:
+            return None
+        
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.counts, key=_bucket_order):
+            seen += self.counts[key]
+            if seen > rank:
+                if key == _ZERO:
+                    return 0.0
+                # Midpoint of the bucket in relative terms
+                return 2 * _GAMMA ** int(key) / (_GAMMA + 1)
+        return None
+    
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Optional[float]]:
+        """Count and selected quantiles, keyed p50, p95, ..."""
+        summary: Dict[str, Optional[float]] = {"count": self.count}
+        for q in quantiles:
+            value = self.quantile(q)
+            summary[f"p{round(q * 100):g}"] = round(value, 4) if value is not None else None
+        return summary
+
+
+def _bucket_order(key: str) -> float:
+    return -math.inf if key == _ZERO else int(key)
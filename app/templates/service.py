@@ -6,6 +6,7 @@ import os
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 
+from app.database import find_secondary
 from app.models.template import Template
 from app.models.user import User
 from app.templates.validator import TemplateValidator
@@ -65,7 +66,7 @@ class TemplateService:
         if user:
             # Show user's templates and public templates
             query_conditions.append(
-                (Template.created_by.id == user.id) | (Template.is_public == True)
+                (Template.created_by_id == str(user.id)) | (Template.is_public == True)
             )
         else:
             # Only show public templates for anonymous users
@@ -73,9 +74,9 @@ class TemplateService:
         
         # Execute query
         if query_conditions:
-            templates = await Template.find(*query_conditions).to_list()
+            templates = await find_secondary(Template.find(*query_conditions))
         else:
-            templates = await Template.find_all().to_list()
+            templates = await find_secondary(Template.find_all())
         
         return templates
     
@@ -98,7 +99,7 @@ class TemplateService:
             return None
         
         # Check ownership
-        if str(template.created_by.id) != str(user.id):
+        if template.owner_id != str(user.id):
             raise PermissionError("Cannot update template you don't own")
         
         # Validate if template structure changed
@@ -126,7 +127,7 @@ class TemplateService:
             return False
         
         # Check ownership
-        if str(template.created_by.id) != str(user.id):
+        if template.owner_id != str(user.id):
             raise PermissionError("Cannot delete template you don't own")
         
         await template.delete()
@@ -48,6 +48,10 @@ class TemplateValidator:
         var_errors = self._validate_variables(template_data.get("variables", {}))
         errors.extend(var_errors)
         
+        # Validate provider fallback chain
+        fallback_errors = self._validate_fallbacks(template_data.get("provider_settings") or {})
+        errors.extend(fallback_errors)
+        
         is_valid = len(errors) == 0
         return is_valid, errors, warnings
     
@@ -136,4 +140,20 @@ class TemplateValidator:
                     if "max" in var_def and default > var_def["max"]:
                         errors.append(f"Variable {var_name}: default > max")
         
+        return errors
+    
+    def _validate_fallbacks(self, provider_settings: Dict[str, Any]) -> List[str]:
+        """Validate the provider_settings.fallbacks chain."""
+        errors = []
+        fallbacks = provider_settings.get("fallbacks")
+        if fallbacks is None:
+            return errors
+        
+        if not isinstance(fallbacks, list):
+            return ["provider_settings.fallbacks must be a list"]
+        
+        for i, entry in enumerate(fallbacks):
+            if not isinstance(entry, dict) or not entry.get("provider") or not entry.get("model"):
+                errors.append(f"Fallback {i + 1} must have 'provider' and 'model'")
+        
         return errors
\ No newline at end of file
@@ -12,10 +12,28 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from jose import jwt
 
 from app.main import app
+from app.auth.api_keys import api_key_auth
 from app.config import get_settings
 from app.database import get_database
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-slow", action="store_true", default=False,
+        help="Also run the wall-clock benchmarks marked slow"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip timing benchmarks unless asked for; they are noisy on shared runners."""
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="benchmark; run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
 @pytest.fixture(scope="session")
 def event_loop() -> Generator:
     """Create an instance of the default event loop for the test session."""
@@ -53,10 +71,13 @@ async def client(test_db) -> AsyncGenerator[AsyncClient, None]:
         return test_db
     
     app.dependency_overrides[get_database] = override_get_database
+    # The client does not run the app lifespan, so background services are started here
+    api_key_auth.usage.start()
     
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
     
+    await api_key_auth.usage.stop()
     app.dependency_overrides.clear()
 
 
@@ -0,0 +1,116 @@
+"""
+In-process mock of the Google and GitHub OAuth endpoints.
+
+Served through httpx's ASGI transport, so the shared OAuth client talks to
+it without network access. Every endpoint sleeps `latency` seconds to model
+provider round trips, and requests are counted per path.
+"""
+import asyncio
+import time
+import uuid
+from collections import Counter
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, Request
+from jose import jwk, jwt
+
+from app.auth.oauth import GoogleOAuth
+
+
+class MockOAuthServer:
+    """Google (OpenID Connect) and GitHub endpoints with signed ID tokens."""
+    
+    def __init__(self, client_id: str = "mock-client-id", latency: float = 0.0):
+        self.client_id = client_id
+        self.latency = latency
+        self.requests = Counter()
+        self.rotate_keys()
+        self.app = self._build_app()
+    
+    def rotate_keys(self) -> None:
+        """Start signing with a new key (published under a new kid)."""
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ).decode()
+        # Parsed once; loading the PEM costs far more than signing
+        self.signing_key = jwk.construct(private_pem, "RS256")
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        self.kid = uuid.uuid4().hex
+        self.public_jwk = dict(jwk.construct(public_pem, "RS256").to_dict(), kid=self.kid, use="sig")
+    
+    def id_token(self, access_token: str, email: str = "mock@example.com", **claims) -> str:
+        """ID token for the mock user, signed with the current key."""
+        now = int(time.time())
+        payload = {
+            "iss": GoogleOAuth.ISSUERS[0],
+            "aud": self.client_id,
+            "sub": "google-user-1",
+            "email": email,
+            "email_verified": True,
+            "name": "Mock User",
+            "iat": now,
+            "exp": now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(
+            payload, self.signing_key, algorithm="RS256",
+            headers={"kid": self.kid}, access_token=access_token
+        )
+    
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+        
+        @app.middleware("http")
+        async def count_and_delay(request: Request, call_next):
+            self.requests[request.url.path] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return await call_next(request)
+        
+        @app.get("/.well-known/openid-configuration")
+        async def discovery():
+            return {
+                "issuer": GoogleOAuth.ISSUERS[0],
+                "jwks_uri": "https://www.googleapis.com/oauth2/v3/certs"
+            }
+        
+        @app.get("/oauth2/v3/certs")
+        async def certs():
+            return {"keys": [self.public_jwk]}
+        
+        @app.post("/token")
+        async def google_token():
+            access_token = f"google-{uuid.uuid4().hex}"
+            return {
+                "access_token": access_token,
+                "token_type": "Bearer",
+                "id_token": self.id_token(access_token)
+            }
+        
+        @app.get("/oauth2/v2/userinfo")
+        async def google_userinfo():
+            return {"id": "google-user-1", "email": "mock@example.com", "name": "Mock User"}
+        
+        @app.post("/login/oauth/access_token")
+        async def github_token():
+            return {"access_token": f"github-{uuid.uuid4().hex}", "token_type": "bearer"}
+        
+        @app.get("/user")
+        async def github_user():
+            return {"id": 42, "login": "octocat", "name": "Octo Cat", "email": None}
+        
+        @app.get("/user/emails")
+        async def github_emails():
+            return [
+                {"email": "octo@secondary.example.com", "primary": False, "verified": True},
+                {"email": "octo@example.com", "primary": True, "verified": True}
+            ]
+        
+        return app
@@ -0,0 +1,304 @@
+"""Unit tests for API key authentication, caching and usage batching."""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.auth import dependencies
+from app.auth.api_keys import (
+    ApiKeyAuthenticator,
+    ApiKeyCache,
+    ApiKeyError,
+    ApiKeyQuotaExceeded,
+    ApiKeyScopeError,
+    CachedKey,
+    UsageRecorder,
+    generate_api_key,
+    hash_api_key,
+    is_api_key,
+    key_prefix,
+    required_scope
+)
+
+
+class FakeUser:
+    """Stand-in for the User document."""
+    
+    def __init__(self, user_id="u1", email="a@example.com"):
+        self.id = user_id
+        self.email = email
+    
+    def model_copy(self):
+        return FakeUser(self.id, self.email)
+
+
+class RecordingWriter:
+    """Usage writer that records batches and can be made to fail."""
+    
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+    
+    async def __call__(self, pending):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(dict(pending))
+
+
+def _authenticator(monkeypatch, scopes=("read", "write"), daily_quota=None, expires_at=None, used_today=0):
+    """Authenticator whose database lookup returns one key; returns (auth, key, loads)."""
+    key, prefix = generate_api_key()
+    loads = []
+    
+    async def load(requested_prefix):
+        loads.append(requested_prefix)
+        if requested_prefix != prefix:
+            return None
+        return CachedKey(
+            key_id="k1",
+            key_hash=hash_api_key(key),
+            scopes=list(scopes),
+            daily_quota=daily_quota,
+            expires_at=expires_at,
+            user=FakeUser(),
+            used_today=used_today
+        )
+    
+    auth = ApiKeyAuthenticator(ApiKeyCache(ttl=60, max_size=100), UsageRecorder(RecordingWriter(), interval=60))
+    monkeypatch.setattr(auth, "_load", load)
+    return auth, key, loads
+
+
+@pytest.mark.unit
+class TestKeyFormat:
+    """Test key generation and parsing."""
+    
+    def test_generated_keys_are_unique_and_parseable(self):
+        key, prefix = generate_api_key()
+        other, other_prefix = generate_api_key()
+        
+        assert key != other and prefix != other_prefix
+        assert is_api_key(key)
+        assert key_prefix(key) == prefix
+    
+    def test_malformed_keys_have_no_prefix(self):
+        assert key_prefix("ltk_") is None
+        assert key_prefix("ltk_abc") is None
+        assert key_prefix("ltk_abc_") is None
+        assert not is_api_key("eyJhbGciOi.jwt.token")
+    
+    def test_hash_is_stable_and_not_the_key(self):
+        key, _ = generate_api_key()
+        
+        assert hash_api_key(key) == hash_api_key(key)
+        assert key not in hash_api_key(key)
+        assert hash_api_key(key) != hash_api_key(key + "x")
+    
+    def test_required_scope(self):
+        assert required_scope("GET") == "read"
+        assert required_scope("head") == "read"
+        assert required_scope("POST") == "write"
+        assert required_scope("DELETE") == "write"
+
+
+@pytest.mark.unit
+class TestApiKeyAuthenticator:
+    """Test key verification, caching, scopes and quotas."""
+    
+    async def test_valid_key_is_loaded_once(self, monkeypatch):
+        auth, key, loads = _authenticator(monkeypatch)
+        
+        for _ in range(5):
+            user, cached = await auth.authenticate(key, "read")
+            assert user.email == "a@example.com"
+        
+        assert len(loads) == 1
+        assert auth.cache.stats()["hits"] == 4
+        assert auth.usage.pending == 5
+    
+    async def test_returns_a_copy_of_the_user(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch)
+        
+        first, _ = await auth.authenticate(key, "read")
+        first.email = "changed@example.com"
+        second, _ = await auth.authenticate(key, "read")
+        
+        assert second.email == "a@example.com"
+    
+    async def test_wrong_secret_is_rejected_even_when_cached(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch)
+        await auth.authenticate(key, "read")
+        
+        forged = key[:-4] + ("aaaa" if not key.endswith("aaaa") else "bbbb")
+        with pytest.raises(ApiKeyError):
+            await auth.authenticate(forged, "read")
+    
+    async def test_unknown_and_malformed_keys_are_rejected(self, monkeypatch):
+        auth, _, _ = _authenticator(monkeypatch)
+        other, _ = generate_api_key()
+        
+        with pytest.raises(ApiKeyError):
+            await auth.authenticate(other, "read")
+        with pytest.raises(ApiKeyError):
+            await auth.authenticate("ltk_nosecret", "read")
+    
+    async def test_missing_scope(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch, scopes=("read",))
+        
+        await auth.authenticate(key, "read")
+        with pytest.raises(ApiKeyScopeError):
+            await auth.authenticate(key, "write")
+    
+    async def test_expired_key(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch, expires_at=datetime.utcnow() - timedelta(seconds=1))
+        
+        with pytest.raises(ApiKeyError, match="expired"):
+            await auth.authenticate(key, "read")
+    
+    async def test_daily_quota_includes_persisted_usage(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch, daily_quota=3, used_today=1)
+        
+        await auth.authenticate(key, "read")
+        await auth.authenticate(key, "read")
+        with pytest.raises(ApiKeyQuotaExceeded):
+            await auth.authenticate(key, "read")
+        
+        assert auth.usage.pending == 2
+    
+    async def test_quota_resets_on_a_new_day(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch, daily_quota=1)
+        _, cached = await auth.authenticate(key, "read")
+        
+        cached.day = "2000-01-01"
+        await auth.authenticate(key, "read")
+        
+        assert cached.used_today == 1
+    
+    async def test_revoke_drops_the_cached_key(self, monkeypatch):
+        auth, key, loads = _authenticator(monkeypatch)
+        await auth.authenticate(key, "read")
+        
+        auth.revoke(key_prefix(key))
+        await auth.authenticate(key, "read")
+        
+        assert len(loads) == 2
+    
+    async def test_invalidate_user(self, monkeypatch):
+        auth, key, loads = _authenticator(monkeypatch)
+        await auth.authenticate(key, "read")
+        
+        auth.cache.invalidate_user("someone-else")
+        await auth.authenticate(key, "read")
+        auth.cache.invalidate_user("u1")
+        await auth.authenticate(key, "read")
+        
+        assert len(loads) == 2
+
+
+@pytest.mark.unit
+class TestApiKeyDependency:
+    """Test API keys through get_current_user."""
+    
+    @pytest.fixture
+    def key(self, monkeypatch):
+        auth, key, _ = _authenticator(monkeypatch, scopes=("read",), daily_quota=1)
+        monkeypatch.setattr(dependencies, "api_key_auth", auth)
+        return key
+    
+    @staticmethod
+    def _request(method):
+        return SimpleNamespace(method=method, state=SimpleNamespace())
+    
+    async def test_read_request_records_the_key(self, key):
+        request = self._request("GET")
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=key)
+        
+        user = await dependencies.get_current_user(credentials, request)
+        
+        assert user.email == "a@example.com"
+        assert request.state.api_key.key_id == "k1"
+    
+    async def test_status_codes(self, key):
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=key)
+        
+        with pytest.raises(HTTPException) as error:
+            await dependencies.get_current_user(credentials, self._request("POST"))
+        assert error.value.status_code == 403
+        
+        await dependencies.get_current_user(credentials, self._request("GET"))
+        with pytest.raises(HTTPException) as error:
+            await dependencies.get_current_user(credentials, self._request("GET"))
+        assert error.value.status_code == 429
+        
+        bad = HTTPAuthorizationCredentials(scheme="Bearer", credentials=generate_api_key()[0])
+        with pytest.raises(HTTPException) as error:
+            await dependencies.get_current_user(bad, self._request("GET"))
+        assert error.value.status_code == 401
+
+
+@pytest.mark.unit
+class TestUsageRecorder:
+    """Test batched usage counters."""
+    
+    async def test_requests_are_batched(self):
+        writer = RecordingWriter()
+        recorder = UsageRecorder(writer, interval=60)
+        
+        for _ in range(100):
+            recorder.record("k1")
+        recorder.record("k2")
+        await recorder.flush()
+        
+        assert len(writer.batches) == 1
+        counts = {key_id: count for (key_id, _), (count, _) in writer.batches[0].items()}
+        assert counts == {"k1": 100, "k2": 1}
+        assert recorder.pending == 0
+    
+    async def test_failed_flush_keeps_counts(self):
+        writer = RecordingWriter()
+        recorder = UsageRecorder(writer, interval=60)
+        recorder.record("k1")
+        
+        writer.fail = True
+        await recorder.flush()
+        recorder.record("k1")
+        assert recorder.pending == 2
+        
+        writer.fail = False
+        await recorder.flush()
+        (count, _), = writer.batches[0].values()
+        assert count == 2
+    
+    async def test_background_flush(self):
+        writer = RecordingWriter()
+        recorder = UsageRecorder(writer, interval=0.01)
+        recorder.start()
+        
+        recorder.record("k1")
+        await asyncio.sleep(0.05)
+        
+        assert recorder.pending == 0
+        assert recorder.stats()["flushes"] == 1
+        await recorder.stop()
+    
+    async def test_stop_flushes_pending_counts(self):
+        writer = RecordingWriter()
+        recorder = UsageRecorder(writer, interval=60)
+        recorder.start()
+        recorder.record("k1")
+        
+        await recorder.stop()
+        
+        assert recorder.pending == 0
+        assert len(writer.batches) == 1
+        assert recorder._task is None
+    
+    async def test_recording_starts_no_task(self):
+        recorder = UsageRecorder(RecordingWriter(), interval=60)
+        
+        recorder.record("k1")
+        
+        assert recorder._task is None
@@ -0,0 +1,188 @@
+"""Unit tests for bulk multi-generation exports."""
+import json
+import zipfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import get_settings
+from app.generation import bulk_export as bulk_export_module
+from app.generation.bulk_export import (
+    BulkArchiveWriter, BulkExportService, export_expiry, history_query, write_bulk_archive
+)
+
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def _documents(count, results_per_job=2):
+    return [
+        {
+            "job_id": f"gen_{i}",
+            "template_id": "t1",
+            "status": "completed",
+            "created_at": datetime(2024, 1, 1),
+            "results": [{"title": f"Item {i}.{j}", "meta": {"rank": j}} for j in range(results_per_job)]
+        }
+        for i in range(count)
+    ]
+
+
+def _cursor(documents):
+    async def iterate():
+        for document in documents:
+            yield document
+    return iterate()
+
+
+async def _no_schema(template_id):
+    return None
+
+
+def _matches(document, query):
+    """Evaluate the $or/$lte/None subset of the MongoDB query language."""
+    if "$or" in query:
+        return any(_matches(document, clause) for clause in query["$or"])
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if value is None or value > condition["$lte"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeExports:
+    """In-memory bulk_exports collection."""
+    
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def find(self, query, projection=None):
+        return _cursor([d for d in self.documents if _matches(d, query)])
+    
+    async def delete_many(self, query):
+        ids = query["_id"]["$in"]
+        self.documents = [d for d in self.documents if d["_id"] not in ids]
+
+
+@pytest.mark.unit
+class TestBulkExport:
+    """Test archive writing from a generation cursor."""
+    
+    def test_history_query(self):
+        start, end = datetime(2024, 1, 1), datetime(2024, 2, 1)
+        assert history_query("u1", "completed", "t1", start, end) == {
+            "user_id": "u1",
+            "status": "completed",
+            "template_id": "t1",
+            "created_at": {"$gte": start, "$lt": end}
+        }
+        assert history_query("u1") == {"user_id": "u1"}
+    
+    async def test_zip_has_one_entry_per_generation_and_manifest(self, tmp_path):
+        writer = BulkArchiveWriter(tmp_path / "out.zip", "zip", "csv")
+        size = await write_bulk_archive(_cursor(_documents(3)), writer, _no_schema)
+        
+        assert size == (tmp_path / "out.zip").stat().st_size
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert sorted(archive.namelist()) == ["gen_0.csv", "gen_1.csv", "gen_2.csv", "manifest.json"]
+            assert archive.read("gen_1.csv").decode().splitlines()[0] == "meta.rank,title"
+            manifest = json.loads(archive.read("manifest.json"))
+        assert [entry["results"] for entry in manifest] == [2, 2, 2]
+    
+    async def test_zip_entries_use_template_schema(self, tmp_path):
+        async def schema(template_id):
+            return {"properties": {"title": {"type": "string"}}}
+        
+        writer = BulkArchiveWriter(tmp_path / "out.zip", "zip", "csv")
+        await write_bulk_archive(_cursor(_documents(1)), writer, schema)
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert archive.read("gen_0.csv").decode().splitlines()[0] == "title,_extra"
+    
+    async def test_ndjson_lines_are_tagged_with_job(self, tmp_path):
+        writer = BulkArchiveWriter(tmp_path / "out.ndjson", "ndjson")
+        await write_bulk_archive(_cursor(_documents(2)), writer, _no_schema)
+        
+        lines = [json.loads(line) for line in (tmp_path / "out.ndjson").read_text().splitlines()]
+        assert len(lines) == 4
+        assert lines[3] == {
+            "job_id": "gen_1", "template_id": "t1", "index": 2,
+            "result": {"title": "Item 1.1", "meta": {"rank": 1}}
+        }
+    
+    async def test_progress_is_reported(self, tmp_path):
+        progress = []
+        
+        async def on_progress(written):
+            progress.append(written)
+        
+        writer = BulkArchiveWriter(tmp_path / "out.ndjson", "ndjson")
+        await write_bulk_archive(_cursor(_documents(60, 1)), writer, _no_schema, on_progress)
+        assert progress == [25, 50, 60]
+    
+    async def test_failed_export_leaves_no_file(self, tmp_path):
+        async def broken():
+            yield _documents(1)[0]
+            raise RuntimeError("cursor lost")
+        
+        writer = BulkArchiveWriter(tmp_path / "out.zip", "zip")
+        with pytest.raises(RuntimeError):
+            await write_bulk_archive(broken(), writer, _no_schema)
+        assert not (tmp_path / "out.zip").exists()
+    
+    def test_rejects_unknown_formats(self, tmp_path):
+        with pytest.raises(ValueError):
+            BulkArchiveWriter(tmp_path / "out.tar", "tar")
+        with pytest.raises(ValueError):
+            BulkArchiveWriter(tmp_path / "out.zip", "zip", "xlsx")
+
+
+@pytest.mark.unit
+class TestBulkExportExpiry:
+    """Test that finished archives and their records are deleted after the TTL."""
+    
+    @pytest.fixture
+    def exports(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(get_settings(), "bulk_export_ttl_hours", 24)
+        
+        def export(n, **fields):
+            path = tmp_path / f"exp_{n}.zip"
+            path.write_bytes(b"PK")
+            return {"_id": n, "path": str(path), **fields}
+        
+        collection = FakeExports([
+            export(1, completed_at=NOW - timedelta(days=2), expires_at=NOW - timedelta(days=1)),
+            export(2, completed_at=NOW, expires_at=NOW + timedelta(days=1)),
+            # Finished before expiry was recorded
+            export(3, completed_at=NOW - timedelta(days=2)),
+            export(4, completed_at=NOW - timedelta(hours=1)),
+            # Still running
+            export(5, completed_at=None),
+        ])
+        monkeypatch.setattr(
+            bulk_export_module, "BulkExport", SimpleNamespace(get_motor_collection=lambda: collection)
+        )
+        return collection
+    
+    def test_expiry_follows_ttl(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "bulk_export_ttl_hours", 24)
+        assert export_expiry(NOW) == NOW + timedelta(days=1)
+        
+        monkeypatch.setattr(get_settings(), "bulk_export_ttl_hours", 0)
+        assert export_expiry(NOW) is None
+    
+    async def test_expired_archives_and_records_are_deleted(self, exports, tmp_path):
+        assert await BulkExportService().purge_expired(now=NOW) == 2
+        
+        assert [d["_id"] for d in exports.documents] == [2, 4, 5]
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["exp_2.zip", "exp_4.zip", "exp_5.zip"]
+        assert await BulkExportService().purge_expired(now=NOW) == 0
+    
+    async def test_zero_ttl_keeps_everything(self, exports, monkeypatch):
+        monkeypatch.setattr(get_settings(), "bulk_export_ttl_hours", 0)
+        
+        assert await BulkExportService().purge_expired(now=NOW) == 0
+        assert len(exports.documents) == 5
@@ -0,0 +1,65 @@
+"""Unit tests for the shared size-bounded TTL cache."""
+import pytest
+
+from app.cache import TTLCache
+from app.config import get_settings
+
+
+class IndexedCache(TTLCache[str, int]):
+    """Cache tracking its keys through the storage hooks."""
+    
+    ttl_setting = "auth_cache_ttl_seconds"
+    size_setting = "auth_cache_size"
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.keys = set()
+    
+    def _stored(self, key, value):
+        self.keys.add(key)
+    
+    def _removed(self, key, value):
+        self.keys.discard(key)
+
+
+@pytest.mark.unit
+class TestTTLCache:
+    """Test expiry, eviction and the subclass hooks."""
+    
+    def test_least_recently_used_is_evicted(self):
+        cache = IndexedCache(ttl=60, max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.keys == {"a", "c"}
+    
+    def test_shorter_entry_ttl_wins(self):
+        cache = IndexedCache(ttl=60, max_size=10)
+        cache.set("a", 1, ttl=-1)
+        cache.set("b", 2, ttl=120)
+        
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.stats()["hit_rate"] == 0.5
+    
+    def test_expired_entries_are_dropped(self):
+        cache = IndexedCache(ttl=60, max_size=10)
+        cache.set("a", 1)
+        cache._entries["a"] = (0.0, 1)
+        
+        assert cache.get("a") is None
+        assert cache.keys == set() and cache.stats()["entries"] == 0
+    
+    def test_limits_follow_settings(self, monkeypatch):
+        cache = IndexedCache()
+        monkeypatch.setattr(get_settings(), "auth_cache_ttl_seconds", 0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        
+        monkeypatch.setattr(get_settings(), "auth_cache_ttl_seconds", 60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
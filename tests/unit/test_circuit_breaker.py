@@ -0,0 +1,163 @@
+"""Unit tests for circuit breakers and provider fallback chains."""
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.providers.base import GenerationRequest, GenerationResponse, GenerationError
+from app.providers.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitState
+from app.providers.factory import ProviderFactory
+from app.providers.fallback import FallbackChain, parse_fallbacks
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class HealthyProvider:
+    """Provider that always succeeds."""
+    
+    calls = 0
+    
+    def __init__(self):
+        self.id = "healthy"
+    
+    async def generate(self, request):
+        HealthyProvider.calls += 1
+        return GenerationResponse(
+            id="ok",
+            model=request.model,
+            choices=[{"index": 0, "message": {"role": "assistant", "content": "ok"}}],
+            created=0,
+            provider=self.id
+        )
+
+
+class BrokenProvider:
+    """Provider that always returns 503."""
+    
+    calls = 0
+    
+    def __init__(self):
+        self.id = "broken"
+    
+    async def generate(self, request):
+        BrokenProvider.calls += 1
+        http_request = httpx.Request("POST", "http://broken.test")
+        raise httpx.HTTPStatusError(
+            "unavailable",
+            request=http_request,
+            response=httpx.Response(503, request=http_request)
+        )
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Register fake providers with fast retries."""
+    monkeypatch.setattr(get_settings(), "provider_max_retries", 0)
+    ProviderFactory.register_provider("healthy", HealthyProvider)
+    ProviderFactory.register_provider("broken", BrokenProvider)
+    HealthyProvider.calls = 0
+    BrokenProvider.calls = 0
+    yield
+    for provider_id in ("healthy", "broken"):
+        ProviderFactory._providers.pop(provider_id, None)
+        ProviderFactory._instances.pop(provider_id, None)
+
+
+def _request() -> GenerationRequest:
+    return GenerationRequest(model="m", messages=[{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+    """Test breaker state transitions."""
+    
+    def test_opens_after_error_rate_threshold(self):
+        breaker = CircuitBreaker(failure_rate_threshold=0.5, min_calls=4)
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+        
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.allow_request() is False
+    
+    def test_half_open_probe_closes_on_success(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+        breaker.record_failure()
+        assert breaker.is_open
+        
+        clock.now = 11
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False  # only one probe at a time
+        
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+    
+    def test_half_open_probe_failure_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 11
+        assert breaker.allow_request() is True
+        
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.unit
+class TestFallbackChain:
+    """Test fallback chain behaviour."""
+    
+    def test_parse_fallbacks_ignores_invalid_entries(self):
+        settings = {"fallbacks": [
+            {"provider": "openrouter", "model": "meta-llama/llama-3-8b-instruct:free"},
+            {"provider": "ollama"},
+            "garbage"
+        ]}
+        assert parse_fallbacks(settings) == [
+            ("openrouter", "meta-llama/llama-3-8b-instruct:free")
+        ]
+    
+    async def test_falls_back_when_primary_fails(self, fake_providers):
+        chain = FallbackChain.for_generation(
+            "broken", "m",
+            {"fallbacks": [{"provider": "healthy", "model": "backup"}]},
+            registry=CircuitBreakerRegistry()
+        )
+        
+        response, provider_id, model = await chain.generate(_request())
+        
+        assert (provider_id, model) == ("healthy", "backup")
+        assert response.model == "backup"
+    
+    async def test_open_circuit_skips_degraded_backend(self, fake_providers, monkeypatch):
+        monkeypatch.setattr(get_settings(), "circuit_breaker_min_calls", 2)
+        registry = CircuitBreakerRegistry()
+        chain = FallbackChain.for_generation(
+            "broken", "m",
+            {"fallbacks": [{"provider": "healthy", "model": "backup"}]},
+            registry=registry
+        )
+        
+        for _ in range(5):
+            await chain.generate(_request())
+        
+        assert BrokenProvider.calls == 2
+        assert HealthyProvider.calls == 5
+        assert registry.get("broken", "m").is_open
+    
+    async def test_all_candidates_failing_raises(self, fake_providers):
+        chain = FallbackChain.for_generation("broken", "m", registry=CircuitBreakerRegistry())
+        
+        with pytest.raises(GenerationError, match="All providers failed"):
+            await chain.generate(_request())
@@ -0,0 +1,77 @@
+"""Unit tests for Arrow, Parquet and NDJSON exports."""
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.generation.columnar import build_table, schema_columns
+from app.generation.export import iter_export, render_binary
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "rating": {"type": "integer"},
+        "price": {"type": ["number", "null"]},
+        "details": {
+            "type": "object",
+            "properties": {"in_stock": {"type": "boolean"}, "tags": {"type": "array"}}
+        }
+    }
+}
+
+RESULTS = [
+    {"title": "Tent", "rating": 5, "price": 199.0, "details": {"in_stock": True, "tags": ["camp"]}},
+    {"title": "Stove", "rating": "4", "price": 49, "details": {"in_stock": False, "tags": []}},
+    {"content": "not json", "raw": True}
+]
+
+
+@pytest.mark.unit
+class TestColumnarExport:
+    """Test schema-derived columnar exports."""
+    
+    def test_schema_columns_are_flattened(self):
+        assert schema_columns(SCHEMA) == [
+            ("title", "string"),
+            ("rating", "integer"),
+            ("price", "number"),
+            ("details.in_stock", "boolean"),
+            ("details.tags", "string")
+        ]
+    
+    def test_table_uses_schema_types_and_infers_extra_columns(self):
+        table = build_table(RESULTS, SCHEMA)
+        
+        assert table.schema.field("rating").type == pa.int64()
+        assert table.schema.field("price").type == pa.float64()
+        assert table.schema.field("details.in_stock").type == pa.bool_()
+        assert table.schema.field("raw").type == pa.bool_()
+        assert table.column("rating").to_pylist() == [5, 4, None]
+        assert table.column("details.tags").to_pylist() == ['["camp"]', "[]", None]
+        assert table.column("content").to_pylist() == [None, None, "not json"]
+    
+    def test_inference_without_schema(self):
+        table = build_table([{"a": 1, "b": 1.5}, {"a": 2, "b": 2}])
+        assert table.schema.field("a").type == pa.int64()
+        assert table.schema.field("b").type == pa.float64()
+    
+    def test_parquet_and_arrow_round_trip(self):
+        parquet = pq.read_table(io.BytesIO(render_binary("parquet", RESULTS, SCHEMA)))
+        assert parquet.column("title").to_pylist() == ["Tent", "Stove", None]
+        
+        with pa.ipc.open_file(pa.BufferReader(render_binary("arrow", RESULTS, SCHEMA))) as reader:
+            arrow = reader.read_all()
+        assert arrow.num_rows == 3
+        assert arrow.equals(build_table(RESULTS, SCHEMA))
+    
+    def test_ndjson_one_line_per_result(self):
+        body = "".join(iter_export(RESULTS, "ndjson"))
+        lines = body.splitlines()
+        
+        assert len(lines) == 3
+        assert [json.loads(line) for line in lines] == RESULTS
+        assert "".join(iter_export([], "ndjson")) == ""
@@ -0,0 +1,301 @@
+"""Unit tests for MongoDB client options, pool metrics and secondary reads."""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pydantic import BaseModel
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+
+from app import database
+from app.auth.dependencies import get_current_user, get_optional_current_user
+from app.config import get_settings
+from app.database import PoolMetrics, available_compressors, client_options, find_secondary
+from app.generation import service as service_module
+from app.templates import service as template_service_module
+
+
+ADDRESS = ("mongo-1", 27017)
+
+
+class Summary(BaseModel):
+    job_id: str
+    status: str
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """Motor collection recording read preferences and find arguments."""
+    
+    def __init__(self, documents, read_preference=None):
+        self.documents = documents
+        self.read_preference = read_preference
+        self.calls = []
+    
+    def with_options(self, read_preference):
+        collection = FakeCollection(self.documents, read_preference)
+        collection.calls = self.calls
+        return collection
+    
+    def find(self, **kwargs):
+        self.calls.append(dict(kwargs, read_preference=self.read_preference))
+        documents = self.documents[kwargs["skip"]:]
+        return FakeCursor(documents[:kwargs["limit"]] if kwargs["limit"] else documents)
+    
+    async def count_documents(self, query):
+        self.calls.append({"count": query, "read_preference": self.read_preference})
+        return len(self.documents)
+
+
+class FakeQuery:
+    """The parts of a Beanie FindMany read by find_secondary."""
+    
+    def __init__(self, collection, projection_model=Summary):
+        self.document_model = SimpleNamespace(get_motor_collection=lambda: collection)
+        self.projection_model = projection_model
+        self.sort_expressions = [("created_at", -1)]
+        self.skip_number = 1
+        self.limit_number = 2
+    
+    def get_filter_query(self):
+        return {"user_id": "u1"}
+    
+    async def to_list(self):
+        return ["primary"]
+    
+    async def count(self):
+        return -1
+
+
+@pytest.fixture
+def connected(monkeypatch):
+    monkeypatch.setattr(database, "_client", object())
+    monkeypatch.setattr(get_settings(), "mongodb_secondary_reads", True)
+
+
+@pytest.mark.unit
+class TestClientOptions:
+    """Test client options built from settings."""
+    
+    def test_pool_and_timeouts(self, monkeypatch):
+        settings = get_settings()
+        monkeypatch.setattr(settings, "mongodb_max_pool_size", 50)
+        monkeypatch.setattr(settings, "mongodb_socket_timeout_ms", 0)
+        
+        options = client_options(settings)
+        
+        assert options["maxPoolSize"] == 50
+        assert options["minPoolSize"] == settings.mongodb_min_pool_size
+        assert options["serverSelectionTimeoutMS"] == settings.mongodb_server_selection_timeout_ms
+        assert options["waitQueueTimeoutMS"] == settings.mongodb_wait_queue_timeout_ms
+        assert options["socketTimeoutMS"] is None
+        assert options["event_listeners"] == [database.pool_metrics]
+    
+    def test_only_installed_compressors_are_used(self, monkeypatch):
+        installed = {"zlib", "zstandard"}
+        monkeypatch.setattr(
+            database.importlib.util, "find_spec", lambda name: object() if name in installed else None
+        )
+        monkeypatch.setattr(get_settings(), "mongodb_compressors", "zstd, snappy,zlib,lz4")
+        
+        assert available_compressors("zstd, snappy,zlib,lz4") == ["zstd", "zlib"]
+        assert client_options(get_settings())["compressors"] == "zstd,zlib"
+    
+    def test_no_compressors(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "mongodb_compressors", "")
+        
+        assert "compressors" not in client_options(get_settings())
+
+
+@pytest.mark.unit
+class TestPoolMetrics:
+    """Test utilization from connection pool events."""
+    
+    def test_checkouts_and_utilization(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "mongodb_max_pool_size", 4)
+        metrics = PoolMetrics()
+        for connection_id in (1, 2, 3):
+            metrics.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, connection_id))
+            metrics.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+            metrics.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, connection_id))
+        metrics.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 3))
+        metrics.connection_closed(monitoring.ConnectionClosedEvent(ADDRESS, 3, "idle"))
+        
+        stats = metrics.stats()
+        
+        assert stats["open"] == 2 and stats["in_use"] == 2 and stats["peak_in_use"] == 3
+        assert stats["utilization"] == 0.5
+        assert stats["checkouts"] == 3 and stats["waiting"] == 0
+        assert stats["max_wait_ms"] >= stats["avg_wait_ms"] >= 0
+    
+    def test_failed_checkouts(self):
+        metrics = PoolMetrics()
+        metrics.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+        assert metrics.stats()["waiting"] == 1
+        
+        metrics.connection_check_out_failed(
+            monitoring.ConnectionCheckOutFailedEvent(ADDRESS, monitoring.ConnectionCheckOutFailedReason.TIMEOUT)
+        )
+        metrics.pool_cleared(monitoring.PoolClearedEvent(ADDRESS))
+        
+        stats = metrics.stats()
+        assert stats["waiting"] == 0
+        assert stats["checkout_failures"] == {"timeout": 1}
+        assert stats["pool_clears"] == 1
+
+
+@pytest.mark.unit
+class TestSecondaryReads:
+    """Test routing lag-tolerant reads to secondaries."""
+    
+    def test_read_preference(self, connected, monkeypatch):
+        monkeypatch.setattr(get_settings(), "mongodb_max_staleness_seconds", 120)
+        assert database.secondary_read_preference() == SecondaryPreferred(max_staleness=120)
+        
+        monkeypatch.setattr(get_settings(), "mongodb_max_staleness_seconds", 0)
+        assert database.secondary_read_preference() == SecondaryPreferred()
+        
+        monkeypatch.setattr(get_settings(), "mongodb_secondary_reads", False)
+        assert database.secondary_read_preference() is None
+    
+    def test_no_client_reads_primary(self, monkeypatch):
+        monkeypatch.setattr(database, "_client", None)
+        
+        assert database.secondary_read_preference() is None
+    
+    async def test_find_runs_query_on_secondary(self, connected):
+        collection = FakeCollection([
+            {"_id": n, "job_id": f"job_{n}", "status": "completed"} for n in range(4)
+        ])
+        
+        results = await find_secondary(FakeQuery(collection))
+        
+        assert [r.job_id for r in results] == ["job_1", "job_2"]
+        call = collection.calls[0]
+        assert isinstance(call["read_preference"], SecondaryPreferred)
+        assert call["filter"] == {"user_id": "u1"}
+        assert call["sort"] == [("created_at", -1)]
+        assert call["projection"] == {"job_id": 1, "status": 1}
+        assert await database.count_secondary(FakeQuery(collection)) == 4
+    
+    async def test_find_without_secondary_reads(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "mongodb_secondary_reads", False)
+        query = FakeQuery(FakeCollection([]))
+        
+        assert await find_secondary(query) == ["primary"]
+        assert await database.count_secondary(query) == -1
+
+
+class FakePool:
+    """Connection pool of max_pool_size connections, each query one round trip."""
+    
+    def __init__(self, size, round_trip):
+        self.connections = asyncio.Semaphore(size)
+        self.round_trip = round_trip
+    
+    async def query(self):
+        async with self.connections:
+            await asyncio.sleep(self.round_trip)
+
+
+class FakeFind:
+    def __init__(self, pool, documents):
+        self.pool = pool
+        self.documents = documents
+    
+    def sort(self, *keys):
+        return self
+    
+    def skip(self, n):
+        return self
+    
+    def limit(self, n):
+        return self
+    
+    def project(self, model):
+        return self
+    
+    async def to_list(self):
+        await self.pool.query()
+        return self.documents
+
+
+def _template(n):
+    now = datetime(2024, 5, 1)
+    public = {
+        "id": f"t{n}", "name": f"Template {n}", "description": "", "category": "other", "tags": [],
+        "system_prompt": "", "user_prompt": "{{ topic }}", "variables": {}, "output_schema": None,
+        "provider_settings": {}, "validation_mode": "strict", "validation_rules": {}, "is_public": True,
+        "created_by": None, "created_at": now.isoformat(), "updated_at": now.isoformat()
+    }
+    return SimpleNamespace(dict_public=lambda: public)
+
+
+def _generation(n):
+    created_at = datetime(2024, 5, 1) - timedelta(minutes=n)
+    return SimpleNamespace(
+        id=f"g{n}", created_at=created_at,
+        dict_public=lambda: {"id": f"g{n}", "created_at": created_at.isoformat(), "results": []}
+    )
+
+
+@pytest.mark.unit
+class TestListingThroughput:
+    """Benchmark /history and /templates under concurrency against a pooled fake database."""
+    
+    @pytest.mark.slow
+    async def test_concurrent_listing_benchmark(self, monkeypatch):
+        from app.main import app
+        
+        # Each query is a simulated 10 ms round trip holding one pooled connection
+        pool = FakePool(1, 0.01)
+        generations, templates = [_generation(n) for n in range(10)], [_template(n) for n in range(10)]
+        async def load_results(generation_ids):
+            await pool.query()
+            return {generation_id: [] for generation_id in generation_ids}
+        
+        monkeypatch.setattr(service_module, "Generation", SimpleNamespace(find=lambda query: FakeFind(pool, generations)))
+        monkeypatch.setattr(service_module, "load_results", load_results)
+        monkeypatch.setattr(template_service_module, "Template", SimpleNamespace(
+            is_public=None,
+            find=lambda *conditions: FakeFind(pool, templates),
+            find_all=lambda: FakeFind(pool, templates)
+        ))
+        monkeypatch.setattr(database, "_client", None)
+        monkeypatch.setattr(app, "dependency_overrides", {
+            get_current_user: lambda: SimpleNamespace(id="u1"),
+            get_optional_current_user: lambda: None
+        })
+        
+        async def throughput(pool_size, requests=200, concurrency=50):
+            pool.connections = asyncio.Semaphore(pool_size)
+            limit = asyncio.Semaphore(concurrency)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def call(n):
+                    async with limit:
+                        response = await client.get("/api/v1/history" if n % 2 else "/templates")
+                        assert response.status_code == 200
+                
+                start = time.perf_counter()
+                await asyncio.gather(*(call(n) for n in range(requests)))
+                return requests / (time.perf_counter() - start)
+        
+        # A starved pool queues the requests; the configured one serves them side by side
+        starved = await throughput(2)
+        tuned = await throughput(get_settings().mongodb_max_pool_size)
+        assert tuned > starved * 3
@@ -0,0 +1,367 @@
+"""Unit tests for chunked, resumable dataset jobs."""
+import asyncio
+import io
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.config import get_settings
+from app.generation import dataset as dataset_module, items as items_module, tasks as tasks_module
+from app.generation.dataset import DatasetRunner, read_variables, write_variables_file
+from app.generation.tasks import GenerationProcessor, ItemOutcome
+from app.models.generation import GenerationStatus
+
+
+def _get(document, path):
+    return document.get(path)
+
+
+def _matches(document, query):
+    """Evaluate the MongoDB filter subset the dataset runner uses."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, part) for part in condition):
+                return False
+            continue
+        value = _get(document, key)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$lt" and not (value is not None and value < operand):
+                    return False
+                if operator == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """In-memory motor collection."""
+    
+    def __init__(self, documents=None):
+        self.documents = documents or []
+    
+    def _apply(self, document, update):
+        for field, value in update.get("$set", {}).items():
+            document[field] = value
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+        for field, value in update.get("$max", {}).items():
+            document[field] = max(document.get(field, value), value)
+    
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.documents if _matches(d, query)), None)
+    
+    async def find_one_and_update(self, query, update, sort=None, projection=None, return_document=None):
+        matching = [d for d in self.documents if _matches(d, query)]
+        if sort:
+            (key, direction), = sort
+            matching.sort(key=lambda d: d[key], reverse=direction < 0)
+        if not matching:
+            return None
+        self._apply(matching[0], update)
+        return dict(matching[0])
+    
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if _matches(document, query):
+                before = dict(document)
+                self._apply(document, update)
+                return SimpleNamespace(matched_count=1, modified_count=int(before != document))
+        return SimpleNamespace(matched_count=0, modified_count=0)
+    
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            key = (document["generation_id"], document["index"])
+            if any((d["generation_id"], d["index"]) == key for d in self.documents):
+                raise BulkWriteError({"writeErrors": [{"code": 11000, "errmsg": "duplicate item"}]})
+            self.documents.append(dict(document))
+    
+    async def delete_many(self, query):
+        before = len(self.documents)
+        self.documents = [d for d in self.documents if not _matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self.documents))
+    
+    async def count_documents(self, query):
+        return sum(1 for d in self.documents if _matches(d, query))
+
+
+class FakeProcessor:
+    """Generates one item per row without calling a provider."""
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+    
+    async def prepare_job(self, generation):
+        return SimpleNamespace(max_cost=generation.metadata.get("max_cost"))
+    
+    async def generate_item(self, job, variables, index):
+        self.calls.append(index)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return ItemOutcome(
+            result={"name": variables["name"], "shared": variables.get("shared")},
+            prompt="prompt" if index == 1 else None,
+            total_tokens=3,
+            prompt_tokens=1,
+            completion_tokens=2,
+            cost=0.01
+        )
+
+
+def _source(rows):
+    return io.BytesIO("".join(json.dumps(row) + "\n" for row in rows).encode("utf-8"))
+
+
+@pytest.fixture
+def dataset_job(tmp_path, monkeypatch):
+    """A 23-row dataset job split into chunks of 5, backed by in-memory collections."""
+    path = tmp_path / "variables.ndjson"
+    count, offsets = write_variables_file(
+        _source([{"name": f"row{n}"} for n in range(1, 24)]), path, chunk_size=5
+    )
+    generation_id = ObjectId()
+    generation = SimpleNamespace(
+        id=generation_id,
+        job_id="ds_test",
+        status=GenerationStatus.PROCESSING,
+        count=count,
+        variables={"shared": "x"},
+        metadata={"dataset": {"file": str(path)}}
+    )
+    generations = FakeCollection([{
+        "_id": generation_id, "status": "processing", "result_count": 0, "cost": 0.0, "progress": 10
+    }])
+    chunks = FakeCollection([
+        {
+            "_id": ObjectId(), "generation_id": generation_id, "chunk": n, "start": n * 5 + 1,
+            "size": min(5, count - n * 5), "offset": offset, "status": "pending",
+            "worker": None, "attempts": 0, "heartbeat_at": None
+        }
+        for n, offset in enumerate(offsets)
+    ])
+    item_store = FakeCollection()
+    
+    async def get(id):
+        return generation
+    
+    monkeypatch.setattr(dataset_module, "Generation", SimpleNamespace(
+        get=get, get_motor_collection=lambda: generations
+    ))
+    monkeypatch.setattr(dataset_module, "DatasetChunk", SimpleNamespace(get_motor_collection=lambda: chunks))
+    item_model = SimpleNamespace(get_motor_collection=lambda: item_store)
+    monkeypatch.setattr(dataset_module, "GenerationItem", item_model)
+    monkeypatch.setattr(items_module, "GenerationItem", item_model)
+    return SimpleNamespace(
+        generation=generation,
+        generations=generations,
+        chunks=chunks,
+        items=item_store,
+        document=generations.documents[0]
+    )
+
+
+@pytest.mark.unit
+class TestVariablesFile:
+    """Test normalising uploads and reading chunks back."""
+    
+    def test_ndjson_offsets_point_at_chunks(self, tmp_path):
+        path = tmp_path / "v.ndjson"
+        rows = [{"n": n, "text": "é" * n} for n in range(12)]
+        
+        count, offsets = write_variables_file(_source(rows), path, chunk_size=5)
+        
+        assert count == 12 and len(offsets) == 3
+        assert read_variables(path, offsets[1], 5) == rows[5:10]
+        assert read_variables(path, offsets[2], 5) == rows[10:]
+    
+    def test_csv_rows_become_objects(self, tmp_path):
+        path = tmp_path / "v.ndjson"
+        source = io.BytesIO(b'\xef\xbb\xbfname,topic\r\nAda,"math, logic"\r\nAlan,"multi\nline"\r\n')
+        
+        count, offsets = write_variables_file(source, path, format="csv", chunk_size=10)
+        
+        assert count == 2
+        assert read_variables(path, offsets[0], 10) == [
+            {"name": "Ada", "topic": "math, logic"},
+            {"name": "Alan", "topic": "multi\nline"}
+        ]
+    
+    def test_blank_lines_are_skipped(self, tmp_path):
+        count, _ = write_variables_file(io.BytesIO(b'{"a": 1}\n\n{"a": 2}\n'), tmp_path / "v", chunk_size=5)
+        
+        assert count == 2
+    
+    @pytest.mark.parametrize("content, message", [
+        (b'{"a": 1}\nnot json\n', "Line 2"),
+        (b'[1, 2]\n', "not a JSON object"),
+    ])
+    def test_malformed_files_are_rejected(self, tmp_path, content, message):
+        path = tmp_path / "v.ndjson"
+        
+        with pytest.raises(ValueError, match=message):
+            write_variables_file(io.BytesIO(content), path)
+        assert not path.exists()
+    
+    def test_row_limit(self, tmp_path):
+        with pytest.raises(ValueError, match="more than 3"):
+            write_variables_file(_source([{}] * 4), tmp_path / "v", max_items=3)
+    
+    def test_upload_stays_open(self, tmp_path):
+        source = _source([{"a": 1}])
+        
+        write_variables_file(source, tmp_path / "v")
+        
+        assert not source.closed
+
+
+@pytest.mark.unit
+class TestDatasetRunner:
+    """Test chunk claiming, checkpointing and resume."""
+    
+    async def test_all_items_generated_once(self, dataset_job):
+        processor = FakeProcessor(delay=0.001)
+        
+        await DatasetRunner(processor).run("id", workers=3)
+        
+        assert sorted(processor.calls) == list(range(1, 24))
+        indexes = sorted(d["index"] for d in dataset_job.items.documents)
+        assert indexes == list(range(1, 24))
+        first = next(d for d in dataset_job.items.documents if d["index"] == 1)
+        assert first["result"] == {"name": "row1", "shared": "x"}
+        
+        assert all(c["status"] == "completed" for c in dataset_job.chunks.documents)
+        assert dataset_job.document["status"] == "completed"
+        assert dataset_job.document["progress"] == 100
+        assert dataset_job.document["result_count"] == 23
+        assert dataset_job.document["total_tokens"] == 69
+        assert dataset_job.document["cost"] == pytest.approx(0.23)
+        assert dataset_job.document["prompt_rendered"] == "prompt"
+    
+    async def test_workers_share_chunks(self, dataset_job):
+        await DatasetRunner(FakeProcessor(delay=0.001)).run("id", workers=3)
+        
+        workers = {c["worker"] for c in dataset_job.chunks.documents}
+        assert len(workers) > 1
+        assert all(c["attempts"] == 1 for c in dataset_job.chunks.documents)
+    
+    async def test_resume_skips_completed_chunks(self, dataset_job):
+        chunks = dataset_job.chunks.documents
+        chunks[0].update(status="completed")
+        dataset_job.document["result_count"] = 5
+        # Abandoned by a crashed worker, with a partial item written
+        chunks[1].update(status="processing", worker="dead", heartbeat_at=datetime.utcnow() - timedelta(hours=1))
+        dataset_job.items.documents.append({"generation_id": dataset_job.generation.id, "index": 6, "result": {}})
+        processor = FakeProcessor()
+        
+        await DatasetRunner(processor).run("id", workers=2)
+        
+        assert sorted(processor.calls) == list(range(6, 24))
+        assert sorted(d["index"] for d in dataset_job.items.documents) == list(range(6, 24))
+        assert chunks[1]["attempts"] == 1
+        assert dataset_job.document["status"] == "completed"
+        assert dataset_job.document["result_count"] == 23
+    
+    async def test_live_claims_are_not_stolen(self, dataset_job):
+        chunks = dataset_job.chunks.documents
+        chunks[0].update(status="processing", worker="busy", heartbeat_at=datetime.utcnow())
+        processor = FakeProcessor()
+        
+        await DatasetRunner(processor).run("id", workers=1)
+        
+        assert 1 not in processor.calls
+        assert chunks[0]["worker"] == "busy"
+        # The job waits for the busy chunk
+        assert dataset_job.document["status"] == "processing"
+    
+    async def test_heartbeat_renews_claim_during_slow_items(self, dataset_job, monkeypatch):
+        monkeypatch.setattr(get_settings(), "dataset_heartbeat_seconds", 0.01)
+        renewals = []
+        
+        class CountingRunner(DatasetRunner):
+            async def _renew(self, chunk, worker):
+                renewals.append(chunk["chunk"])
+                return await super()._renew(chunk, worker)
+        
+        await CountingRunner(FakeProcessor(delay=0.02)).run("id", workers=1)
+        
+        # Every chunk is renewed while its items are generated, not just between them
+        assert set(renewals) == {0, 1, 2, 3, 4}
+        assert dataset_job.document["heartbeat_at"] is not None
+        assert dataset_job.document["status"] == "completed"
+    
+    async def test_taken_over_chunk_stops(self, dataset_job, monkeypatch):
+        monkeypatch.setattr(get_settings(), "dataset_heartbeat_seconds", 0.01)
+        chunks = dataset_job.chunks.documents
+        processor = FakeProcessor(delay=0.02)
+        
+        run = asyncio.create_task(DatasetRunner(processor).run("id", workers=1))
+        await asyncio.sleep(0.03)
+        chunks[0]["worker"] = "thief"
+        await run
+        
+        assert chunks[0]["status"] == "processing"
+        assert [n for n in processor.calls if n <= 5] != [1, 2, 3, 4, 5]
+        assert dataset_job.document["status"] == "processing"
+    
+    async def test_items_written_by_the_new_owner_stop_the_chunk(self, dataset_job):
+        chunks = dataset_job.chunks.documents
+        
+        class RacedProcessor(FakeProcessor):
+            async def generate_item(self, job, variables, index):
+                if index == 3:
+                    # The chunk is reclaimed and its new owner writes before the heartbeat notices
+                    chunks[0]["worker"] = "thief"
+                    dataset_job.items.documents.append(
+                        {"generation_id": dataset_job.generation.id, "index": 5, "result": {"by": "thief"}}
+                    )
+                return await super().generate_item(job, variables, index)
+        
+        await DatasetRunner(RacedProcessor()).run("id", workers=1)
+        
+        assert chunks[0]["status"] == "processing"
+        assert all(c["status"] == "completed" for c in chunks[1:])
+        last = [d["result"] for d in dataset_job.items.documents if d["index"] == 5]
+        assert last == [{"by": "thief"}]
+    
+    async def test_cancelled_job_stops(self, dataset_job):
+        dataset_job.document["status"] = "cancelled"
+        processor = FakeProcessor()
+        
+        await DatasetRunner(processor).run("id", workers=2)
+        
+        assert processor.calls == []
+    
+    @pytest.mark.parametrize("cancelled, status", [(False, "failed"), (True, "cancelled")])
+    async def test_prepare_failure_only_fails_a_processing_job(self, dataset_job, monkeypatch, cancelled, status):
+        class FailingProcessor(GenerationProcessor):
+            async def prepare_job(self, generation):
+                if cancelled:
+                    dataset_job.document["status"] = "cancelled"
+                raise ValueError("Template not found")
+        
+        monkeypatch.setattr(tasks_module, "Generation", SimpleNamespace(
+            get_motor_collection=lambda: dataset_job.generations
+        ))
+        
+        await DatasetRunner(FailingProcessor()).run("id", workers=1)
+        
+        assert dataset_job.document["status"] == status
+    
+    async def test_budget_is_shared_across_chunks(self, dataset_job):
+        dataset_job.generation.metadata["max_cost"] = 0.075
+        processor = FakeProcessor()
+        
+        await DatasetRunner(processor).run("id", workers=1)
+        
+        # Chunk 1 spends 0.05; chunk 2 stops once 0.08 >= 0.075
+        assert processor.calls == [1, 2, 3, 4, 5, 6, 7, 8]
+        errors = [d for d in dataset_job.items.documents if d["result"].get("error") == "Budget exceeded"]
+        assert len(errors) == 15
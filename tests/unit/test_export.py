@@ -0,0 +1,144 @@
+"""Unit tests for streaming exports."""
+import io
+import json
+import time
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+from app.generation.export import export_results, iter_export, render_binary, stream_export
+
+
+RESULTS = [
+    {"name": "John", "age": 30},
+    {"name": "Jane", "age": 25, "address": {"city": "Paris"}}
+]
+
+
+def _source(results):
+    async def open_results():
+        for result in results:
+            yield result
+    return open_results
+
+
+async def _collect(results, format, chunk_size=64 * 1024):
+    chunks = [chunk async for chunk in stream_export(_source(results), format, chunk_size)]
+    return chunks, b"".join(chunks).decode("utf-8")
+
+
+@pytest.mark.unit
+class TestStreamingExport:
+    """Test result-by-result export rendering."""
+    
+    async def test_json_stream_is_valid_json(self):
+        _, body = await _collect(RESULTS, "json")
+        assert json.loads(body) == RESULTS
+    
+    async def test_csv_columns_cover_all_results(self):
+        _, body = await _collect(RESULTS, "csv")
+        lines = body.splitlines()
+        assert lines[0] == "address.city,age,name"
+        assert lines[1] == ",30,John"
+        assert lines[2] == "Paris,25,Jane"
+    
+    async def test_html_falls_back_to_sections_for_nested_results(self):
+        _, body = await _collect(RESULTS, "html")
+        assert "<table>" not in body
+        assert "<h2>Result 2</h2>" in body
+        assert body.endswith("</body></html>")
+        
+        _, flat = await _collect(RESULTS[:1], "html")
+        assert "<th>age</th><th>name</th>" in flat
+        assert flat.endswith("</tbody></table></body></html>")
+    
+    async def test_xml_and_text_are_well_formed(self):
+        _, xml = await _collect(RESULTS, "xml")
+        assert xml.startswith("<results generated_at=")
+        assert '<result index="2"><name>Jane</name>' in xml
+        assert xml.endswith("</results>")
+        
+        _, text = await _collect(RESULTS, "txt")
+        assert "Result 2:\n" + "-" * 30 + "\nname: Jane" in text
+    
+    async def test_empty_results(self):
+        _, body = await _collect([], "markdown")
+        assert body == "# No Results\n"
+        _, body = await _collect([], "json")
+        assert body == "[]"
+    
+    async def test_output_is_chunked(self):
+        results = [{"value": "x" * 100, "index": i} for i in range(100)]
+        chunks, body = await _collect(results, "json", chunk_size=1000)
+        
+        assert len(chunks) > 5
+        assert len(json.loads(body)) == 100
+    
+    @pytest.mark.parametrize("format", ["markdown", "html", "xml", "txt"])
+    async def test_renders_with_a_fixed_timestamp_are_identical(self, format):
+        completed_at = datetime(2024, 5, 1, 12, 30)
+        
+        async def render():
+            chunks = stream_export(_source(RESULTS), format, generated_at=completed_at)
+            return b"".join([chunk async for chunk in chunks])
+        
+        first = await render()
+        assert first == await render()
+        assert completed_at.isoformat().encode() in first
+    
+    def test_in_memory_export_matches_stream_format(self):
+        markdown = export_results(RESULTS, "markdown")
+        assert markdown.startswith("# Generation Results\n\nGenerated at: ")
+        assert "\n\n## Result 1\n\n- **name**: John\n- **age**: 30" in markdown
+        assert "".join(iter_export(RESULTS, "csv")).startswith("address.city,age,name")
+
+
+@pytest.mark.unit
+class TestXLSXExport:
+    """Test the write-only XLSX writer."""
+    
+    def test_columns_in_first_seen_order(self):
+        content = render_binary("xlsx", RESULTS + [{"extra": [1, 2], "name": "Max"}])
+        rows = list(load_workbook(io.BytesIO(content)).active.values)
+        
+        assert rows[0] == ("name", "age", "address.city", "extra")
+        assert rows[1] == ("John", 30, None, None)
+        assert rows[2] == ("Jane", 25, "Paris", None)
+        assert rows[3] == ("Max", None, None, "[1, 2]")
+    
+    def test_schema_columns_from_a_single_pass(self):
+        schema = {"type": "object", "properties": {
+            "name": {"type": "string"},
+            "address": {"type": "object", "properties": {"city": {"type": "string"}}}
+        }}
+        
+        def results():
+            yield from RESULTS
+            yield {"name": "Max", "age": 41, "address": {"city": "Oslo", "zip": "0150"}}
+        
+        rows = list(load_workbook(io.BytesIO(render_binary("xlsx", results(), schema))).active.values)
+        
+        assert rows[0] == ("name", "address.city", "_extra")
+        assert rows[2] == ("Jane", "Paris", '{"age": 25}')
+        # Undeclared keys under a declared object are kept too
+        assert rows[3] == ("Max", "Oslo", '{"age": 41, "address": {"zip": "0150"}}')
+    
+    def test_empty_results(self):
+        content = render_binary("xlsx", [])
+        assert load_workbook(io.BytesIO(content)).sheetnames == ["Results"]
+    
+    @pytest.mark.slow
+    def test_10k_rows_benchmark(self):
+        results = [
+            {"title": f"Item {i}", "score": i * 0.5, "meta": {"tag": "bench", "rank": i}}
+            for i in range(10_000)
+        ]
+        
+        start = time.perf_counter()
+        content = render_binary("xlsx", results)
+        elapsed = time.perf_counter() - start
+        
+        sheet = load_workbook(io.BytesIO(content), read_only=True).active
+        assert sum(1 for _ in sheet.iter_rows(values_only=True)) == 10_001
+        assert elapsed < 5.0
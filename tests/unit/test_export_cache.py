@@ -0,0 +1,84 @@
+"""Unit tests for the export artifact cache."""
+import pytest
+
+from app.generation.export_cache import ExportCache, ExportUsage, parse_range
+
+
+async def _chunks(*parts, fail=False):
+    for part in parts:
+        yield part
+    if fail:
+        raise RuntimeError("client went away")
+
+
+@pytest.mark.unit
+class TestExportCache:
+    """Test storage, LRU eviction and range parsing."""
+    
+    async def test_store_and_get(self, tmp_path):
+        cache = ExportCache(directory=str(tmp_path), max_bytes=1000)
+        key = cache.key("gen1", "csv")
+        assert cache.get(key) is None
+        
+        await cache.store(key, b"a,b\n1,2\n")
+        
+        path = cache.get(key)
+        assert path.read_bytes() == b"a,b\n1,2\n"
+        assert cache.stats()["hits"] == 1
+        assert cache.key("gen1", "csv") != cache.key("gen1", "json")
+    
+    async def test_stream_is_published_only_when_complete(self, tmp_path):
+        cache = ExportCache(directory=str(tmp_path), max_bytes=1000)
+        
+        received = [chunk async for chunk in cache.store_stream("done", _chunks(b"ab", b"cd"))]
+        assert received == [b"ab", b"cd"]
+        assert cache.get("done").read_bytes() == b"abcd"
+        
+        with pytest.raises(RuntimeError):
+            async for _ in cache.store_stream("aborted", _chunks(b"ab", fail=True)):
+                pass
+        assert cache.get("aborted") is None
+        assert not list(tmp_path.glob("*/*.tmp"))
+    
+    async def test_evicts_least_recently_used(self, tmp_path):
+        cache = ExportCache(directory=str(tmp_path), max_bytes=25)
+        await cache.store("first", b"x" * 10)
+        await cache.store("second", b"x" * 10)
+        cache.get("first")
+        await cache.store("third", b"x" * 10)
+        
+        assert cache.contains("first")
+        assert not cache.contains("second")
+        assert cache.contains("third")
+        assert not (tmp_path / "se" / "second").exists()
+    
+    async def test_index_is_rebuilt_from_disk(self, tmp_path):
+        await ExportCache(directory=str(tmp_path), max_bytes=1000).store("kept", b"data")
+        
+        fresh = ExportCache(directory=str(tmp_path), max_bytes=1000)
+        assert fresh.get("kept").read_bytes() == b"data"
+    
+    async def test_read_range(self, tmp_path):
+        cache = ExportCache(directory=str(tmp_path), max_bytes=1000)
+        await cache.store("key", b"0123456789")
+        
+        body = b"".join([chunk async for chunk in cache.read(cache.get("key"), 2, 5)])
+        assert body == b"2345"
+    
+    def test_parse_range(self):
+        assert parse_range(None, 100) is None
+        assert parse_range("bytes=0-9", 100) == (0, 9)
+        assert parse_range("bytes=90-", 100) == (90, 99)
+        assert parse_range("bytes=-10", 100) == (90, 99)
+        assert parse_range("bytes=50-500", 100) == (50, 99)
+        assert parse_range("bytes=0-1,5-6", 100) is None
+        with pytest.raises(ValueError):
+            parse_range("bytes=100-", 100)
+    
+    def test_usage_top_formats(self):
+        usage = ExportUsage()
+        for format in ["csv", "xlsx", "csv", "json", "csv", "xlsx"]:
+            usage.record("user1", format)
+        
+        assert usage.top_formats("user1", 2) == ["csv", "xlsx"]
+        assert usage.top_formats("user2", 2) == []
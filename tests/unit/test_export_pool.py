@@ -0,0 +1,113 @@
+"""Unit tests for the export render pool."""
+import asyncio
+import io
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.generation import export_pool as export_pool_module
+from app.generation.export_pool import ExportBusyError, ExportRenderPool
+
+
+def _slow_render(format, results, output_schema=None):
+    time.sleep(0.3)
+    return b"done"
+
+
+@pytest.mark.unit
+class TestExportRenderPool:
+    """Test off-loop rendering, admission control and timeouts."""
+    
+    async def test_renders_xlsx_in_worker_process(self):
+        import openpyxl
+        
+        pool = ExportRenderPool(workers=1, max_pending=2, timeout=60)
+        try:
+            content = await pool.render("xlsx", [{"name": "John", "age": 30}])
+        finally:
+            pool.shutdown()
+        
+        sheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        assert [cell.value for cell in sheet[1]] == ["name", "age"]
+        assert pool.pending == 0
+    
+    async def test_rejects_when_saturated(self, monkeypatch):
+        monkeypatch.setattr(export_pool_module, "render_binary", _slow_render)
+        pool = ExportRenderPool(workers=0, max_pending=1, timeout=5)
+        
+        first = asyncio.create_task(pool.render("pdf", []))
+        await asyncio.sleep(0)
+        with pytest.raises(ExportBusyError):
+            await pool.render("pdf", [])
+        
+        assert await first == b"done"
+        await asyncio.sleep(0)
+        assert pool.pending == 0
+        pool.shutdown()
+    
+    async def test_timeout_keeps_slot_until_worker_finishes(self, monkeypatch):
+        monkeypatch.setattr(export_pool_module, "render_binary", _slow_render)
+        pool = ExportRenderPool(workers=0, max_pending=1, timeout=0.05)
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.render("pdf", [])
+        assert pool.pending == 1
+        
+        await asyncio.sleep(0.4)
+        assert pool.pending == 0
+        pool.shutdown()
+    
+    async def test_background_renders_leave_slots_for_users(self, monkeypatch):
+        monkeypatch.setattr(export_pool_module, "render_binary", _slow_render)
+        monkeypatch.setattr(get_settings(), "export_prebuild_max_pending", 1)
+        pool = ExportRenderPool(workers=0, max_pending=3, timeout=5)
+        
+        prebuild = asyncio.create_task(pool.render("pdf", [], background=True))
+        await asyncio.sleep(0)
+        assert not pool.has_capacity(background=True)
+        with pytest.raises(ExportBusyError):
+            await pool.render("pdf", [], background=True)
+        
+        # User downloads still get the remaining slots
+        assert pool.has_capacity()
+        download = asyncio.create_task(pool.render("pdf", []))
+        assert await asyncio.gather(prebuild, download) == [b"done", b"done"]
+        pool.shutdown()
+    
+    async def test_stream_feeds_thread_render_from_async_source(self):
+        import openpyxl
+        
+        schema = {"type": "object", "properties": {"n": {"type": "integer"}}}
+        fetched = []
+        
+        async def results():
+            for n in range(25):
+                fetched.append(n)
+                yield {"n": n}
+        
+        pool = ExportRenderPool(workers=0, max_pending=1, timeout=5)
+        content = await pool.render_stream("xlsx", results(), schema, batch_size=10)
+        pool.shutdown()
+        
+        rows = list(openpyxl.load_workbook(io.BytesIO(content)).active.values)
+        assert [row[0] for row in rows[1:]] == list(range(25))
+        assert fetched == list(range(25))
+    
+    async def test_stream_collects_results_for_multi_pass_formats(self, monkeypatch):
+        received = []
+        
+        def render(format, results, output_schema=None):
+            received.append(results)
+            return b"done"
+        
+        monkeypatch.setattr(export_pool_module, "render_binary", render)
+        
+        async def results():
+            yield {"n": 1}
+        
+        pool = ExportRenderPool(workers=0, max_pending=1, timeout=5)
+        assert await pool.render_stream("pdf", results()) == b"done"
+        pool.shutdown()
+        
+        assert received == [[{"n": 1}]]
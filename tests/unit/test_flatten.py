@@ -0,0 +1,185 @@
+"""Unit tests for schema-compiled result flattening."""
+import csv
+import io
+import json
+import time
+
+import pytest
+
+from app.generation.export import iter_export, stream_export
+from app.generation.flatten import EXTRA_COLUMN, Flattener, compile_flattener, flatten_into
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "details": {
+            "type": "object",
+            "properties": {
+                "rating": {"type": "number"},
+                "author": {"type": "object", "properties": {"name": {"type": "string"}}}
+            }
+        },
+        "tags": {"type": "array"}
+    }
+}
+
+
+def _legacy_csv(results):
+    """CSV as rendered before compiled flatteners: flatten, union keys, DictWriter."""
+    def flatten(d, parent_key=""):
+        items = []
+        for k, v in d.items():
+            new_key = f"{parent_key}.{k}" if parent_key else k
+            if isinstance(v, dict):
+                items.extend(flatten(v, new_key).items())
+            elif isinstance(v, list):
+                items.append((new_key, json.dumps(v)))
+            else:
+                items.append((new_key, v))
+        return dict(items)
+    
+    keys = set()
+    for result in results:
+        keys.update(flatten(result).keys())
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=sorted(keys))
+    writer.writeheader()
+    for result in results:
+        writer.writerow(flatten(result))
+    return output.getvalue()
+
+
+@pytest.mark.unit
+class TestFlattener:
+    """Test compiled and generic flatteners."""
+    
+    def test_compiled_columns_follow_schema(self):
+        flattener = compile_flattener(SCHEMA)
+        assert flattener.columns == [
+            "title", "details.rating", "details.author.name", "tags", EXTRA_COLUMN
+        ]
+    
+    def test_compiled_values_match_generic_flattening(self):
+        flattener = compile_flattener(SCHEMA)
+        result = {"title": "A", "details": {"rating": 4.5, "author": {"name": "Ann"}}, "tags": ["x"]}
+        flat = flatten_into(result, {})
+        assert flattener.values(result) == [flat.get(c) for c in flattener.columns[:-1]] + [None]
+    
+    def test_missing_paths_are_empty(self):
+        flattener = compile_flattener(SCHEMA)
+        assert flattener.values({}) == [None, None, None, None, None]
+        assert flattener.values({"details": {"author": {"name": {"first": "Ann"}}}})[2] == '{"first": "Ann"}'
+    
+    def test_non_object_at_object_path_is_kept(self):
+        flattener = compile_flattener(SCHEMA)
+        
+        values = flattener.values({"title": "A", "details": "n/a"})
+        
+        assert values[:4] == ["A", None, None, None]
+        assert json.loads(values[-1]) == {"details": "n/a"}
+    
+    def test_undeclared_keys_go_to_extra_column(self):
+        flattener = compile_flattener(SCHEMA)
+        values = flattener.values({"error": "timeout", "index": 3})
+        assert json.loads(values[-1]) == {"error": "timeout", "index": 3}
+    
+    def test_undeclared_nested_keys_are_kept(self):
+        schema = {"properties": {
+            "a": {"type": "object", "properties": {"x": {"type": "integer"}}},
+            "b": {"type": "string"}
+        }}
+        flattener = compile_flattener(schema)
+        
+        values = flattener.values({"a": {"x": 1, "y": 2}, "b": "q", "c": 3})
+        
+        assert values[:2] == [1, "q"]
+        assert json.loads(values[-1]) == {"a": {"y": 2}, "c": 3}
+    
+    def test_every_value_survives(self):
+        flattener = compile_flattener(SCHEMA)
+        result = {
+            "title": "A",
+            "details": {"rating": 4.5, "author": {"name": "Ann", "email": "a@x"}, "pages": 3},
+            "tags": ["x"],
+            "extra": {"deep": {"er": True}}
+        }
+        
+        values = flattener.values(result)
+        kept = dict(zip(flattener.columns[:-1], values))
+        flatten_into(json.loads(values[-1]), kept)
+        
+        assert kept == flatten_into(result, {})
+    
+    def test_odd_property_names(self):
+        flattener = compile_flattener({"properties": {"it's \"odd\"": {"type": "string"}}})
+        assert flattener.values({"it's \"odd\"": 1}) == [1, None]
+    
+    def test_dotted_property_names(self):
+        schema = {"properties": {
+            "v1.0": {"type": "string"},
+            "meta": {"type": "object", "properties": {"a.b": {"type": "integer"}}}
+        }}
+        flattener = compile_flattener(schema)
+        
+        assert flattener.columns == ["v1.0", "meta.a.b", EXTRA_COLUMN]
+        assert flattener.values({"v1.0": "x", "meta": {"a.b": 2}}) == ["x", 2, None]
+    
+    def test_no_schema_means_no_compiled_flattener(self):
+        assert compile_flattener(None) is None
+        assert compile_flattener({"type": "object"}) is None
+    
+    def test_generic_flattener(self):
+        flattener = Flattener(["a", "b.c"])
+        assert flattener.values({"b": {"c": [1]}}) == [None, "[1]"]
+
+
+@pytest.mark.unit
+class TestSchemaCSVExport:
+    """Test single-pass CSV/TSV rendering."""
+    
+    async def test_schema_stream_opens_results_once(self):
+        opened = []
+        
+        async def open_results():
+            opened.append(1)
+            yield {"title": "A", "details": {"rating": 1}}
+        
+        chunks = [c async for c in stream_export(open_results, "csv", output_schema=SCHEMA)]
+        body = b"".join(chunks).decode("utf-8")
+        assert len(opened) == 1
+        assert body.splitlines() == [
+            "title,details.rating,details.author.name,tags,_extra",
+            "A,1,,,"
+        ]
+    
+    def test_tsv_uses_tabs(self):
+        body = "".join(iter_export([{"title": "A", "tags": [1, 2]}], "tsv", SCHEMA))
+        assert body.splitlines()[1] == "A\t\t\t[1, 2]\t"
+    
+    def test_schemaless_csv_matches_previous_output(self):
+        results = [{"name": "John", "age": 30}, {"name": "Jane", "address": {"city": "Paris"}, "x": [1]}]
+        assert "".join(iter_export(results, "csv")) == _legacy_csv(results)
+    
+    @pytest.mark.slow
+    def test_compiled_csv_benchmark(self):
+        results = [
+            {
+                "title": f"Item {i}",
+                "details": {"rating": i * 0.5, "author": {"name": "Ann"}},
+                "tags": ["a", "b"]
+            }
+            for i in range(50_000)
+        ]
+        
+        start = time.perf_counter()
+        _legacy_csv(results)
+        legacy = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        body = "".join(iter_export(results, "csv", SCHEMA))
+        compiled = time.perf_counter() - start
+        
+        assert body.count("\n") == 50_001
+        assert compiled < legacy
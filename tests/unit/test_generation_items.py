@@ -0,0 +1,282 @@
+"""Unit tests for results stored in the generation_items collection."""
+import json
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app import migrate
+from app.generation import bulk_export, items as items_module, service as service_module
+from app.generation.items import ItemWriter, ItemsTakenOver, delete_items, iter_items
+from app.generation.pagination import HistoryTotal
+from app.generation.service import generation_service
+
+
+class FakeCursor:
+    """Async cursor over already-filtered documents."""
+    
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for name, order in reversed(keys):
+            self.documents = sorted(self.documents, key=lambda d: d[name], reverse=order < 0)
+        return self
+    
+    def batch_size(self, n):
+        return self
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in list(self.documents):
+            yield document
+
+
+class FakeCollection:
+    """In-memory motor collection supporting the operations the item store uses."""
+    
+    def __init__(self):
+        self.documents = []
+        self.inserts = 0
+        self.finds = 0
+    
+    @staticmethod
+    def _matches(document, query):
+        for key, condition in query.items():
+            if key == "results.0":
+                if bool(document.get("results")) != condition["$exists"]:
+                    return False
+            elif isinstance(condition, dict) and "$in" in condition:
+                if document.get(key) not in condition["$in"]:
+                    return False
+            elif document.get(key) != condition:
+                return False
+        return True
+    
+    async def insert_many(self, documents, ordered=True):
+        self.inserts += 1
+        for document in documents:
+            if any(
+                d["generation_id"] == document["generation_id"] and d["index"] == document["index"]
+                for d in self.documents
+            ):
+                raise BulkWriteError({"writeErrors": [{"code": 11000, "errmsg": "duplicate item"}]})
+            self.documents.append(dict(document))
+    
+    def find(self, query, projection=None):
+        self.finds += 1
+        matching = [dict(d) for d in self.documents if self._matches(d, query)]
+        return FakeCursor(matching)
+    
+    async def delete_many(self, query):
+        before = len(self.documents)
+        self.documents = [d for d in self.documents if not self._matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self.documents))
+    
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if self._matches(document, query):
+                document.update(update["$set"])
+
+
+class FakeModel:
+    """Document class whose motor collection is in memory."""
+    
+    def __init__(self):
+        self.collection = FakeCollection()
+    
+    def get_motor_collection(self):
+        return self.collection
+
+
+@pytest.fixture
+def item_store(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(items_module, "GenerationItem", model)
+    return model.collection
+
+
+@pytest.mark.unit
+class TestItemStore:
+    """Test writing and streaming generation items."""
+    
+    async def test_writer_batches_inserts(self, item_store):
+        generation_id = ObjectId()
+        writer = ItemWriter(generation_id, batch_size=10)
+        
+        for index in range(1, 26):
+            await writer.add(index, {"n": index})
+        assert item_store.inserts == 2 and writer.pending == 5
+        
+        await writer.flush()
+        assert item_store.inserts == 3
+        assert writer.written == 25
+    
+    async def test_duplicate_items_are_taken_over(self, item_store):
+        generation_id = ObjectId()
+        await ItemWriter(generation_id, batch_size=1).add(1, {"n": 1})
+        writer = ItemWriter(generation_id, batch_size=1)
+        
+        with pytest.raises(ItemsTakenOver):
+            await writer.add(1, {"n": 1})
+    
+    async def test_items_stream_in_index_order(self, item_store):
+        generation_id = ObjectId()
+        writer = ItemWriter(generation_id, batch_size=3)
+        for index in (3, 1, 2, 5, 4):
+            await writer.add(index, {"n": index})
+        await writer.flush()
+        await ItemWriter(ObjectId(), batch_size=1).add(1, {"n": "other"})
+        
+        results = [result async for result in iter_items(generation_id)]
+        
+        assert results == [{"n": n} for n in range(1, 6)]
+    
+    async def test_delete_items(self, item_store):
+        generation_id = ObjectId()
+        writer = ItemWriter(generation_id, batch_size=2)
+        await writer.add(1, {})
+        await writer.add(2, {})
+        
+        assert await delete_items(generation_id) == 2
+        assert [r async for r in iter_items(generation_id)] == []
+
+
+@pytest.mark.unit
+class TestServiceResults:
+    """Test result reads through the service."""
+    
+    @staticmethod
+    def _generation(results=()):
+        generation = SimpleNamespace(id=ObjectId(), results=list(results))
+        generation.dict_public = lambda: {"job_id": "job_1", "status": "completed", "results": generation.results}
+        return generation
+    
+    async def test_stream_result_is_valid_json(self, item_store):
+        generation = self._generation()
+        writer = ItemWriter(generation.id, batch_size=50)
+        for index in range(1, 251):
+            await writer.add(index, {"n": index, "text": "a \"quoted\" value"})
+        await writer.flush()
+        
+        chunks = [chunk async for chunk in generation_service.stream_generation_result(generation, batch_size=100)]
+        body = json.loads(b"".join(chunks))
+        
+        assert len(chunks) > 3
+        assert body["job_id"] == "job_1"
+        assert [r["n"] for r in body["results"]] == list(range(1, 251))
+    
+    async def test_stream_result_without_items(self, item_store):
+        chunks = [chunk async for chunk in generation_service.stream_generation_result(self._generation())]
+        
+        assert json.loads(b"".join(chunks))["results"] == []
+    
+    async def test_legacy_inline_results_are_used(self, item_store):
+        generation = self._generation([{"n": 1}, {"n": 2}])
+        
+        chunks = [chunk async for chunk in generation_service.stream_generation_result(generation)]
+        
+        assert json.loads(b"".join(chunks))["results"] == [{"n": 1}, {"n": 2}]
+    
+    async def test_iter_results_falls_back_to_inline_results(self, item_store, monkeypatch):
+        legacy_id = ObjectId()
+        
+        class LegacyCollection:
+            async def find_one(self, query, projection):
+                start, size = projection["results"]["$slice"]
+                return {"_id": legacy_id, "results": [{"n": n} for n in range(1, 4)][start:start + size]}
+        
+        monkeypatch.setattr(
+            service_module, "Generation", SimpleNamespace(get_motor_collection=lambda: LegacyCollection())
+        )
+        
+        results = [r async for r in generation_service.iter_results(legacy_id, batch_size=2)]
+        
+        assert results == [{"n": 1}, {"n": 2}, {"n": 3}]
+    
+    async def test_full_history_reads_items_with_one_query(self, item_store, monkeypatch):
+        generations = [self._generation(), self._generation([{"n": "inline"}]), self._generation()]
+        for generation, indexes in ((generations[0], (2, 1)), (generations[2], (1,))):
+            for index in indexes:
+                await ItemWriter(generation.id, batch_size=1).add(index, {"n": index})
+        
+        class Page:
+            def sort(self, *keys):
+                return self
+            
+            def skip(self, n):
+                return self
+            
+            def limit(self, n):
+                return self
+            
+            async def to_list(self):
+                return generations
+        
+        monkeypatch.setattr(service_module, "Generation", SimpleNamespace(find=lambda query: Page()))
+        
+        history = await generation_service.get_user_history(SimpleNamespace(id="u1"), total=HistoryTotal.NONE)
+        
+        assert [item["results"] for item in history["items"]] == [
+            [{"n": 1}, {"n": 2}], [{"n": "inline"}], [{"n": 1}]
+        ]
+        assert item_store.finds == 1
+    
+    async def test_bulk_export_attaches_items(self, item_store):
+        generation_id = ObjectId()
+        writer = ItemWriter(generation_id, batch_size=10)
+        await writer.add(1, {"n": 1})
+        await writer.flush()
+        
+        async def documents():
+            yield {"_id": generation_id, "job_id": "new"}
+            yield {"_id": ObjectId(), "job_id": "legacy", "results": [{"n": "inline"}]}
+        
+        attached = [d async for d in bulk_export.with_results(documents())]
+        
+        assert attached[0]["results"] == [{"n": 1}]
+        assert attached[1]["results"] == [{"n": "inline"}]
+
+
+@pytest.mark.unit
+class TestSplitMigration:
+    """Test moving inline results into generation_items."""
+    
+    @pytest.fixture
+    def collections(self, monkeypatch, item_store):
+        generations = FakeModel()
+        monkeypatch.setattr(migrate, "Generation", generations)
+        monkeypatch.setattr(migrate, "GenerationItem", SimpleNamespace(get_motor_collection=lambda: item_store))
+        return generations.collection, item_store
+    
+    async def test_migration_moves_results(self, collections):
+        generations, items = collections
+        legacy = ObjectId()
+        generations.documents = [
+            {"_id": legacy, "results": [{"n": n} for n in range(1, 251)]},
+            {"_id": ObjectId(), "results": [], "result_count": 3}
+        ]
+        
+        assert await migrate.split_generation_results(batch_size=100) == 1
+        
+        assert generations.documents[0]["results"] == []
+        assert generations.documents[0]["result_count"] == 250
+        assert items.inserts == 3
+        stored = sorted((d for d in items.documents if d["generation_id"] == legacy), key=lambda d: d["index"])
+        assert [d["index"] for d in stored] == list(range(1, 251))
+        assert stored[0]["result"] == {"n": 1}
+    
+    async def test_migration_is_repeatable(self, collections):
+        generations, items = collections
+        legacy = ObjectId()
+        generations.documents = [{"_id": legacy, "results": [{"n": 1}, {"n": 2}]}]
+        # Left over from an interrupted run
+        items.documents = [{"generation_id": legacy, "index": 1, "result": {"n": 1}}]
+        
+        assert await migrate.split_generation_results() == 1
+        assert await migrate.split_generation_results() == 0
+        assert len(items.documents) == 2
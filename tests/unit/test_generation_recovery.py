@@ -0,0 +1,397 @@
+"""Unit tests for checkpointed generation jobs and the stale job reaper."""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.config import get_settings
+from app.generation import items as items_module, recovery, tasks as tasks_module
+from app.generation.recovery import StaleJobReaper
+from app.generation.tasks import GenerationProcessor, ItemOutcome
+
+
+def _matches(document, query):
+    """Evaluate the MongoDB filter subset used for job leases."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, part) for part in condition):
+                return False
+            continue
+        value = document.get(key)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$lt" and not (value is not None and value < operand):
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def limit(self, n):
+        self.documents = self.documents[:n]
+        return self
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """In-memory motor collection."""
+    
+    def __init__(self):
+        self.documents = []
+    
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.documents if _matches(d, query)])
+    
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update.get("$set", {}))
+                for field, value in update.get("$inc", {}).items():
+                    document[field] = document.get(field, 0) + value
+                for field, value in update.get("$max", {}).items():
+                    document[field] = max(document.get(field, value), value)
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+    
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            key = (document["generation_id"], document["index"])
+            if any((d["generation_id"], d["index"]) == key for d in self.documents):
+                raise BulkWriteError({"writeErrors": [{"code": 11000, "errmsg": "duplicate item"}]})
+            self.documents.append(dict(document))
+
+
+class FakeGenerations:
+    """Generation document class over an in-memory collection."""
+    
+    def __init__(self):
+        self.collection = FakeCollection()
+    
+    def get_motor_collection(self):
+        return self.collection
+    
+    def add(self, **fields):
+        document = {
+            "_id": ObjectId(),
+            "job_id": "job_1",
+            "kind": "generation",
+            "user_id": "user_1",
+            "status": "pending",
+            "progress": 0,
+            "count": 5,
+            "variables": {},
+            "metadata": {},
+            "attempts": 0,
+            "worker": None,
+            "heartbeat_at": None,
+            "started_at": None,
+            "created_at": datetime.utcnow(),
+            **fields
+        }
+        self.collection.documents.append(document)
+        return document
+    
+    async def get(self, generation_id):
+        document = next(d for d in self.collection.documents if d["_id"] == ObjectId(generation_id))
+        generation = SimpleNamespace(id=document["_id"], **{k: v for k, v in document.items() if k != "_id"})
+        return generation
+
+
+class FakeProcessor(GenerationProcessor):
+    """Processor whose items are generated without a provider."""
+    
+    def __init__(self, fail_at=None, delay=0.0):
+        super().__init__()
+        self.fail_at = fail_at
+        self.delay = delay
+        self.calls = []
+    
+    async def prepare_job(self, generation):
+        return SimpleNamespace(max_cost=generation.metadata.get("max_cost"))
+    
+    async def generate_item(self, job, base_variables, index):
+        if index == self.fail_at:
+            raise RuntimeError("process killed")
+        self.calls.append(index)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return ItemOutcome(
+            result={"n": index},
+            prompt="prompt",
+            fallback="ollama/llama" if index == 2 else None,
+            total_tokens=3,
+            prompt_tokens=1,
+            completion_tokens=2,
+            cost=0.01
+        )
+
+
+class TakeoverProcessor(FakeProcessor):
+    """Processor whose job is taken over by another worker while it generates an item."""
+    
+    def __init__(self, store, at, write=False):
+        super().__init__(fail_at=at if not write else None)
+        self.store = store
+        self.at = at
+        self.write = write
+    
+    async def generate_item(self, job, base_variables, index):
+        if index == self.at:
+            document = self.store.generations.collection.documents[0]
+            document.update(worker="other", heartbeat_at=datetime.utcnow())
+            if self.write:
+                self.store.items.documents.append({"generation_id": document["_id"], "index": index})
+        return await super().generate_item(job, base_variables, index)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    generations = FakeGenerations()
+    item_store = FakeCollection()
+    monkeypatch.setattr(tasks_module, "Generation", generations)
+    monkeypatch.setattr(recovery, "Generation", generations)
+    monkeypatch.setattr(items_module, "GenerationItem", SimpleNamespace(get_motor_collection=lambda: item_store))
+    monkeypatch.setattr(get_settings(), "export_prebuild_formats", 0)
+    return SimpleNamespace(generations=generations, items=item_store)
+
+
+def _stale():
+    return datetime.utcnow() - timedelta(seconds=get_settings().generation_stale_seconds + 1)
+
+
+@pytest.mark.unit
+class TestCheckpointedGeneration:
+    """Test per-item checkpoints and resuming from them."""
+    
+    async def test_items_are_checkpointed_as_generated(self, store):
+        document = store.generations.add()
+        
+        await FakeProcessor(fail_at=4).process_generation(str(document["_id"]))
+        
+        # The failure stops the job, but the first three items survive it
+        assert sorted(d["index"] for d in store.items.documents) == [1, 2, 3]
+        assert store.items.documents[0]["usage"]["cost"] == 0.01
+        assert document["prompt_rendered"] == "prompt"
+        assert document["status"] == "failed"
+        assert document["progress"] == 0
+    
+    async def test_resume_generates_only_missing_items(self, store):
+        document = store.generations.add()
+        await FakeProcessor(fail_at=4).process_generation(str(document["_id"]))
+        # The process died instead of failing the job
+        document.update(status="processing", heartbeat_at=_stale())
+        processor = FakeProcessor()
+        
+        await processor.process_generation(str(document["_id"]))
+        
+        assert processor.calls == [4, 5]
+        assert sorted(d["index"] for d in store.items.documents) == [1, 2, 3, 4, 5]
+        assert document["status"] == "completed"
+        assert document["attempts"] == 2
+        assert document["result_count"] == 5
+        # Usage of items from the first attempt is kept
+        assert document["total_tokens"] == 15
+        assert document["cost"] == pytest.approx(0.05)
+        assert document["metadata.fallbacks_used"] == {"ollama/llama": 1}
+    
+    async def test_budget_counts_resumed_usage(self, store):
+        document = store.generations.add(metadata={"max_cost": 0.025})
+        store.items.documents = [
+            {"generation_id": document["_id"], "index": n, "result": {}, "usage": {"cost": 0.01}}
+            for n in (1, 2)
+        ]
+        document.update(status="processing", heartbeat_at=_stale())
+        processor = FakeProcessor()
+        
+        await processor.process_generation(str(document["_id"]))
+        
+        assert processor.calls == [3]
+        errors = [d["index"] for d in store.items.documents if d["result"].get("error") == "Budget exceeded"]
+        assert errors == [4, 5]
+    
+    async def test_live_lease_is_not_taken(self, store):
+        document = store.generations.add(status="processing", worker="other", heartbeat_at=datetime.utcnow())
+        processor = FakeProcessor()
+        
+        await processor.process_generation(str(document["_id"]))
+        
+        assert processor.calls == []
+        assert document["worker"] == "other"
+    
+    async def test_cancelled_job_stops_at_next_checkpoint(self, store):
+        document = store.generations.add()
+        processor = FakeProcessor()
+        original = processor.generate_item
+        
+        async def cancel_after_second(job, variables, index):
+            if index == 2:
+                document["status"] = "cancelled"
+            return await original(job, variables, index)
+        
+        processor.generate_item = cancel_after_second
+        await processor.process_generation(str(document["_id"]))
+        
+        assert processor.calls == [1, 2]
+        assert document["status"] == "cancelled"
+    
+    async def test_heartbeat_renews_lease_during_slow_items(self, store, monkeypatch):
+        monkeypatch.setattr(get_settings(), "generation_heartbeat_seconds", 0.01)
+        document = store.generations.add(count=1)
+        beats = []
+        update_one = store.generations.collection.update_one
+        
+        async def record(query, update):
+            if set(update["$set"]) == {"heartbeat_at"}:
+                beats.append(update["$set"]["heartbeat_at"])
+            return await update_one(query, update)
+        
+        monkeypatch.setattr(store.generations.collection, "update_one", record)
+        await FakeProcessor(delay=0.05).process_generation(str(document["_id"]))
+        
+        assert len(beats) >= 2
+        assert document["status"] == "completed"
+    
+    async def test_outcomes_are_rolled_up(self, store, monkeypatch):
+        recorded = []
+        
+        async def record(generation, **outcome):
+            recorded.append(outcome)
+        
+        monkeypatch.setattr(tasks_module.usage_rollups, "record", record)
+        completed = store.generations.add(count=2)
+        failed = store.generations.add(count=2)
+        
+        await FakeProcessor().process_generation(str(completed["_id"]))
+        await FakeProcessor(fail_at=2).process_generation(str(failed["_id"]))
+        
+        done, crashed = recorded
+        assert done["completed"] == 1 and done["items"] == 2
+        assert done["usage"]["cost"] == pytest.approx(0.02)
+        assert crashed["failed"] == 1 and crashed["usage"]["cost"] == pytest.approx(0.01)
+    
+    async def test_lost_lease_does_not_fail_the_new_owner(self, store, monkeypatch):
+        recorded = []
+        
+        async def record(generation, **outcome):
+            recorded.append(outcome)
+        
+        monkeypatch.setattr(tasks_module.usage_rollups, "record", record)
+        document = store.generations.add(count=3)
+        
+        await TakeoverProcessor(store, at=2).process_generation(str(document["_id"]))
+        
+        assert document["status"] == "processing"
+        assert document["worker"] == "other"
+        assert recorded == []
+    
+    async def test_duplicate_items_mean_taken_over(self, store, monkeypatch):
+        recorded = []
+        
+        async def record(generation, **outcome):
+            recorded.append(outcome)
+        
+        monkeypatch.setattr(tasks_module.usage_rollups, "record", record)
+        document = store.generations.add(count=3)
+        
+        await TakeoverProcessor(store, at=2, write=True).process_generation(str(document["_id"]))
+        
+        assert document["status"] == "processing"
+        assert document.get("error_message") is None
+        assert recorded == []
+    
+    async def test_export_prebuild_task_is_kept_until_done(self, store, monkeypatch):
+        from app.generation.service import generation_service
+        
+        monkeypatch.setattr(get_settings(), "export_prebuild_formats", 1)
+        release = asyncio.Event()
+        built = []
+        
+        async def prebuild(generation_id, user_id):
+            await release.wait()
+            built.append(generation_id)
+        
+        monkeypatch.setattr(generation_service, "prebuild_exports", prebuild)
+        document = store.generations.add(count=1)
+        processor = FakeProcessor()
+        
+        await processor.process_generation(str(document["_id"]))
+        
+        assert len(processor._background) == 1
+        release.set()
+        await asyncio.gather(*processor._background)
+        await asyncio.sleep(0)
+        assert built == [document["_id"]]
+        assert processor._background == set()
+    
+    async def test_repeatedly_abandoned_job_fails(self, store):
+        document = store.generations.add(
+            status="processing", heartbeat_at=_stale(), attempts=get_settings().generation_max_attempts
+        )
+        processor = FakeProcessor()
+        
+        await processor.process_generation(str(document["_id"]))
+        
+        assert processor.calls == []
+        assert document["status"] == "failed"
+
+
+@pytest.mark.unit
+class TestStaleJobReaper:
+    """Test finding and resuming abandoned jobs."""
+    
+    async def test_only_abandoned_jobs_are_resumed(self, store):
+        add = store.generations.add
+        stale = add(status="processing", heartbeat_at=_stale())
+        legacy = add(status="processing", started_at=_stale())
+        lost_pending = add(created_at=_stale())
+        add()  # Just created, its task is about to start
+        add(status="processing", heartbeat_at=datetime.utcnow())
+        add(status="completed", heartbeat_at=_stale())
+        dataset = add(kind="dataset", status="processing", heartbeat_at=_stale())
+        add(kind="dataset", status="processing", heartbeat_at=datetime.utcnow())
+        resumed, datasets = [], []
+        
+        assert await StaleJobReaper(resume=resumed.append, resume_dataset=datasets.append).reap() == 4
+        
+        assert resumed == [str(d["_id"]) for d in (stale, legacy, lost_pending)]
+        assert datasets == [str(dataset["_id"])]
+    
+    async def test_reaped_job_is_completed(self, store, monkeypatch):
+        document = store.generations.add(status="processing", heartbeat_at=_stale())
+        processor = FakeProcessor()
+        tasks = []
+        reaper = StaleJobReaper(
+            resume=lambda generation_id: tasks.append(
+                asyncio.create_task(processor.process_generation(generation_id))
+            )
+        )
+        
+        await reaper.reap()
+        await asyncio.gather(*tasks)
+        
+        assert document["status"] == "completed"
+        assert reaper.stats() == {"sweeps": 1, "resumed": 1}
+    
+    async def test_background_sweeps(self, store):
+        reaper = StaleJobReaper(resume=lambda generation_id: None, interval=0.01)
+        
+        reaper.start()
+        await asyncio.sleep(0.05)
+        await reaper.stop()
+        
+        assert reaper.stats()["sweeps"] >= 2
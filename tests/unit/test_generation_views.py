@@ -0,0 +1,214 @@
+"""Unit tests for projected generation views."""
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from beanie import PydanticObjectId
+from beanie.odm.utils.projection import get_projection
+from fastapi import HTTPException
+
+from app.api.generation import _resolve_view, _select_fields
+from app.generation import service as service_module
+from app.generation.service import generation_service
+from app.models.generation import (
+    GENERATION_VIEW_FIELDS,
+    GENERATION_VIEW_MODELS,
+    GenerationStatusView,
+    GenerationSummaryView,
+    GenerationView,
+    view_for_fields
+)
+
+
+def _document(results=100):
+    """Raw generation document as stored in MongoDB."""
+    return {
+        "_id": PydanticObjectId(),
+        "job_id": "job_1",
+        "user_id": "u1",
+        "template_id": "t1",
+        "provider": "openrouter",
+        "model": "m",
+        "variables": {"topic": "x" * 1000},
+        "count": results,
+        "status": "completed",
+        "progress": 100,
+        "error_message": None,
+        "results": [{"answer": "y" * 500} for _ in range(results)],
+        "total_tokens": 10,
+        "prompt_tokens": 4,
+        "completion_tokens": 6,
+        "cost": 0.01,
+        "created_at": datetime(2024, 1, 1),
+        "started_at": datetime(2024, 1, 1),
+        "completed_at": datetime(2024, 1, 1),
+        "metadata": {}
+    }
+
+
+def _project(document, model):
+    """Apply a view's projection the way MongoDB would."""
+    projected = {}
+    for name, spec in get_projection(model).items():
+        if spec == 1:
+            projected[name] = document[name]
+        else:
+            projected[name] = len(document.get("results") or [])
+    return model.model_validate(projected)
+
+
+class FakeCursor:
+    """Chainable stand-in for a Beanie find query."""
+    
+    def __init__(self, documents):
+        self.documents = documents
+        self.projection_model = None
+    
+    def sort(self, *args):
+        return self
+    
+    def skip(self, n):
+        return self
+    
+    def limit(self, n):
+        return self
+    
+    def project(self, model):
+        self.projection_model = model
+        return self
+    
+    async def count(self):
+        return len(self.documents)
+    
+    async def to_list(self):
+        return [_project(d, self.projection_model) for d in self.documents]
+
+
+class FakeGeneration:
+    """Stand-in for the Generation document that applies projections."""
+    
+    documents = []
+    calls = []
+    cursors = []
+    
+    @classmethod
+    async def find_one(cls, query, projection_model=None):
+        cls.calls.append(projection_model)
+        document = next((d for d in cls.documents if d["job_id"] == query["job_id"]), None)
+        return _project(document, projection_model) if document else None
+    
+    @classmethod
+    def find(cls, query):
+        cursor = FakeCursor(cls.documents)
+        cls.cursors.append(cursor)
+        return cursor
+
+
+@pytest.fixture
+def fake_generations(monkeypatch):
+    monkeypatch.setattr(service_module, "Generation", FakeGeneration)
+    FakeGeneration.documents = [_document()]
+    FakeGeneration.calls = []
+    FakeGeneration.cursors = []
+    return FakeGeneration
+
+
+@pytest.mark.unit
+class TestViewModels:
+    """Test the projection models."""
+    
+    def test_status_projection_excludes_payload_fields(self):
+        projection = get_projection(GenerationStatusView)
+        
+        assert "_id" in projection and "status" in projection
+        assert not {"results", "variables", "metadata"} & set(projection)
+    
+    def test_summary_counts_results_server_side(self):
+        projection = get_projection(GenerationSummaryView)
+        
+        assert "results" not in projection
+        assert projection["result_count"] == {
+            "$max": ["$result_count", {"$size": {"$ifNull": ["$results", []]}}]
+        }
+        assert set(projection) - {"_id"} == set(GenerationSummaryView.model_fields) - {"id"}
+    
+    def test_dict_public_matches_declared_fields(self):
+        for view, model in GENERATION_VIEW_MODELS.items():
+            data = _project(_document(), model).dict_public()
+            assert tuple(data) == GENERATION_VIEW_FIELDS[view]
+    
+    def test_status_view_is_small(self):
+        document = _document(results=1000)
+        
+        data = _project(document, GenerationStatusView).dict_public()
+        
+        assert len(json.dumps(data)) < 400
+        assert data["status"] == "completed"
+    
+    def test_views_are_subsets(self):
+        status = set(GENERATION_VIEW_FIELDS[GenerationView.STATUS])
+        summary = set(GENERATION_VIEW_FIELDS[GenerationView.SUMMARY])
+        full = set(GENERATION_VIEW_FIELDS[GenerationView.FULL])
+        
+        assert status < summary < full
+
+
+@pytest.mark.unit
+class TestFieldSelection:
+    """Test mapping of the view/fields parameters."""
+    
+    def test_smallest_view_is_chosen(self):
+        assert view_for_fields(["status", "progress"]) == GenerationView.STATUS
+        assert view_for_fields(["status", "cost"]) == GenerationView.SUMMARY
+        assert view_for_fields(["results"]) == GenerationView.FULL
+    
+    def test_unknown_fields(self):
+        with pytest.raises(ValueError, match="bogus"):
+            view_for_fields(["status", "bogus"])
+        with pytest.raises(HTTPException) as error:
+            _resolve_view(None, "status,bogus")
+        assert error.value.status_code == 400
+    
+    def test_resolve_view(self):
+        assert _resolve_view(None, None) == (GenerationView.FULL, None)
+        assert _resolve_view(GenerationView.STATUS, None) == (GenerationView.STATUS, None)
+        assert _resolve_view(None, "status, progress,status") == (GenerationView.STATUS, ["status", "progress"])
+        # A larger explicit view is kept, a smaller one is widened
+        assert _resolve_view(GenerationView.SUMMARY, "status")[0] == GenerationView.SUMMARY
+        assert _resolve_view(GenerationView.STATUS, "cost")[0] == GenerationView.SUMMARY
+    
+    def test_select_fields(self):
+        data = {"status": "completed", "progress": 100, "cost": 1.0}
+        
+        assert _select_fields(data, ["progress"]) == {"progress": 100}
+        assert _select_fields(data, None) is data
+
+
+@pytest.mark.unit
+class TestServiceViews:
+    """Test that the service reads through projections."""
+    
+    async def test_status_view_uses_projection(self, fake_generations):
+        user = SimpleNamespace(id="u1")
+        
+        data = await generation_service.get_generation_view("job_1", user, GenerationView.STATUS)
+        
+        assert fake_generations.calls == [GenerationStatusView]
+        assert data["progress"] == 100
+        assert "results" not in data
+    
+    async def test_missing_job(self, fake_generations):
+        user = SimpleNamespace(id="u1")
+        
+        assert await generation_service.get_generation_view("nope", user, GenerationView.STATUS) is None
+    
+    async def test_history_summary(self, fake_generations):
+        user = SimpleNamespace(id="u1")
+        
+        history = await generation_service.get_user_history(user, view=GenerationView.SUMMARY)
+        
+        assert fake_generations.cursors[-1].projection_model is GenerationSummaryView
+        assert history["total"] == 1
+        assert history["items"][0]["result_count"] == 100
+        assert "results" not in history["items"][0]
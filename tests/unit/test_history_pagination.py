@@ -0,0 +1,247 @@
+"""Unit tests for keyset-paginated generation history."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.generation import get_generation_history
+from app.generation import service as service_module
+from app.generation.pagination import (
+    CountCache,
+    HistoryTotal,
+    decode_cursor,
+    encode_cursor,
+    history_counts,
+    keyset_filter
+)
+from app.generation.service import generation_service
+from app.models.generation import GenerationView
+
+
+def _matches(document, query):
+    """Evaluate the subset of MongoDB filters the history query uses."""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(document, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(document, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document[key]
+            for operator, operand in condition.items():
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+        elif document[key] != condition:
+            return False
+    return True
+
+
+class FakeDocument(SimpleNamespace):
+    """History item returned by the fake query."""
+    
+    def dict_public(self):
+        return {"id": str(self.id), "created_at": self.created_at.isoformat(), "results": []}
+
+
+class FakeFind:
+    """In-memory find query supporting sort by (created_at, _id) descending."""
+    
+    def __init__(self, owner, query):
+        self.owner = owner
+        self.query = query
+        self._skip = 0
+        self._limit = None
+    
+    def sort(self, *keys):
+        assert keys == ("-created_at", "-_id")
+        return self
+    
+    def skip(self, n):
+        self._skip = n
+        return self
+    
+    def limit(self, n):
+        self._limit = n
+        return self
+    
+    def project(self, model):
+        return self
+    
+    def _matching(self):
+        documents = [d for d in self.owner.documents if _matches(d, self.query)]
+        return sorted(documents, key=lambda d: (d["created_at"], d["_id"]), reverse=True)
+    
+    async def count(self):
+        self.owner.counts += 1
+        return len(self._matching())
+    
+    async def to_list(self):
+        self.owner.scanned += self._skip
+        page = self._matching()[self._skip:self._skip + self._limit]
+        return [FakeDocument(id=d["_id"], created_at=d["created_at"]) for d in page]
+
+
+class FakeGeneration:
+    """Stand-in for the Generation document."""
+    
+    documents = []
+    counts = 0
+    scanned = 0
+    
+    @classmethod
+    def find(cls, query):
+        return FakeFind(cls, query)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """250 generations of one user; every 10 share a creation time."""
+    async def no_items(generation_ids):
+        return {generation_id: [] for generation_id in generation_ids}
+    
+    monkeypatch.setattr(service_module, "Generation", FakeGeneration)
+    monkeypatch.setattr(service_module, "load_results", no_items)
+    start = datetime(2024, 1, 1)
+    FakeGeneration.documents = [
+        {"_id": ObjectId(), "user_id": "u1", "created_at": start + timedelta(seconds=i // 10)}
+        for i in range(250)
+    ] + [{"_id": ObjectId(), "user_id": "u2", "created_at": start}]
+    FakeGeneration.counts = 0
+    FakeGeneration.scanned = 0
+    history_counts.clear()
+    yield FakeGeneration
+    history_counts.clear()
+
+
+USER = SimpleNamespace(id="u1")
+
+
+@pytest.mark.unit
+class TestCursor:
+    """Test cursor encoding."""
+    
+    def test_round_trip(self):
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+        id = ObjectId()
+        
+        assert decode_cursor(encode_cursor(created_at, id)) == (created_at, id)
+    
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor(datetime.utcnow(), ObjectId())
+        
+        assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    
+    @pytest.mark.parametrize("cursor", ["", "garbage", "e30", encode_cursor(datetime.utcnow(), "nope")])
+    def test_malformed_cursors(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+    
+    def test_keyset_filter_breaks_ties_by_id(self):
+        created_at = datetime(2024, 1, 1)
+        low, high = sorted([ObjectId(), ObjectId()])
+        condition = keyset_filter(created_at, high)
+        
+        assert _matches({"created_at": created_at, "_id": low}, condition)
+        assert not _matches({"created_at": created_at, "_id": high}, condition)
+        assert _matches({"created_at": created_at - timedelta(seconds=1), "_id": high}, condition)
+
+
+@pytest.mark.unit
+class TestKeysetHistory:
+    """Test paging through history with next_cursor."""
+    
+    async def test_pages_cover_history_once(self, history):
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            page = await generation_service.get_user_history(USER, limit=20, cursor=cursor)
+            seen.extend(item["id"] for item in page["items"])
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        
+        assert pages == 13
+        assert len(seen) == len(set(seen)) == 250
+        expected = sorted(
+            (d for d in history.documents if d["user_id"] == "u1"),
+            key=lambda d: (d["created_at"], d["_id"]),
+            reverse=True
+        )
+        assert seen == [str(d["_id"]) for d in expected]
+        # Nothing was skipped over and the total was counted once
+        assert history.scanned == 0
+        assert history.counts == 1
+    
+    async def test_last_page_has_no_cursor(self, history):
+        page = await generation_service.get_user_history(USER, limit=250)
+        
+        assert len(page["items"]) == 250
+        assert page["next_cursor"] is None
+        assert page["total"] == 250
+        assert history.counts == 0
+    
+    async def test_total_modes(self, history):
+        none = await generation_service.get_user_history(USER, limit=5, total=HistoryTotal.NONE)
+        assert none["total"] is None
+        assert history.counts == 0
+        
+        await generation_service.get_user_history(USER, limit=5, total=HistoryTotal.CACHED)
+        await generation_service.get_user_history(USER, limit=5, total=HistoryTotal.CACHED)
+        assert history.counts == 1
+        
+        exact = await generation_service.get_user_history(USER, limit=5, total=HistoryTotal.EXACT)
+        assert exact["total"] == 250
+        assert history.counts == 2
+    
+    async def test_skip_still_supported(self, history):
+        page = await generation_service.get_user_history(USER, skip=240, limit=20)
+        
+        assert len(page["items"]) == 10
+        assert page["next_cursor"] is None
+        assert page["total"] == 250
+    
+    async def test_skip_past_the_end_counts(self, history):
+        page = await generation_service.get_user_history(USER, skip=1000, limit=20, total=HistoryTotal.EXACT)
+        
+        assert page["items"] == []
+        assert page["total"] == 250
+    
+    async def test_invalid_cursor_is_a_bad_request(self, history):
+        with pytest.raises(HTTPException) as error:
+            await get_generation_history(
+                skip=0, limit=20, status=None, template_id=None, created_from=None,
+                created_to=None, view=GenerationView.FULL, fields=None, cursor="garbage",
+                total=HistoryTotal.CACHED, current_user=USER
+            )
+        assert error.value.status_code == 400
+
+
+@pytest.mark.unit
+class TestCountCache:
+    """Test the history total cache."""
+    
+    def test_expiry_and_size(self):
+        cache = CountCache(ttl=60, max_size=2)
+        cache.set({"user_id": "a"}, 1)
+        cache.set({"user_id": "b"}, 2)
+        cache.set({"user_id": "c"}, 3)
+        
+        assert cache.get({"user_id": "a"}) is None
+        assert cache.get({"user_id": "c"}) == 3
+        
+        expired = CountCache(ttl=0, max_size=2)
+        expired.set({"user_id": "a"}, 1)
+        assert expired.get({"user_id": "a"}) is None
+    
+    def test_key_covers_filters(self):
+        created = {"user_id": "a", "created_at": {"$gte": datetime(2024, 1, 1)}}
+        
+        assert CountCache.key(created) != CountCache.key({"user_id": "a"})
+        assert CountCache.key({"a": 1, "b": 2}) == CountCache.key({"b": 2, "a": 1})
@@ -0,0 +1,107 @@
+"""Unit tests for the pooled OAuth client, ID token verification and GitHub lookups."""
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+
+from app.auth import oauth
+from app.config import get_settings
+from tests.mock_oauth import MockOAuthServer
+
+
+@pytest.fixture
+async def mock_oauth_server(monkeypatch):
+    server = MockOAuthServer()
+    monkeypatch.setattr(get_settings(), "google_client_id", server.client_id)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app))
+    oauth.set_oauth_client(client)
+    oauth.metadata_cache.clear()
+    yield server
+    await client.aclose()
+    oauth.set_oauth_client(None)
+    oauth.metadata_cache.clear()
+
+
+async def _google_login(code="code"):
+    token_data = await oauth.exchange_google_code(code, "http://test/callback")
+    return await oauth.get_google_identity(token_data)
+
+
+@pytest.mark.unit
+class TestOAuthClient:
+    """Test OAuth provider calls against the mock server."""
+    
+    async def test_providers_share_one_client(self, mock_oauth_server):
+        assert oauth.get_google_oauth().http is oauth.get_github_oauth().http
+    
+    async def test_google_login_uses_id_token_without_userinfo(self, mock_oauth_server):
+        for _ in range(5):
+            identity = await _google_login()
+        
+        assert identity == {
+            "id": "google-user-1",
+            "email": "mock@example.com",
+            "name": "Mock User",
+            "email_verified": True
+        }
+        assert mock_oauth_server.requests["/oauth2/v2/userinfo"] == 0
+        assert mock_oauth_server.requests["/.well-known/openid-configuration"] == 1
+        assert mock_oauth_server.requests["/oauth2/v3/certs"] == 1
+    
+    async def test_invalid_id_token_falls_back_to_userinfo(self, mock_oauth_server):
+        token_data = {
+            "access_token": "at",
+            "id_token": mock_oauth_server.id_token("at", aud="someone-else")
+        }
+        identity = await oauth.get_google_identity(token_data)
+        assert identity["id"] == "google-user-1"
+        assert mock_oauth_server.requests["/oauth2/v2/userinfo"] == 1
+    
+    async def test_key_rotation_refetches_jwks(self, mock_oauth_server, monkeypatch):
+        monkeypatch.setattr(oauth.metadata_cache, "MIN_REFRESH_INTERVAL", 0.0)
+        await _google_login()
+        mock_oauth_server.rotate_keys()
+        
+        identity = await _google_login()
+        assert identity["email"] == "mock@example.com"
+        assert mock_oauth_server.requests["/oauth2/v3/certs"] == 2
+        assert mock_oauth_server.requests["/oauth2/v2/userinfo"] == 0
+    
+    async def test_concurrent_logins_fetch_metadata_once(self, mock_oauth_server):
+        mock_oauth_server.latency = 0.01
+        await asyncio.gather(*[_google_login() for _ in range(10)])
+        assert mock_oauth_server.requests["/oauth2/v3/certs"] == 1
+    
+    async def test_github_user_and_emails_are_fetched_concurrently(self, mock_oauth_server):
+        mock_oauth_server.latency = 0.05
+        start = time.perf_counter()
+        user = await oauth.get_github_user_info("token")
+        elapsed = time.perf_counter() - start
+        
+        assert user["email"] == "octo@example.com"
+        assert mock_oauth_server.requests["/user/emails"] == 1
+        assert elapsed < 0.09
+    
+    @pytest.mark.slow
+    async def test_google_callback_latency_benchmark(self, mock_oauth_server):
+        mock_oauth_server.latency = 0.02
+        google = oauth.get_google_oauth()
+        
+        async def userinfo_login():
+            token_data = await google.exchange_code_for_token("code", "http://test/callback")
+            return await google.get_user_info(token_data["access_token"])
+        
+        async def p50(login):
+            samples = []
+            for _ in range(20):
+                start = time.perf_counter()
+                await login()
+                samples.append(time.perf_counter() - start)
+            return statistics.median(samples)
+        
+        await _google_login()  # warm the discovery/JWKS cache
+        baseline = await p50(userinfo_login)
+        verified = await p50(_google_login)
+        assert verified < baseline * 0.75
@@ -0,0 +1,109 @@
+"""Unit tests for pooled password hashing."""
+import asyncio
+import time
+
+import pytest
+from passlib.context import CryptContext
+
+from app.auth import password
+from app.auth.password import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture
+def fast_context(monkeypatch):
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    monkeypatch.setattr(password, "pwd_context", context)
+    return context
+
+
+async def _max_loop_lag(work) -> float:
+    """Longest delay of a 5 ms heartbeat on the event loop while work runs."""
+    lags = []
+    done = asyncio.Event()
+    
+    async def heartbeat():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+    
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    await work()
+    done.set()
+    await beat
+    return max(lags) if lags else 0.0
+
+
+@pytest.mark.unit
+class TestPasswordHasher:
+    """Test bcrypt hashing in the bounded pool."""
+    
+    async def test_hash_and_verify(self, fast_context):
+        hasher = PasswordHasher(workers=2, max_pending=4)
+        hashed = await hasher.hash("Secret123!")
+        assert await hasher.verify_and_update("Secret123!", hashed) == (True, None)
+        assert (await hasher.verify_and_update("wrong", hashed))[0] is False
+        hasher.shutdown()
+    
+    async def test_rehash_when_rounds_change(self, fast_context, monkeypatch):
+        hasher = PasswordHasher(workers=1, max_pending=4)
+        old_hash = await hasher.hash("Secret123!")
+        
+        monkeypatch.setattr(
+            password, "pwd_context",
+            CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+        )
+        valid, new_hash = await hasher.verify_and_update("Secret123!", old_hash)
+        assert valid and new_hash and new_hash != old_hash
+        assert password.pwd_context.verify("Secret123!", new_hash)
+        assert await hasher.verify_and_update("Secret123!", new_hash) == (True, None)
+        hasher.shutdown()
+    
+    async def test_accounts_without_password_never_verify(self, fast_context):
+        hasher = PasswordHasher(workers=1, max_pending=4)
+        assert await hasher.verify_and_update("", "") == (False, None)
+        hasher.shutdown()
+    
+    async def test_fast_fail_when_saturated(self, fast_context):
+        hasher = PasswordHasher(workers=1, max_pending=2)
+        hashed = fast_context.hash("Secret123!")
+        
+        outcomes = await asyncio.gather(
+            *[hasher.verify_and_update("Secret123!", hashed) for _ in range(5)],
+            return_exceptions=True
+        )
+        assert sum(isinstance(o, PasswordHasherBusy) for o in outcomes) == 3
+        assert hasher.stats()["rejected"] == 3
+        assert hasher.pending == 0
+        hasher.shutdown()
+    
+    @pytest.mark.slow
+    async def test_concurrent_login_benchmark(self, monkeypatch):
+        # Production-like cost so each verification takes tens of milliseconds
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=10)
+        monkeypatch.setattr(password, "pwd_context", context)
+        hashed = context.hash("Secret123!")
+        clients = 16
+        
+        async def inline_logins():
+            for _ in range(clients):
+                password.verify_and_update("Secret123!", hashed)
+        
+        hasher = PasswordHasher(workers=4, max_pending=clients)
+        
+        async def pooled_logins():
+            results = await asyncio.gather(
+                *[hasher.verify_and_update("Secret123!", hashed) for _ in range(clients)]
+            )
+            assert all(valid for valid, _ in results)
+        
+        inline_lag = await _max_loop_lag(inline_logins)
+        start = time.perf_counter()
+        pooled_lag = await _max_loop_lag(pooled_logins)
+        throughput = clients / (time.perf_counter() - start)
+        hasher.shutdown()
+        
+        # Inline bcrypt freezes the loop for the whole storm; pooled bcrypt does not
+        assert pooled_lag < inline_lag / 5
+        assert throughput > 1
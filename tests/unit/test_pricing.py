@@ -0,0 +1,158 @@
+"""Unit tests for the model price table."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.providers import catalog as catalog_module, pricing as pricing_module, tasks as provider_tasks
+from app.providers.base import ModelInfo
+from app.providers.catalog import ModelCatalog
+from app.providers.pricing import PriceTable
+
+
+def _model(model_id: str, input_price: float, output_price: float) -> ModelInfo:
+    return ModelInfo(
+        id=model_id,
+        name=model_id,
+        provider="openrouter",
+        pricing={"input": input_price, "output": output_price},
+        capabilities={},
+        context_length=8192
+    )
+
+
+@pytest.mark.unit
+class TestPriceTable:
+    """Test cost calculation from catalog pricing."""
+    
+    def test_cost_uses_per_million_prices(self):
+        catalog = ModelCatalog(ttl=3600)
+        catalog.update("openrouter", [_model("gpt", 3.0, 15.0)])
+        table = PriceTable(catalog)
+        
+        assert table.cost("openrouter", "gpt", 1_000_000, 0) == pytest.approx(3.0)
+        assert table.cost("openrouter", "gpt", 1000, 2000) == pytest.approx(0.003 + 0.03)
+    
+    def test_unknown_model_costs_nothing(self):
+        table = PriceTable(ModelCatalog(ttl=3600))
+        assert table.get("openrouter", "missing") is None
+        assert table.cost("openrouter", "missing", 1000, 1000) == 0.0
+    
+    def test_rebuilds_when_catalog_changes(self):
+        catalog = ModelCatalog(ttl=3600)
+        catalog.update("openrouter", [_model("gpt", 1.0, 1.0)])
+        table = PriceTable(catalog)
+        assert len(table) == 1
+        
+        catalog.update("openrouter", [_model("gpt", 2.0, 2.0), _model("other", 0.0, 0.0)])
+        
+        assert len(table) == 2
+        assert table.cost("openrouter", "gpt", 1_000_000, 0) == pytest.approx(2.0)
+
+
+class FakeProviderModels:
+    """provider_models collection holding one document per provider."""
+    
+    def __init__(self):
+        self.documents = {}
+    
+    async def find_one(self, query):
+        return self.documents.get(query["provider"])
+    
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query["provider"]] = dict(update["$set"], provider=query["provider"])
+
+
+class FakeProvider:
+    def __init__(self, models):
+        self.models = models
+        self.calls = 0
+    
+    async def list_models(self):
+        self.calls += 1
+        return self.models
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    collection = FakeProviderModels()
+    provider = FakeProvider([_model("gpt", 3.0, 15.0)])
+    monkeypatch.setattr(catalog_module, "ProviderModels", SimpleNamespace(get_motor_collection=lambda: collection))
+    monkeypatch.setattr(catalog_module, "ProviderFactory", SimpleNamespace(
+        get_provider=lambda provider_id: provider,
+        get_all_providers=lambda: {"openrouter": provider},
+        _providers={"openrouter": provider}
+    ))
+    return SimpleNamespace(collection=collection, provider=provider)
+
+
+@pytest.mark.unit
+class TestSharedPricing:
+    """Test that refreshed pricing reaches every process through MongoDB."""
+    
+    async def test_fetched_models_are_published(self, shared):
+        await ModelCatalog(ttl=3600).refresh("openrouter")
+        
+        document = shared.collection.documents["openrouter"]
+        assert document["models"][0]["pricing"] == {"input": 3.0, "output": 15.0}
+    
+    async def test_published_models_are_used_without_fetching(self, shared):
+        shared.collection.documents["openrouter"] = {
+            "models": [_model("gpt", 1.0, 2.0).model_dump()],
+            "refreshed_at": datetime.utcnow() - timedelta(minutes=50)
+        }
+        catalog = ModelCatalog(ttl=3600)
+        
+        await catalog.ensure_fresh("openrouter")
+        
+        assert shared.provider.calls == 0
+        assert PriceTable(catalog).cost("openrouter", "gpt", 1_000_000, 0) == pytest.approx(1.0)
+        # Counts as fetched 50 minutes ago, not now
+        assert not catalog.is_stale("openrouter")
+        catalog._ttl = 45 * 60
+        assert catalog.is_stale("openrouter")
+    
+    async def test_stale_published_models_are_refetched(self, shared):
+        shared.collection.documents["openrouter"] = {
+            "models": [_model("gpt", 1.0, 2.0).model_dump()],
+            "refreshed_at": datetime.utcnow() - timedelta(hours=2)
+        }
+        catalog = ModelCatalog(ttl=3600)
+        
+        await catalog.refresh("openrouter")
+        
+        assert shared.provider.calls == 1
+        assert catalog.get("openrouter", "gpt").pricing["input"] == 3.0
+    
+    async def test_scheduled_task_always_fetches(self, shared, monkeypatch):
+        shared.collection.documents["openrouter"] = {
+            "models": [_model("gpt", 1.0, 2.0).model_dump()],
+            "refreshed_at": datetime.utcnow()
+        }
+        connections = []
+        
+        async def connect():
+            connections.append("open")
+        
+        async def close():
+            connections.append("closed")
+        
+        monkeypatch.setattr(provider_tasks, "connect_to_database", connect)
+        monkeypatch.setattr(provider_tasks, "close_database_connection", close)
+        monkeypatch.setattr(pricing_module, "model_catalog", ModelCatalog(ttl=3600))
+        
+        await provider_tasks._update_model_prices()
+        
+        assert shared.provider.calls == 1
+        assert connections == ["open", "closed"]
+        assert shared.collection.documents["openrouter"]["models"][0]["pricing"]["input"] == 3.0
+    
+    async def test_database_errors_fall_back_to_providers(self, monkeypatch, shared):
+        def broken():
+            raise RuntimeError("not initialized")
+        
+        monkeypatch.setattr(catalog_module, "ProviderModels", SimpleNamespace(get_motor_collection=broken))
+        catalog = ModelCatalog(ttl=3600)
+        
+        assert await catalog.refresh("openrouter") == 1
+        assert catalog.get("openrouter", "gpt") is not None
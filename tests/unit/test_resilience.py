@@ -0,0 +1,120 @@
+"""Unit tests for the resilient provider call layer."""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.providers.base import GenerationRequest, GenerationResponse, GenerationError
+from app.providers.resilience import ResilientProvider, classify_error
+from app.providers.telemetry import ModelTelemetry
+
+
+class FakeProvider:
+    """Minimal provider that replays scripted outcomes."""
+    
+    def __init__(self, outcomes, delays=None):
+        self.id = "fake"
+        self.outcomes = list(outcomes)
+        self.delays = list(delays or [])
+        self.calls = 0
+    
+    async def generate(self, request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return GenerationResponse(
+            id=f"resp-{self.calls}",
+            model=request.model,
+            choices=[{"index": 0, "message": {"role": "assistant", "content": outcome}}],
+            created=0,
+            provider=self.id
+        )
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://provider.test")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def _request() -> GenerationRequest:
+    return GenerationRequest(model="m", messages=[{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.unit
+class TestErrorClassification:
+    """Test retryable vs fatal error classification."""
+    
+    def test_rate_limit_and_server_errors_are_retryable(self):
+        assert classify_error(_status_error(429))[0] is True
+        assert classify_error(_status_error(503))[0] is True
+        assert classify_error(httpx.ReadTimeout("slow"))[0] is True
+        assert classify_error(asyncio.TimeoutError())[0] is True
+    
+    def test_client_errors_are_fatal(self):
+        assert classify_error(_status_error(400))[0] is False
+        assert classify_error(_status_error(401))[0] is False
+        assert classify_error(ValueError("bad"))[0] is False
+
+
+@pytest.mark.unit
+class TestResilientProvider:
+    """Test retries, deadlines and hedging."""
+    
+    async def test_retries_retryable_errors(self):
+        provider = FakeProvider([_status_error(503), httpx.ConnectError("down"), "ok"])
+        resilient = ResilientProvider(provider, max_retries=3, base_delay=0.001, hedging=False)
+        
+        response = await resilient.generate(_request())
+        
+        assert response.choices[0]["message"]["content"] == "ok"
+        assert provider.calls == 3
+    
+    async def test_fatal_error_is_not_retried(self):
+        provider = FakeProvider([_status_error(400), "ok"])
+        resilient = ResilientProvider(provider, max_retries=3, base_delay=0.001, hedging=False)
+        
+        with pytest.raises(GenerationError) as exc_info:
+            await resilient.generate(_request())
+        
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.retryable is False
+        assert provider.calls == 1
+    
+    async def test_gives_up_after_max_retries(self):
+        provider = FakeProvider([_status_error(500)] * 3)
+        resilient = ResilientProvider(provider, max_retries=2, base_delay=0.001, hedging=False)
+        
+        with pytest.raises(GenerationError):
+            await resilient.generate(_request())
+        
+        assert provider.calls == 3
+    
+    async def test_expired_deadline_stops_retries(self):
+        provider = FakeProvider([_status_error(503), "ok"])
+        resilient = ResilientProvider(provider, max_retries=5, base_delay=100, hedging=False)
+        
+        with pytest.raises(GenerationError, match="deadline"):
+            await resilient.generate(_request(), deadline=time.monotonic() + 0.05)
+        
+        assert provider.calls == 1
+    
+    async def test_hedged_request_returns_faster_response(self):
+        tracker = ModelTelemetry()
+        for _ in range(5):
+            tracker.record("fake", "m", 0.01)
+        provider = FakeProvider(["slow", "fast"], delays=[1.0, 0.0])
+        resilient = ResilientProvider(
+            provider, hedging=True, hedge_min_samples=5, tracker=tracker
+        )
+        
+        started = time.monotonic()
+        response = await resilient.generate(_request())
+        
+        assert response.choices[0]["message"]["content"] == "fast"
+        assert provider.calls == 2
+        assert time.monotonic() - started < 0.5
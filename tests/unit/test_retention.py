@@ -0,0 +1,289 @@
+"""Unit tests for archiving and deleting expired generations."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app import migrate
+from app.celery_app import celery_app
+from app.config import get_settings
+from app.generation import items as items_module, retention as retention_module, tasks as tasks_module
+from app.generation.retention import ArchiveWriter, RetentionService, expiry_for, read_archive, retention_for
+
+
+NOW = datetime(2024, 6, 1, 12)
+
+
+def _matches(document, query):
+    for key, condition in query.items():
+        value = document.get(key)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$lte" and not (value is not None and value <= operand):
+                    return False
+                if operator == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if operator == "$lt" and not (value is not None and value < operand):
+                    return False
+                if operator == "$exists" and (key in document) != operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def sort(self, key, direction):
+        self.documents.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+    
+    def limit(self, n):
+        self.documents = self.documents[:n]
+        return self
+    
+    def batch_size(self, n):
+        return self
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """In-memory motor collection."""
+    
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        self.deletes = 0
+    
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.documents if _matches(d, query)])
+    
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update["$set"])
+                return
+    
+    async def update_many(self, query, update):
+        modified = 0
+        for document in self.documents:
+            if _matches(document, query):
+                if isinstance(update, list):
+                    # Aggregation pipeline update as used by the expiry migration
+                    for field, expression in update[0]["$set"].items():
+                        if expression is None:
+                            document[field] = None
+                        else:
+                            source, milliseconds = expression["$add"]
+                            document[field] = document[source[1:]] + timedelta(milliseconds=milliseconds)
+                else:
+                    document.update(update["$set"])
+                modified += 1
+        return SimpleNamespace(modified_count=modified)
+    
+    async def delete_many(self, query):
+        self.deletes += 1
+        before = len(self.documents)
+        self.documents = [d for d in self.documents if not _matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self.documents))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    generations = FakeCollection()
+    item_store = FakeCollection()
+    chunks = FakeCollection()
+    monkeypatch.setattr(retention_module, "Generation", SimpleNamespace(get_motor_collection=lambda: generations))
+    item_model = SimpleNamespace(get_motor_collection=lambda: item_store)
+    monkeypatch.setattr(retention_module, "GenerationItem", item_model)
+    monkeypatch.setattr(items_module, "GenerationItem", item_model)
+    monkeypatch.setattr(retention_module, "DatasetChunk", SimpleNamespace(get_motor_collection=lambda: chunks))
+    
+    settings = get_settings()
+    monkeypatch.setattr(settings, "retention_archive_dir", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "retention_delete_pause_seconds", 0)
+    monkeypatch.setattr(settings, "retention_delete_batch_size", 2)
+    return SimpleNamespace(generations=generations, items=item_store, chunks=chunks, archive=tmp_path / "archive")
+
+
+def _add(store, items=3, **fields):
+    document = {
+        "_id": ObjectId(),
+        "job_id": f"gen_{len(store.generations.documents)}",
+        "kind": "generation",
+        "status": "completed",
+        "count": items,
+        "results": [],
+        "created_at": NOW - timedelta(days=40),
+        "expires_at": NOW - timedelta(days=10),
+        "archived_at": None,
+        **fields
+    }
+    store.generations.documents.append(document)
+    store.items.documents.extend(
+        {"generation_id": document["_id"], "index": n, "result": {"n": n}} for n in range(1, items + 1)
+    )
+    return document
+
+
+@pytest.mark.unit
+class TestRetentionPolicy:
+    """Test retention periods per tier."""
+    
+    def test_tiers(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "retention_days", {"free": 30, "pro": 180, "enterprise": 0})
+        
+        assert retention_for("pro") == timedelta(days=180)
+        assert retention_for("enterprise") is None
+        assert retention_for("unknown") == timedelta(days=30)
+        assert retention_for(None) == timedelta(days=30)
+    
+    def test_expiry_for_user(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "retention_days", {"free": 30, "enterprise": 0})
+        
+        assert expiry_for(SimpleNamespace(tier="free"), NOW) == NOW + timedelta(days=30)
+        assert expiry_for(SimpleNamespace(tier="enterprise"), NOW) is None
+
+
+@pytest.mark.unit
+class TestArchive:
+    """Test the compressed archive format."""
+    
+    def test_round_trip(self, tmp_path):
+        writer = ArchiveWriter(tmp_path / "a" / "archive.ndjson.zst")
+        writer.open()
+        writer.write([{"type": "generation", "created_at": NOW}, {"type": "item", "result": {"text": "é"}}])
+        size = writer.close()
+        
+        assert size > 0
+        assert (tmp_path / "a" / "archive.ndjson.zst").read_bytes()[:4] == b"\x28\xb5\x2f\xfd"
+        assert read_archive(tmp_path / "a" / "archive.ndjson.zst") == [
+            {"type": "generation", "created_at": "2024-06-01 12:00:00"},
+            {"type": "item", "result": {"text": "é"}}
+        ]
+    
+    def test_abort_removes_partial_file(self, tmp_path):
+        writer = ArchiveWriter(tmp_path / "archive.ndjson.zst")
+        writer.open()
+        writer.abort()
+        
+        assert not (tmp_path / "archive.ndjson.zst").exists()
+
+
+@pytest.mark.unit
+class TestRetentionService:
+    """Test archiving and purging expired generations."""
+    
+    async def test_expired_generations_are_archived_then_purged(self, store):
+        expired = _add(store, items=5)
+        legacy = _add(store, items=0, results=[{"n": "inline"}], count=1)
+        kept = [
+            _add(store, expires_at=NOW + timedelta(days=1)),
+            _add(store, status="processing"),
+            _add(store, expires_at=None),
+        ]
+        
+        stats = await RetentionService().run(now=NOW)
+        
+        assert stats == {"archived": 2, "purged": 2, "items_deleted": 5}
+        archive_file = expired["archive_file"]
+        assert legacy["archive_file"] == archive_file
+        records = read_archive(archive_file)
+        assert [r["type"] for r in records] == ["generation"] + ["item"] * 5 + ["generation", "item"]
+        assert records[0]["job_id"] == expired["job_id"] and "results" not in records[0]
+        assert [r["result"] for r in records[1:6]] == [{"n": n} for n in range(1, 6)]
+        assert records[7]["result"] == {"n": "inline"}
+        
+        assert expired["archived_at"] and legacy["archived_at"] and legacy["results"] == []
+        remaining = {d["generation_id"] for d in store.items.documents}
+        assert remaining == {d["_id"] for d in kept if d["count"]}
+        assert all(d["archived_at"] is None for d in kept)
+    
+    async def test_items_are_deleted_in_batches(self, store):
+        _add(store, items=5)
+        
+        await RetentionService().run(now=NOW)
+        
+        # Batches of 2 over indexes 1-5, then one sweep for strays
+        assert store.items.deletes == 4
+    
+    async def test_interrupted_run_is_not_archived_twice(self, store):
+        document = _add(store, archive_file="/archive/earlier.ndjson.zst")
+        
+        stats = await RetentionService().run(now=NOW)
+        
+        assert stats["archived"] == 0 and stats["purged"] == 1
+        assert document["archive_file"] == "/archive/earlier.ndjson.zst"
+        assert not store.archive.exists()
+        assert store.items.documents == []
+    
+    async def test_dataset_files_are_removed(self, store, tmp_path):
+        variables = tmp_path / "variables.ndjson"
+        variables.write_text("{}\n")
+        document = _add(store, kind="dataset", metadata={"dataset": {"file": str(variables)}})
+        store.chunks.documents.append({"generation_id": document["_id"], "chunk": 0})
+        
+        await RetentionService().run(now=NOW)
+        
+        assert not variables.exists()
+        assert store.chunks.documents == []
+    
+    async def test_nothing_expired(self, store):
+        assert await RetentionService().run(now=NOW) == {"archived": 0, "purged": 0, "items_deleted": 0}
+        assert not store.archive.exists()
+
+
+@pytest.mark.unit
+class TestRetentionWiring:
+    """Test the beat task and the expiry migration."""
+    
+    def test_beat_schedule_task_is_registered(self):
+        name = celery_app.conf.beat_schedule["cleanup-old-generations"]["task"]
+        
+        assert tasks_module.cleanup_old_generations.name == name
+        assert name in celery_app.tasks
+    
+    async def test_cleanup_also_deletes_expired_exports(self, monkeypatch):
+        async def nothing():
+            pass
+        
+        async def run():
+            return {"archived": 0, "purged": 0, "items_deleted": 0}
+        
+        async def purge_expired():
+            return 3
+        
+        monkeypatch.setattr(tasks_module, "connect_to_database", nothing)
+        monkeypatch.setattr(tasks_module, "close_database_connection", nothing)
+        monkeypatch.setattr(tasks_module, "retention_service", SimpleNamespace(run=run))
+        monkeypatch.setattr(tasks_module, "bulk_export_service", SimpleNamespace(purge_expired=purge_expired))
+        
+        stats = await tasks_module._cleanup_old_generations()
+        
+        assert stats["exports_deleted"] == 3
+    
+    async def test_expiry_migration(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "retention_days", {"free": 30, "enterprise": 0})
+        free, enterprise = ObjectId(), ObjectId()
+        users = FakeCollection([{"_id": free}, {"_id": enterprise, "tier": "enterprise"}])
+        generations = FakeCollection([
+            {"_id": 1, "user_id": str(free), "created_at": NOW},
+            {"_id": 2, "user_id": str(enterprise), "created_at": NOW},
+            {"_id": 3, "user_id": str(free), "created_at": NOW, "expires_at": NOW},
+        ])
+        monkeypatch.setattr(migrate, "User", SimpleNamespace(get_motor_collection=lambda: users))
+        monkeypatch.setattr(migrate, "Generation", SimpleNamespace(get_motor_collection=lambda: generations))
+        
+        assert await migrate.set_generation_expiry() == 2
+        assert [d["expires_at"] for d in generations.documents] == [NOW + timedelta(days=30), None, NOW]
+        assert await migrate.set_generation_expiry() == 0
@@ -0,0 +1,85 @@
+"""Unit tests for telemetry-driven model routing."""
+import pytest
+
+from app.providers.base import ModelInfo
+from app.providers.catalog import ModelCatalog
+from app.providers.circuit_breaker import CircuitBreakerRegistry
+from app.providers.router import ModelRouter, RoutingConstraints, RoutingPolicy
+from app.providers.telemetry import ModelTelemetry
+
+
+def _model(model_id: str, price: float, context_length: int = 8192, **capabilities) -> ModelInfo:
+    return ModelInfo(
+        id=model_id,
+        name=model_id,
+        provider="openrouter",
+        pricing={"input": price, "output": price},
+        capabilities={"max_tokens": 4096, "online": False, **capabilities},
+        context_length=context_length
+    )
+
+
+@pytest.fixture
+def router():
+    """Router over a small in-memory catalog."""
+    catalog = ModelCatalog(ttl=3600)
+    catalog.update("openrouter", [
+        _model("cheap-slow", 0.5),
+        _model("pricey-fast", 5.0),
+        _model("free-ok", 0.0),
+        _model("small-context", 0.1, context_length=2048),
+        _model("vision", 3.0, vision=True)
+    ])
+    stats = ModelTelemetry()
+    for _ in range(10):
+        stats.record("openrouter", "cheap-slow", 8.0)
+        stats.record("openrouter", "pricey-fast", 0.5)
+        stats.record("openrouter", "free-ok", 2.0)
+    return ModelRouter(catalog=catalog, stats=stats, breakers=CircuitBreakerRegistry())
+
+
+@pytest.mark.unit
+class TestModelRouter:
+    """Test routing policies and constraints."""
+    
+    async def test_cheapest_under_latency_budget(self, router):
+        constraints = RoutingConstraints(
+            policy=RoutingPolicy.CHEAPEST,
+            max_p95_seconds=5,
+            min_context_length=4096,
+            max_price_per_million=4
+        )
+        selected = await router.select(constraints, "openrouter")
+        assert selected.id == "free-ok"
+    
+    async def test_fastest_free(self, router):
+        selected = await router.select(RoutingConstraints(policy=RoutingPolicy.FASTEST_FREE))
+        assert selected.id == "free-ok"
+    
+    async def test_fastest_prefers_observed_latency(self, router):
+        selected = await router.select(RoutingConstraints(policy=RoutingPolicy.FASTEST))
+        assert selected.id == "pricey-fast"
+    
+    async def test_excludes_high_error_rate_and_open_circuits(self, router):
+        for _ in range(10):
+            router.stats.record("openrouter", "free-ok", 1.0, success=False)
+        breaker = router.breakers.get("openrouter", "pricey-fast")
+        breaker.min_calls = 1
+        breaker.record_failure()
+        
+        ranked = router.rank(
+            await router.catalog.list_models(),
+            RoutingConstraints(policy=RoutingPolicy.FASTEST, min_context_length=4096)
+        )
+        
+        assert [m.id for m in ranked][:1] == ["cheap-slow"]
+        assert "free-ok" not in [m.id for m in ranked]
+        assert "pricey-fast" not in [m.id for m in ranked]
+    
+    async def test_required_capabilities(self, router):
+        selected = await router.select(RoutingConstraints(required_capabilities=["vision"]))
+        assert selected.id == "vision"
+    
+    async def test_nothing_eligible(self, router):
+        selected = await router.select(RoutingConstraints(min_context_length=1_000_000))
+        assert selected is None
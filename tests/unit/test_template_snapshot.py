@@ -0,0 +1,213 @@
+"""Unit tests for template snapshots on generations and denormalized template owners."""
+import json
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import DBRef, ObjectId
+
+from app import migrate
+from app.generation import tasks as tasks_module
+from app.generation.bulk_export import BulkArchiveWriter, write_bulk_archive
+from app.generation.tasks import GenerationProcessor
+from app.models.generation import TemplateSnapshot
+from app.models.template import Template
+
+
+def _template(**fields):
+    return SimpleNamespace(**{
+        "id": ObjectId(),
+        "name": "Quiz",
+        "system_prompt": "You write quizzes.",
+        "user_prompt": "Write a question about {{ topic }}.",
+        "variables": {"topic": {"type": "string"}},
+        "output_schema": {"type": "object", "properties": {"question": {"type": "string"}}},
+        "provider_settings": {"temperature": 0.2},
+        "validation_mode": "strict",
+        "validation_rules": {},
+        "updated_at": datetime(2024, 5, 1),
+        **fields
+    })
+
+
+class FakeCollection:
+    """In-memory motor collection."""
+    
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        self.updates = []
+    
+    def find(self, query, projection=None):
+        matching = [
+            d for d in self.documents
+            if d.get("created_by_id") is None and d.get("created_by") is not None
+        ]
+        return SimpleNamespace(batch_size=lambda n: _cursor(matching))
+    
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+        for document in self.documents:
+            if document["_id"] == query["_id"]:
+                document.update(update["$set"])
+
+
+async def _cursor(documents):
+    for document in list(documents):
+        yield document
+
+
+@pytest.fixture
+def job_setup(monkeypatch):
+    async def no_prices(candidates):
+        list(candidates)
+    
+    monkeypatch.setattr(tasks_module, "ensure_prices", no_prices)
+    generations = FakeCollection()
+    monkeypatch.setattr(tasks_module, "Generation", SimpleNamespace(get_motor_collection=lambda: generations))
+    return generations
+
+
+def _generation(**fields):
+    return SimpleNamespace(**{
+        "id": ObjectId(),
+        "template_id": str(ObjectId()),
+        "template_snapshot": None,
+        "provider": "openrouter",
+        "model": "openai/gpt-4o",
+        "metadata": {},
+        **fields
+    })
+
+
+@pytest.mark.unit
+class TestTemplateSnapshot:
+    """Test that jobs use the template captured when they were created."""
+    
+    def test_snapshot_copies_what_jobs_use(self):
+        snapshot = TemplateSnapshot.from_template(_template())
+        
+        assert snapshot.user_prompt == "Write a question about {{ topic }}."
+        assert snapshot.output_schema["type"] == "object"
+        assert snapshot.provider_settings == {"temperature": 0.2}
+        assert snapshot.updated_at == datetime(2024, 5, 1)
+    
+    async def test_job_does_not_load_the_template(self, job_setup, monkeypatch):
+        async def unexpected(template_id):
+            raise AssertionError("template was loaded")
+        
+        monkeypatch.setattr(tasks_module, "Template", SimpleNamespace(get=unexpected))
+        snapshot = TemplateSnapshot.from_template(_template())
+        
+        job = await GenerationProcessor().prepare_job(_generation(template_snapshot=snapshot))
+        
+        assert job.template is snapshot
+        assert job_setup.updates == []
+    
+    async def test_older_job_is_snapshotted_once(self, job_setup, monkeypatch):
+        loads = []
+        
+        async def get(template_id):
+            loads.append(template_id)
+            return _template(user_prompt="Current prompt")
+        
+        monkeypatch.setattr(tasks_module, "Template", SimpleNamespace(get=get))
+        generation = _generation()
+        processor = GenerationProcessor()
+        
+        job = await processor.prepare_job(generation)
+        await processor.prepare_job(generation)
+        
+        assert job.template.user_prompt == "Current prompt"
+        assert loads == [generation.template_id]
+        (query, update), = job_setup.updates
+        assert query == {"_id": generation.id}
+        assert update["$set"]["template_snapshot"]["user_prompt"] == "Current prompt"
+    
+    async def test_deleted_template_fails_the_job(self, job_setup, monkeypatch):
+        async def get(template_id):
+            return None
+        
+        monkeypatch.setattr(tasks_module, "Template", SimpleNamespace(get=get))
+        
+        with pytest.raises(ValueError, match="Template not found"):
+            await GenerationProcessor().prepare_job(_generation())
+    
+    async def test_bulk_export_uses_snapshot_schema(self, tmp_path):
+        async def lookup(template_id):
+            raise AssertionError("template was loaded")
+        
+        document = {
+            "job_id": "gen_1",
+            "template_id": "t1",
+            "template_snapshot": {"output_schema": {"properties": {"title": {}, "rank": {}}}},
+            "status": "completed",
+            "results": [{"rank": 1, "title": "First"}]
+        }
+        writer = BulkArchiveWriter(tmp_path / "out.zip", "zip", "csv")
+        
+        await write_bulk_archive(_cursor([document]), writer, lookup)
+        
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert archive.read("gen_1.csv").decode().splitlines()[0].startswith("title,rank")
+            assert json.loads(archive.read("manifest.json"))[0]["template_id"] == "t1"
+
+
+@pytest.mark.unit
+class TestTemplateOwner:
+    """Test the creator ID stored next to the created_by link."""
+    
+    def test_owner_from_id_or_link(self):
+        owner = ObjectId()
+        
+        assert Template.model_construct(created_by_id="u1", created_by=None).owner_id == "u1"
+        linked = Template.model_construct(created_by_id=None, created_by=SimpleNamespace(ref=DBRef("users", owner)))
+        assert linked.owner_id == str(owner)
+        unsaved = Template.model_construct(created_by_id=None, created_by=SimpleNamespace(id=owner))
+        assert unsaved.owner_id == str(owner)
+    
+    def test_created_by_id_is_set_before_saving(self):
+        owner = ObjectId()
+        template = Template.model_construct(created_by_id=None, created_by=SimpleNamespace(id=owner))
+        
+        template.set_created_by_id()
+        
+        assert template.created_by_id == str(owner)
+    
+    async def test_private_template_access_uses_the_owner(self, monkeypatch):
+        from app.generation import service as service_module
+        from app.templates import service as templates_module
+        
+        owner, stranger = ObjectId(), ObjectId()
+        # A loaded template's created_by is an unfetched link without an id
+        template = Template.model_construct(
+            is_public=False, created_by_id=None, created_by=SimpleNamespace(ref=DBRef("users", owner))
+        )
+        
+        async def get(template_id):
+            return template
+        
+        monkeypatch.setattr(service_module, "Template", SimpleNamespace(get=get))
+        monkeypatch.setattr(templates_module, "Template", SimpleNamespace(get=get))
+        generation_service = service_module.generation_service
+        template_service = templates_module.TemplateService()
+        
+        assert await generation_service._load_template("t1", SimpleNamespace(id=owner)) is template
+        with pytest.raises(ValueError, match="Access denied"):
+            await generation_service._load_template("t1", SimpleNamespace(id=stranger))
+        with pytest.raises(PermissionError):
+            await template_service.update_template("t1", {}, SimpleNamespace(id=stranger))
+        with pytest.raises(PermissionError):
+            await template_service.delete_template("t1", SimpleNamespace(id=stranger))
+    
+    async def test_owner_migration(self, monkeypatch):
+        owner = ObjectId()
+        templates = FakeCollection([
+            {"_id": 1, "created_by": DBRef("users", owner)},
+            {"_id": 2, "created_by": DBRef("users", owner), "created_by_id": "already"},
+        ])
+        monkeypatch.setattr(migrate, "Template", SimpleNamespace(get_motor_collection=lambda: templates))
+        
+        assert await migrate.set_template_owner_ids() == 1
+        assert [d["created_by_id"] for d in templates.documents] == [str(owner), "already"]
+        assert await migrate.set_template_owner_ids() == 0
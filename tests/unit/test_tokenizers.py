@@ -0,0 +1,92 @@
+"""Unit tests for local token counting."""
+import base64
+import time
+
+import pytest
+
+from app.providers.base import ModelInfo
+from app.providers.tokenizers import (
+    BPETokenizer,
+    ContextLengthExceeded,
+    EstimatingTokenizer,
+    TokenizerRegistry,
+    fit_max_tokens,
+    model_family
+)
+
+
+PROMPT = (
+    "You are a helpful assistant that writes product descriptions. "
+    "Write a description for item #{index} in the 'outdoor' category, "
+    "mentioning durability, weight (under 2.5kg) and price."
+)
+
+
+def _write_ranks(path, tokens):
+    path.write_text("\n".join(
+        f"{base64.b64encode(token).decode()} {rank}" for rank, token in enumerate(tokens)
+    ))
+
+
+@pytest.mark.unit
+class TestTokenizers:
+    """Test tokenizers, family resolution and context fitting."""
+    
+    def test_model_family(self):
+        assert model_family("openai/gpt-4o-mini") == "o200k_base"
+        assert model_family("openai/gpt-4-turbo") == "cl100k_base"
+        assert model_family("llama3:8b") == "llama"
+        assert model_family("anthropic/claude-3-haiku") == "claude"
+        assert model_family("unknown-model") == "default"
+    
+    def test_bpe_applies_merges_by_rank(self, tmp_path):
+        single_bytes = [bytes([b]) for b in range(256)]
+        path = tmp_path / "tiny.tiktoken"
+        _write_ranks(path, single_bytes + [b"ab", b"abc", b" ab"])
+        tokenizer = BPETokenizer.from_file(path)
+        
+        assert tokenizer.count("abc") == 1
+        assert tokenizer.count("abcd") == 2
+        assert tokenizer.count("abc abx") == 3
+        assert tokenizer.count("") == 0
+    
+    def test_registry_prefers_rank_files_and_caches(self, tmp_path):
+        _write_ranks(tmp_path / "llama.tiktoken", [bytes([b]) for b in range(256)])
+        registry = TokenizerRegistry(directory=str(tmp_path))
+        
+        assert isinstance(registry.for_model("llama3:8b"), BPETokenizer)
+        assert registry.for_model("llama2:13b") is registry.for_model("llama3:8b")
+        assert isinstance(registry.for_model("mistral:7b"), EstimatingTokenizer)
+    
+    def test_calibrate_recovers_weights(self):
+        reference = EstimatingTokenizer(piece_weight=0.9, char_weight=0.05)
+        texts = [PROMPT * n for n in range(1, 6)] + ["word " * 200, "x" * 900, "a, b; c. " * 80]
+        samples = [(text, reference.count(text)) for text in texts]
+        calibrated = EstimatingTokenizer.calibrate(samples)
+        
+        assert calibrated.piece_weight == pytest.approx(reference.piece_weight, rel=0.1)
+        assert calibrated.char_weight == pytest.approx(reference.char_weight, rel=0.1)
+    
+    def test_fit_max_tokens(self):
+        model = ModelInfo(
+            id="small", name="small", provider="ollama",
+            capabilities={"max_tokens": 512}, context_length=1000
+        )
+        
+        assert fit_max_tokens(100, model) == 512
+        assert fit_max_tokens(700, model, requested=1000) == 300
+        assert fit_max_tokens(100, None, requested=None) == 1000
+        with pytest.raises(ContextLengthExceeded):
+            fit_max_tokens(995, model, min_completion_tokens=16)
+    
+    @pytest.mark.slow
+    def test_counting_throughput(self):
+        registry = TokenizerRegistry(directory="")
+        prompts = [PROMPT.replace("{index}", str(i)) * 4 for i in range(10_000)]
+        
+        start = time.perf_counter()
+        for prompt in prompts:
+            registry.count("openai/gpt-4o", prompt)
+        elapsed = time.perf_counter() - start
+        
+        assert len(prompts) / elapsed >= 10_000
@@ -0,0 +1,273 @@
+"""Unit tests for usage rollups and the latency sketch."""
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from bson import DBRef, ObjectId
+
+from app.api import stats as stats_module
+from app.auth.dependencies import get_current_user
+from app.models.template import Template
+from app.stats import rollups as rollups_module
+from app.stats.rollups import UsageRollups, bucket_start
+from app.stats.sketch import RELATIVE_ACCURACY, LatencySketch
+from app.models.usage import RollupGranularity, RollupScope
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def sort(self, key, direction):
+        self.documents.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeRollupCollection:
+    """Applies upserted $inc updates to in-memory bucket documents."""
+    
+    def __init__(self):
+        self.documents = []
+    
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            query, update = operation._filter, operation._doc
+            document = next(
+                (d for d in self.documents if all(d.get(k) == v for k, v in query.items())), None
+            )
+            if document is None:
+                document = dict(query)
+                self.documents.append(document)
+            for path, value in update["$inc"].items():
+                target = document
+                *parents, name = path.split(".")
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[name] = target.get(name, 0) + value
+    
+    def find(self, query, projection=None):
+        start = query["start"]
+        matching = [
+            dict(d) for d in self.documents
+            if d["scope"] == query["scope"] and d["key"] == query["key"]
+            and d["granularity"] == query["granularity"]
+            and start["$gte"] <= d["start"] < start["$lt"]
+        ]
+        return FakeCursor(matching)
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    collection = FakeRollupCollection()
+    monkeypatch.setattr(
+        rollups_module, "UsageRollup", SimpleNamespace(get_motor_collection=lambda: collection)
+    )
+    return collection
+
+
+def _generation(**fields):
+    return SimpleNamespace(**{
+        "job_id": "job_1",
+        "user_id": "user_1",
+        "template_id": "template_1",
+        "provider": "openrouter",
+        "model": "openai/gpt-4o",
+        **fields
+    })
+
+
+def _usage(cost=0.5):
+    return {"total_tokens": 30, "prompt_tokens": 10, "completion_tokens": 20, "cost": cost}
+
+
+@pytest.mark.unit
+class TestLatencySketch:
+    """Test quantile accuracy and merging."""
+    
+    def test_quantiles_are_within_relative_accuracy(self):
+        rng = random.Random(7)
+        samples = [rng.lognormvariate(0, 1) for _ in range(5000)]
+        sketch = LatencySketch()
+        for sample in samples:
+            sketch.add(sample)
+        
+        ordered = sorted(samples)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ACCURACY * 1.01)
+    
+    def test_merge_equals_sketch_of_all_samples(self):
+        first, second, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for n in range(1, 200):
+            (first if n % 3 else second).add(n / 10)
+            both.add(n / 10)
+        
+        merged = LatencySketch(first.counts).merge(second)
+        
+        assert merged.counts == both.counts
+        assert merged.count == 199
+    
+    def test_tiny_and_missing_samples(self):
+        sketch = LatencySketch()
+        assert sketch.quantile(0.5) is None
+        assert sketch.summary() == {"count": 0, "p50": None, "p95": None, "p99": None}
+        
+        sketch.add(0.0)
+        assert sketch.quantile(0.5) == 0.0
+
+
+@pytest.mark.unit
+class TestUsageRollups:
+    """Test recording and reading rollups."""
+    
+    async def test_record_updates_every_scope_and_granularity(self, rollups):
+        sketch = LatencySketch()
+        sketch.add(1.0)
+        at = datetime(2024, 5, 1, 13, 45)
+        
+        await UsageRollups().record(_generation(), completed=1, items=3, usage=_usage(), latency=sketch, at=at)
+        
+        keys = {(d["scope"], d["key"], d["granularity"], d["start"]) for d in rollups.documents}
+        assert keys == {
+            (scope, key, granularity, start)
+            for scope, key in (("user", "user_1"), ("template", "template_1"), ("model", "openrouter/openai/gpt-4o"))
+            for granularity, start in (("hour", datetime(2024, 5, 1, 13)), ("day", datetime(2024, 5, 1)))
+        }
+        document = rollups.documents[0]
+        assert document["completed"] == 1 and document["items"] == 3 and document["cost"] == 0.5
+        assert "failed" not in document
+        assert sum(document["latency"].values()) == 1
+    
+    async def test_nothing_to_record(self, rollups):
+        await UsageRollups().record(_generation(), usage=dict.fromkeys(_usage(), 0))
+        
+        assert rollups.documents == []
+    
+    async def test_write_errors_do_not_raise(self, monkeypatch):
+        async def fail(operations, ordered=True):
+            raise RuntimeError("database down")
+        
+        monkeypatch.setattr(
+            rollups_module, "UsageRollup",
+            SimpleNamespace(get_motor_collection=lambda: SimpleNamespace(bulk_write=fail))
+        )
+        
+        await UsageRollups().record(_generation(), completed=1)
+    
+    async def test_series_merges_buckets(self, rollups):
+        service = UsageRollups()
+        now = datetime(2024, 5, 2, 10, 30)
+        for hours_ago, seconds, outcome in ((1, 1.0, "completed"), (3, 4.0, "completed"), (3, 2.0, "failed")):
+            sketch = LatencySketch()
+            sketch.add(seconds)
+            await service.record(
+                _generation(), items=2, usage=_usage(), latency=sketch,
+                at=now - timedelta(hours=hours_ago), **{outcome: 1}
+            )
+        await service.record(_generation(user_id="other"), completed=1, at=now)
+        
+        series = await service.series(RollupScope.USER, "user_1", RollupGranularity.HOUR, end=now)
+        
+        assert [p["start"] for p in series["points"]] == ["2024-05-02T07:00:00", "2024-05-02T09:00:00"]
+        assert series["points"][0]["failed"] == 1 and series["points"][0]["latency"]["count"] == 2
+        totals = series["totals"]
+        assert totals["completed"] == 2 and totals["failed"] == 1
+        assert totals["items"] == 6 and totals["cost"] == pytest.approx(1.5)
+        assert totals["latency"]["count"] == 3
+        assert totals["latency"]["p50"] == pytest.approx(2.0, rel=RELATIVE_ACCURACY)
+    
+    async def test_daily_series_default_range(self, rollups):
+        service = UsageRollups()
+        now = datetime(2024, 5, 31, 12)
+        await service.record(_generation(), completed=1, at=now - timedelta(days=29))
+        await service.record(_generation(), completed=1, at=now - timedelta(days=31))
+        
+        series = await service.series(RollupScope.USER, "user_1", RollupGranularity.DAY, end=now)
+        
+        assert series["start"] == "2024-05-01T00:00:00"
+        assert series["totals"]["completed"] == 1
+    
+    async def test_aware_datetimes_are_accepted(self, rollups):
+        end = datetime(2024, 5, 2, 12, tzinfo=timezone(timedelta(hours=2)))
+        
+        series = await UsageRollups().series(RollupScope.USER, "user_1", end=end)
+        
+        assert series["end"] == "2024-05-02T10:00:00"
+    
+    @pytest.mark.parametrize("granularity, span", [
+        (RollupGranularity.HOUR, timedelta(days=40)),
+        (RollupGranularity.DAY, timedelta(days=800)),
+    ])
+    async def test_range_is_bounded(self, rollups, granularity, span):
+        end = datetime(2024, 5, 2)
+        
+        with pytest.raises(ValueError, match="more than"):
+            await UsageRollups().series(RollupScope.USER, "user_1", granularity, end - span, end)
+    
+    async def test_start_after_end(self, rollups):
+        with pytest.raises(ValueError, match="before end"):
+            await UsageRollups().series(RollupScope.USER, "user_1", start=datetime(2024, 5, 2), end=datetime(2024, 5, 1))
+    
+    def test_bucket_start(self):
+        moment = datetime(2024, 5, 1, 13, 45, 12, 5)
+        
+        assert bucket_start(moment, RollupGranularity.HOUR) == datetime(2024, 5, 1, 13)
+        assert bucket_start(moment, RollupGranularity.DAY) == datetime(2024, 5, 1)
+
+
+@pytest.mark.unit
+class TestTemplateUsageEndpoint:
+    """Test who may read a template's usage."""
+    
+    @pytest.fixture
+    def call(self, monkeypatch):
+        from app.main import app
+        
+        owner = ObjectId()
+        # A loaded template holds a link to its creator, not the user
+        template = Template.model_construct(
+            created_by_id=None, created_by=SimpleNamespace(ref=DBRef("users", owner))
+        )
+        
+        async def get_template(template_id):
+            return template if template_id == "t1" else None
+        
+        async def series(scope, key, granularity, start, end):
+            return {"scope": scope.value, "key": key, "points": []}
+        
+        monkeypatch.setattr(stats_module.template_service, "get_template", get_template)
+        monkeypatch.setattr(stats_module.usage_rollups, "series", series)
+        
+        async def call(user_id, is_superuser=False, template_id="t1"):
+            user = SimpleNamespace(id=user_id, is_superuser=is_superuser)
+            monkeypatch.setattr(app, "dependency_overrides", {get_current_user: lambda: user})
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get(f"/api/v1/stats/templates/{template_id}")
+        
+        call.owner = owner
+        return call
+    
+    async def test_owner(self, call):
+        response = await call(call.owner)
+        
+        assert response.status_code == 200
+        assert response.json()["key"] == "t1"
+    
+    async def test_stranger(self, call):
+        assert (await call(ObjectId())).status_code == 403
+    
+    async def test_superuser(self, call):
+        assert (await call(ObjectId(), is_superuser=True)).status_code == 200
+    
+    async def test_missing_template(self, call):
+        assert (await call(call.owner, template_id="nope")).status_code == 404
@@ -0,0 +1,166 @@
+"""Unit tests for the verified token -> user cache."""
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.auth import dependencies
+from app.auth.jwt import create_access_token
+from app.auth.user_cache import UserCache, user_cache
+from app.models import user as user_module
+from app.models.user import User
+
+
+class _EmailField:
+    """`User.email == value` evaluates to the value, standing in for a query expression."""
+    
+    def __eq__(self, other):
+        return other
+
+
+class FakeUser:
+    """Stand-in for the User document (which needs an initialized database)."""
+    
+    email = _EmailField()
+    lookups = 0
+    lookup_delay = 0.0
+    users = {}
+    
+    def __init__(self, email, is_active=True, id=None):
+        self.id = id or f"id-{email}"
+        self.email = email
+        self.is_active = is_active
+    
+    def model_copy(self):
+        return FakeUser(self.email, self.is_active, self.id)
+    
+    @classmethod
+    async def find_one(cls, email):
+        cls.lookups += 1
+        if cls.lookup_delay:
+            await asyncio.sleep(cls.lookup_delay)
+        return cls.users.get(email)
+
+
+@pytest.fixture
+def fake_users(monkeypatch):
+    monkeypatch.setattr(dependencies, "User", FakeUser)
+    FakeUser.users = {"a@example.com": FakeUser("a@example.com")}
+    FakeUser.lookups = 0
+    FakeUser.lookup_delay = 0.0
+    user_cache.clear()
+    yield FakeUser
+    user_cache.clear()
+
+
+def _credentials(email="a@example.com", **kwargs):
+    token = create_access_token({"sub": email}, **kwargs)
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.mark.unit
+class TestUserCache:
+    """Test the cache on its own."""
+    
+    def test_hit_returns_copy(self):
+        cache = UserCache(ttl=60, max_size=10)
+        user = FakeUser("a@example.com")
+        cache.set("t1", user)
+        
+        cached = cache.get("t1")
+        assert cached.email == "a@example.com" and cached is not user
+        assert cache.get("t2") is None
+        assert cache.stats()["hit_rate"] == 0.5
+    
+    def test_entries_expire_with_token(self):
+        cache = UserCache(ttl=60, max_size=10)
+        cache.set("t1", FakeUser("a@example.com"), token_expires_at=time.time() - 1)
+        assert cache.get("t1") is None
+        assert cache.stats()["entries"] == 0
+    
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = UserCache(ttl=60, max_size=2)
+        cache.set("t1", FakeUser("a@example.com"))
+        cache.set("t2", FakeUser("b@example.com"))
+        cache.get("t1")
+        cache.set("t3", FakeUser("c@example.com"))
+        assert cache.get("t2") is None
+        assert cache.get("t1") is not None
+    
+    def test_invalidate_drops_all_tokens_of_user(self):
+        cache = UserCache(ttl=60, max_size=10)
+        cache.set("t1", FakeUser("a@example.com"))
+        cache.set("t2", FakeUser("a@example.com"))
+        cache.set("t3", FakeUser("b@example.com"))
+        cache.invalidate("id-a@example.com")
+        assert cache.get("t1") is None and cache.get("t2") is None
+        assert cache.get("t3") is not None
+    
+    def test_invalidate_after_email_change(self, monkeypatch):
+        monkeypatch.setattr(user_module, "user_cache", UserCache(ttl=60, max_size=10))
+        user = User.model_construct(id=ObjectId(), email="old@example.com", is_active=True)
+        user_module.user_cache.set("t1", user)
+        
+        user.email = "new@example.com"
+        user.invalidate_cached_tokens()
+        
+        assert user_module.user_cache.get("t1") is None
+    
+    def test_zero_ttl_disables_cache(self):
+        cache = UserCache(ttl=0, max_size=10)
+        cache.set("t1", FakeUser("a@example.com"))
+        assert cache.get("t1") is None
+
+
+@pytest.mark.unit
+class TestCachedCurrentUser:
+    """Test get_current_user with the cache."""
+    
+    async def test_second_request_skips_lookup(self, fake_users):
+        credentials = _credentials()
+        await dependencies.get_current_user(credentials)
+        user = await dependencies.get_current_user(credentials)
+        assert user.email == "a@example.com"
+        assert fake_users.lookups == 1
+    
+    async def test_deactivation_is_seen_after_invalidation(self, fake_users):
+        credentials = _credentials()
+        await dependencies.get_current_user(credentials)
+        
+        fake_users.users["a@example.com"].is_active = False
+        user_cache.invalidate("id-a@example.com")
+        with pytest.raises(HTTPException) as exc:
+            await dependencies.get_current_user(credentials)
+        assert exc.value.status_code == 403
+    
+    async def test_expired_token_is_not_cached(self, fake_users):
+        credentials = _credentials(expires_delta=timedelta(seconds=-1))
+        with pytest.raises(HTTPException):
+            await dependencies.get_current_user(credentials)
+        assert user_cache.stats()["entries"] == 0
+    
+    @pytest.mark.slow
+    async def test_p50_latency_benchmark(self, fake_users):
+        # Simulate a 2 ms MongoDB round trip for the user lookup
+        fake_users.lookup_delay = 0.002
+        credentials = _credentials()
+        
+        async def p50(cached):
+            samples = []
+            for _ in range(200):
+                if not cached:
+                    user_cache.clear()
+                start = time.perf_counter()
+                await dependencies.get_current_user(credentials)
+                samples.append(time.perf_counter() - start)
+            return statistics.median(samples)
+        
+        uncached = await p50(False)
+        cached = await p50(True)
+        assert cached < uncached / 10
+        assert user_cache.stats()["hit_rate"] > 0.99